@@ -34,7 +34,13 @@ const ChatManagementPage = () => {
 
     const wsUrl = `${getWsBaseUrl()}/chat/${selectedThreadId}/?token=${token}`;
     const ws = new WebSocket(wsUrl);
-    ws.onmessage = () => refetch();
+    ws.onmessage = (event) => {
+      if (JSON.parse(event.data).type === 'ping') {
+        ws.send(JSON.stringify({ type: 'pong' }));
+        return;
+      }
+      refetch();
+    };
     wsRef.current = ws;
     return () => ws.close();
   }, [selectedThreadId, refetch]);
@@ -3,7 +3,7 @@ Admin API admin configuration
 """
 
 from django.contrib import admin
-from .models import AdminAction, TransactionNote
+from .models import AdminAction, TransactionNote, OutboxMessage
 
 
 @admin.register(AdminAction)
@@ -26,3 +26,13 @@ class TransactionNoteAdmin(admin.ModelAdmin):
     search_fields = ['transaction__id', 'admin_user__email', 'note']
     readonly_fields = ['created_at']
     ordering = ['-created_at']
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    """Pending and dispatched side effects"""
+    
+    list_display = ['id', 'kind', 'status', 'attempts', 'available_at', 'created_at', 'sent_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['created_at', 'sent_at']
+    ordering = ['-id']
@@ -9,3 +9,6 @@ class AdminApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'admin_api'
     verbose_name = 'Admin API'
+
+    def ready(self):
+        import admin_api.signals
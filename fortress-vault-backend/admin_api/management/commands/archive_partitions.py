@@ -0,0 +1,54 @@
+"""
+Management command to archive monthly partitions past the retention window
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.partitioning import PARTITIONED_TABLES, archive_partitions, is_supported
+
+
+class Command(BaseCommand):
+    help = 'Export old monthly partitions to gzipped CSV, then detach and drop them (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=settings.PARTITION_RETENTION_MONTHS,
+            help='Months kept online before the current one',
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=str(settings.PARTITION_ARCHIVE_DIR),
+            help='Directory for the <partition>.csv.gz exports',
+        )
+        parser.add_argument(
+            '--table',
+            action='append',
+            choices=sorted(PARTITIONED_TABLES),
+            help='Limit to this table (repeatable)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the partitions that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Table partitioning requires PostgreSQL')
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months must be at least 1')
+
+        archived = archive_partitions(
+            options['output_dir'],
+            retention_months=options['retention_months'],
+            tables=options['table'],
+            dry_run=options['dry_run'],
+        )
+        for name, path, rows in archived:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {name}')
+            else:
+                self.stdout.write(f'Archived {name}: {rows} rows -> {path}')
+        self.stdout.write(self.style.SUCCESS(f'{len(archived)} partition(s) archived'))
@@ -0,0 +1,34 @@
+"""
+Management command to create upcoming monthly partitions
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.partitioning import PARTITIONED_TABLES, ensure_partitions, is_supported
+
+
+class Command(BaseCommand):
+    help = 'Create monthly partitions for the partitioned tables ahead of time (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.PARTITION_PREMAKE_MONTHS,
+            help='Partitions to keep ready after the current month',
+        )
+        parser.add_argument(
+            '--table',
+            action='append',
+            choices=sorted(PARTITIONED_TABLES),
+            help='Limit to this table (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Table partitioning requires PostgreSQL')
+
+        created = ensure_partitions(months_ahead=options['months_ahead'], tables=options['table'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created'))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_api', '0006_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='platformsettings',
+            name='flags',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='platformsettings',
+            name='halted_metals',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0003_shipmentworkflowstage'),
+        ('admin_api', '0007_platformsettings_flags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionnote',
+            name='transaction',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='admin_notes', to='trading.transaction'),
+        ),
+    ]
@@ -5,6 +5,8 @@ Admin API models
 import uuid
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 
 class AdminAction(models.Model):
@@ -39,10 +41,13 @@ class TransactionNote(models.Model):
     """Admin notes on transactions"""
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # No database-level constraint: transactions is partitioned (utils.partitioning)
+    # and its primary key is (id, created_at); the ORM still cascades deletes
     transaction = models.ForeignKey(
         'trading.Transaction',
         on_delete=models.CASCADE,
-        related_name='admin_notes'
+        related_name='admin_notes',
+        db_constraint=False
     )
     admin_user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -93,14 +98,68 @@ class PlatformSettings(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     metals_buying_enabled = models.BooleanField(default=True)
     metals_selling_enabled = models.BooleanField(default=True)
+    halted_metals = models.JSONField(default=list, blank=True)  # Metal symbols with trading halted, e.g. ['XPT']
+    flags = models.JSONField(default=dict, blank=True)  # Other feature flags / toggles, by name
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'platform_settings'
 
     @classmethod
-    def get_solo(cls):
+    def get_solo(cls, use_cache=True):
+        """
+        Return the platform settings row.
+
+        By default this is a process-local cached instance (see
+        admin_api.platform_settings) that must be treated as read-only; pass
+        use_cache=False to load a fresh row for updates.
+        """
+        if use_cache:
+            from .platform_settings import get_cached_settings
+            return get_cached_settings()
+
         obj = cls.objects.first()
         if obj is None:
             obj = cls.objects.create()
         return obj
+
+    def is_metal_halted(self, symbol):
+        return symbol in self.halted_metals
+
+    def flag(self, name, default=False):
+        return self.flags.get(name, default)
+
+
+class OutboxMessage(models.Model):
+    """Side effect recorded in the same transaction as the change that caused it"""
+
+    class Kind(models.TextChoices):
+        CHANNEL = 'channel', 'Channel Layer'
+        EMAIL = 'email', 'Email'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENDING = 'sending', 'Sending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outbox_messages'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
@@ -0,0 +1,261 @@
+"""
+Transactional outbox - side effects committed with the change that caused them
+
+Request paths record WebSocket broadcasts and notification emails as
+OutboxMessage rows inside their own atomic() block instead of performing
+them inline. relay_outbox() (run by the admin_api.tasks.relay_outbox worker)
+drains pending rows in batches and dispatches them to the channel layer or
+the email sender, retrying failures with exponential backoff. A rolled back
+request therefore never fires its side effects, and slow Redis or SMTP no
+longer adds to request latency.
+"""
+
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from utils.metrics import CHANNEL_LAYER_SEND_SECONDS
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+RELAY_PENDING_KEY = 'outbox:relay:pending'
+
+
+# ---------------------------------------------------------------------------
+# Enqueueing (request side)
+# ---------------------------------------------------------------------------
+
+def enqueue(kind, payload):
+    """Record a side effect; it is dispatched only if the current transaction commits."""
+    message = OutboxMessage.objects.create(kind=kind, payload=payload)
+    db_transaction.on_commit(_kick_relay)
+    return message
+
+
+def enqueue_many(kind, payloads, batch_size=1000):
+    """Record many side effects of one kind with bulk inserts; dispatched only if the transaction commits."""
+    messages = OutboxMessage.objects.bulk_create(
+        [OutboxMessage(kind=kind, payload=payload) for payload in payloads], batch_size=batch_size
+    )
+    if messages:
+        db_transaction.on_commit(_kick_relay)
+    return messages
+
+
+def enqueue_group_send(group, message):
+    """Queue a channel-layer group_send."""
+    return enqueue(OutboxMessage.Kind.CHANNEL, {'group': group, 'message': message})
+
+
+def queue_kyc_decision_email(user, approved, reason=None):
+    return enqueue(OutboxMessage.Kind.EMAIL, {
+        'email': 'kyc_decision', 'user_id': str(user.id), 'approved': approved, 'reason': reason
+    })
+
+
+def queue_account_status_email(user, suspended, reason=None):
+    return enqueue(OutboxMessage.Kind.EMAIL, {
+        'email': 'account_status', 'user_id': str(user.id), 'suspended': suspended, 'reason': reason
+    })
+
+
+def queue_shipment_update_email(shipment):
+    return enqueue(OutboxMessage.Kind.EMAIL, {
+        'email': 'shipment_update', 'shipment_id': str(shipment.id)
+    })
+
+
+def _kick_relay():
+    # The beat schedule drains the outbox regardless; this only shortens
+    # the delay, so at most one kick is in flight at a time.
+    try:
+        if not cache.add(RELAY_PENDING_KEY, 1, timeout=5):
+            return
+        from .tasks import relay_outbox
+        relay_outbox.delay()
+    except Exception as e:
+        logger.warning(f"Failed to kick outbox relay: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Dispatch (relay side)
+# ---------------------------------------------------------------------------
+
+def _send_kyc_decision_email(payload):
+    from users.models import User
+    from .utils import send_kyc_decision_email
+    user = User.objects.get(pk=payload['user_id'])
+    send_kyc_decision_email(user, approved=payload['approved'], reason=payload.get('reason'))
+
+
+def _send_account_status_email(payload):
+    from users.models import User
+    from .utils import send_account_status_email
+    user = User.objects.get(pk=payload['user_id'])
+    send_account_status_email(user, suspended=payload['suspended'], reason=payload.get('reason'))
+
+
+def _send_shipment_update_email(payload):
+    from trading.models import Shipment
+    from .utils import send_shipment_update_email
+    shipment = Shipment.objects.select_related('user').get(pk=payload['shipment_id'])
+    send_shipment_update_email(shipment)
+
+
+def _send_price_alert_email(payload):
+    from trading.models import PriceAlert
+    from .utils import send_price_alert_email
+    alert = PriceAlert.objects.select_related('user', 'metal').get(pk=payload['alert_id'])
+    send_price_alert_email(alert)
+
+
+EMAIL_SENDERS = {
+    'kyc_decision': _send_kyc_decision_email,
+    'account_status': _send_account_status_email,
+    'shipment_update': _send_shipment_update_email,
+    'price_alert': _send_price_alert_email,
+}
+
+
+def _dispatch_emails(messages):
+    results = {}
+    for message in messages:
+        try:
+            EMAIL_SENDERS[message.payload['email']](message.payload)
+            results[message.id] = None
+        except Exception as e:
+            results[message.id] = e
+    return results
+
+
+def _dispatch_channel_messages(messages):
+    channel_layer = get_channel_layer()
+    results = {}
+
+    async def send_all():
+        # One event loop for the whole batch; messages go out in id order so
+        # chat messages keep their order within a thread.
+        for message in messages:
+            try:
+                with CHANNEL_LAYER_SEND_SECONDS.time(operation='group_send'):
+                    await channel_layer.group_send(message.payload['group'], message.payload['message'])
+                results[message.id] = None
+            except Exception as e:
+                results[message.id] = e
+
+    async_to_sync(send_all)()
+    return results
+
+
+DISPATCHERS = {
+    OutboxMessage.Kind.CHANNEL: _dispatch_channel_messages,
+    OutboxMessage.Kind.EMAIL: _dispatch_emails,
+}
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(2 ** attempts, 3600))
+
+
+def _claim_batch(batch_size):
+    """
+    Mark up to batch_size due messages SENDING and return them. Rows are
+    picked with SELECT ... FOR UPDATE SKIP LOCKED so concurrent relays never
+    claim the same message; the lock is held only for this short
+    transaction. available_at becomes the claim's deadline, after which a
+    SENDING message counts as abandoned and is claimed again.
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=[OutboxMessage.Status.PENDING, OutboxMessage.Status.SENDING],
+                available_at__lte=now,
+            )
+            .order_by('id')[:batch_size]
+        )
+        if messages:
+            OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+                status=OutboxMessage.Status.SENDING,
+                available_at=now + timedelta(seconds=getattr(settings, 'OUTBOX_CLAIM_SECONDS', 300)),
+            )
+    return messages
+
+
+def relay_batch(batch_size=None):
+    """
+    Dispatch one batch of due messages. Returns the number of messages
+    processed (sent or rescheduled).
+
+    The batch is claimed in its own short transaction (see _claim_batch)
+    and dispatched outside any transaction, so a slow mail server or
+    channel layer holds neither row locks nor a database connection's
+    transaction while it works. Results are written back afterwards.
+    """
+    batch_size = batch_size or getattr(settings, 'OUTBOX_RELAY_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+
+    messages = _claim_batch(batch_size)
+    if not messages:
+        return 0
+
+    results = {}
+    for kind, dispatch in DISPATCHERS.items():
+        of_kind = [message for message in messages if message.kind == kind]
+        if of_kind:
+            results.update(dispatch(of_kind))
+
+    now = timezone.now()
+    for message in messages:
+        error = results.get(message.id, ValueError(f"Unknown outbox kind {message.kind}"))
+        message.attempts += 1
+        if error is None:
+            message.status = OutboxMessage.Status.SENT
+            message.sent_at = now
+            message.last_error = ''
+            continue
+
+        message.last_error = str(error)
+        if message.attempts >= max_attempts:
+            message.status = OutboxMessage.Status.FAILED
+            logger.error(f"Outbox message {message.id} failed permanently: {error}")
+        else:
+            message.status = OutboxMessage.Status.PENDING
+            message.available_at = now + _retry_delay(message.attempts)
+            logger.warning(f"Outbox message {message.id} failed (attempt {message.attempts}): {error}")
+
+    OutboxMessage.objects.bulk_update(
+        messages, ['status', 'attempts', 'last_error', 'available_at', 'sent_at']
+    )
+    return len(messages)
+
+
+def relay_outbox(batch_size=None, max_batches=50):
+    """Drain due messages batch by batch. Returns the number processed."""
+    cache.delete(RELAY_PENDING_KEY)
+
+    processed = 0
+    for _ in range(max_batches):
+        count = relay_batch(batch_size)
+        processed += count
+        if not count:
+            break
+    return processed
+
+
+def prune_outbox(retention_days=None):
+    """Delete sent messages older than the retention window."""
+    retention_days = retention_days or getattr(settings, 'OUTBOX_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = OutboxMessage.objects.filter(
+        status=OutboxMessage.Status.SENT, sent_at__lt=cutoff
+    ).delete()
+    return deleted
@@ -0,0 +1,85 @@
+"""
+Process-local cache of the PlatformSettings singleton
+
+Hot paths (buy/sell, the public settings endpoint) read settings through
+PlatformSettings.get_solo(), which serves a cached instance from process
+memory. Every PLATFORM_SETTINGS_CHECK_SECONDS the cache compares its
+version against a shared version key in the default cache (Redis) and
+reloads the row only when an update has bumped it. Saving PlatformSettings
+resets this process immediately and bumps the shared version on commit, so
+other workers pick up a change within one check interval.
+"""
+
+import logging
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'platform_settings:version'
+
+_Entry = namedtuple('_Entry', ['settings', 'version', 'next_check'])
+_entry = None
+
+
+def _check_interval():
+    return getattr(settings, 'PLATFORM_SETTINGS_CHECK_SECONDS', 1.0)
+
+
+def _shared_version():
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # First process after a flush/eviction seeds the key
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+    except Exception as e:
+        logger.warning(f"Platform settings version check failed: {e}")
+        return None
+
+
+def get_cached_settings():
+    """Return the cached PlatformSettings instance (read-only)."""
+    global _entry
+
+    entry = _entry
+    now = time.monotonic()
+    if entry is not None and now < entry.next_check:
+        return entry.settings
+
+    version = _shared_version()
+    next_check = now + _check_interval()
+    if entry is not None and version is not None and version == entry.version:
+        _entry = entry._replace(next_check=next_check)
+        return entry.settings
+
+    from .models import PlatformSettings
+    obj = PlatformSettings.get_solo(use_cache=False)
+    _entry = _Entry(obj, version, next_check)
+    return obj
+
+
+def clear_local_settings():
+    """Drop this process's cached instance; the next read reloads it."""
+    global _entry
+    _entry = None
+
+
+def invalidate_platform_settings():
+    """Reload settings here now and in every other process once the transaction commits."""
+    clear_local_settings()
+    db_transaction.on_commit(_bump_shared_version)
+
+
+def _bump_shared_version():
+    clear_local_settings()
+    try:
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to publish platform settings change: {e}")
@@ -0,0 +1,263 @@
+"""
+Monte Carlo value at risk over platform holdings
+
+Daily closes are read from the metal price history (trading.MetalPrice, the
+last price recorded each day) and turned into a (days x metals) matrix of
+log returns. Its mean and covariance define a multivariate normal model of
+the metals' returns over RISK_VAR_HORIZON_DAYS, and correlated paths are
+drawn as mean + z @ factor.T, where factor @ factor.T is the covariance.
+
+Losses are linear in the price moves, so every group (the platform, each
+vault, each user tier) is one column of a (metals x groups) matrix of
+current holding values, and a chunk of paths is one matrix product:
+
+    losses[path, group] = -(exp(returns[path]) - 1) @ values
+
+Paths are simulated RISK_VAR_CHUNK_SIZE at a time and each chunk keeps only
+the running loss sum and its largest losses per group, the tail the widest
+confidence level needs (5% of the paths at 95%). The full (paths x groups)
+loss matrix is never built, and the chunks are independent, so with
+RISK_VAR_WORKERS > 1 they are
+spread over a process pool. Each chunk draws from its own child of
+SeedSequence(seed): a report is reproducible for a given seed, path count
+and chunk size, whatever the number of workers.
+
+At confidence c over n paths, VaR is the k-th largest loss and CVaR the mean
+of the k largest, with k = ceil(n * (1 - c)). Client cash in wallets has no
+price risk; it is reported as part of each group's value, and users are
+tiered by holdings plus cash.
+"""
+
+import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from trading.models import MetalPrice
+from users.models import Wallet
+from .exposure import UNALLOCATED, Holdings
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'admin:value_at_risk'
+# Kept past the next daily run, so a failed run leaves yesterday's report visible
+CACHE_TIMEOUT = 60 * 60 * 48
+CONFIDENCE_LEVELS = (0.95, 0.99)
+MIN_OBSERVATIONS = 20
+
+
+class RiskError(ValueError):
+    pass
+
+
+def daily_returns(metals, lookback_days):
+    """(days x metals) daily log returns from the price history of metals [(id, symbol, price)]."""
+    codes = {metal_id: code for code, (metal_id, _, _) in enumerate(metals)}
+    since = timezone.now() - timedelta(days=lookback_days)
+    rows = (
+        MetalPrice.objects.filter(metal_id__in=codes, recorded_at__gte=since)
+        .order_by('recorded_at')
+        .values_list('metal_id', 'recorded_at', 'price')
+        .iterator(chunk_size=5000)
+    )
+    closes = {}
+    for metal_id, recorded_at, price in rows:
+        day = timezone.localdate(recorded_at)
+        closes.setdefault(day, [math.nan] * len(metals))[codes[metal_id]] = float(price)
+
+    table = np.array([closes[day] for day in sorted(closes)]).reshape(len(closes), len(metals))
+    # Carry each metal's last close over days it was not priced, then start
+    # from the first day every metal has a price
+    for day in range(1, len(table)):
+        missing = np.isnan(table[day])
+        table[day, missing] = table[day - 1, missing]
+    priced = ~np.isnan(table).any(axis=1)
+    table = table[priced.argmax():] if priced.any() else table[:0]
+    return np.diff(np.log(table), axis=0)
+
+
+def fit(returns, horizon_days):
+    """Mean and covariance factor of returns over the horizon."""
+    mean = returns.mean(axis=0) * horizon_days
+    covariance = np.atleast_2d(np.cov(returns, rowvar=False)) * horizon_days
+    # eigh rather than Cholesky: a metal with a flat price makes the covariance singular
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    return mean, factor
+
+
+def _tail(losses, size):
+    """The size largest losses in each row of (groups x paths) losses, unordered."""
+    if losses.shape[1] <= size:
+        return losses
+    return np.partition(losses, losses.shape[1] - size, axis=1)[:, -size:]
+
+
+def simulate_chunk(job):
+    """(loss sum, largest losses) per group for one chunk of paths; module level so it pickles."""
+    seed, paths, mean, factor, values, tail_size = job
+    rng = np.random.default_rng(seed)
+    returns = mean + rng.standard_normal((paths, len(mean))) @ factor.T
+    # (groups x paths), so the per-group partition runs over contiguous rows
+    losses = values.T @ -np.expm1(returns).T
+    return losses.sum(axis=1), _tail(losses, tail_size)
+
+
+def simulate(mean, factor, values, paths, chunk_size, seed, workers=1, confidence=CONFIDENCE_LEVELS):
+    """
+    Expected loss and {confidence: (VaR, CVaR)} per column of values
+    (metals x groups), over paths simulated in chunks.
+    """
+    tail_size = max(1, math.ceil(paths * (1 - min(confidence))))
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = ((child, size, mean, factor, values, tail_size) for child, size in zip(seeds, sizes))
+
+    total = np.zeros(values.shape[1])
+    tails = []
+    pending = 0
+
+    def collect(results):
+        nonlocal total, tails, pending
+        for chunk_total, chunk_tail in results:
+            total += chunk_total
+            tails.append(chunk_tail)
+            pending += chunk_tail.shape[1]
+            # Cut back to the tail only every few chunks, not on each one
+            if pending > 4 * tail_size:
+                tails = [_tail(np.hstack(tails), tail_size)]
+                pending = tails[0].shape[1]
+
+    # Celery's prefork workers are daemonic and may not start child processes
+    if workers > 1 and len(sizes) > 1 and not multiprocessing.current_process().daemon:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(simulate_chunk, jobs))
+    else:
+        if workers > 1:
+            logger.warning("Value at risk: running chunks in-process; the worker cannot start a process pool")
+        collect(map(simulate_chunk, jobs))
+
+    tail = -np.sort(-_tail(np.hstack(tails), tail_size), axis=1)
+    levels = {}
+    for level in confidence:
+        k = max(1, math.ceil(paths * (1 - level)))
+        levels[level] = (tail[:, k - 1], tail[:, :k].mean(axis=1))
+    return total / paths, levels
+
+
+def tier_labels(bounds):
+    """'<10,000', '10,000-100,000', ..., '1,000,000+' for bounds [10000, 100000, 1000000]."""
+    if not bounds:
+        return ['All']
+    labels = [f'<{bounds[0]:,}']
+    labels += [f'{low:,}-{high:,}' for low, high in zip(bounds, bounds[1:])]
+    labels.append(f'{bounds[-1]:,}+')
+    return labels
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _group(value, cash, expected, levels, column):
+    return {
+        'holdings_value': _money(value),
+        'cash': _money(cash),
+        'expected_loss': _money(expected[column]),
+        'var': {f'{level:.2f}': _money(var[column]) for level, (var, _) in levels.items()},
+        'cvar': {f'{level:.2f}': _money(cvar[column]) for level, (_, cvar) in levels.items()},
+    }
+
+
+def value_at_risk(paths=None, chunk_size=None, seed=None, workers=None, horizon_days=None, lookback_days=None):
+    """VaR/CVaR report for the platform, each vault and each user tier."""
+    from vaults.models import Vault
+
+    paths = paths or settings.RISK_VAR_PATHS
+    chunk_size = chunk_size or settings.RISK_VAR_CHUNK_SIZE
+    seed = settings.RISK_VAR_SEED if seed is None else seed
+    workers = workers or settings.RISK_VAR_WORKERS
+    horizon_days = horizon_days or settings.RISK_VAR_HORIZON_DAYS
+    lookback_days = lookback_days or settings.RISK_VAR_LOOKBACK_DAYS
+    bounds = sorted(settings.RISK_VAR_TIER_BOUNDS)
+
+    holdings = Holdings.load()
+    returns = daily_returns(holdings.metals, lookback_days)
+    if len(returns) < MIN_OBSERVATIONS:
+        raise RiskError(
+            f"Value at risk needs {MIN_OBSERVATIONS} days of price history for every metal; have {len(returns)}"
+        )
+    mean, factor = fit(returns, horizon_days)
+    prices = holdings.prices
+
+    # Tier every user with holdings or cash by their total value
+    user_values = holdings.by_user @ prices
+    cash_by_user = dict(
+        (user_id, float(cash)) for user_id, cash in Wallet.objects.values_list('user_id', 'cash_balance').iterator()
+    )
+    holding_cash = np.array([cash_by_user.pop(user_id, 0.0) for user_id in holdings.users])
+    other_cash = np.fromiter(cash_by_user.values(), dtype=np.float64, count=len(cash_by_user))
+    user_tiers = np.searchsorted(bounds, user_values + holding_cash, side='right')
+    other_tiers = np.searchsorted(bounds, other_cash, side='right')
+    n_tiers = len(bounds) + 1
+    by_tier = np.zeros((n_tiers, len(prices)))
+    np.add.at(by_tier, user_tiers, holdings.by_user)
+    tier_cash = np.bincount(user_tiers, weights=holding_cash, minlength=n_tiers)
+    tier_cash += np.bincount(other_tiers, weights=other_cash, minlength=n_tiers)
+    tier_users = np.bincount(user_tiers, minlength=n_tiers) + np.bincount(other_tiers, minlength=n_tiers)
+
+    # Value columns: platform, then vaults, then tiers
+    by_group = np.vstack([holdings.by_metal, holdings.by_vault, by_tier])
+    values = (by_group * prices).T
+    expected, levels = simulate(mean, factor, values, paths, chunk_size, seed, workers=workers)
+
+    vault_names = dict(Vault.objects.filter(id__in=[v for v in holdings.vaults if v]).values_list('id', 'name'))
+    vault_offset = 1
+    tier_offset = vault_offset + len(holdings.vaults)
+    total_cash = tier_cash.sum()
+    volatility = np.sqrt((factor ** 2).sum(axis=1))
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'seed': seed,
+        'paths': paths,
+        'chunk_size': chunk_size,
+        'horizon_days': horizon_days,
+        'observations': len(returns),
+        'holdings': holdings.count,
+        'prices': dict(zip(holdings.symbols, (_money(price) for price in prices))),
+        'volatility': dict(zip(holdings.symbols, (round(float(v), 6) for v in volatility))),
+        'platform': _group(values[:, 0].sum(), total_cash, expected, levels, 0),
+        'by_vault': [
+            {
+                'vault': vault_names.get(vault_id, UNALLOCATED) if vault_id else UNALLOCATED,
+                **_group(values[:, vault_offset + index].sum(), 0, expected, levels, vault_offset + index),
+            }
+            for index, vault_id in enumerate(holdings.vaults)
+        ],
+        'by_tier': [
+            {
+                'tier': label,
+                'users': int(tier_users[index]),
+                **_group(values[:, tier_offset + index].sum(), tier_cash[index], expected, levels, tier_offset + index),
+            }
+            for index, label in enumerate(tier_labels(bounds))
+        ],
+    }
+
+
+def refresh_report(**options):
+    """Run the report and cache it for the admin endpoint."""
+    report = value_at_risk(**options)
+    cache.set(CACHE_KEY, report, CACHE_TIMEOUT)
+    return report
+
+
+def cached_report():
+    return cache.get(CACHE_KEY)
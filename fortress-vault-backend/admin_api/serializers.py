@@ -5,6 +5,7 @@ Admin API serializers
 from rest_framework import serializers
 from users.models import User, Address, Wallet, ChatThread, ChatMessage
 from trading.models import Transaction, Shipment, ShipmentEvent, ShipmentWorkflowStage, PortfolioItem, Metal, Product
+from utils.compiled_serializers import CompiledReadSerializer, reads
 from .models import AdminAction, TransactionNote, DevEmail
 
 
@@ -197,6 +198,7 @@ class AdminTransactionSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = '__all__'
     
+    @reads('user__first_name', 'user__last_name', 'user__username')
     def get_user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
 
@@ -254,12 +256,26 @@ class AdminDeliverySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
     
+    @reads('user__first_name', 'user__last_name', 'user__username')
     def get_user_name(self, obj):
         """Get full name or username"""
         full_name = f"{obj.user.first_name} {obj.user.last_name}".strip()
         return full_name if full_name else obj.user.username
 
 
+# Compiled read serializers for the admin list endpoints (see utils.compiled_serializers)
+class AdminUserListReadSerializer(CompiledReadSerializer):
+    serializer_class = AdminUserListSerializer
+
+
+class AdminTransactionReadSerializer(CompiledReadSerializer):
+    serializer_class = AdminTransactionSerializer
+
+
+class AdminDeliveryReadSerializer(CompiledReadSerializer):
+    serializer_class = AdminDeliverySerializer
+
+
 # Legacy shipment serializers (kept for backward compatibility)
 class ShipmentEventSerializer(serializers.ModelSerializer):
     class Meta:
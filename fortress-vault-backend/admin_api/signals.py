@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import PlatformSettings
+from .platform_settings import invalidate_platform_settings
+
+@receiver(post_save, sender=PlatformSettings)
+def publish_platform_settings_change(sender, instance, **kwargs):
+    """Invalidate cached platform settings in every process"""
+    invalidate_platform_settings()
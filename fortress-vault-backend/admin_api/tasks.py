@@ -0,0 +1,65 @@
+"""
+Celery tasks for admin_api app
+"""
+
+from celery import shared_task
+from django.conf import settings
+import logging
+
+from utils import partitioning
+from . import outbox, risk
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def relay_outbox():
+    """Dispatch pending outbox messages to the channel layer and email senders"""
+    try:
+        processed = outbox.relay_outbox()
+        return f"Relayed {processed} outbox messages"
+    except Exception as e:
+        logger.error(f"Error relaying outbox: {e}")
+        raise
+
+
+@shared_task
+def prune_outbox():
+    """Delete sent outbox messages past the retention window"""
+    try:
+        deleted = outbox.prune_outbox()
+        return f"Pruned {deleted} outbox messages"
+    except Exception as e:
+        logger.error(f"Error pruning outbox: {e}")
+        raise
+
+
+@shared_task
+def maintain_partitions():
+    """Create upcoming monthly partitions and archive the ones past retention"""
+    if not partitioning.is_supported():
+        return "Partitioning requires PostgreSQL; skipped"
+    try:
+        created = partitioning.ensure_partitions(months_ahead=settings.PARTITION_PREMAKE_MONTHS)
+        archived = partitioning.archive_partitions(
+            settings.PARTITION_ARCHIVE_DIR, retention_months=settings.PARTITION_RETENTION_MONTHS
+        )
+        return f"Created {len(created)} partitions, archived {len(archived)}"
+    except Exception as e:
+        logger.error(f"Error maintaining partitions: {e}")
+        raise
+
+
+@shared_task
+def value_at_risk():
+    """Simulate the daily value-at-risk report and cache it for the admin dashboard"""
+    try:
+        report = risk.refresh_report()
+        platform = report['platform']
+        return f"Value at risk over {report['paths']} paths: {platform['var']}"
+    except risk.RiskError as e:
+        logger.warning(f"Value at risk skipped: {e}")
+        return str(e)
+    except Exception as e:
+        logger.error(f"Error computing value at risk: {e}")
+        raise
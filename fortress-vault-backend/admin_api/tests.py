@@ -3,10 +3,14 @@ Admin API tests
 """
 
 import pytest
-from django.test import TestCase
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from utils.testing import QueryBudgetMixin
 
 User = get_user_model()
 
@@ -1249,3 +1253,835 @@ class TestAuditLogViewSet(TestCase):
         response = self.client.get(f'/api/admin/audit/{self.action1.id}/')
         
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CACHES=LOCAL_CACHES, USE_SMTP_EMAIL=False)
+class TestOutboxRelay(TestCase):
+    """Test transactional outbox enqueueing and relay"""
+    
+    def setUp(self):
+        from admin_api.models import OutboxMessage, DevEmail
+        
+        self.OutboxMessage = OutboxMessage
+        self.DevEmail = DevEmail
+        self.client = APIClient()
+        
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.pending_user = User.objects.create_user(
+            email='pending@test.com',
+            username='pending',
+            password='testpass123',
+            kyc_status=User.KYCStatus.PENDING
+        )
+    
+    def test_kyc_approval_queues_email_until_relay(self):
+        """Test that KYC approval records the email instead of sending it inline"""
+        from admin_api.outbox import relay_outbox
+        
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(f'/api/admin/kyc/{self.pending_user.id}/approve/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        message = self.OutboxMessage.objects.get()
+        self.assertEqual(message.kind, self.OutboxMessage.Kind.EMAIL)
+        self.assertEqual(message.payload['email'], 'kyc_decision')
+        self.assertFalse(self.DevEmail.objects.exists())
+        
+        self.assertEqual(relay_outbox(), 1)
+        
+        message.refresh_from_db()
+        self.assertEqual(message.status, self.OutboxMessage.Status.SENT)
+        self.assertEqual(self.DevEmail.objects.get().recipient_list, ['pending@test.com'])
+    
+    def test_rolled_back_transaction_discards_side_effects(self):
+        """Test that side effects are not recorded when the transaction rolls back"""
+        from django.db import transaction as db_transaction
+        from admin_api.outbox import enqueue_group_send
+        
+        with self.assertRaises(RuntimeError):
+            with db_transaction.atomic():
+                enqueue_group_send('chat_rollback', {'type': 'chat_message', 'message': {}})
+                raise RuntimeError('rollback')
+        
+        self.assertFalse(self.OutboxMessage.objects.exists())
+    
+    def test_relay_sends_channel_messages_in_order(self):
+        """Test that channel messages are delivered to the group in insertion order"""
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from admin_api.outbox import enqueue_group_send, relay_outbox
+        
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('chat_thread-1', channel_name)
+        
+        for body in ['first', 'second']:
+            enqueue_group_send('chat_thread-1', {'type': 'chat_message', 'message': {'body': body}})
+        relay_outbox()
+        
+        received = [async_to_sync(channel_layer.receive)(channel_name)['message']['body'] for _ in range(2)]
+        self.assertEqual(received, ['first', 'second'])
+        self.assertEqual(
+            self.OutboxMessage.objects.filter(status=self.OutboxMessage.Status.SENT).count(), 2
+        )
+    
+    def test_failed_dispatch_is_retried_then_marked_failed(self):
+        """Test that failing messages back off and stop after the maximum attempts"""
+        from django.utils import timezone
+        from admin_api import outbox
+        
+        outbox.queue_kyc_decision_email(self.pending_user, approved=True)
+        
+        with patch.dict(outbox.EMAIL_SENDERS, {'kyc_decision': Mock(side_effect=ConnectionError('SMTP down'))}):
+            with override_settings(OUTBOX_MAX_ATTEMPTS=2):
+                outbox.relay_outbox()
+                message = self.OutboxMessage.objects.get()
+                self.assertEqual(message.status, self.OutboxMessage.Status.PENDING)
+                self.assertEqual(message.attempts, 1)
+                self.assertGreater(message.available_at, timezone.now())
+                self.assertIn('SMTP down', message.last_error)
+                
+                # Not due yet, so a second run leaves it alone
+                self.assertEqual(outbox.relay_outbox(), 0)
+                
+                self.OutboxMessage.objects.update(available_at=timezone.now())
+                outbox.relay_outbox()
+        
+        message.refresh_from_db()
+        self.assertEqual(message.status, self.OutboxMessage.Status.FAILED)
+        self.assertEqual(message.attempts, 2)
+
+    
+    def test_messages_are_claimed_before_sending(self):
+        """Test that a batch is marked in flight before dispatch and an abandoned claim is retried"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from admin_api import outbox
+        
+        outbox.queue_kyc_decision_email(self.pending_user, approved=True)
+        seen = []
+        
+        def sender(payload):
+            message = self.OutboxMessage.objects.get()
+            seen.append((message.status, message.available_at > timezone.now()))
+        
+        with patch.dict(outbox.EMAIL_SENDERS, {'kyc_decision': sender}):
+            # A relay that claimed the message and died: not due until its claim runs out
+            self.OutboxMessage.objects.update(
+                status=self.OutboxMessage.Status.SENDING, available_at=timezone.now() + timedelta(minutes=5)
+            )
+            self.assertEqual(outbox.relay_outbox(), 0)
+            
+            self.OutboxMessage.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.relay_outbox(), 1)
+        
+        self.assertEqual(seen, [(self.OutboxMessage.Status.SENDING, True)])
+        self.assertEqual(self.OutboxMessage.objects.get().status, self.OutboxMessage.Status.SENT)
+
+class TestCompiledReadSerializers(TestCase):
+    """Test that the compiled admin list serializers match the DRF serializers"""
+    
+    def setUp(self):
+        """Set up users, transactions with notes and a delivery"""
+        from decimal import Decimal
+        from trading.models import Metal, Product, PortfolioItem, Shipment, Transaction
+        from admin_api.models import TransactionNote
+        
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.customer = User.objects.create_user(
+            email='customer@test.com',
+            username='customer',
+            password='testpass123',
+            first_name='Ada',
+            last_name='Lovelace'
+        )
+        
+        gold = Metal.objects.create(name='Gold', symbol='AU', current_price=Decimal('2000.00'))
+        product = Product.objects.create(
+            metal=gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type='bar'
+        )
+        transaction = Transaction.objects.create(
+            user=self.customer, transaction_type=Transaction.TransactionType.BUY, metal=gold,
+            amount_oz=Decimal('1.0000'), price_per_oz=Decimal('2000.00'), total_value=Decimal('2000.00'),
+            fees=Decimal('12.50')
+        )
+        TransactionNote.objects.create(transaction=transaction, admin_user=self.admin_user, note='Checked')
+        TransactionNote.objects.create(transaction=transaction, admin_user=self.admin_user, note='Approved')
+        Transaction.objects.create(
+            user=self.admin_user, transaction_type=Transaction.TransactionType.DEPOSIT, metal=None,
+            total_value=Decimal('500.00')
+        )
+        
+        shipment = Shipment.objects.create(
+            user=self.customer, carrier='fedex', tracking_number='TRK-100',
+            destination_address={'street': '1 Vault Way'}
+        )
+        shipment.initialize_workflow()
+        shipment.events.create(status=Shipment.Status.REQUESTED, description='Requested')
+        PortfolioItem.objects.create(
+            user=self.customer, metal=gold, product=product, weight_oz=Decimal('1.0000'),
+            shipment=shipment, purchase_price=Decimal('2050.00'), status=PortfolioItem.Status.IN_TRANSIT
+        )
+        Shipment.objects.create(user=self.admin_user, carrier='brinks', destination_address={})
+    
+    def test_serializers_match(self):
+        """Test compiled output is byte-identical to the DRF serializers"""
+        from trading.models import Shipment, Transaction
+        from utils import fastjson
+        from admin_api.serializers import (
+            AdminUserListSerializer, AdminTransactionSerializer, AdminDeliverySerializer,
+            AdminUserListReadSerializer, AdminTransactionReadSerializer, AdminDeliveryReadSerializer
+        )
+        
+        cases = [
+            (AdminUserListSerializer, AdminUserListReadSerializer, User.objects.order_by('email')),
+            (AdminTransactionSerializer, AdminTransactionReadSerializer, Transaction.objects.order_by('created_at')),
+            (AdminDeliverySerializer, AdminDeliveryReadSerializer, Shipment.objects.order_by('created_at')),
+        ]
+        for serializer_class, read_serializer_class, queryset in cases:
+            with self.subTest(serializer=serializer_class.__name__):
+                expected = serializer_class(queryset, many=True).data
+                actual = read_serializer_class(queryset).data
+                self.assertEqual(fastjson.dumps(actual), fastjson.dumps(expected))
+    
+    def test_list_endpoints_match_regular_serializers(self):
+        """Test admin list responses are unchanged with compiled serializers turned off"""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        urls = [
+            '/api/admin/users/',
+            '/api/admin/transactions/',
+            '/api/admin/transactions/pending/',
+            '/api/admin/deliveries/?ordering=created_at',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(COMPILED_READ_SERIALIZERS=False):
+                    expected = self.client.get(url)
+                response = self.client.get(url)
+                
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.content, expected.content)
+    
+    def test_field_selection_on_admin_lists(self):
+        """Test ?fields= / ?expand= give the same output on both serializer paths"""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        url = '/api/admin/deliveries/?ordering=created_at&expand=items&fields=id,user_name,items.product_name,history'
+        with override_settings(COMPILED_READ_SERIALIZERS=False):
+            expected = self.client.get(url)
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected.content)
+        delivery = response.json()['results'][0]
+        self.assertEqual(list(delivery), ['id', 'user_name', 'items', 'history'])
+        self.assertEqual(delivery['user_name'], 'Ada Lovelace')
+        self.assertEqual(delivery['items'], [{'product_name': '1oz Gold Bar'}])
+        self.assertEqual(len(delivery['history']), 1)
+        self.assertIsInstance(delivery['history'][0], str)
+
+
+class TestSQLInstrumentation(QueryBudgetMixin, TestCase):
+    """Test the SQL instrumentation middleware, stats endpoint and budget helper"""
+    
+    def setUp(self):
+        """Set up an admin and chat threads whose list serializer queries per thread"""
+        from users.models import ChatThread
+        
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        for i in range(4):
+            customer = User.objects.create_user(
+                email=f'customer{i}@test.com',
+                username=f'customer{i}',
+                password='testpass123'
+            )
+            ChatThread.objects.create(customer=customer)
+    
+    def test_server_timing_header(self):
+        """Test that responses report query count and SQL time"""
+        response = self.client.get('/api/admin/deliveries/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, 0 duplicate", db-worst;dur=[\d.]+$'
+        )
+    
+    @override_settings(SQL_N_PLUS_ONE_THRESHOLD=4)
+    def test_n_plus_one_is_recorded_and_logged(self):
+        """Test that repeated per-row queries are aggregated under the endpoint name"""
+        with patch('utils.sql_instrumentation.record_endpoint_stats') as record:
+            with self.assertLogs('utils.sql_instrumentation', level='WARNING') as logs:
+                response = self.client.get('/api/admin/chats/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        endpoint, recorder = record.call_args.args
+        self.assertEqual(endpoint, 'GET admin-chat-list')
+        self.assertGreaterEqual(recorder.duplicate_count, 6)
+        self.assertIn('Possible N+1 on GET admin-chat-list', logs.output[0])
+    
+    def test_query_budget_helper_reports_duplicates(self):
+        """Test that exceeding a budget fails with the repeated statement"""
+        with self.assertRaises(AssertionError) as failure:
+            self.assertEndpointBudget(self.client, 'get', '/api/admin/chats/', max_queries=50)
+        
+        self.assertIn('Duplicate query budget of 0 exceeded', str(failure.exception))
+        self.assertIn('4x SELECT', str(failure.exception))
+        
+        self.assertEndpointBudget(self.client, 'get', '/api/admin/deliveries/', max_queries=2)
+    
+    @override_settings(SQL_STATS_FLUSH_EVERY=3, SQL_STATS_FLUSH_INTERVAL=3600)
+    def test_stats_are_buffered_and_flushed_in_one_pipeline(self):
+        """Test that per-request stats reach Redis in batches, not one call per request"""
+        from utils import sql_instrumentation
+        
+        sql_instrumentation.flush_endpoint_stats()
+        recorder = sql_instrumentation.QueryRecorder()
+        recorder.queries = [('SELECT 1', 2.0), ('SELECT 1', 3.0), ('SELECT 2', 5.0)]
+        client = Mock()
+        
+        with patch('utils.sql_instrumentation.get_redis_client', return_value=client):
+            sql_instrumentation.record_endpoint_stats('GET admin-chat-list', recorder)
+            sql_instrumentation.record_endpoint_stats('GET admin-chat-list', recorder)
+            client.pipeline.assert_not_called()
+            sql_instrumentation.record_endpoint_stats('GET portfolio-list', recorder)
+        
+        client.register_script.assert_not_called()
+        pipe = client.pipeline.return_value
+        pipe.execute.assert_called_once()
+        calls = {call.args[4]: call.args[5:] for call in pipe.evalsha.call_args_list}
+        self.assertEqual(set(calls), {'GET admin-chat-list', 'GET portfolio-list'})
+        # requests, queries, sql_ms, duplicates, requests_with_duplicates, max_queries, worst_ms
+        self.assertEqual(calls['GET admin-chat-list'][:7], (2, 6, '20.000', 2, 2, 3, '5.000'))
+        self.assertEqual(sql_instrumentation._buffer, {})
+    
+    def test_stats_endpoint_ranks_endpoints(self):
+        """Test that the stats endpoint orders aggregates from Redis"""
+        from utils import sql_instrumentation
+        
+        stored = {
+            b'GET admin-chat-list': {b'requests': b'2', b'queries': b'30', b'sql_ms': b'12.5', b'duplicate_queries': b'24'},
+            b'GET portfolio-list': {b'requests': b'10', b'queries': b'20', b'sql_ms': b'40.0', b'duplicate_queries': b'0'},
+        }
+        
+        class FakePipeline:
+            def __init__(self):
+                self.results = []
+            
+            def hgetall(self, key):
+                for endpoint, values in stored.items():
+                    if key == sql_instrumentation.ENDPOINT_KEY.format(
+                        endpoint=sql_instrumentation.hashlib.sha1(endpoint).hexdigest()[:16]
+                    ):
+                        self.results.append(values)
+            
+            def execute(self):
+                return self.results
+        
+        client = Mock()
+        client.zrange.return_value = list(stored)
+        client.pipeline.side_effect = FakePipeline
+        
+        with patch('utils.sql_instrumentation.get_redis_client', return_value=client):
+            response = self.client.get('/api/admin/performance/sql/')
+            by_time = self.client.get('/api/admin/performance/sql/?order=avg_sql_ms&limit=1')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['endpoint'] for row in response.data['endpoints']], ['GET admin-chat-list', 'GET portfolio-list'])
+        self.assertEqual(response.data['endpoints'][0]['avg_queries'], 15.0)
+        self.assertEqual([row['endpoint'] for row in by_time.data['endpoints']], ['GET admin-chat-list'])
+        
+        bad_order = self.client.get('/api/admin/performance/sql/?order=nope')
+        self.assertEqual(bad_order.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], CACHES=LOCAL_CACHES)
+class TestReplicaRouting(TestCase):
+    """Test read-replica selection, fallback and read-your-writes stickiness"""
+    
+    def setUp(self):
+        """Set up an admin user and clear cached lag checks"""
+        from django.core.cache import cache
+        from utils import db_routing
+        
+        self.db_routing = db_routing
+        db_routing._lag_checks.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+    
+    def test_reads_go_to_replica_until_first_write(self):
+        """Test that a write moves the rest of the request back to the primary"""
+        from trading.models import Transaction
+        
+        with patch.object(self.db_routing, 'measure_replica_lag', return_value=0.0):
+            with self.db_routing.request_routing():
+                self.assertEqual(self.db_routing.use_replica(), 'replica')
+                self.assertEqual(Transaction.objects.all().db, 'replica')
+                
+                self.db_routing.ReplicaRouter().db_for_write(Transaction)
+                self.assertEqual(Transaction.objects.all().db, 'default')
+        
+        # Outside a request nothing is routed
+        self.assertEqual(Transaction.objects.all().db, 'default')
+    
+    def test_lagging_or_unreachable_replica_falls_back_to_primary(self):
+        """Test that replicas over the lag limit or failing the check are skipped"""
+        from django.db import OperationalError
+        
+        with override_settings(REPLICA_MAX_LAG_SECONDS=2):
+            with patch.object(self.db_routing, 'measure_replica_lag', return_value=30.0):
+                self.assertIsNone(self.db_routing.choose_replica())
+            
+            self.db_routing._lag_checks.clear()
+            with patch.object(self.db_routing, 'measure_replica_lag', side_effect=OperationalError('down')):
+                with self.assertLogs('utils.db_routing', level='WARNING'):
+                    self.assertIsNone(self.db_routing.choose_replica())
+            
+            # The failed check is cached rather than retried on every request
+            with patch.object(self.db_routing, 'measure_replica_lag', return_value=0.0) as measure:
+                self.assertIsNone(self.db_routing.choose_replica())
+            measure.assert_not_called()
+    
+    def test_write_pins_user_to_primary(self):
+        """Test that a user who wrote keeps reading from the primary"""
+        other_admin = User.objects.create_user(
+            email='other@test.com',
+            username='other',
+            password='testpass123',
+            is_staff=True
+        )
+        
+        response = self.client.post('/api/admin/platform/settings/', {'metals_buying_enabled': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        with patch.object(self.db_routing, 'measure_replica_lag', return_value=0.0):
+            self.assertIsNone(self.db_routing.choose_replica(self.admin_user))
+            self.assertEqual(self.db_routing.choose_replica(other_admin), 'replica')
+    
+    def test_only_replica_safe_views_use_replica(self):
+        """Test that annotated admin dashboards opt in and other views do not"""
+        with patch.object(self.db_routing, 'use_replica', return_value=None) as use_replica:
+            self.client.get('/api/admin/transactions/')
+            use_replica.assert_not_called()
+            
+            response = self.client.get('/api/admin/dashboard/transaction-volume/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            use_replica.assert_called_once()
+    
+    def test_action_level_annotation(self):
+        """Test that @replica_safe on a single action only covers that action"""
+        from types import SimpleNamespace
+        from rest_framework import viewsets
+        from rest_framework.decorators import action
+        
+        class ReportViewSet(self.db_routing.ReplicaReadMixin, viewsets.ViewSet):
+            @self.db_routing.replica_safe
+            @action(detail=False, methods=['get'])
+            def report(self, request):
+                pass
+            
+            def list(self, request):
+                pass
+        
+        get = SimpleNamespace(method='GET')
+        self.assertTrue(ReportViewSet(action='report').is_replica_safe(get))
+        self.assertFalse(ReportViewSet(action='list').is_replica_safe(get))
+        self.assertFalse(ReportViewSet(action='report').is_replica_safe(SimpleNamespace(method='POST')))
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias (DB_REPLICA_HOSTS)')
+@override_settings(CACHES=LOCAL_CACHES)
+class TestReplicaRoutingIntegration(TransactionTestCase):
+    """Run replica-safe views against a second database alias"""
+    
+    # The runner checks every alias a test class names, skipped or not
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+    
+    def test_dashboard_reads_from_replica(self):
+        """Test that a replica-safe dashboard queries the replica alias"""
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        
+        admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        client = APIClient()
+        client.force_authenticate(user=admin_user)
+        
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = client.get('/api/admin/dashboard/vault-inventory/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica_queries), 0)
+
+
+class TestPartitioning(TestCase):
+    """Test monthly partition bookkeeping and its behaviour off PostgreSQL"""
+    
+    def test_month_arithmetic_and_names(self):
+        """Test partition names round-trip and months roll over years"""
+        from datetime import date
+        from utils.partitioning import add_months, parse_partition_name, partition_name
+        
+        self.assertEqual(add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partition_name('transactions', date(2026, 2, 1)), 'transactions_p2026_02')
+        self.assertEqual(
+            parse_partition_name('shipment_events_p2026_02'),
+            ('shipment_events', date(2026, 2, 1))
+        )
+        self.assertIsNone(parse_partition_name('transactions_default'))
+    
+    def test_partitions_past_retention_are_selected(self):
+        """Test that only whole months before the retention window are archived"""
+        from datetime import date
+        from utils.partitioning import partitions_to_archive
+        
+        names = [
+            'transactions_default',
+            'transactions_p2025_12',
+            'transactions_p2026_01',
+            'transactions_p2026_02',
+            'transactions_p2026_03',
+        ]
+        
+        self.assertEqual(
+            partitions_to_archive(names, date(2026, 3, 15), retention_months=1),
+            ['transactions_p2025_12', 'transactions_p2026_01']
+        )
+        self.assertEqual(partitions_to_archive(names, date(2026, 3, 15), retention_months=2), ['transactions_p2025_12'])
+    
+    def test_maintenance_is_a_no_op_without_postgres(self):
+        """Test that commands refuse and the task skips on other databases"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.db import connection
+        from admin_api.tasks import maintain_partitions
+        
+        if connection.vendor == 'postgresql':
+            self.skipTest('runs against PostgreSQL')
+        with self.assertRaises(CommandError):
+            call_command('create_partitions')
+        with self.assertRaises(CommandError):
+            call_command('archive_partitions', '--dry-run')
+        self.assertIn('skipped', maintain_partitions())
+    
+    def test_deleting_transaction_still_cascades_to_notes(self):
+        """Test that notes go with their transaction without a database constraint"""
+        from decimal import Decimal
+        from trading.models import Transaction
+        from .models import TransactionNote
+        
+        admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        transaction = Transaction.objects.create(
+            user=admin_user,
+            transaction_type=Transaction.TransactionType.DEPOSIT,
+            total_value=Decimal('100.00')
+        )
+        TransactionNote.objects.create(transaction=transaction, admin_user=admin_user, note='Checked')
+        
+        transaction.delete()
+        
+        self.assertFalse(TransactionNote.objects.exists())
+
+
+class TestExports(TestCase):
+    """Test streamed CSV/NDJSON exports of admin lists"""
+    
+    def setUp(self):
+        """Set up an admin user, a customer and some transactions"""
+        from decimal import Decimal
+        from trading.models import Metal, Transaction
+        
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.customer = User.objects.create_user(
+            email='customer@test.com',
+            username='customer',
+            password='testpass123'
+        )
+        gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        for value, status_value in [('100.00', 'pending'), ('250.00', 'completed'), ('900.00', 'pending')]:
+            Transaction.objects.create(
+                user=self.customer,
+                transaction_type='buy',
+                metal=gold,
+                amount_oz=Decimal('0.0500'),
+                price_per_oz=Decimal('2000.00'),
+                total_value=Decimal(value),
+                status=status_value
+            )
+    
+    def test_transaction_export_uses_list_filters(self):
+        """Test that the export applies the list's filter and ordering parameters"""
+        import csv
+        
+        response = self.client.get(
+            '/api/admin/transactions/export/?status=pending&ordering=-total_value'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['total_value'] for row in rows], ['900.00', '100.00'])
+        self.assertEqual(rows[0]['user_email'], 'customer@test.com')
+        self.assertEqual(rows[0]['metal_symbol'], 'XAU')
+    
+    def test_audit_log_ndjson_export(self):
+        """Test that audit log entries export as one JSON object per line"""
+        import json
+        import uuid
+        from .models import AdminAction
+        
+        target_id = uuid.uuid4()
+        AdminAction.objects.create(
+            admin_user=self.admin_user,
+            action_type='suspend_user',
+            target_type='user',
+            target_id=target_id,
+            details={'reason': 'fraud'}
+        )
+        
+        response = self.client.get('/api/admin/audit/export/?output=ndjson&action_type=suspend_user')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['admin_email'], 'admin@test.com')
+        self.assertEqual(rows[0]['target_id'], str(target_id))
+        self.assertEqual(rows[0]['details'], {'reason': 'fraud'})
+    
+    def test_export_requires_admin(self):
+        """Test that non-admin users cannot export"""
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get('/api/admin/transactions/export/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestVaultExposure(TestCase):
+    """Test the price-shock stress test over vaulted holdings"""
+    
+    def setUp(self):
+        """Set up gold and silver holdings in two vaults"""
+        from decimal import Decimal
+        from trading.models import Metal, Product, PortfolioItem
+        from vaults.models import Vault
+        
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        silver = Metal.objects.create(name='Silver', symbol='XAG', current_price=Decimal('25.00'))
+        london = Vault.objects.create(name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008'))
+        zurich = Vault.objects.create(name='Zurich', city='Zurich', country='CH', storage_fee_percent=Decimal('0.0008'))
+        self.whale = User.objects.create_user(email='whale@test.com', username='whale', password='testpass123')
+        self.minnow = User.objects.create_user(email='minnow@test.com', username='minnow', password='testpass123')
+        holdings = [
+            (self.whale, gold, london, '10.0000', 'vaulted'),
+            (self.whale, silver, zurich, '100.0000', 'vaulted'),
+            (self.minnow, gold, zurich, '1.0000', 'vaulted'),
+            (self.minnow, silver, zurich, '400.0000', 'vaulted'),
+            # Delivered metal is no longer platform exposure
+            (self.minnow, gold, None, '50.0000', 'delivered'),
+        ]
+        for user, metal, vault, weight, item_status in holdings:
+            product = Product.objects.get_or_create(
+                metal=metal, name=f'{metal.name} Bar', manufacturer='PAMP', purity='.9999',
+                weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('5.00'), product_type='bar'
+            )[0]
+            PortfolioItem.objects.create(
+                user=user, metal=metal, product=product, weight_oz=Decimal(weight),
+                vault_location=vault, status=item_status, purchase_price=Decimal('1.00')
+            )
+    
+    def test_shock_tables_and_top_users(self):
+        """Test per-metal and per-vault changes and the users most exposed to the worst scenario"""
+        response = self.client.post('/api/admin/dashboard/vault-exposure/', {
+            'scenarios': [
+                {'name': 'gold -10 silver +15', 'shocks': {'XAU': -0.10, 'XAG': 0.15}},
+                {'name': 'silver crash', 'shocks': {'xag': -0.5}},
+            ],
+            'top_users': 1
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['holdings'], 4)
+        self.assertEqual(response.data['base']['by_metal'], {'XAG': 12500.0, 'XAU': 22000.0})
+        
+        mixed, crash = response.data['scenarios']
+        # gold: 11oz * -200, silver: 500oz * +3.75
+        self.assertEqual(mixed['by_metal'], {'XAG': 1875.0, 'XAU': -2200.0})
+        self.assertEqual(mixed['by_vault'], {'London': -2000.0, 'Zurich': 1675.0})
+        self.assertEqual(mixed['total_change'], -325.0)
+        self.assertEqual(crash['total_change'], -6250.0)
+        
+        self.assertEqual(response.data['worst_scenario'], 'silver crash')
+        self.assertEqual(response.data['top_users'], [{
+            'user_id': str(self.minnow.id),
+            'email': 'minnow@test.com',
+            'current_value': 12000.0,
+            'change': -5000.0,
+        }])
+    
+    def test_default_scenarios_and_validation(self):
+        """Test the default shock ladder and rejection of unknown metals"""
+        response = self.client.post('/api/admin/dashboard/vault-exposure/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['scenarios']), 12)
+        self.assertEqual(response.data['scenarios'][0]['name'], 'XAG -30%')
+        
+        for scenario in ({'shocks': {'XPT': -0.1}}, {'shocks': [1]}, {'shocks': 'XAU'}, {'name': ['crash']}):
+            response = self.client.post('/api/admin/dashboard/vault-exposure/', {
+                'scenarios': [scenario]
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TestValueAtRisk(TestCase):
+    """Test the Monte Carlo value-at-risk report"""
+    
+    def setUp(self):
+        """Set up gold and silver holdings with 60 days of correlated price history"""
+        from datetime import timedelta
+        from decimal import Decimal
+        import numpy as np
+        from django.utils import timezone
+        from trading.models import Metal, MetalPrice, Product, PortfolioItem
+        from vaults.models import Vault
+        
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.admin_user.wallet.cash_balance = Decimal('5000.00')
+        self.admin_user.wallet.save()
+        self.client.force_authenticate(user=self.admin_user)
+        gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        silver = Metal.objects.create(name='Silver', symbol='XAG', current_price=Decimal('25.00'))
+        
+        rng = np.random.default_rng(1)
+        now = timezone.now()
+        gold_moves = rng.normal(0, 0.01, 60)
+        silver_moves = 0.8 * gold_moves + rng.normal(0, 0.01, 60)
+        history = []
+        for day, (gold_move, silver_move) in enumerate(zip(gold_moves, silver_moves)):
+            recorded_at = now - timedelta(days=61 - day)
+            history.append(MetalPrice(metal=gold, price=Decimal(f'{2000 * np.exp(gold_move):.2f}'), recorded_at=recorded_at))
+            history.append(MetalPrice(metal=silver, price=Decimal(f'{25 * np.exp(silver_move):.2f}'), recorded_at=recorded_at))
+        MetalPrice.objects.bulk_create(history)
+        
+        london = Vault.objects.create(name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008'))
+        whale = User.objects.create_user(email='whale@test.com', username='whale', password='testpass123')
+        product = Product.objects.create(
+            metal=gold, name='Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('5.00'), product_type='bar'
+        )
+        for metal, weight in [(gold, '10.0000'), (silver, '100.0000')]:
+            PortfolioItem.objects.create(
+                user=whale, metal=metal, product=product, weight_oz=Decimal(weight),
+                vault_location=london, purchase_price=Decimal('1.00')
+            )
+    
+    def test_report_is_reproducible_and_cached(self):
+        """Test the same seed gives the same report, served from the cache"""
+        from admin_api import risk
+        
+        response = self.client.get('/api/admin/dashboard/value-at-risk/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        first = risk.refresh_report(paths=4000, chunk_size=1000, seed=7)
+        second = risk.value_at_risk(paths=4000, chunk_size=1000, seed=7)
+        first.pop('generated_at')
+        second.pop('generated_at')
+        self.assertEqual(first, second)
+        self.assertEqual(first['observations'], 60)
+        
+        platform = first['platform']
+        self.assertEqual(platform['holdings_value'], 22500.0)
+        self.assertEqual(platform['cash'], 5000.0)
+        self.assertGreater(platform['var']['0.95'], 0)
+        self.assertGreater(platform['var']['0.99'], platform['var']['0.95'])
+        self.assertGreaterEqual(platform['cvar']['0.99'], platform['var']['0.99'])
+        # A single vault holds everything, so it carries the platform's risk
+        self.assertEqual(first['by_vault'][0]['vault'], 'London')
+        self.assertEqual(first['by_vault'][0]['var'], platform['var'])
+        
+        tiers = {tier['tier']: tier for tier in first['by_tier']}
+        self.assertEqual(tiers['<10,000']['users'], 1)
+        self.assertEqual(tiers['<10,000']['var']['0.99'], 0)
+        self.assertEqual(tiers['10,000-100,000']['holdings_value'], 22500.0)
+        self.assertEqual(tiers['10,000-100,000']['var'], platform['var'])
+        
+        response = self.client.get('/api/admin/dashboard/value-at-risk/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['platform'], platform)
+    
+    def test_process_pool_matches_in_process(self):
+        """Test chunks spread over worker processes give the same numbers"""
+        from admin_api import risk
+        
+        in_process = risk.value_at_risk(paths=3000, chunk_size=1000, seed=3, workers=1)
+        pooled = risk.value_at_risk(paths=3000, chunk_size=1000, seed=3, workers=2)
+        self.assertEqual(in_process['platform'], pooled['platform'])
+    
+    def test_requires_price_history(self):
+        """Test the report refuses to run without enough history"""
+        from admin_api import risk
+        from trading.models import MetalPrice
+        
+        MetalPrice.objects.all().delete()
+        with self.assertRaises(risk.RiskError):
+            risk.value_at_risk(paths=100)
@@ -8,8 +8,9 @@ from .views import (
     KYCManagementViewSet, AdminUserViewSet, AdminTransactionViewSet,
     AdminShipmentViewSet, DeliveryManagementViewSet, AdminDashboardViewSet, AdminProductViewSet,
     DashboardMetricsView, DashboardAlertsView, DashboardRecentActionsView,
-    VaultInventoryView, TransactionVolumeView, MetalPricesView, AuditLogViewSet, DevEmailViewSet,
-    AdminChatViewSet
+    VaultInventoryView, VaultExposureView, ValueAtRiskView, TransactionVolumeView, MetalPricesView,
+    AuditLogViewSet, DevEmailViewSet,
+    AdminChatViewSet, SQLStatsView
 )
 from .views import PlatformSettingsView
 
@@ -38,11 +39,16 @@ urlpatterns = [
     path('dashboard/recent-actions/', DashboardRecentActionsView.as_view({'get': 'recent_actions'}), name='admin-dashboard-recent-actions'),
     path('dashboard/alerts/', DashboardAlertsView.as_view({'get': 'alerts'}), name='admin-dashboard-alerts'),
     path('dashboard/vault-inventory/', VaultInventoryView.as_view({'get': 'inventory'}), name='admin-dashboard-vault-inventory'),
+    path('dashboard/vault-exposure/', VaultExposureView.as_view({'post': 'stress_test'}), name='admin-dashboard-vault-exposure'),
+    path('dashboard/value-at-risk/', ValueAtRiskView.as_view({'get': 'report'}), name='admin-dashboard-value-at-risk'),
+    path('dashboard/value-at-risk/refresh/', ValueAtRiskView.as_view({'post': 'refresh'}), name='admin-dashboard-value-at-risk-refresh'),
     path('dashboard/metal-prices/', MetalPricesView.as_view({'get': 'prices'}), name='admin-dashboard-metal-prices'),
     path('dashboard/metal-prices/trigger-update/', MetalPricesView.as_view({'post': 'trigger_update'}), name='admin-dashboard-metal-prices-trigger-update'),
     path('dashboard/metal-prices/update-status/', MetalPricesView.as_view({'get': 'update_status'}), name='admin-dashboard-metal-prices-update-status'),
     path('dashboard/transaction-volume/', TransactionVolumeView.as_view({'get': 'volume'}), name='admin-dashboard-transaction-volume'),
 
+    path('performance/sql/', SQLStatsView.as_view({'get': 'list', 'delete': 'reset'}), name='admin-performance-sql'),
+
     path('platform/settings/', PlatformSettingsView.as_view({'get': 'retrieve', 'post': 'update'}), name='admin-platform-settings'),
     
     # Legacy dashboard endpoint
@@ -97,3 +97,21 @@ def send_shipment_update_email(shipment):
         },
         recipient_list=[user.email]
     )
+
+
+def send_price_alert_email(alert):
+    """Send email notification for a triggered price alert"""
+    from utils.emails import send_html_email
+    
+    user = alert.user
+    subject = f"Price Alert - {alert.metal.name} {alert.get_direction_display().lower()} ${alert.threshold}"
+    
+    send_html_email(
+        subject=subject,
+        template_name="emails/price_alert.html",
+        context={
+            'user': user,
+            'alert': alert
+        },
+        recipient_list=[user.email]
+    )
@@ -12,6 +12,7 @@ from django.db import transaction as db_transaction
 from decimal import Decimal
 import random
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from celery.result import AsyncResult
@@ -26,15 +27,22 @@ from .serializers import (
     DevEmailListSerializer, DevEmailDetailSerializer,
     AdminProductSerializer, AdminMetalSerializer,
     AdminShipmentSerializer, ShipmentEventSerializer, DeliveryHistorySerializer,
-    AdminChatThreadSerializer, AdminChatMessageSerializer
+    AdminChatThreadSerializer, AdminChatMessageSerializer,
+    AdminUserListReadSerializer, AdminTransactionReadSerializer, AdminDeliveryReadSerializer
 )
 from .permissions import IsAdminUser
 from .pagination import AdminPagination
+from utils.compiled_serializers import CompiledListMixin
+from utils.db_routing import ReplicaReadMixin, replica_safe
+from utils.exports import ExportMixin
+from utils.field_selection import FieldSelectionMixin
+from utils.sql_instrumentation import SORT_FIELDS as SQL_SORT_FIELDS, get_endpoint_stats, reset_endpoint_stats
 from users.consumers import broadcast_chat_message
-from .utils import (
-    log_admin_action, send_kyc_decision_email,
-    send_account_status_email, send_shipment_update_email
-)
+from trading import lots
+from trading.portfolio_push import request_portfolio_push
+from trading.tasks import request_limit_order_execution, request_price_alert_match
+from .utils import log_admin_action
+from .outbox import queue_kyc_decision_email, queue_account_status_email, queue_shipment_update_email
 
 
 class KYCManagementViewSet(viewsets.ViewSet):
@@ -85,9 +93,8 @@ class KYCManagementViewSet(viewsets.ViewSet):
                 target_id=user.id,
                 details={'user_email': user.email}
             )
-        
-        # Send email
-        send_kyc_decision_email(user, approved=True)
+            
+            queue_kyc_decision_email(user, approved=True)
         
         return Response({
             'message': 'KYC approved successfully',
@@ -113,9 +120,8 @@ class KYCManagementViewSet(viewsets.ViewSet):
                 target_id=user.id,
                 details={'user_email': user.email, 'reason': reason}
             )
-        
-        # Send email
-        send_kyc_decision_email(user, approved=False, reason=reason)
+            
+            queue_kyc_decision_email(user, approved=False, reason=reason)
         
         return Response({
             'message': 'KYC rejected',
@@ -182,11 +188,7 @@ class KYCManagementViewSet(viewsets.ViewSet):
                         details={'user_email': user.email}
                     )
                     
-                    # Send email
-                    try:
-                        send_kyc_decision_email(user, approved=True)
-                    except Exception:
-                        pass
+                    queue_kyc_decision_email(user, approved=True)
                     
                     successful.append({
                         'user_id': str(user.id),
@@ -271,11 +273,7 @@ class KYCManagementViewSet(viewsets.ViewSet):
                         details={'user_email': user.email, 'reason': reason}
                     )
                     
-                    # Send email
-                    try:
-                        send_kyc_decision_email(user, approved=False, reason=reason)
-                    except Exception:
-                        pass
+                    queue_kyc_decision_email(user, approved=False, reason=reason)
                     
                     successful.append({
                         'user_id': str(user.id),
@@ -309,21 +307,41 @@ class KYCManagementViewSet(viewsets.ViewSet):
 class PlatformSettingsView(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
 
+    @staticmethod
+    def _settings_data(obj):
+        return {
+            'metals_buying_enabled': obj.metals_buying_enabled,
+            'metals_selling_enabled': obj.metals_selling_enabled,
+            'halted_metals': obj.halted_metals,
+            'flags': obj.flags,
+        }
+
     @action(detail=False, methods=['get'])
     def retrieve(self, request):
         obj = PlatformSettings.get_solo()
-        return Response({'metals_buying_enabled': obj.metals_buying_enabled, 'metals_selling_enabled': obj.metals_selling_enabled})
+        return Response(self._settings_data(obj))
 
     @action(detail=False, methods=['post'])
     def update(self, request):
-        obj = PlatformSettings.get_solo()
+        obj = PlatformSettings.get_solo(use_cache=False)
         buying_enabled = request.data.get('metals_buying_enabled')
         selling_enabled = request.data.get('metals_selling_enabled')
+        halted_metals = request.data.get('halted_metals')
+        flags = request.data.get('flags')
 
         if buying_enabled is not None and not isinstance(buying_enabled, bool):
             return Response({'error': 'metals_buying_enabled must be a boolean'}, status=status.HTTP_400_BAD_REQUEST)
         if selling_enabled is not None and not isinstance(selling_enabled, bool):
             return Response({'error': 'metals_selling_enabled must be a boolean'}, status=status.HTTP_400_BAD_REQUEST)
+        if halted_metals is not None:
+            if not isinstance(halted_metals, list) or not all(isinstance(symbol, str) for symbol in halted_metals):
+                return Response({'error': 'halted_metals must be a list of metal symbols'}, status=status.HTTP_400_BAD_REQUEST)
+            halted_metals = sorted({symbol.upper() for symbol in halted_metals})
+            unknown = set(halted_metals) - set(Metal.objects.filter(symbol__in=halted_metals).values_list('symbol', flat=True))
+            if unknown:
+                return Response({'error': f'Unknown metal symbols: {", ".join(sorted(unknown))}'}, status=status.HTTP_400_BAD_REQUEST)
+        if flags is not None and not isinstance(flags, dict):
+            return Response({'error': 'flags must be an object'}, status=status.HTTP_400_BAD_REQUEST)
 
         fields_to_update = ['updated_at']
         if buying_enabled is not None:
@@ -332,20 +350,34 @@ class PlatformSettingsView(viewsets.ViewSet):
         if selling_enabled is not None:
             obj.metals_selling_enabled = selling_enabled
             fields_to_update.append('metals_selling_enabled')
+        if halted_metals is not None:
+            obj.halted_metals = halted_metals
+            fields_to_update.append('halted_metals')
+        if flags is not None:
+            # Merge: a null value removes the flag
+            merged = dict(obj.flags)
+            for name, value in flags.items():
+                if value is None:
+                    merged.pop(name, None)
+                else:
+                    merged[name] = value
+            obj.flags = merged
+            fields_to_update.append('flags')
 
         if len(fields_to_update) == 1:
             return Response({'error': 'At least one setting must be provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
         obj.save(update_fields=fields_to_update)
-        return Response({'metals_buying_enabled': obj.metals_buying_enabled, 'metals_selling_enabled': obj.metals_selling_enabled})
+        return Response(self._settings_data(obj))
 
 
-class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
+class UserManagementViewSet(FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """User management endpoints"""
     
     permission_classes = [IsAdminUser]
     queryset = User.objects.all()
     pagination_class = AdminPagination
+    compiled_serializer_class = AdminUserListReadSerializer
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['email', 'first_name', 'last_name', 'username']
     ordering_fields = ['created_at', 'email', 'last_login']
@@ -519,8 +551,8 @@ class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
                 target_id=user.id,
                 details={'user_email': user.email, 'reason': reason}
             )
-        
-        send_account_status_email(user, suspended=True, reason=reason)
+            
+            queue_account_status_email(user, suspended=True, reason=reason)
         
         return Response({'message': 'User suspended successfully'})
     
@@ -540,8 +572,8 @@ class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
                 target_id=user.id,
                 details={'user_email': user.email}
             )
-        
-        send_account_status_email(user, suspended=False)
+            
+            queue_account_status_email(user, suspended=False)
         
         return Response({'message': 'User activated successfully'})
     
@@ -568,7 +600,7 @@ class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
         
         with db_transaction.atomic():
             # Get or create wallet
-            wallet, created = Wallet.objects.get_or_create(user=user)
+            wallet, created = Wallet.objects.select_for_update().get_or_create(user=user)
             
             old_balance = wallet.cash_balance
             wallet.cash_balance += amount_decimal
@@ -582,6 +614,8 @@ class UserManagementViewSet(viewsets.ReadOnlyModelViewSet):
                 status=Transaction.Status.COMPLETED
             )
             
+            request_portfolio_push(user.id)
+            
             log_admin_action(
                 admin_user=request.user,
                 action_type='adjust_balance',
@@ -651,17 +685,25 @@ class DevEmailViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset.order_by('-created_at')
 
 
-class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class AdminTransactionViewSet(ExportMixin, FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """Transaction management endpoints"""
     
     permission_classes = [IsAdminUser]
     queryset = Transaction.objects.all()
     serializer_class = AdminTransactionSerializer
+    compiled_serializer_class = AdminTransactionReadSerializer
     pagination_class = AdminPagination
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['user__email', 'id']
     ordering_fields = ['created_at', 'total_value']
     ordering = ['-created_at']
+    export_filename = 'transactions'
+    export_columns = [
+        ('id', 'id'), ('created_at', 'created_at'), ('user', 'user_id'), ('user_email', 'user__email'),
+        ('transaction_type', 'transaction_type'), ('metal_symbol', 'metal__symbol'),
+        ('amount_oz', 'amount_oz'), ('price_per_oz', 'price_per_oz'), ('total_value', 'total_value'),
+        ('fees', 'fees'), ('status', 'status'),
+    ]
     
     def get_queryset(self):
         queryset = Transaction.objects.select_related('user', 'metal').prefetch_related('admin_notes')
@@ -709,16 +751,7 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
         # Order by amount descending, then by age (created_at ascending = oldest first)
         queryset = queryset.order_by('-total_value', 'created_at')
         
-        # Use pagination
-        paginator = self.pagination_class()
-        page = paginator.paginate_queryset(queryset, request)
-        
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.compiled_list_response(queryset)
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -741,14 +774,14 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
                 # For buy transactions, create portfolio item
                 if transaction_obj.metal and transaction_obj.amount_oz:
                     # Get user's wallet
-                    wallet = Wallet.objects.get(user=transaction_obj.user)
+                    wallet = Wallet.objects.select_for_update().get(user=transaction_obj.user)
                     
                     # Deduct from cash balance (should already be held)
                     wallet.cash_balance -= transaction_obj.total_value
                     wallet.save()
                     
                     # Create portfolio item (simplified - in real system would link to product)
-                    PortfolioItem.objects.create(
+                    portfolio_item = PortfolioItem.objects.create(
                         user=transaction_obj.user,
                         metal=transaction_obj.metal,
                         product=None,  # Would need product reference
@@ -757,13 +790,16 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
                         purchase_price=transaction_obj.price_per_oz,
                         status=PortfolioItem.Status.VAULTED
                     )
+                    lots.record_buy(transaction_obj, portfolio_item)
             
             elif transaction_obj.transaction_type == Transaction.TransactionType.SELL:
                 # For sell transactions, add to cash balance
-                wallet = Wallet.objects.get(user=transaction_obj.user)
+                wallet = Wallet.objects.select_for_update().get(user=transaction_obj.user)
                 wallet.cash_balance += transaction_obj.total_value
                 wallet.save()
             
+            request_portfolio_push(transaction_obj.user_id)
+            
             # Log admin action
             log_admin_action(
                 admin_user=request.user,
@@ -808,10 +844,12 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
             
             # Refund held funds for buy transactions
             if transaction_obj.transaction_type == Transaction.TransactionType.BUY:
-                wallet = Wallet.objects.get(user=transaction_obj.user)
+                wallet = Wallet.objects.select_for_update().get(user=transaction_obj.user)
                 wallet.cash_balance += transaction_obj.total_value
                 wallet.save()
             
+            request_portfolio_push(transaction_obj.user_id)
+            
             # Log admin action
             log_admin_action(
                 admin_user=request.user,
@@ -1097,6 +1135,8 @@ class AdminShipmentViewSet(viewsets.ModelViewSet):
             elif delivery.status in [Shipment.Status.SHIPPED, Shipment.Status.IN_TRANSIT, Shipment.Status.OUT_FOR_DELIVERY, Shipment.Status.PREPARING]:
                 delivery.items.update(status=PortfolioItem.Status.IN_TRANSIT)
 
+            request_portfolio_push(delivery.user_id)
+
         return Response({'message': 'Workflow stage advanced successfully', 'delivery': self.get_serializer(delivery).data})
 
     @action(detail=True, methods=['post'])
@@ -1128,6 +1168,8 @@ class AdminShipmentViewSet(viewsets.ModelViewSet):
             if new_status == Shipment.Status.DELIVERED:
                 shipment.items.update(status=PortfolioItem.Status.DELIVERED)
             
+            request_portfolio_push(shipment.user_id)
+            
             log_admin_action(
                 admin_user=request.user,
                 action_type='update_shipment_status',
@@ -1139,8 +1181,8 @@ class AdminShipmentViewSet(viewsets.ModelViewSet):
                     'new_status': new_status
                 }
             )
-        
-        send_shipment_update_email(shipment)
+            
+            queue_shipment_update_email(shipment)
         
         serializer = self.get_serializer(shipment)
         return Response(serializer.data)
@@ -1200,13 +1242,14 @@ class AdminChatViewSet(viewsets.ReadOnlyModelViewSet):
         if not body:
             return Response({'error': 'body is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not thread.assigned_admin:
-            thread.assigned_admin = request.user
-            thread.save(update_fields=['assigned_admin', 'updated_at'])
+        with db_transaction.atomic():
+            if not thread.assigned_admin:
+                thread.assigned_admin = request.user
+                thread.save(update_fields=['assigned_admin', 'updated_at'])
 
-        message = ChatMessage.objects.create(thread=thread, sender=request.user, body=body)
-        payload = AdminChatMessageSerializer(message).data
-        broadcast_chat_message(thread.id, payload)
+            message = ChatMessage.objects.create(thread=thread, sender=request.user, body=body)
+            payload = AdminChatMessageSerializer(message).data
+            broadcast_chat_message(thread.id, payload)
         return Response({'message': 'Message sent', 'data': payload}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -1224,12 +1267,13 @@ class AdminChatViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'message': 'Thread closed'})
 
 
-class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
+class DeliveryManagementViewSet(FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """Delivery management endpoints for admin"""
     
     permission_classes = [IsAdminUser]
     queryset = Shipment.objects.all()
     serializer_class = AdminDeliverySerializer
+    compiled_serializer_class = AdminDeliveryReadSerializer
     pagination_class = AdminPagination
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['tracking_number', 'user__email', 'carrier']
@@ -1265,19 +1309,6 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
         
         return queryset
     
-    def list(self, request):
-        """List deliveries with filtering and pagination"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Use DRF pagination (inherited from ReadOnlyModelViewSet)
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-    
     def retrieve(self, request, pk=None):
         """Get delivery details"""
         delivery = get_object_or_404(self.get_queryset(), pk=pk)
@@ -1416,6 +1447,8 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
             elif delivery.status in [Shipment.Status.SHIPPED, Shipment.Status.IN_TRANSIT, Shipment.Status.OUT_FOR_DELIVERY, Shipment.Status.PREPARING]:
                 delivery.items.update(status=PortfolioItem.Status.IN_TRANSIT)
 
+            request_portfolio_push(delivery.user_id)
+
         return Response({'message': 'Workflow stage advanced successfully', 'delivery': self.get_serializer(delivery).data})
 
     @action(detail=True, methods=['post'])
@@ -1463,6 +1496,8 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
             elif new_status in [Shipment.Status.SHIPPED, Shipment.Status.IN_TRANSIT, Shipment.Status.OUT_FOR_DELIVERY]:
                 delivery.items.update(status=PortfolioItem.Status.IN_TRANSIT)
             
+            request_portfolio_push(delivery.user_id)
+            
             # Log admin action
             log_admin_action(
                 admin_user=request.user,
@@ -1477,9 +1512,8 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
                     'description': description
                 }
             )
-        
-        # Send notification email
-        send_shipment_update_email(delivery)
+            
+            queue_shipment_update_email(delivery)
         
         # Return updated delivery
         serializer = self.get_serializer(delivery)
@@ -1546,9 +1580,8 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
                     'new_tracking_number': tracking_number
                 }
             )
-        
-        # Send notification email
-        send_shipment_update_email(delivery)
+            
+            queue_shipment_update_email(delivery)
         
         # Return updated delivery
         serializer = self.get_serializer(delivery)
@@ -1558,7 +1591,8 @@ class DeliveryManagementViewSet(viewsets.ReadOnlyModelViewSet):
         })
 
 
-class AdminDashboardViewSet(viewsets.ViewSet):
+@replica_safe
+class AdminDashboardViewSet(ReplicaReadMixin, viewsets.ViewSet):
     """Dashboard statistics endpoints"""
     
     permission_classes = [IsAdminUser]
@@ -1614,7 +1648,8 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         })
 
 
-class DashboardMetricsView(viewsets.ViewSet):
+@replica_safe
+class DashboardMetricsView(ReplicaReadMixin, viewsets.ViewSet):
     """Dashboard metrics with caching"""
     
     permission_classes = [IsAdminUser]
@@ -1714,7 +1749,8 @@ class DashboardMetricsView(viewsets.ViewSet):
         return Response(metrics_data)
 
 
-class DashboardAlertsView(viewsets.ViewSet):
+@replica_safe
+class DashboardAlertsView(ReplicaReadMixin, viewsets.ViewSet):
     """Dashboard alerts for items requiring attention"""
     
     permission_classes = [IsAdminUser]
@@ -1768,7 +1804,8 @@ class DashboardAlertsView(viewsets.ViewSet):
         return Response(alerts)
 
 
-class DashboardRecentActionsView(viewsets.ViewSet):
+@replica_safe
+class DashboardRecentActionsView(ReplicaReadMixin, viewsets.ViewSet):
     """Dashboard recent admin actions"""
     
     permission_classes = [IsAdminUser]
@@ -1802,7 +1839,8 @@ class DashboardRecentActionsView(viewsets.ViewSet):
         })
 
 
-class VaultInventoryView(viewsets.ViewSet):
+@replica_safe
+class VaultInventoryView(ReplicaReadMixin, viewsets.ViewSet):
     """Vault inventory aggregation"""
     
     permission_classes = [IsAdminUser]
@@ -1864,7 +1902,76 @@ class VaultInventoryView(viewsets.ViewSet):
         })
 
 
-class TransactionVolumeView(viewsets.ViewSet):
+class VaultExposureView(viewsets.ViewSet):
+    """Platform exposure under metal price shocks (see admin_api.exposure)"""
+    
+    permission_classes = [IsAdminUser]
+    
+    @action(detail=False, methods=['post'])
+    def stress_test(self, request):
+        """Value changes by metal and vault per price scenario, and the users most exposed to the worst"""
+        from . import exposure
+        
+        scenarios = request.data.get('scenarios')
+        max_scenarios = getattr(settings, 'STRESS_TEST_MAX_SCENARIOS', 10000)
+        if scenarios is not None and (not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios)):
+            return Response(
+                {'error': 'scenarios must be a list of {"name": ..., "shocks": {"XAU": -0.1}} objects'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if scenarios and len(scenarios) > max_scenarios:
+            return Response(
+                {'error': f'At most {max_scenarios} scenarios per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            top_n = int(request.data.get('top_users', 10))
+        except (TypeError, ValueError):
+            return Response({'error': 'top_users must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if top_n < 0 or top_n > 100:
+            return Response({'error': 'top_users must be between 0 and 100'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        holdings = exposure.Holdings.load()
+        try:
+            result = exposure.stress_test(
+                holdings, scenarios or exposure.default_scenarios(holdings.symbols), top_n=top_n
+            )
+        except exposure.ScenarioError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        result['last_updated'] = timezone.now()
+        return Response(result)
+
+
+class ValueAtRiskView(viewsets.ViewSet):
+    """Monte Carlo VaR/CVaR of platform holdings, simulated daily (see admin_api.risk)"""
+    
+    permission_classes = [IsAdminUser]
+    
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """The latest cached value-at-risk report"""
+        from . import risk
+        
+        report = risk.cached_report()
+        if report is None:
+            return Response(
+                {'error': 'No value-at-risk report yet; trigger a refresh or wait for the daily run'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(report)
+    
+    @action(detail=False, methods=['post'])
+    def refresh(self, request):
+        """Recompute the report in the background"""
+        from .tasks import value_at_risk
+        
+        task = value_at_risk.delay()
+        return Response({'task_id': task.id, 'status': task.status}, status=status.HTTP_202_ACCEPTED)
+
+
+@replica_safe
+class TransactionVolumeView(ReplicaReadMixin, viewsets.ViewSet):
     """Transaction volume aggregation"""
     
     permission_classes = [IsAdminUser]
@@ -2008,7 +2115,8 @@ class MetalPricesView(viewsets.ViewSet):
 
 
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+@replica_safe
+class AuditLogViewSet(ExportMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Audit log endpoints"""
     
     permission_classes = [IsAdminUser]
@@ -2017,6 +2125,12 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['action_type', 'admin_user__email', 'target_type']
     ordering_fields = ['timestamp']
     ordering = ['-timestamp']  # Order by timestamp descending
+    export_filename = 'audit-log'
+    export_columns = [
+        ('id', 'id'), ('timestamp', 'timestamp'), ('admin_user', 'admin_user_id'),
+        ('admin_email', 'admin_user__email'), ('action_type', 'action_type'),
+        ('target_type', 'target_type'), ('target_id', 'target_id'), ('details', 'details'),
+    ]
     
     def get_queryset(self):
         """Get audit logs with filtering"""
@@ -2129,6 +2243,9 @@ class AdminProductViewSet(viewsets.ModelViewSet):
                 metal.price_change_24h = Decimal(str(price_change))
             
             metal.save()
+            moves = [(metal.id, old_price, metal.current_price)]
+            db_transaction.on_commit(lambda: request_price_alert_match(moves))
+            db_transaction.on_commit(lambda: request_limit_order_execution(moves))
             
             log_admin_action(
                 admin_user=request.user,
@@ -2144,3 +2261,41 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         
         serializer = AdminMetalSerializer(metal)
         return Response(serializer.data)
+
+
+class SQLStatsView(viewsets.ViewSet):
+    """Per-endpoint SQL aggregates recorded by utils.sql_instrumentation"""
+    
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        """Return the top offending endpoints"""
+        order_by = request.query_params.get('order', 'duplicate_queries')
+        if order_by not in SQL_SORT_FIELDS:
+            return Response(
+                {'error': f"order must be one of: {', '.join(SQL_SORT_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            endpoints = get_endpoint_stats(order_by=order_by, limit=limit)
+        except Exception as e:
+            return Response({'error': f'SQL stats unavailable: {e}'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        return Response({
+            'endpoints': endpoints,
+            'order': order_by,
+            'count': len(endpoints)
+        })
+    
+    def reset(self, request):
+        """Clear the aggregates"""
+        try:
+            cleared = reset_endpoint_stats()
+        except Exception as e:
+            return Response({'error': f'SQL stats unavailable: {e}'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'cleared': cleared})
@@ -0,0 +1,443 @@
+"""
+Offline load-test and micro-benchmark suite for the trading, admin and WebSocket paths
+
+Creates a throwaway test database (SQLite, or the configured Postgres), seeds
+a configurable dataset, then drives the real URLconf and middleware
+in-process with JWT-authenticated requests:
+
+- every scenario on its own: throughput, p50/p95/p99/max latency and SQL
+  queries per request
+- a weighted, locust-style mix of all scenarios, picked at random per request
+- PriceConsumer over an in-memory channel layer: connect latency (until the
+  first price frame) and broadcast fan-out to every connected client
+
+Requests run one after another in a single process, so the numbers are
+service times without network or worker contention. Results are written as
+JSON; pass a previous run to --compare to print the changes and, with
+--fail-on-regression, exit non-zero when any p95 got worse by more than
+that percentage.
+
+    python benchmarks/api_suite.py --users 50 --requests 200 --ws-clients 200
+    python benchmarks/api_suite.py --compare benchmarks/results/abc1234.json --fail-on-regression 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from channels.layers import get_channel_layer  # noqa: E402
+from channels.testing import WebsocketCommunicator  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from trading.consumers import PriceConsumer  # noqa: E402
+from trading.models import Metal, PortfolioItem, Product, Shipment, ShipmentEvent, Transaction  # noqa: E402
+from users.models import User, Wallet  # noqa: E402
+from utils.sql_instrumentation import QueryRecorder  # noqa: E402
+from vaults.models import Vault  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+BENCH_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'utils.cache.InstrumentedLocMemCache'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 10000}}},
+    # Aggregation would try to reach Redis on every request
+    'SQL_INSTRUMENTATION': False,
+    'CELERY_TASK_ALWAYS_EAGER': False,
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    """Latencies in seconds -> JSON-friendly stats in milliseconds."""
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    for name, pct in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99), ('max_ms', 100)):
+        value = percentile(latencies, pct)
+        summary[name] = round(value * 1000, 3) if value is not None else None
+    if queries:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2)
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Dataset
+# ---------------------------------------------------------------------------
+
+class Dataset:
+    def __init__(self, users, items, transactions, seed):
+        self.random = random.Random(seed)
+        self.metals = [
+            Metal.objects.create(name=name, symbol=symbol, current_price=Decimal(price), price_change_24h=Decimal('0.42'))
+            for name, symbol, price in [
+                ('Gold', 'XAU', '2345.67'), ('Silver', 'XAG', '29.81'),
+                ('Platinum', 'XPT', '981.20'), ('Palladium', 'XPD', '1012.45'),
+            ]
+        ]
+        self.products = [
+            Product.objects.create(
+                metal=metal, name=f'1oz {metal.name} {kind.title()}', manufacturer='PAMP', purity='.9999',
+                weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), product_type=kind
+            )
+            for metal in self.metals for kind in (Product.ProductType.BAR, Product.ProductType.COIN)
+        ]
+        self.vaults = [
+            Vault.objects.create(
+                name=f'{city} Vault', city=city, country=country, storage_fee_percent=Decimal('0.0008')
+            )
+            for city, country in [('Zurich', 'Switzerland'), ('London', 'United Kingdom'), ('Singapore', 'Singapore')]
+        ]
+
+        self.admin = User.objects.create_user(
+            email='bench-admin@example.com', username='bench-admin', password='bench', is_staff=True
+        )
+        self.users = []
+        for i in range(users):
+            user = User.objects.create_user(
+                email=f'bench-{i}@example.com', username=f'bench-{i}', password='bench',
+                kyc_status=User.KYCStatus.VERIFIED if i % 5 else User.KYCStatus.PENDING
+            )
+            self.users.append(user)
+        verified = [user for user in self.users if user.kyc_status == User.KYCStatus.VERIFIED]
+        Wallet.objects.filter(user__in=verified).update(cash_balance=Decimal('10000000.00'))
+        self.traders = verified or self.users
+
+        PortfolioItem.objects.bulk_create([
+            PortfolioItem(
+                user=user, metal=product.metal, product=product, weight_oz=Decimal('5.0000'), quantity=5,
+                vault_location=self.vaults[n % len(self.vaults)], purchase_price=product.metal.current_price,
+                status=PortfolioItem.Status.VAULTED
+            )
+            for user in self.users for n, product in enumerate(self.random.choices(self.products, k=items))
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user, transaction_type=self.random.choice(Transaction.TransactionType.values),
+                metal=self.random.choice(self.metals), amount_oz=Decimal('1.5000'),
+                price_per_oz=Decimal('2301.15'), total_value=Decimal('3451.73'), fees=Decimal('12.50'),
+                status=self.random.choice(Transaction.Status.values)
+            )
+            for user in self.users for _ in range(transactions)
+        ])
+        shipments = Shipment.objects.bulk_create([
+            Shipment(user=user, carrier='fedex', tracking_number=f'BENCH-{n}', destination_address={'city': 'Zurich'})
+            for n, user in enumerate(self.users)
+        ])
+        ShipmentEvent.objects.bulk_create([
+            ShipmentEvent(shipment=shipment, status=Shipment.Status.REQUESTED, description='Requested')
+            for shipment in shipments
+        ])
+
+        self.tokens = {user.pk: str(AccessToken.for_user(user)) for user in self.users + [self.admin]}
+        self.sellable = {
+            user.pk: list(PortfolioItem.objects.filter(user=user).values_list('pk', flat=True))
+            for user in self.traders
+        }
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens[user.pk]}')
+        return client
+
+
+# ---------------------------------------------------------------------------
+# HTTP scenarios
+# ---------------------------------------------------------------------------
+
+class Scenario:
+    """One request shape; request() returns (client, method, path, data)."""
+
+    def __init__(self, name, weight, request, expected=200):
+        self.name = name
+        self.weight = weight
+        self.request = request
+        self.expected = expected
+
+
+def build_scenarios(data):
+    def trader():
+        return data.random.choice(data.traders)
+
+    def get(path, user=None):
+        return lambda: (data.client_for(user() if callable(user) else user), 'get', path, None)
+
+    def buy():
+        return (data.client_for(trader()), 'post', '/api/trading/trade/buy/', {
+            'product_id': str(data.random.choice(data.products).pk), 'quantity': 1,
+            'delivery_method': 'vault', 'vault_id': str(data.random.choice(data.vaults).pk),
+        })
+
+    def sell():
+        user = trader()
+        return (data.client_for(user), 'post', '/api/trading/trade/sell/', {
+            'portfolio_item_id': str(data.random.choice(data.sellable[user.pk])), 'amount_oz': '0.0010',
+        })
+
+    admin = data.admin
+    return [
+        Scenario('trade.buy', 5, buy, expected=201),
+        Scenario('trade.sell', 3, sell),
+        Scenario('portfolio.dashboard', 10, get('/api/trading/portfolio/dashboard/', trader)),
+        Scenario('portfolio.list', 6, get('/api/trading/portfolio/', trader)),
+        Scenario('transactions.list', 4, get('/api/trading/transactions/', trader)),
+        Scenario('metal-prices.public', 20, get('/api/trading/metal-prices/')),
+        Scenario('admin.dashboard.stats', 1, get('/api/admin/dashboard/stats/', admin)),
+        Scenario('admin.dashboard.metrics', 1, get('/api/admin/dashboard/metrics/', admin)),
+        Scenario('admin.dashboard.alerts', 1, get('/api/admin/dashboard/alerts/', admin)),
+        Scenario('admin.dashboard.recent-actions', 1, get('/api/admin/dashboard/recent-actions/', admin)),
+        Scenario('admin.dashboard.vault-inventory', 1, get('/api/admin/dashboard/vault-inventory/', admin)),
+        Scenario('admin.dashboard.transaction-volume', 1, get('/api/admin/dashboard/transaction-volume/', admin)),
+        Scenario('admin.users.list', 1, get('/api/admin/users/', admin)),
+        Scenario('admin.transactions.list', 1, get('/api/admin/transactions/', admin)),
+        Scenario('admin.kyc.pending', 1, get('/api/admin/kyc/pending/', admin)),
+        Scenario('admin.deliveries.list', 1, get('/api/admin/deliveries/', admin)),
+    ]
+
+
+def timed_request(scenario):
+    client, method, path, payload = scenario.request()
+    recorder = QueryRecorder()
+    started = time.perf_counter()
+    with recorder.record():
+        response = getattr(client, method)(path, payload, format='json') if payload else getattr(client, method)(path)
+    elapsed = time.perf_counter() - started
+    return elapsed, recorder.count, response.status_code == scenario.expected, response
+
+
+def run_scenario(scenario, requests, warmup):
+    for _ in range(warmup):
+        _, _, ok, response = timed_request(scenario)
+        if not ok:
+            raise RuntimeError(f"{scenario.name}: HTTP {response.status_code} {getattr(response, 'data', '')}")
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        elapsed, count, ok, _ = timed_request(scenario)
+        latencies.append(elapsed)
+        queries.append(count)
+        errors += not ok
+    return summarize(latencies, time.perf_counter() - started, errors, queries)
+
+
+def run_mix(scenarios, requests, rng):
+    picks = rng.choices(scenarios, weights=[scenario.weight for scenario in scenarios], k=requests)
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for scenario in picks:
+        elapsed, _, ok, _ = timed_request(scenario)
+        latencies.append(elapsed)
+        errors += not ok
+    result = summarize(latencies, time.perf_counter() - started, errors)
+    result['weights'] = {scenario.name: scenario.weight for scenario in scenarios}
+    return result
+
+
+# ---------------------------------------------------------------------------
+# WebSocket: PriceConsumer connect and broadcast fan-out
+# ---------------------------------------------------------------------------
+
+async def run_websocket(clients, broadcasts, interval):
+    communicators = []
+    connect_latencies = []
+    started = time.perf_counter()
+    for _ in range(clients):
+        communicator = WebsocketCommunicator(PriceConsumer.as_asgi(), '/ws/prices/')
+        connect_started = time.perf_counter()
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('PriceConsumer refused the connection')
+        await communicator.receive_json_from(timeout=10)
+        connect_latencies.append(time.perf_counter() - connect_started)
+        communicators.append(communicator)
+    connect = summarize(connect_latencies, time.perf_counter() - started)
+
+    channel_layer = get_channel_layer()
+    delivery_latencies, fanout_latencies, missed = [], [], 0
+    for tick in range(broadcasts):
+        # PriceConsumer coalesces price frames within its flush interval
+        await asyncio.sleep(interval)
+        sent_at = time.perf_counter()
+        await channel_layer.group_send('metal_prices', {
+            'type': 'price_update', 'prices': [{'symbol': 'BENCH', 'bench_tick': tick}],
+        })
+
+        async def receive(communicator):
+            while True:
+                message = await communicator.receive_json_from(timeout=10)
+                if message.get('prices', [{}])[0].get('bench_tick') == tick:
+                    return time.perf_counter() - sent_at
+
+        results = await asyncio.gather(*(receive(c) for c in communicators), return_exceptions=True)
+        arrivals = [result for result in results if not isinstance(result, BaseException)]
+        missed += len(results) - len(arrivals)
+        delivery_latencies.extend(arrivals)
+        if arrivals:
+            fanout_latencies.append(max(arrivals))
+
+    for communicator in communicators:
+        await communicator.disconnect()
+
+    per_client = summarize(delivery_latencies, sum(fanout_latencies) or None, errors=missed)
+    per_client.pop('throughput_per_sec')
+    fanout = summarize(fanout_latencies, None)
+    fanout.pop('throughput_per_sec')
+    return {
+        'clients': clients,
+        'connect': connect,
+        'broadcast_delivery': per_client,
+        'broadcast_fanout': fanout,
+        'note': f'latencies can include PriceConsumer.send_flush_interval ({PriceConsumer.send_flush_interval}s)',
+    }
+
+
+# ---------------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_table(results):
+    print(f"{'scenario':<38}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'sql':>7}{'err':>5}")
+    rows = list(results['http'].items()) + [('mix', results['mix'])]
+    for name, row in rows:
+        print(
+            f"{name:<38}{row['throughput_per_sec'] or 0:>9.0f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+            f"{row['p99_ms']:>9.2f}{row['max_ms']:>9.2f}{row.get('queries_per_request', ''):>7}{row['errors']:>5}"
+        )
+    ws = results.get('websocket')
+    if ws:
+        print(f"\nPriceConsumer, {ws['clients']} clients ({ws['note']})")
+        for name in ('connect', 'broadcast_delivery', 'broadcast_fanout'):
+            row = ws[name]
+            print(f"  {name:<20} p50={row['p50_ms']}ms p95={row['p95_ms']}ms p99={row['p99_ms']}ms errors={row['errors']}")
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95 / throughput changes against a previous run; return the regressed scenario names."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta']['commit']} ({baseline['meta']['started_at']})")
+    print(f"{'scenario':<38}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'req/s change':>14}")
+    regressed = []
+    current = dict(results['http'], mix=results['mix'])
+    previous = dict(baseline['http'], mix=baseline['mix'])
+    for name, row in current.items():
+        before = previous.get(name)
+        if not before or not before['p95_ms']:
+            continue
+        change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        throughput = (row['throughput_per_sec'] - before['throughput_per_sec']) / before['throughput_per_sec'] * 100
+        flag = ''
+        if threshold is not None and change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSED'
+        print(f"{name:<38}{before['p95_ms']:>12.2f}{row['p95_ms']:>10.2f}{change:>+8.1f}%{throughput:>+13.1f}%{flag}")
+    return regressed
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    data = Dataset(args.users, args.items, args.transactions, args.seed)
+    scenarios = build_scenarios(data)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if any(part in scenario.name for part in args.only)]
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'args': vars(args),
+        },
+        'http': {},
+    }
+    for scenario in scenarios:
+        results['http'][scenario.name] = run_scenario(scenario, args.requests, args.warmup)
+    results['mix'] = run_mix(scenarios, args.mix_requests, rng)
+    if args.ws_clients:
+        results['websocket'] = asyncio.run(run_websocket(args.ws_clients, args.ws_broadcasts, args.ws_interval))
+
+    print(f"users={args.users} items={args.items} transactions={args.transactions} requests={args.requests} "
+          f"database={connection.vendor} (latencies in ms)")
+    print_table(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        regressed = compare(results, args.compare, args.fail_on_regression)
+        if regressed:
+            print(f"p95 regressed by more than {args.fail_on_regression}%: {', '.join(regressed)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--items', type=int, default=20, help='portfolio items per user')
+    parser.add_argument('--transactions', type=int, default=50, help='transactions per user')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--mix-requests', type=int, default=1000, help='requests in the weighted mix')
+    parser.add_argument('--only', nargs='*', help='run scenarios whose name contains any of these')
+    parser.add_argument('--ws-clients', type=int, default=200, help='PriceConsumer connections (0 = skip)')
+    parser.add_argument('--ws-broadcasts', type=int, default=20)
+    parser.add_argument('--ws-interval', type=float, default=0.3, help='seconds between broadcasts')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help=f'JSON results path (default {RESULTS_DIR}/<commit>.json)')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PCT',
+                        help='with --compare, exit 1 if any p95 is more than PCT%% slower')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(**BENCH_SETTINGS):
+            status = main(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    sys.exit(status)
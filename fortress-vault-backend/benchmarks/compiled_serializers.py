@@ -0,0 +1,170 @@
+"""
+Benchmark the DRF list serializers against their compiled read serializers
+
+Creates a throwaway test database, fills it with portfolio items,
+transactions (with admin notes) and shipments, then times each list
+serializer with the querysets the views use. Reports rows/sec for the DRF
+path and the compiled values() path, both end to end (query + serialize)
+and for serialization alone from already-fetched instances / tuples (the
+compiled many=True relations still issue their queries there). Every case
+is checked for byte-identical JSON before it is timed.
+
+    python benchmarks/compiled_serializers.py --rows 2000 --page-size 100 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+from admin_api.models import TransactionNote  # noqa: E402
+from admin_api.serializers import (  # noqa: E402
+    AdminDeliveryReadSerializer, AdminDeliverySerializer,
+    AdminTransactionReadSerializer, AdminTransactionSerializer
+)
+from trading.models import Metal, PortfolioItem, Product, Shipment, ShipmentEvent, Transaction  # noqa: E402
+from trading.serializers import (  # noqa: E402
+    PortfolioItemReadSerializer, PortfolioItemSerializer,
+    ShipmentReadSerializer, ShipmentSerializer,
+    TransactionReadSerializer, TransactionSerializer
+)
+from users.models import User  # noqa: E402
+from utils import fastjson  # noqa: E402
+from vaults.models import Vault  # noqa: E402
+
+
+def populate(rows):
+    user = User.objects.create_user(email='bench@example.com', username='bench', password='bench', first_name='Bench')
+    admin = User.objects.create_user(email='admin@example.com', username='admin', password='admin', is_staff=True)
+    metals = [
+        Metal.objects.create(name=name, symbol=symbol, current_price=Decimal(price), price_change_24h=Decimal('0.42'))
+        for name, symbol, price in [('Gold', 'XAU', '2345.67'), ('Silver', 'XAG', '29.81'), ('Platinum', 'XPT', '981.20')]
+    ]
+    products = [
+        Product.objects.create(
+            metal=metal, name=f'1oz {metal.name} Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), product_type='bar'
+        )
+        for metal in metals
+    ]
+    vault = Vault.objects.create(
+        name='Zurich Vault', city='Zurich', country='Switzerland', flag_emoji='🇨🇭',
+        storage_fee_percent=Decimal('0.0008')
+    )
+
+    shipments = Shipment.objects.bulk_create([
+        Shipment(user=user, carrier='fedex', tracking_number=f'BENCH-{i}', destination_address={'street': f'{i} Main St'})
+        for i in range(max(1, rows // 10))
+    ])
+    ShipmentEvent.objects.bulk_create([
+        ShipmentEvent(shipment=shipment, status=Shipment.Status.REQUESTED, description='Requested')
+        for shipment in shipments for _ in range(3)
+    ])
+
+    PortfolioItem.objects.bulk_create([
+        PortfolioItem(
+            user=user, metal=products[i % 3].metal, product=products[i % 3], weight_oz=Decimal('2.5000'),
+            quantity=2, vault_location=vault if i % 4 else None, shipment=shipments[i % len(shipments)] if i % 5 == 0 else None,
+            purchase_price=Decimal('2301.15')
+        )
+        for i in range(rows)
+    ])
+    transactions = Transaction.objects.bulk_create([
+        Transaction(
+            user=user, transaction_type=Transaction.TransactionType.BUY, metal=metals[i % 3] if i % 7 else None,
+            amount_oz=Decimal('2.5000'), price_per_oz=Decimal('2301.15'), total_value=Decimal('5752.88'),
+            fees=Decimal('113.75')
+        )
+        for i in range(rows)
+    ])
+    TransactionNote.objects.bulk_create([
+        TransactionNote(transaction=transaction, admin_user=admin, note='Reviewed')
+        for transaction in transactions[::3]
+    ])
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main(args):
+    populate(args.rows)
+    cases = [
+        ('PortfolioItemSerializer', PortfolioItemSerializer, PortfolioItemReadSerializer,
+         PortfolioItem.objects.select_related('metal', 'product', 'vault_location').order_by('created_at')),
+        ('TransactionSerializer', TransactionSerializer, TransactionReadSerializer,
+         Transaction.objects.select_related('metal').order_by('-created_at')),
+        ('ShipmentSerializer', ShipmentSerializer, ShipmentReadSerializer,
+         Shipment.objects.prefetch_related('events', 'items', 'workflow_stages')),
+        ('AdminTransactionSerializer', AdminTransactionSerializer, AdminTransactionReadSerializer,
+         Transaction.objects.select_related('user', 'metal').prefetch_related('admin_notes').order_by('-created_at')),
+        ('AdminDeliverySerializer', AdminDeliverySerializer, AdminDeliveryReadSerializer,
+         Shipment.objects.select_related('user').prefetch_related('items', 'events', 'workflow_stages')),
+    ]
+
+    print(f"rows={args.rows} page_size={args.page_size} repeat={args.repeat} (rows/sec)")
+    print(
+        f"{'serializer':<28}{'size':>6}{'drf':>10}{'compiled':>10}{'speedup':>9}"
+        f"{'drf ser':>10}{'comp ser':>10}{'speedup':>9}"
+    )
+    for name, serializer_class, read_serializer_class, queryset in cases:
+        count = queryset.count()
+        for size in (args.page_size, count):
+            rows = min(size, count)
+
+            def drf():
+                return serializer_class(queryset[:size], many=True).data
+
+            def compiled():
+                return read_serializer_class(read_serializer_class.values(queryset)[:size]).data
+
+            if fastjson.dumps(compiled()) != fastjson.dumps(drf()):
+                print(f"WARNING: {name} output differs between serializers")
+
+            # Serialization alone, from already-fetched instances / tuples
+            instances = list(queryset[:size])
+            values = list(read_serializer_class.values(queryset)[:size])
+
+            drf_time = time_call(drf, args.repeat)
+            compiled_time = time_call(compiled, args.repeat)
+            drf_serialize_time = time_call(lambda: serializer_class(instances, many=True).data, args.repeat)
+            compiled_serialize_time = time_call(lambda: read_serializer_class(values).data, args.repeat)
+            print(
+                f"{name:<28}{rows:>6}{rows / drf_time:>10.0f}{rows / compiled_time:>10.0f}"
+                f"{drf_time / compiled_time:>8.1f}x"
+                f"{rows / drf_serialize_time:>10.0f}{rows / compiled_serialize_time:>10.0f}"
+                f"{drf_serialize_time / compiled_serialize_time:>8.1f}x"
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        main(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
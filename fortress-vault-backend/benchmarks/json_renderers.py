@@ -0,0 +1,120 @@
+"""
+Benchmark DRF's stdlib JSONRenderer against utils.fastjson.ORJSONRenderer
+
+Serializes large PortfolioItemSerializer and AdminTransactionSerializer
+payloads built from in-memory model instances (no database access), then
+times rendering the same data with each renderer and both decimal modes.
+
+    python benchmarks/json_renderers.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from admin_api.models import TransactionNote  # noqa: E402
+from admin_api.serializers import AdminTransactionSerializer  # noqa: E402
+from trading.models import Metal, PortfolioItem, Product, Transaction  # noqa: E402
+from trading.serializers import PortfolioItemSerializer  # noqa: E402
+from users.models import User  # noqa: E402
+from utils import fastjson  # noqa: E402
+from vaults.models import Vault  # noqa: E402
+
+
+def build_instances(rows):
+    now = timezone.now()
+    metals = [
+        Metal(name=name, symbol=symbol, current_price=Decimal(price), price_change_24h=Decimal('0.42'))
+        for name, symbol, price in [('Gold', 'XAU', '2345.67'), ('Silver', 'XAG', '29.81'), ('Platinum', 'XPT', '981.20')]
+    ]
+    products = [
+        Product(
+            metal=metal, name=f'1oz {metal.name} Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), created_at=now
+        )
+        for metal in metals
+    ]
+    vault = Vault(
+        name='Zurich Vault', city='Zurich', country='Switzerland', flag_emoji='🇨🇭',
+        storage_fee_percent=Decimal('0.0008'), created_at=now
+    )
+    user = User(id=uuid.uuid4(), email='bench@example.com', username='bench', first_name='Bench', last_name='User')
+
+    portfolio_items = []
+    transactions = []
+    for i in range(rows):
+        product = products[i % len(products)]
+        portfolio_items.append(PortfolioItem(
+            user=user, metal=product.metal, product=product, weight_oz=Decimal('2.5000'),
+            quantity=2, vault_location=vault, purchase_price=Decimal('2301.15'),
+            purchase_date=(now - timedelta(days=i % 365)).date()
+        ))
+        transaction = Transaction(
+            user=user, transaction_type=Transaction.TransactionType.BUY, metal=product.metal,
+            amount_oz=Decimal('2.5000'), price_per_oz=Decimal('2301.15'), total_value=Decimal('5752.88'),
+            fees=Decimal('113.75'), status=Transaction.Status.COMPLETED, created_at=now
+        )
+        # Serve admin_notes from an empty prefetch cache so no query is issued
+        transaction._prefetched_objects_cache = {'admin_notes': TransactionNote.objects.none()}
+        transactions.append(transaction)
+    return portfolio_items, transactions
+
+
+def time_call(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main(args):
+    portfolio_items, transactions = build_instances(args.rows)
+    cases = [
+        ('PortfolioItemSerializer', PortfolioItemSerializer, portfolio_items),
+        ('AdminTransactionSerializer', AdminTransactionSerializer, transactions),
+    ]
+
+    print(f"rows={args.rows} repeat={args.repeat} (median ms)")
+    print(f"{'payload':<28}{'serialize':>11}{'stdlib':>10}{'orjson':>10}{'orjson/num':>12}{'speedup':>9}{'bytes':>11}")
+    for name, serializer_class, instances in cases:
+        serialize_time, data = time_call(lambda: serializer_class(instances, many=True).data, max(1, args.repeat // 5))
+        stdlib_time, stdlib_bytes = time_call(lambda: JSONRenderer().render(data), args.repeat)
+        with override_settings(JSON_DECIMAL_MODE='string'):
+            orjson_time, orjson_bytes = time_call(lambda: fastjson.ORJSONRenderer().render(data), args.repeat)
+        with override_settings(JSON_DECIMAL_MODE='number'):
+            number_time, _ = time_call(lambda: fastjson.ORJSONRenderer().render(data), args.repeat)
+
+        if fastjson.loads(orjson_bytes) != fastjson.loads(stdlib_bytes):
+            print(f"WARNING: {name} output differs between renderers")
+
+        print(
+            f"{name:<28}{serialize_time * 1000:>11.1f}{stdlib_time * 1000:>10.1f}"
+            f"{orjson_time * 1000:>10.1f}{number_time * 1000:>12.1f}"
+            f"{stdlib_time / orjson_time:>8.1f}x{len(orjson_bytes):>11}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    main(parser.parse_args())
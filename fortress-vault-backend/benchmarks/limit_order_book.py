@@ -0,0 +1,209 @@
+"""
+Benchmark the limit order book: placement and tick execution over a deep book
+
+Creates a throwaway test database and rests --orders limit orders on one
+metal (buys below the price, sells above it, spread evenly over
++/- --spread), spread over --users users with funded wallets and holdings.
+Then times:
+
+- placement: order_book.place_order() for --placements new orders on top of
+  the book (wallet reservation, insert and, with --redis, the ZADD)
+- idle ticks: a tick that makes no order marketable, which should cost the
+  same whatever the depth of the book
+- ticks that walk the price down and then up in --step moves, each filling
+  the band of orders it crosses in batches of LIMIT_ORDER_BATCH_SIZE
+
+Without --redis the book is read through the partial (metal, side,
+limit_price) index on open orders; with --redis the configured default
+cache must be django-redis and the sorted sets are loaded with
+rebuild_book() first.
+
+    python benchmarks/limit_order_book.py --orders 100000 --users 1000
+    python benchmarks/limit_order_book.py --orders 100000 --redis --output book.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+
+from api_suite import BENCH_SETTINGS, git_commit, summarize  # noqa: E402
+from trading import order_book  # noqa: E402
+from trading.models import LimitOrder, Metal, PortfolioItem, Product  # noqa: E402
+from users.models import User, Wallet  # noqa: E402
+from utils.redis import get_redis_client  # noqa: E402
+from vaults.models import Vault  # noqa: E402
+
+PRICE = Decimal('2000.00')
+
+
+def seed(orders, users, spread, rng):
+    metal = Metal.objects.create(name='Gold', symbol='XAU', current_price=PRICE)
+    product = Product.objects.create(
+        metal=metal, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+        weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), product_type=Product.ProductType.BAR
+    )
+    vault = Vault.objects.create(name='Zurich Vault', city='Zurich', country='Switzerland',
+                                 storage_fee_percent=Decimal('0.0008'))
+
+    accounts = User.objects.bulk_create([
+        User(email=f'book{n}@example.com', username=f'book{n}', kyc_status=User.KYCStatus.VERIFIED)
+        for n in range(users)
+    ], batch_size=1000)
+    Wallet.objects.filter(user__in=accounts).delete()
+    Wallet.objects.bulk_create(
+        [Wallet(user=user, cash_balance=Decimal('100000000.00')) for user in accounts], batch_size=1000
+    )
+    holdings = PortfolioItem.objects.bulk_create([
+        PortfolioItem(user=user, metal=metal, product=product, weight_oz=Decimal('100000.0000'), quantity=1,
+                      vault_location=vault, purchase_price=PRICE)
+        for user in accounts
+    ], batch_size=1000)
+
+    rows = []
+    for n in range(orders):
+        user = n % users
+        offset = PRICE * Decimal(rng.uniform(0.0005, spread)).quantize(Decimal('0.0001'))
+        if n % 2:
+            rows.append(LimitOrder(
+                user=accounts[user], metal=metal, side=LimitOrder.Side.SELL,
+                limit_price=(PRICE + offset).quantize(Decimal('0.01')),
+                amount_oz=Decimal('1.0000'), portfolio_item=holdings[user],
+            ))
+        else:
+            limit_price = (PRICE - offset).quantize(Decimal('0.01'))
+            rows.append(LimitOrder(
+                user=accounts[user], metal=metal, side=LimitOrder.Side.BUY, limit_price=limit_price,
+                amount_oz=Decimal('1.0000'), product=product, quantity=1, vault=vault,
+                premium_per_oz=product.premium_per_oz,
+                reserved_amount=order_book.buy_reservation(Decimal('1.0000'), limit_price, product),
+            ))
+    LimitOrder.objects.bulk_create(rows, batch_size=5000)
+    return metal, product, vault, accounts
+
+
+def time_placements(count, metal, product, vault, accounts, spread, rng):
+    latencies = []
+    started = time.perf_counter()
+    for n in range(count):
+        offset = PRICE * Decimal(rng.uniform(0.0005, spread)).quantize(Decimal('0.0001'))
+        limit_price = (PRICE - offset).quantize(Decimal('0.01'))
+        order = LimitOrder(
+            user=accounts[n % len(accounts)], metal=metal, side=LimitOrder.Side.BUY, limit_price=limit_price,
+            amount_oz=Decimal('1.0000'), product=product, quantity=1, vault=vault,
+            premium_per_oz=product.premium_per_oz,
+            reserved_amount=order_book.buy_reservation(Decimal('1.0000'), limit_price, product),
+        )
+        start = time.perf_counter()
+        order_book.place_order(order)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_tick(metal, price):
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        filled = order_book.execute_tick(metal, price)
+    elapsed = time.perf_counter() - start
+    return {
+        'price': str(price),
+        'filled': filled,
+        'ms': round(elapsed * 1000, 3),
+        'fills_per_sec': round(filled / elapsed, 1) if filled else None,
+        'queries': len(queries),
+    }
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    metal, product, vault, accounts = seed(args.orders, args.users, args.spread, rng)
+    seeded = time.perf_counter() - started
+    if args.redis:
+        if get_redis_client() is None:
+            print('--redis needs the default cache to be django-redis')
+            return 1
+        order_book.rebuild_book()
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'book': 'redis' if args.redis else 'database',
+            'batch_size': settings.LIMIT_ORDER_BATCH_SIZE,
+            'seed_seconds': round(seeded, 2),
+            'args': vars(args),
+        },
+        'placement': time_placements(args.placements, metal, product, vault, accounts, args.spread, rng),
+        'idle_ticks': [run_tick(metal, PRICE) for _ in range(args.idle_ticks)],
+        'ticks': [],
+    }
+    price = PRICE
+    for direction in (-1, 1):
+        price = PRICE
+        for _ in range(args.ticks):
+            price = (price * (1 + direction * Decimal(str(args.step)))).quantize(Decimal('0.01'))
+            results['ticks'].append(run_tick(metal, price))
+
+    open_orders = LimitOrder.objects.filter(status=LimitOrder.Status.OPEN).count()
+    print(f"orders={args.orders} users={args.users} book={results['meta']['book']} database={connection.vendor} "
+          f"batch={settings.LIMIT_ORDER_BATCH_SIZE} seeded in {seeded:.1f}s, {open_orders} still open")
+    placement = results['placement']
+    print(f"placement      {placement['throughput_per_sec']:>9.0f}/s p50={placement['p50_ms']}ms "
+          f"p95={placement['p95_ms']}ms p99={placement['p99_ms']}ms")
+    for tick in results['idle_ticks']:
+        print(f"idle tick      price={tick['price']:>9} {tick['ms']:>9.2f}ms queries={tick['queries']}")
+    for tick in results['ticks']:
+        print(f"tick           price={tick['price']:>9} filled={tick['filled']:>6} {tick['ms']:>9.2f}ms "
+              f"{tick['fills_per_sec'] or 0:>9.0f} fills/s queries={tick['queries']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=100000, help='resting orders in the book')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--spread', type=float, default=0.10, help='limits spread over +/- this fraction of the price')
+    parser.add_argument('--placements', type=int, default=1000, help='timed order placements')
+    parser.add_argument('--idle-ticks', type=int, default=5)
+    parser.add_argument('--ticks', type=int, default=5, help='price moves down, then up')
+    parser.add_argument('--step', type=float, default=0.002, help='fractional price move per tick')
+    parser.add_argument('--redis', action='store_true', help='keep the book in the configured Redis cache')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='JSON results path')
+    args = parser.parse_args()
+
+    bench_settings = dict(BENCH_SETTINGS)
+    if args.redis:
+        del bench_settings['CACHES']
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(**bench_settings):
+            status = main(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    sys.exit(status)
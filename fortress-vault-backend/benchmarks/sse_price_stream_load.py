@@ -0,0 +1,176 @@
+"""
+Local load test for the SSE price stream (/api/trading/metal-prices/stream/)
+
+Opens many concurrent SSE connections against a running ASGI server, then
+optionally publishes synthetic price ticks through the channel layer and
+measures how long each tick takes to reach every listener.
+
+    daphne -b 127.0.0.1 -p 8000 config.asgi:application
+    python benchmarks/sse_price_stream_load.py --clients 5000 --ticks 10
+
+Synthetic ticks go to the real 'metal_prices' group, so only run this
+against a local stack.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import resource
+import statistics
+import sys
+import time
+
+TICK_PATTERN = re.compile(rb'"bench_tick":(\d+)')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def raise_fd_limit(clients):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, clients + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.frames = 0
+        self.first_frame_latencies = []
+        # tick number -> list of arrival times
+        self.tick_arrivals = {}
+
+
+async def run_client(host, port, path, stats, stop):
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n'.encode()
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if b' 200 ' not in status_line:
+            raise ConnectionError(status_line.decode(errors='replace').strip())
+        await reader.readuntil(b'\r\n\r\n')
+        stats.connected += 1
+
+        first = True
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            if b'event: price_update' not in chunk:
+                continue
+            now = time.perf_counter()
+            stats.frames += 1
+            if first:
+                stats.first_frame_latencies.append(now - started)
+                first = False
+            for match in TICK_PATTERN.finditer(chunk):
+                stats.tick_arrivals.setdefault(int(match.group(1)), []).append(now)
+        writer.close()
+    except Exception:
+        stats.failed += 1
+
+
+async def publish_ticks(ticks, interval):
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    published = {}
+    for tick in range(ticks):
+        await asyncio.sleep(interval)
+        published[tick] = time.perf_counter()
+        await channel_layer.group_send('metal_prices', {
+            'type': 'price_update',
+            'prices': [{'symbol': 'BENCH', 'bench_tick': tick}],
+        })
+    return published
+
+
+async def main(args):
+    stats = Stats()
+    stop = asyncio.Event()
+    raise_fd_limit(args.clients)
+
+    clients = []
+    ramp_started = time.perf_counter()
+    for i in range(args.clients):
+        clients.append(asyncio.ensure_future(run_client(args.host, args.port, args.path, stats, stop)))
+        if args.ramp and i % args.ramp == args.ramp - 1:
+            await asyncio.sleep(0.05)
+
+    # Let connections settle before publishing
+    while stats.connected + stats.failed < args.clients:
+        if time.perf_counter() - ramp_started > args.connect_timeout:
+            break
+        await asyncio.sleep(0.1)
+    connect_seconds = time.perf_counter() - ramp_started
+
+    published = {}
+    if args.ticks:
+        published = await publish_ticks(args.ticks, args.interval)
+    await asyncio.sleep(args.drain)
+
+    stop.set()
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    print(f"clients requested:   {args.clients}")
+    print(f"clients connected:   {stats.connected} in {connect_seconds:.2f}s")
+    print(f"clients failed:      {stats.failed}")
+    print(f"frames received:     {stats.frames}")
+    if stats.first_frame_latencies:
+        print(
+            "first frame (ms):    "
+            f"p50={percentile(stats.first_frame_latencies, 50) * 1000:.1f} "
+            f"p95={percentile(stats.first_frame_latencies, 95) * 1000:.1f} "
+            f"p99={percentile(stats.first_frame_latencies, 99) * 1000:.1f}"
+        )
+
+    fanout_ms = []
+    coverage = []
+    for tick, sent_at in published.items():
+        arrivals = stats.tick_arrivals.get(tick, [])
+        coverage.append(len(arrivals) / stats.connected if stats.connected else 0)
+        if arrivals:
+            fanout_ms.append((max(arrivals) - sent_at) * 1000)
+    if fanout_ms:
+        print(
+            "tick fan-out (ms):   "
+            f"median={statistics.median(fanout_ms):.1f} max={max(fanout_ms):.1f}"
+        )
+        print(f"tick coverage:       min={min(coverage):.1%} mean={statistics.mean(coverage):.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--path', default='/api/trading/metal-prices/stream/')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--ramp', type=int, default=200, help='connections opened per 50ms step (0 = all at once)')
+    parser.add_argument('--connect-timeout', type=float, default=60.0)
+    parser.add_argument('--ticks', type=int, default=10, help='synthetic price ticks to publish (0 = none)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between ticks')
+    parser.add_argument('--drain', type=float, default=2.0, help='seconds to wait after the last tick')
+    args = parser.parse_args()
+
+    if args.ticks:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        import django
+        django.setup()
+
+    asyncio.run(main(args))
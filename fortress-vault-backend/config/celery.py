@@ -6,6 +6,8 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 
+from utils.metrics import install_celery_metrics
+
 # Set default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -17,6 +19,9 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Auto-discover tasks in all installed apps
 app.autodiscover_tasks()
 
+# Task runtime and queue wait metrics
+install_celery_metrics()
+
 # Celery Beat Schedule
 app.conf.beat_schedule = {
     'update-metal-prices': {
@@ -27,6 +32,36 @@ app.conf.beat_schedule = {
         'task': 'trading.tasks.calculate_portfolio_values',
         'schedule': 300.0,  # Every 5 minutes
     },
+    'relay-outbox': {
+        'task': 'admin_api.tasks.relay_outbox',
+        'schedule': 10.0,  # Safety net; commits also kick the relay directly
+    },
+    'prune-outbox': {
+        'task': 'admin_api.tasks.prune_outbox',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'maintain-partitions': {
+        'task': 'admin_api.tasks.maintain_partitions',
+        'schedule': crontab(hour=2, minute=15),
+    },
+    'accrue-storage-fees': {
+        'task': 'trading.tasks.accrue_storage_fees',
+        # Hourly on the 1st so an interrupted run resumes the same day
+        'schedule': crontab(day_of_month=1, minute=45),
+    },
+    'snapshot-portfolios': {
+        'task': 'trading.tasks.snapshot_portfolios',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    'execute-recurring-purchases': {
+        'task': 'trading.tasks.execute_recurring_purchases',
+        # Hourly windows: today's plans run in the first, plans left due retry in the next
+        'schedule': crontab(minute=5),
+    },
+    'value-at-risk': {
+        'task': 'admin_api.tasks.value_at_risk',
+        'schedule': crontab(hour=0, minute=30),
+    },
 }
 
 @app.task(bind=True, ignore_result=True)
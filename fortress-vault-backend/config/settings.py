@@ -64,7 +64,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'utils.sql_instrumentation.SQLInstrumentationMiddleware',
+    'utils.db_routing.ReplicaRoutingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -108,6 +111,17 @@ DATABASES = {
     }
 }
 
+# Optional read replicas (utils.db_routing): one alias per host, 'replica', 'replica_2', ...,
+# sharing the primary's name and credentials. Only views marked @replica_safe read from them.
+for index, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    DATABASES['replica' if index == 0 else f'replica_{index + 1}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['utils.db_routing.ReplicaRouter']
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
@@ -153,11 +167,23 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'utils.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'utils.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DATETIME_FORMAT': '%Y-%m-%dT%H:%M:%S%z',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Decimal encoding for utils.fastjson (API responses and WebSocket frames): 'number' or 'string'
+JSON_DECIMAL_MODE = env('JSON_DECIMAL_MODE', default='number')
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=env.int('JWT_ACCESS_TOKEN_LIFETIME', default=60)),
@@ -193,7 +219,7 @@ REDIS_URL = env('REDIS_URL')
 # Caching
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'utils.cache.InstrumentedRedisCache',
         'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -220,6 +246,106 @@ CHANNEL_LAYERS = {
     },
 }
 
+# WebSocket outbound flow control (see utils.websocket.BackpressureMixin)
+WEBSOCKET_SEND_QUEUE_SIZE = env.int('WEBSOCKET_SEND_QUEUE_SIZE', default=64)
+WEBSOCKET_HEARTBEAT_INTERVAL = env.int('WEBSOCKET_HEARTBEAT_INTERVAL', default=25)
+WEBSOCKET_PING_TIMEOUT = env.int('WEBSOCKET_PING_TIMEOUT', default=75)
+
+# SSE price stream: seconds between keepalive comments on an idle stream
+PRICE_STREAM_KEEPALIVE_SECONDS = env.int('PRICE_STREAM_KEEPALIVE_SECONDS', default=15)
+
+# Portfolio push: events for the same user within this window collapse into one update
+PORTFOLIO_PUSH_COALESCE_SECONDS = env.float('PORTFOLIO_PUSH_COALESCE_SECONDS', default=1.0)
+
+# Portfolio socket presence: sockets not refreshed by a heartbeat within this many seconds stop
+# receiving price-tick revaluations (keep it a few WEBSOCKET_HEARTBEAT_INTERVALs)
+PORTFOLIO_PRESENCE_TTL_SECONDS = env.int('PORTFOLIO_PRESENCE_TTL_SECONDS', default=90)
+
+# Per-request SQL instrumentation (utils.sql_instrumentation): Server-Timing header,
+# per-endpoint aggregates kept this long in Redis, repeats of one statement that log an N+1 warning,
+# and how often each process writes its buffered aggregates (every N requests or T seconds)
+SQL_INSTRUMENTATION = env.bool('SQL_INSTRUMENTATION', default=True)
+SQL_SERVER_TIMING = env.bool('SQL_SERVER_TIMING', default=True)
+SQL_STATS_TTL_SECONDS = env.int('SQL_STATS_TTL_SECONDS', default=7 * 24 * 3600)
+SQL_N_PLUS_ONE_THRESHOLD = env.int('SQL_N_PLUS_ONE_THRESHOLD', default=5)
+SQL_STATS_FLUSH_EVERY = env.int('SQL_STATS_FLUSH_EVERY', default=100)
+SQL_STATS_FLUSH_INTERVAL = env.int('SQL_STATS_FLUSH_INTERVAL', default=10)
+
+# Prometheus metrics (utils.metrics): seconds between flushes of each process's samples
+# to Redis, and who may scrape /metrics: a bearer token or client addresses/networks
+# (e.g. 10.0.0.0/8). With neither set, /metrics is only served when DEBUG is on.
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_FLUSH_INTERVAL = env.int('METRICS_FLUSH_INTERVAL', default=5)
+METRICS_AUTH_TOKEN = env('METRICS_AUTH_TOKEN', default='')
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+
+# Read replicas: seconds a user stays on the primary after writing, the replica lag
+# beyond which reads fall back to the primary, and how often each process re-checks lag
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+REPLICA_MAX_LAG_SECONDS = env.float('REPLICA_MAX_LAG_SECONDS', default=2.0)
+REPLICA_LAG_CHECK_SECONDS = env.int('REPLICA_LAG_CHECK_SECONDS', default=5)
+
+# List endpoints serialize values() rows via utils.compiled_serializers instead of DRF serializers
+COMPILED_READ_SERIALIZERS = env.bool('COMPILED_READ_SERIALIZERS', default=True)
+
+# Public catalog responses (utils.response_cache): browser max-age and shared cache TTL
+CATALOG_CACHE_MAX_AGE = env.int('CATALOG_CACHE_MAX_AGE', default=0)
+CATALOG_RESPONSE_CACHE_SECONDS = env.int('CATALOG_RESPONSE_CACHE_SECONDS', default=3600)
+
+# Platform settings: seconds between shared version checks for the process-local copy
+PLATFORM_SETTINGS_CHECK_SECONDS = env.float('PLATFORM_SETTINGS_CHECK_SECONDS', default=1.0)
+
+# Transactional outbox relay (see admin_api.outbox); a claimed batch not finished within
+# OUTBOX_CLAIM_SECONDS (e.g. its worker died) is picked up again by another relay
+OUTBOX_RELAY_BATCH_SIZE = env.int('OUTBOX_RELAY_BATCH_SIZE', default=100)
+OUTBOX_CLAIM_SECONDS = env.int('OUTBOX_CLAIM_SECONDS', default=300)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=8)
+OUTBOX_RETENTION_DAYS = env.int('OUTBOX_RETENTION_DAYS', default=7)
+
+# Monthly partitions (utils.partitioning, PostgreSQL only): months created ahead of time,
+# months kept online before the current one, and where archived partitions are exported
+PARTITION_PREMAKE_MONTHS = env.int('PARTITION_PREMAKE_MONTHS', default=3)
+PARTITION_RETENTION_MONTHS = env.int('PARTITION_RETENTION_MONTHS', default=24)
+PARTITION_ARCHIVE_DIR = env('PARTITION_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+# Streaming exports (utils.exports): rows fetched per server-side cursor round trip and written per chunk
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Monthly storage-fee accrual (trading.storage_fees): users charged per database transaction
+STORAGE_FEE_CHUNK_SIZE = env.int('STORAGE_FEE_CHUNK_SIZE', default=5000)
+
+# Nightly portfolio snapshots (trading.snapshots): users valued per batch
+PORTFOLIO_SNAPSHOT_CHUNK_SIZE = env.int('PORTFOLIO_SNAPSHOT_CHUNK_SIZE', default=2000)
+
+# Price alerts (trading.price_alerts): alerts triggered per batch, and active alerts allowed per user
+PRICE_ALERT_BATCH_SIZE = env.int('PRICE_ALERT_BATCH_SIZE', default=1000)
+PRICE_ALERT_MAX_PER_USER = env.int('PRICE_ALERT_MAX_PER_USER', default=50)
+
+# Limit order book (trading.order_book): orders filled per database transaction, and open orders allowed per user
+LIMIT_ORDER_BATCH_SIZE = env.int('LIMIT_ORDER_BATCH_SIZE', default=1000)
+LIMIT_ORDER_MAX_PER_USER = env.int('LIMIT_ORDER_MAX_PER_USER', default=100)
+
+# Recurring purchases (trading.recurring): plans executed per database transaction, and plans allowed per user
+RECURRING_PURCHASE_BATCH_SIZE = env.int('RECURRING_PURCHASE_BATCH_SIZE', default=1000)
+RECURRING_PURCHASE_MAX_PER_USER = env.int('RECURRING_PURCHASE_MAX_PER_USER', default=20)
+
+# Price quotes (trading.quotes): seconds a quoted price is held, and lines allowed in one quote
+QUOTE_TTL_SECONDS = env.int('QUOTE_TTL_SECONDS', default=30)
+QUOTE_MAX_LINES = env.int('QUOTE_MAX_LINES', default=50)
+
+# Admin exposure stress test (admin_api.exposure): price scenarios accepted per request
+STRESS_TEST_MAX_SCENARIOS = env.int('STRESS_TEST_MAX_SCENARIOS', default=10000)
+
+# Monte Carlo value at risk (admin_api.risk): simulated paths, paths per chunk, process pool size and seed
+RISK_VAR_PATHS = env.int('RISK_VAR_PATHS', default=100000)
+RISK_VAR_CHUNK_SIZE = env.int('RISK_VAR_CHUNK_SIZE', default=10000)
+RISK_VAR_WORKERS = env.int('RISK_VAR_WORKERS', default=1)
+RISK_VAR_SEED = env.int('RISK_VAR_SEED', default=0)
+# Loss horizon, days of price history used, and user tier bounds on holdings plus cash
+RISK_VAR_HORIZON_DAYS = env.int('RISK_VAR_HORIZON_DAYS', default=1)
+RISK_VAR_LOOKBACK_DAYS = env.int('RISK_VAR_LOOKBACK_DAYS', default=365)
+RISK_VAR_TIER_BOUNDS = env.list('RISK_VAR_TIER_BOUNDS', cast=int, default=[10000, 100000, 1000000])
+
 # Email Configuration
 USE_SMTP_EMAIL = env.bool('USE_SMTP_EMAIL', default=False)
 
@@ -7,6 +7,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from utils.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('djoser.urls')),
@@ -16,6 +18,7 @@ urlpatterns = [
     path('api/vaults/', include('vaults.urls')),
     path('api/delivery/', include('delivery.urls')),
     path('api/admin/', include('admin_api.urls')),  # Admin API endpoints
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape target
 ]
 
 if settings.DEBUG:
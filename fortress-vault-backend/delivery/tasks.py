@@ -10,35 +10,35 @@ logger = logging.getLogger(__name__)
 
 @shared_task
 def update_delivery_status(delivery_id, status, description):
-    """Update delivery status and broadcast to WebSocket"""
+    """Update delivery status and queue a WebSocket broadcast"""
     try:
         from delivery.models import DeliveryRequest, DeliveryHistory
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
+        from django.db import transaction as db_transaction
+        from admin_api.outbox import enqueue_group_send
         
-        delivery = DeliveryRequest.objects.get(id=delivery_id)
-        delivery.status = status
-        delivery.save()
-        
-        # Create history entry
-        DeliveryHistory.objects.create(
-            delivery_request=delivery,
-            status=status,
-            description=description
-        )
-        
-        # Broadcast to WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f'delivery_{delivery_id}',
-            {
-                'type': 'delivery_update',
-                'data': {
-                    'status': status,
-                    'description': description
+        with db_transaction.atomic():
+            delivery = DeliveryRequest.objects.get(id=delivery_id)
+            delivery.status = status
+            delivery.save()
+            
+            # Create history entry
+            DeliveryHistory.objects.create(
+                delivery_request=delivery,
+                status=status,
+                description=description
+            )
+            
+            # Broadcast to WebSocket once the change is committed
+            enqueue_group_send(
+                f'delivery_{delivery_id}',
+                {
+                    'type': 'delivery_update',
+                    'data': {
+                        'status': status,
+                        'description': description
+                    }
                 }
-            }
-        )
+            )
         
         logger.info(f"Updated delivery {delivery.tracking_number} to {status}")
         return f"Delivery {delivery.tracking_number} updated"
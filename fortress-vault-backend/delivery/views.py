@@ -13,6 +13,7 @@ import uuid
 
 from .models import DeliveryRequest, DeliveryItem, DeliveryHistory
 from trading.models import PortfolioItem
+from trading.portfolio_push import request_portfolio_push
 from .serializers import (
     DeliveryRequestSerializer, CreateDeliveryRequestSerializer, DeliveryHistorySerializer
 )
@@ -89,6 +90,8 @@ class DeliveryViewSet(viewsets.ModelViewSet):
                 status='Processing',
                 description='Delivery request received and being processed'
             )
+            
+            request_portfolio_push(user.id)
         
         return Response(
             DeliveryRequestSerializer(delivery).data,
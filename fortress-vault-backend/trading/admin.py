@@ -3,7 +3,7 @@ Trading admin configuration
 """
 
 from django.contrib import admin
-from .models import Metal, Product, PortfolioItem, Transaction
+from .models import Metal, Product, PortfolioItem, Transaction, StorageFeeRun
 
 
 @admin.register(Metal)
@@ -42,3 +42,12 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ['transaction_type', 'status', 'created_at']
     search_fields = ['user__email']
     readonly_fields = ['created_at']
+
+
+@admin.register(StorageFeeRun)
+class StorageFeeRunAdmin(admin.ModelAdmin):
+    """Storage fee run admin"""
+    
+    list_display = ['period', 'status', 'users_charged', 'total_fees', 'started_at', 'completed_at']
+    list_filter = ['status']
+    readonly_fields = ['prices', 'cursor', 'users_charged', 'total_fees', 'started_at', 'completed_at']
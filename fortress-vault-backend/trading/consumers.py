@@ -2,16 +2,29 @@
 WebSocket consumers for real-time updates
 """
 
-import json
+import logging
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
 
+from utils.metrics import CHANNEL_LAYER_SEND_SECONDS
+from utils.websocket import BackpressureMixin
+from .portfolio_push import (
+    build_dashboard_payload, mark_portfolio_online, mark_portfolio_offline, portfolio_group_name
+)
+
+logger = logging.getLogger(__name__)
+
 
-class PriceConsumer(AsyncWebsocketConsumer):
+class PriceConsumer(BackpressureMixin, AsyncWebsocketConsumer):
     """Real-time metal price updates"""
     
+    # Only the latest price snapshot matters to a client that fell behind
+    coalesce_topics = ('price_update',)
+    send_flush_interval = 0.25
+    
     async def connect(self):
         """Handle WebSocket connection"""
         self.room_group_name = 'metal_prices'
@@ -26,10 +39,10 @@ class PriceConsumer(AsyncWebsocketConsumer):
         
         # Send current prices on connect
         prices = await self.get_current_prices()
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'price_update',
             'prices': prices
-        }))
+        })
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
@@ -40,10 +53,10 @@ class PriceConsumer(AsyncWebsocketConsumer):
     
     async def price_update(self, event):
         """Receive price update from room group"""
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'price_update',
             'prices': event['prices']
-        }))
+        })
     
     @database_sync_to_async
     def get_current_prices(self):
@@ -55,9 +68,12 @@ class PriceConsumer(AsyncWebsocketConsumer):
         return MetalSerializer(metals, many=True).data
 
 
-class PortfolioConsumer(AsyncWebsocketConsumer):
+class PortfolioConsumer(BackpressureMixin, AsyncWebsocketConsumer):
     """Real-time portfolio updates"""
     
+    coalesce_topics = ('portfolio_update',)
+    send_flush_interval = 0.25
+    
     async def connect(self):
         """Handle WebSocket connection"""
         self.user = self.scope['user']
@@ -66,7 +82,7 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        self.room_group_name = f'portfolio_{self.user.id}'
+        self.room_group_name = portfolio_group_name(self.user.id)
         
         # Join room group
         await self.channel_layer.group_add(
@@ -75,24 +91,57 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        # Price ticks only revalue portfolios of users with an open socket
+        await self.mark_online()
+        
+        # Send current portfolio on connect
+        data = await self.get_current_portfolio()
+        await self.queue_send({
+            'type': 'portfolio_update',
+            'data': data
+        })
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        if getattr(self, 'is_tracked_online', False):
+            try:
+                await sync_to_async(mark_portfolio_offline)(self.user.id, self.channel_name)
+            except Exception as e:
+                # The entry expires after PORTFOLIO_PRESENCE_TTL_SECONDS anyway
+                logger.warning(f"Failed to clear portfolio presence for {self.user.id}: {e}")
+        
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
     
+    async def mark_online(self):
+        """Record (or refresh) this socket's presence; a Redis failure must not break the connection."""
+        try:
+            await sync_to_async(mark_portfolio_online)(self.user.id, self.channel_name)
+            self.is_tracked_online = True
+        except Exception as e:
+            logger.warning(f"Failed to record portfolio presence for {self.user.id}: {e}")
+    
+    async def on_heartbeat(self):
+        await self.mark_online()
+    
+    @database_sync_to_async
+    def get_current_portfolio(self):
+        """Get the user's dashboard summary from database"""
+        return build_dashboard_payload(self.user)
+    
     async def portfolio_update(self, event):
         """Receive portfolio update from room group"""
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'portfolio_update',
             'data': event['data']
-        }))
+        })
 
 
-class DeliveryConsumer(AsyncWebsocketConsumer):
+class DeliveryConsumer(BackpressureMixin, AsyncWebsocketConsumer):
     """Real-time delivery tracking updates"""
     
     async def connect(self):
@@ -130,10 +179,10 @@ class DeliveryConsumer(AsyncWebsocketConsumer):
     
     async def delivery_update(self, event):
         """Receive delivery update from room group"""
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'delivery_update',
             'data': event['data']
-        }))
+        })
     
     @database_sync_to_async
     def verify_delivery_access(self):
@@ -157,10 +206,11 @@ def broadcast_price_update():
     metals = Metal.objects.all()
     prices = MetalSerializer(metals, many=True).data
     
-    async_to_sync(channel_layer.group_send)(
-        'metal_prices',
-        {
-            'type': 'price_update',
-            'prices': prices
-        }
-    )
+    with CHANNEL_LAYER_SEND_SECONDS.time(operation='group_send'):
+        async_to_sync(channel_layer.group_send)(
+            'metal_prices',
+            {
+                'type': 'price_update',
+                'prices': prices
+            }
+        )
@@ -0,0 +1,277 @@
+"""
+FIFO lot ledger and P&L
+
+Every buy opens a Lot holding its ounces and total cost (spot plus
+premium). Sells and conversions consume the user's open lots of that metal
+oldest first: each lot touched gets a LotAllocation, and the transaction
+stores the cost_basis it consumed and its realized_pnl (net proceeds minus
+cost basis).
+
+Position keeps running per (user, metal) totals of the open lots (ounces
+and cost) and of realized P&L. It is updated in the same database
+transaction as the lots, so P&L reads never replay history:
+
+- unrealized P&L is open_oz * current price - open_cost, one row per metal
+- a sale reads and locks only that user's open lots of the metal
+
+A lot carries its remaining cost separately from its remaining ounces, so
+partial sales never lose cents to rounding; the sale that closes a lot
+takes exactly what is left of its cost.
+
+record_buys() and record_sales() do the same for a batch of fills (the
+limit order book, trading.order_book) with bulk writes: the batch's open
+lots are read once, and the lots, transactions and positions it touches
+are each written with one UPDATE (utils.bulk_sql).
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F
+from django.utils import timezone
+
+from utils.bulk_sql import update_from_values
+from .models import Lot, LotAllocation, Position, Transaction
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _adjust_position(user_id, metal_id, open_oz=0, open_cost=0, realized_pnl=0):
+    position, _ = Position.objects.get_or_create(user_id=user_id, metal_id=metal_id)
+    Position.objects.filter(pk=position.pk).update(
+        open_oz=F('open_oz') + open_oz,
+        open_cost=F('open_cost') + open_cost,
+        realized_pnl=F('realized_pnl') + realized_pnl,
+        updated_at=timezone.now(),
+    )
+
+
+def _add_delta(deltas, transaction, open_oz, open_cost, realized_pnl):
+    delta = deltas.setdefault(
+        (transaction.user_id, transaction.metal_id), [Decimal('0'), Decimal('0.00'), Decimal('0.00')]
+    )
+    delta[0] += open_oz
+    delta[1] += open_cost
+    delta[2] += realized_pnl
+
+
+def _adjust_positions(deltas):
+    """_adjust_position for {(user id, metal id): [open_oz, open_cost, realized_pnl]}, in bulk."""
+    if not deltas:
+        return
+    Position.objects.bulk_create(
+        [Position(user_id=user_id, metal_id=metal_id) for user_id, metal_id in deltas],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    update_from_values(
+        Position,
+        ['user', 'metal'],
+        [(user_id, metal_id, *delta) for (user_id, metal_id), delta in deltas.items()],
+        add=['open_oz', 'open_cost', 'realized_pnl'],
+        constants={'updated_at': timezone.now()},
+    )
+
+
+def record_buy(transaction, portfolio_item=None):
+    """Open a lot for a completed buy; its cost is the transaction's total_value."""
+    cost = _cents(transaction.total_value)
+    lot = Lot.objects.create(
+        user_id=transaction.user_id,
+        metal_id=transaction.metal_id,
+        transaction=transaction,
+        portfolio_item=portfolio_item,
+        quantity_oz=transaction.amount_oz,
+        cost=cost,
+        remaining_oz=transaction.amount_oz,
+        remaining_cost=cost,
+        acquired_at=transaction.created_at or timezone.now(),
+    )
+    _adjust_position(transaction.user_id, transaction.metal_id, open_oz=transaction.amount_oz, open_cost=cost)
+    return lot
+
+
+def record_buys(buys):
+    """
+    record_buy for a batch of completed buys [(transaction, portfolio_item)]:
+    one insert for the lots and one pass over the positions they touch.
+    """
+    now = timezone.now()
+    new_lots = []
+    deltas = {}
+    for transaction, portfolio_item in buys:
+        cost = _cents(transaction.total_value)
+        new_lots.append(Lot(
+            user_id=transaction.user_id,
+            metal_id=transaction.metal_id,
+            transaction=transaction,
+            portfolio_item=portfolio_item,
+            quantity_oz=transaction.amount_oz,
+            cost=cost,
+            remaining_oz=transaction.amount_oz,
+            remaining_cost=cost,
+            acquired_at=transaction.created_at or now,
+        ))
+        _add_delta(deltas, transaction, transaction.amount_oz, cost, 0)
+    Lot.objects.bulk_create(new_lots, batch_size=1000)
+    _adjust_positions(deltas)
+    return new_lots
+
+
+def _allocate(transaction, proceeds, open_lots, now):
+    """
+    Take transaction.amount_oz from open_lots (oldest first) and split the
+    proceeds over them. Updates the lots and the transaction in memory and
+    returns (allocations, lots touched, ounces and cost taken from lots).
+    """
+    quantity = transaction.amount_oz
+    unallocated_oz = quantity
+    unallocated_proceeds = proceeds
+    allocations = []
+    touched = []
+    for lot in open_lots:
+        if lot.closed_at is not None:
+            # Closed by an earlier sale in the same batch
+            continue
+        take = min(lot.remaining_oz, unallocated_oz)
+        if take == lot.remaining_oz:
+            cost = lot.remaining_cost
+            lot.remaining_oz = Decimal('0')
+            lot.remaining_cost = Decimal('0.00')
+            lot.closed_at = now
+        else:
+            cost = _cents(lot.remaining_cost * take / lot.remaining_oz)
+            lot.remaining_oz -= take
+            lot.remaining_cost -= cost
+        touched.append(lot)
+
+        unallocated_oz -= take
+        # The last allocation takes the rounding remainder of the proceeds
+        share = unallocated_proceeds if unallocated_oz == 0 else _cents(proceeds * take / quantity)
+        unallocated_proceeds -= share
+        allocations.append(LotAllocation(
+            lot=lot,
+            transaction=transaction,
+            quantity_oz=take,
+            cost_basis=cost,
+            proceeds=share,
+            realized_pnl=share - cost,
+        ))
+        if unallocated_oz == 0:
+            break
+
+    lot_oz = sum((allocation.quantity_oz for allocation in allocations), Decimal('0'))
+    lot_cost = sum((allocation.cost_basis for allocation in allocations), Decimal('0.00'))
+    realized = sum((allocation.realized_pnl for allocation in allocations), Decimal('0.00'))
+
+    if unallocated_oz > 0:
+        # Holdings from before the ledger, or adjusted outside it: no known
+        # cost, so this part is booked at its proceeds (no gain or loss)
+        logger.warning(
+            f"Sale {transaction.id} exceeds open lots of user {transaction.user_id} by {unallocated_oz}oz"
+        )
+
+    transaction.cost_basis = lot_cost + unallocated_proceeds
+    transaction.realized_pnl = realized
+    return allocations, touched, lot_oz, lot_cost
+
+
+def record_sale(transaction, proceeds):
+    """
+    Consume open lots first-in first-out for a sell or conversion of
+    transaction.amount_oz, with proceeds the net cash received. Sets and
+    saves the transaction's cost_basis and realized_pnl. Must run inside the
+    atomic block that moves the holdings.
+    """
+    open_lots = Lot.objects.select_for_update().filter(
+        user_id=transaction.user_id, metal_id=transaction.metal_id, closed_at__isnull=True
+    ).order_by('acquired_at', 'id')
+
+    allocations, touched, lot_oz, lot_cost = _allocate(transaction, _cents(proceeds), open_lots, timezone.now())
+    for lot in touched:
+        lot.save(update_fields=['remaining_oz', 'remaining_cost', 'closed_at'])
+    LotAllocation.objects.bulk_create(allocations)
+    transaction.save(update_fields=['cost_basis', 'realized_pnl'])
+    _adjust_position(
+        transaction.user_id, transaction.metal_id,
+        open_oz=-lot_oz, open_cost=-lot_cost, realized_pnl=transaction.realized_pnl
+    )
+    return allocations
+
+
+def record_sales(sales):
+    """
+    record_sale for a batch of saved sells [(transaction, net proceeds)],
+    applied in order: one read of the open lots of every (user, metal) in
+    the batch, then bulk writes of the lots, allocations, transactions and
+    positions. Must run inside the atomic block that moves the holdings.
+    """
+    if not sales:
+        return []
+    pairs = {(transaction.user_id, transaction.metal_id) for transaction, _ in sales}
+    open_lots = {pair: [] for pair in pairs}
+    rows = Lot.objects.select_for_update().filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        metal_id__in={metal_id for _, metal_id in pairs},
+        closed_at__isnull=True,
+    ).order_by('acquired_at', 'id')
+    for lot in rows:
+        if (lot.user_id, lot.metal_id) in open_lots:
+            open_lots[(lot.user_id, lot.metal_id)].append(lot)
+
+    now = timezone.now()
+    allocations = []
+    touched = {}
+    deltas = {}
+    for transaction, proceeds in sales:
+        sold, lots_touched, lot_oz, lot_cost = _allocate(
+            transaction, _cents(proceeds), open_lots[(transaction.user_id, transaction.metal_id)], now
+        )
+        allocations.extend(sold)
+        touched.update((lot.pk, lot) for lot in lots_touched)
+        _add_delta(deltas, transaction, -lot_oz, -lot_cost, transaction.realized_pnl)
+
+    update_from_values(
+        Lot, 'id',
+        [(lot.pk, lot.remaining_oz, lot.remaining_cost, lot.closed_at) for lot in touched.values()],
+        assign=['remaining_oz', 'remaining_cost', 'closed_at'],
+    )
+    LotAllocation.objects.bulk_create(allocations, batch_size=1000)
+    update_from_values(
+        Transaction, 'id',
+        [(transaction.pk, transaction.cost_basis, transaction.realized_pnl) for transaction, _ in sales],
+        assign=['cost_basis', 'realized_pnl'],
+    )
+    _adjust_positions(deltas)
+    return allocations
+
+
+def portfolio_pnl(user):
+    """Realized and unrealized P&L per metal at current prices, read from Position rows only."""
+    metals = []
+    totals = {
+        'cost_basis': Decimal('0.00'),
+        'market_value': Decimal('0.00'),
+        'unrealized_pnl': Decimal('0.00'),
+        'realized_pnl': Decimal('0.00'),
+    }
+    for position in Position.objects.filter(user=user).select_related('metal').order_by('metal__symbol'):
+        market_value = _cents(position.open_oz * position.metal.current_price)
+        row = {
+            'metal': position.metal.symbol,
+            'open_oz': position.open_oz,
+            'cost_basis': position.open_cost,
+            'market_value': market_value,
+            'unrealized_pnl': market_value - position.open_cost,
+            'realized_pnl': position.realized_pnl,
+        }
+        metals.append(row)
+        for key in totals:
+            totals[key] += row[key]
+    return {'metals': metals, 'totals': totals}
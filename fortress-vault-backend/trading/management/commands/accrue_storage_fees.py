@@ -0,0 +1,38 @@
+"""
+Management command to accrue storage fees for a billing period
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.storage_fees import accrue_storage_fees, previous_period
+
+
+class Command(BaseCommand):
+    help = 'Charge (or resume charging) monthly storage fees on vaulted holdings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            help='Billing month as YYYY-MM (default: last month)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.STORAGE_FEE_CHUNK_SIZE,
+            help='Users charged per database transaction',
+        )
+
+    def handle(self, *args, **options):
+        period = previous_period()
+        if options['period']:
+            try:
+                period = datetime.strptime(options['period'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--period must be YYYY-MM')
+
+        run = accrue_storage_fees(period, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.period:%Y-%m}: {run.users_charged} user(s) charged {run.total_fees} ({run.status})'
+        ))
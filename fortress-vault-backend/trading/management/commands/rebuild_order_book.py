@@ -0,0 +1,17 @@
+"""
+Management command to reload the limit order book sorted sets from the database
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.order_book import rebuild_book
+from utils.redis import get_redis_client
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis limit order book from open orders (e.g. after a Redis flush)'
+
+    def handle(self, *args, **options):
+        if get_redis_client() is None:
+            raise CommandError('The default cache is not Redis; orders are executed from the database')
+        indexed = rebuild_book()
+        self.stdout.write(self.style.SUCCESS(f'{indexed} open order(s) indexed'))
@@ -0,0 +1,17 @@
+"""
+Management command to reload the price alert sorted sets from the database
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.price_alerts import rebuild_index
+from utils.redis import get_redis_client
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis price alert index from active alerts (e.g. after a Redis flush)'
+
+    def handle(self, *args, **options):
+        if get_redis_client() is None:
+            raise CommandError('The default cache is not Redis; alerts are matched from the database')
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'{indexed} active alert(s) indexed'))
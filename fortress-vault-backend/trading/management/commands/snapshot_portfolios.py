@@ -0,0 +1,45 @@
+"""
+Management command to write or backfill daily portfolio snapshots
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.snapshots import snapshot_portfolios
+
+
+class Command(BaseCommand):
+    help = 'Write daily portfolio snapshots for a date range (default: yesterday); reruns overwrite'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='First day as YYYY-MM-DD (default: yesterday)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            help='Last day as YYYY-MM-DD (default: the first day)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.PORTFOLIO_SNAPSHOT_CHUNK_SIZE,
+            help='Users valued per batch',
+        )
+
+    def handle(self, *args, **options):
+        days = {}
+        for option in ('date_from', 'date_to'):
+            if options[option]:
+                try:
+                    days[option] = datetime.strptime(options[option], '%Y-%m-%d').date()
+                except ValueError:
+                    raise CommandError(f'--{option[5:]} must be YYYY-MM-DD')
+
+        written = snapshot_portfolios(
+            days.get('date_from'), days.get('date_to'), chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{written} snapshot(s) written'))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from utils.partitioning import convert_to_partitioned, convert_to_plain
+
+TABLES = ('transactions', 'shipment_events')
+
+
+def partition_tables(apps, schema_editor):
+    for table in TABLES:
+        convert_to_partitioned(schema_editor, table)
+
+
+def unpartition_tables(apps, schema_editor):
+    for table in TABLES:
+        convert_to_plain(schema_editor, table)
+
+
+class Migration(migrations.Migration):
+    """Monthly range partitions on PostgreSQL; a no-op elsewhere (see utils.partitioning)"""
+
+    dependencies = [
+        ('trading', '0003_shipmentworkflowstage'),
+        # transaction_notes must stop referencing transactions at the database level first
+        ('admin_api', '0008_transactionnote_no_db_constraint'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
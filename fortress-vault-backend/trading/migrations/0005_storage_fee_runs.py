@@ -0,0 +1,51 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trading', '0004_partition_transactions_shipment_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageFeeRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period', models.DateField(unique=True)),
+                ('prices', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=20)),
+                ('cursor', models.UUIDField(blank=True, null=True)),
+                ('users_charged', models.PositiveIntegerField(default=0)),
+                ('total_fees', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'storage_fee_runs',
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageFeeCharge',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('holdings_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='charges', to='trading.storagefeerun')),
+                ('transaction', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='storage_fee_charge', to='trading.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='storage_fee_charges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'storage_fee_charges',
+                'unique_together': {('run', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trading', '0005_storage_fee_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('quantity_oz', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('remaining_oz', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('remaining_cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('acquired_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('metal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lots', to='trading.metal')),
+                ('portfolio_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lots', to='trading.portfolioitem')),
+            ],
+            options={
+                'db_table': 'lots',
+                'ordering': ['acquired_at', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='cost_basis',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='realized_pnl',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.CreateModel(
+            name='LotAllocation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('quantity_oz', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('cost_basis', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('proceeds', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('realized_pnl', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='trading.lot')),
+                ('transaction', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='lot_allocations', to='trading.transaction')),
+            ],
+            options={
+                'db_table': 'lot_allocations',
+            },
+        ),
+        migrations.AddField(
+            model_name='lot',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lots', to='trading.transaction'),
+        ),
+        migrations.AddField(
+            model_name='lot',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('open_oz', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('open_cost', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('realized_pnl', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('metal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='positions', to='trading.metal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'positions',
+                'unique_together': {('user', 'metal')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(condition=models.Q(('closed_at__isnull', True)), fields=['user', 'metal', 'acquired_at'], name='lots_open_fifo_idx'),
+        ),
+    ]
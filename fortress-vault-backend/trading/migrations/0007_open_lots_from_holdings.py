@@ -0,0 +1,55 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations
+
+CENT = Decimal('0.01')
+
+
+def open_lots(apps, schema_editor):
+    """One opening lot per existing holding, costed at its recorded spot price per oz."""
+    PortfolioItem = apps.get_model('trading', 'PortfolioItem')
+    Lot = apps.get_model('trading', 'Lot')
+    Position = apps.get_model('trading', 'Position')
+
+    positions = defaultdict(lambda: [Decimal('0'), Decimal('0.00')])
+    lots = []
+    items = PortfolioItem.objects.filter(weight_oz__gt=0).values_list(
+        'id', 'user_id', 'metal_id', 'weight_oz', 'purchase_price', 'created_at'
+    )
+    for item_id, user_id, metal_id, weight_oz, purchase_price, created_at in items.iterator(chunk_size=2000):
+        cost = (weight_oz * purchase_price).quantize(CENT, rounding=ROUND_HALF_UP)
+        lots.append(Lot(
+            user_id=user_id, metal_id=metal_id, portfolio_item_id=item_id, quantity_oz=weight_oz, cost=cost,
+            remaining_oz=weight_oz, remaining_cost=cost, acquired_at=created_at
+        ))
+        positions[(user_id, metal_id)][0] += weight_oz
+        positions[(user_id, metal_id)][1] += cost
+        if len(lots) >= 2000:
+            Lot.objects.bulk_create(lots)
+            lots = []
+    Lot.objects.bulk_create(lots)
+    Position.objects.bulk_create(
+        [
+            Position(user_id=user_id, metal_id=metal_id, open_oz=open_oz, open_cost=open_cost)
+            for (user_id, metal_id), (open_oz, open_cost) in positions.items()
+        ],
+        batch_size=2000
+    )
+
+
+def close_lots(apps, schema_editor):
+    apps.get_model('trading', 'LotAllocation').objects.all().delete()
+    apps.get_model('trading', 'Lot').objects.all().delete()
+    apps.get_model('trading', 'Position').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0006_lot_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(open_lots, close_lots),
+    ]
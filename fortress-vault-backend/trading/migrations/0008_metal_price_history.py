@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0007_open_lots_from_holdings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetalPrice',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('metal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='trading.metal')),
+            ],
+            options={
+                'db_table': 'metal_price_history',
+                'indexes': [models.Index(fields=['metal', 'recorded_at'], name='metal_price_metal_i_3da413_idx'), models.Index(fields=['recorded_at'], name='metal_price_recorde_4c5cb6_idx')],
+            },
+        ),
+    ]
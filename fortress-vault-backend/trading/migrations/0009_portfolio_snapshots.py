@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trading', '0008_metal_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('metals', models.JSONField(default=dict)),
+                ('cash', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('net_flow', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'portfolio_snapshots',
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trading', '0009_portfolio_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('direction', models.CharField(choices=[('above', 'Rises to or above'), ('below', 'Falls to or below')], max_length=10)),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('triggered', 'Triggered'), ('cancelled', 'Cancelled')], default='active', max_length=20)),
+                ('triggered_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('metal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='trading.metal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'price_alerts',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'status'], name='price_alert_user_id_82c832_idx'), models.Index(condition=models.Q(('status', 'active')), fields=['metal', 'direction', 'threshold'], name='price_alerts_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.9 on 2026-10-19 03:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vaults', '0001_initial'),
+        ('trading', '0010_price_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LimitOrder',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('side', models.CharField(choices=[('buy', 'Buy at or below'), ('sell', 'Sell at or above')], max_length=10)),
+                ('limit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('amount_oz', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('quantity', models.IntegerField(blank=True, null=True)),
+                ('reserved_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('filled', 'Filled'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], default='open', max_length=20)),
+                ('filled_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('metal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='limit_orders', to='trading.metal')),
+                ('portfolio_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='limit_orders', to='trading.portfolioitem')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='limit_orders', to='trading.product')),
+                ('transaction', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='limit_orders', to='trading.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='limit_orders', to=settings.AUTH_USER_MODEL)),
+                ('vault', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='limit_orders', to='vaults.vault')),
+            ],
+            options={
+                'db_table': 'limit_orders',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'status'], name='limit_order_user_id_82bf7c_idx'), models.Index(condition=models.Q(('status', 'open')), fields=['metal', 'side', 'limit_price'], name='limit_orders_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vaults', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trading', '0011_limit_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringPurchase',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('start_on', models.DateField()),
+                ('next_run_on', models.DateField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('paused', 'Paused'), ('cancelled', 'Cancelled')], default='active', max_length=20)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recurring_purchases', to='trading.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_purchases', to=settings.AUTH_USER_MODEL)),
+                ('vault', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_purchases', to='vaults.vault')),
+            ],
+            options={
+                'db_table': 'recurring_purchases',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringPurchaseExecution',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('scheduled_on', models.DateField()),
+                ('status', models.CharField(choices=[('completed', 'Completed'), ('failed', 'Failed')], max_length=20)),
+                ('price_per_oz', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('quantity', models.IntegerField(blank=True, null=True)),
+                ('amount_oz', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('total_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='executions', to='trading.recurringpurchase')),
+                ('transaction', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_purchase_executions', to='trading.transaction')),
+            ],
+            options={
+                'db_table': 'recurring_purchase_executions',
+                'ordering': ['-scheduled_on'],
+                'unique_together': {('plan', 'scheduled_on')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recurringpurchase',
+            index=models.Index(fields=['user', 'status'], name='recurring_p_user_id_bd659e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringpurchase',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['next_run_on', 'id'], name='recurring_purchases_due_idx'),
+        ),
+    ]
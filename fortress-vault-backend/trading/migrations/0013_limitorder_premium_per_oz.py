@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:02
+
+from decimal import Decimal, ROUND_DOWN
+
+from django.db import migrations, models
+
+CENT = Decimal('0.01')
+
+
+def premium_from_reservation(apps, schema_editor):
+    """The premium per oz an existing buy's reservation covers, rounded down so its fill stays within it."""
+    LimitOrder = apps.get_model('trading', 'LimitOrder')
+    orders = LimitOrder.objects.filter(side='buy', amount_oz__gt=0, premium_per_oz__isnull=True)
+    for order in orders.iterator(chunk_size=2000):
+        premium = (order.reserved_amount / order.amount_oz - order.limit_price).quantize(CENT, rounding=ROUND_DOWN)
+        LimitOrder.objects.filter(pk=order.pk).update(premium_per_oz=max(premium, Decimal('0.00')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0012_recurring_purchases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='limitorder',
+            name='premium_per_oz',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(premium_from_reservation, migrations.RunPython.noop),
+    ]
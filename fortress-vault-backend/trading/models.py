@@ -5,6 +5,7 @@ Trading models - Metals, Products, Portfolio, Transactions
 import uuid
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Metal(models.Model):
@@ -27,6 +28,25 @@ class Metal(models.Model):
         return f"{self.name} ({self.symbol})"
 
 
+class MetalPrice(models.Model):
+    """Price history: one row each time a metal's current price is saved"""
+    
+    id = models.BigAutoField(primary_key=True)
+    metal = models.ForeignKey(Metal, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    recorded_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'metal_price_history'
+        indexes = [
+            models.Index(fields=['metal', 'recorded_at']),
+            models.Index(fields=['recorded_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.metal.symbol} {self.price} at {self.recorded_at}"
+
+
 class Product(models.Model):
     """Specific products available for purchase"""
     
@@ -126,6 +146,9 @@ class Transaction(models.Model):
     price_per_oz = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     total_value = models.DecimalField(max_digits=12, decimal_places=2)
     fees = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Sells and conversions: FIFO cost of the lots consumed, and net proceeds minus that cost
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    realized_pnl = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -141,6 +164,343 @@ class Transaction(models.Model):
         return f"{self.user.email} - {self.transaction_type} - ${self.total_value}"
 
 
+class Lot(models.Model):
+    """Metal acquired in one buy, consumed first-in first-out by sells (see trading.lots)"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lots')
+    metal = models.ForeignKey(Metal, on_delete=models.PROTECT, related_name='lots')
+    # No database FK: transactions is range-partitioned on PostgreSQL (utils.partitioning)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='lots'
+    )
+    portfolio_item = models.ForeignKey(
+        PortfolioItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='lots'
+    )
+    quantity_oz = models.DecimalField(max_digits=10, decimal_places=4)
+    cost = models.DecimalField(max_digits=14, decimal_places=2)  # Total paid, premium included
+    remaining_oz = models.DecimalField(max_digits=10, decimal_places=4)
+    remaining_cost = models.DecimalField(max_digits=14, decimal_places=2)
+    acquired_at = models.DateTimeField()
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'lots'
+        ordering = ['acquired_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['user', 'metal', 'acquired_at'],
+                condition=models.Q(closed_at__isnull=True),
+                name='lots_open_fifo_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.remaining_oz}/{self.quantity_oz}oz {self.metal_id}"
+
+
+class LotAllocation(models.Model):
+    """The part of a lot consumed by one sell or conversion"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lot = models.ForeignKey(Lot, on_delete=models.CASCADE, related_name='allocations')
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='lot_allocations'
+    )
+    quantity_oz = models.DecimalField(max_digits=10, decimal_places=4)
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2)
+    proceeds = models.DecimalField(max_digits=14, decimal_places=2)
+    realized_pnl = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'lot_allocations'
+
+    def __str__(self):
+        return f"{self.quantity_oz}oz of lot {self.lot_id} -> {self.transaction_id}"
+
+
+class Position(models.Model):
+    """Running per-user, per-metal totals of the open lots and realized P&L"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='positions')
+    metal = models.ForeignKey(Metal, on_delete=models.PROTECT, related_name='positions')
+    open_oz = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    open_cost = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    realized_pnl = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'positions'
+        unique_together = [('user', 'metal')]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.open_oz}oz {self.metal_id}"
+
+
+class StorageFeeRun(models.Model):
+    """Storage-fee accrual for one monthly billing period (see trading.storage_fees)"""
+
+    class Status(models.TextChoices):
+        RUNNING = 'running', 'Running'
+        COMPLETED = 'completed', 'Completed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    period = models.DateField(unique=True)  # First day of the billed month
+    prices = models.JSONField(default=dict)  # Metal id -> price per oz when the run started
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.RUNNING)
+    cursor = models.UUIDField(null=True, blank=True)  # Last user id processed
+    users_charged = models.PositiveIntegerField(default=0)
+    total_fees = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'storage_fee_runs'
+        ordering = ['-period']
+
+    def __str__(self):
+        return f"Storage fees {self.period:%Y-%m} ({self.status})"
+
+
+class StorageFeeCharge(models.Model):
+    """A user's storage fee for one billing period; at most one per user and run"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    run = models.ForeignKey(StorageFeeRun, on_delete=models.CASCADE, related_name='charges')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='storage_fee_charges')
+    # transactions is range-partitioned on PostgreSQL (utils.partitioning), so
+    # id alone is not unique there and cannot be the target of a database FK
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='storage_fee_charge'
+    )
+    holdings_value = models.DecimalField(max_digits=14, decimal_places=2)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'storage_fee_charges'
+        unique_together = [('run', 'user')]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.amount} ({self.run.period:%Y-%m})"
+
+
+class PortfolioSnapshot(models.Model):
+    """A user's portfolio value at the close of one day (see trading.snapshots)"""
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='portfolio_snapshots')
+    date = models.DateField()
+    metals = models.JSONField(default=dict)  # Metal symbol -> value at the day's closing price
+    cash = models.DecimalField(max_digits=14, decimal_places=2)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2)
+    net_flow = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)  # Deposits less withdrawals that day
+
+    class Meta:
+        db_table = 'portfolio_snapshots'
+        # Also the index that serves a user's history as one range read
+        unique_together = [('user', 'date')]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.total_value}"
+
+
+class PriceAlert(models.Model):
+    """Notify a user once when a metal's price crosses a threshold (see trading.price_alerts)"""
+
+    class Direction(models.TextChoices):
+        ABOVE = 'above', 'Rises to or above'
+        BELOW = 'below', 'Falls to or below'
+
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        TRIGGERED = 'triggered', 'Triggered'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='price_alerts')
+    metal = models.ForeignKey(Metal, on_delete=models.CASCADE, related_name='price_alerts')
+    direction = models.CharField(max_length=10, choices=Direction.choices)
+    threshold = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    triggered_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    triggered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'price_alerts'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            # Threshold range reads when Redis is unavailable
+            models.Index(
+                fields=['metal', 'direction', 'threshold'],
+                condition=models.Q(status='active'),
+                name='price_alerts_active_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.metal_id} {self.direction} {self.threshold} ({self.status})"
+
+
+class LimitOrder(models.Model):
+    """Resting buy or sell filled by the first price tick that reaches its limit (see trading.order_book)"""
+
+    class Side(models.TextChoices):
+        BUY = 'buy', 'Buy at or below'
+        SELL = 'sell', 'Sell at or above'
+
+    class Status(models.TextChoices):
+        OPEN = 'open', 'Open'
+        FILLED = 'filled', 'Filled'
+        CANCELLED = 'cancelled', 'Cancelled'
+        REJECTED = 'rejected', 'Rejected'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='limit_orders')
+    metal = models.ForeignKey(Metal, on_delete=models.PROTECT, related_name='limit_orders')
+    side = models.CharField(max_length=10, choices=Side.choices)
+    limit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_oz = models.DecimalField(max_digits=10, decimal_places=4)
+    # Buys: what to buy and where to vault it; the worst-case cost is taken from the wallet on placement
+    product = models.ForeignKey(
+        Product, on_delete=models.PROTECT, null=True, blank=True, related_name='limit_orders'
+    )
+    quantity = models.IntegerField(null=True, blank=True)
+    vault = models.ForeignKey(
+        'vaults.Vault', on_delete=models.SET_NULL, null=True, blank=True, related_name='limit_orders'
+    )
+    reserved_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Buys: the product premium the reservation was taken at; the fill charges this one
+    premium_per_oz = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Sells: the holding the ounces come from, checked again when the order fills
+    portfolio_item = models.ForeignKey(
+        PortfolioItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='limit_orders'
+    )
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
+    filled_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # No database FK: transactions is range-partitioned on PostgreSQL (utils.partitioning)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='limit_orders'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'limit_orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            # Marketable-range reads when Redis is unavailable
+            models.Index(
+                fields=['metal', 'side', 'limit_price'],
+                condition=models.Q(status='open'),
+                name='limit_orders_open_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.side} {self.amount_oz}oz {self.metal_id} @ {self.limit_price} ({self.status})"
+
+
+class RecurringPurchase(models.Model):
+    """Buy a fixed cash amount of a product on a schedule (see trading.recurring)"""
+
+    class Frequency(models.TextChoices):
+        WEEKLY = 'weekly', 'Weekly'
+        MONTHLY = 'monthly', 'Monthly'
+
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        PAUSED = 'paused', 'Paused'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recurring_purchases')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='recurring_purchases')
+    vault = models.ForeignKey(
+        'vaults.Vault', on_delete=models.SET_NULL, null=True, related_name='recurring_purchases'
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Cash spent per purchase, premium included
+    frequency = models.CharField(max_length=10, choices=Frequency.choices)
+    start_on = models.DateField()  # Anchors the schedule: same weekday, or same day of the month
+    next_run_on = models.DateField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'recurring_purchases'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            models.Index(
+                fields=['next_run_on', 'id'],
+                condition=models.Q(status='active'),
+                name='recurring_purchases_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount} of {self.product_id} {self.frequency} ({self.status})"
+
+
+class RecurringPurchaseExecution(models.Model):
+    """One scheduled run of a recurring purchase, completed or failed"""
+
+    class Status(models.TextChoices):
+        COMPLETED = 'completed', 'Completed'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    plan = models.ForeignKey(RecurringPurchase, on_delete=models.CASCADE, related_name='executions')
+    scheduled_on = models.DateField()
+    status = models.CharField(max_length=20, choices=Status.choices)
+    price_per_oz = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    quantity = models.IntegerField(null=True, blank=True)
+    amount_oz = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    # No database FK: transactions is range-partitioned on PostgreSQL (utils.partitioning)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='recurring_purchase_executions'
+    )
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'recurring_purchase_executions'
+        ordering = ['-scheduled_on']
+        # A window rerun never buys twice for the same scheduled day
+        unique_together = [('plan', 'scheduled_on')]
+
+    def __str__(self):
+        return f"{self.plan_id} on {self.scheduled_on} ({self.status})"
+
+
 class Shipment(models.Model):
     """Physical shipment tracking"""
     
@@ -0,0 +1,425 @@
+"""
+Limit order book filled in batches on price ticks
+
+A LimitOrder rests until a tick makes it marketable: a buy once the price
+falls to or below its limit, a sell once the price rises to or above it. It
+then fills at the tick's price, never worse than its limit.
+
+Open orders are indexed per metal and side in Redis sorted sets, scored by
+limit price:
+
+    order_book:<metal id>:buy     buy orders, marketable while limit >= price
+    order_book:<metal id>:sell    sell orders, marketable while limit <= price
+
+Placing an order is one ZADD (O(log n)), made after commit; if Redis fails
+there the order still stands and is logged, and rebuild_book() (the
+rebuild_order_book command) puts it back in the book. A tick at price p reads only the
+marketable end of each set, ZRANGEBYSCORE p +inf for buys and -inf p for
+sells; every order it returns is filled or rejected and leaves the book, so
+the orders a tick reads are exactly those that became marketable since the
+last one. Ids are popped by the shared Lua script (utils.redis), at most
+LIMIT_ORDER_BATCH_SIZE at a time, so two workers never fill the same order.
+Without Redis the same range reads run against the partial (metal, side,
+limit_price) index on open orders.
+
+Each batch is filled in one database transaction with a fixed number of
+statements, whatever its size:
+
+- bulk_create of the transactions and of the bought portfolio items
+- the lot ledger's bulk record_buys() / record_sales()
+- one UPDATE of the sold holdings (and one DELETE of those sold out)
+- one UPDATE wallets crediting every user in the batch: sale proceeds, and
+  for buys the part of the reservation the fill did not use
+- one UPDATE of the orders, and the fill notifications through the outbox
+
+The UPDATEs join the table to a VALUES list of the batch's rows
+(utils.bulk_sql) rather than going through bulk_update(), whose per-row
+CASE expressions cost more to build than to run at these batch sizes.
+
+A buy reserves its worst case, limit plus premium, from the wallet when it
+is placed, so it cannot fail for lack of funds when it fills; cancelling
+refunds the reservation. The order keeps the premium it reserved at and its
+fill charges that one, so a premium raised while it rests cannot push the
+fill past its reservation. A sell is checked against its holding when it
+fills and is rejected if the holding has since been sold, shipped or
+reduced below the order's ounces.
+
+Fills follow the same platform switches as TradingViewSet.buy and sell: a
+halted metal fills nothing, and a disabled side rests until it is enabled.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from admin_api import outbox
+from admin_api.models import OutboxMessage, PlatformSettings
+from users.consumers import notification_group_name
+from users.models import Wallet
+from utils.bulk_sql import update_from_values
+from utils.redis import POP_RANGE_SCRIPT, get_redis_client
+from . import lots
+from .models import LimitOrder, Metal, PortfolioItem, Transaction
+from .portfolio_push import request_portfolio_push
+
+logger = logging.getLogger(__name__)
+
+BOOK_KEY = 'order_book:{metal_id}:{side}'
+# Orders placed this long before a rebuild started are added again after its swap,
+# covering ones that committed while it ran (the swap replaces what they added)
+REBUILD_OVERLAP = timedelta(minutes=1)
+CENT = Decimal('0.01')
+# Same fee as TradingViewSet.sell
+SELL_FEE_RATE = Decimal('0.005')
+
+
+class OrderError(ValueError):
+    pass
+
+
+def book_key(metal_id, side):
+    return BOOK_KEY.format(metal_id=metal_id, side=side)
+
+
+def _batch_size():
+    return getattr(settings, 'LIMIT_ORDER_BATCH_SIZE', 1000)
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def buy_reservation(amount_oz, limit_price, product):
+    """Cash held for a buy: the ounces at its limit plus the product premium."""
+    return _cents(amount_oz * (limit_price + product.premium_per_oz))
+
+
+# ---------------------------------------------------------------------------
+# Book maintenance
+# ---------------------------------------------------------------------------
+
+def _add(client, orders):
+    pipe = client.pipeline(transaction=False)
+    for order_id, metal_id, side, limit_price in orders:
+        pipe.zadd(book_key(metal_id, side), {str(order_id): float(limit_price)})
+    pipe.execute()
+
+
+def place_order(order):
+    """
+    Save a new open order, taking a buy's reservation from the wallet in the
+    same transaction; it joins the book once that commits. Raises OrderError
+    when the wallet cannot cover the reservation.
+    """
+    with db_transaction.atomic():
+        if order.side == LimitOrder.Side.BUY:
+            wallet = Wallet.objects.select_for_update().filter(user_id=order.user_id).first()
+            if wallet is None:
+                raise OrderError('User wallet not found. Please contact support.')
+            if wallet.cash_balance < order.reserved_amount:
+                raise OrderError('Insufficient funds in your cash balance to cover the order at its limit.')
+            wallet.cash_balance -= order.reserved_amount
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
+            request_portfolio_push(order.user_id)
+        order.save()
+
+        def add():
+            try:
+                client = get_redis_client()
+                if client is not None:
+                    _add(client, [(order.id, order.metal_id, order.side, order.limit_price)])
+            except Exception as e:
+                logger.warning(f"Failed to add limit order {order.id} to the book; run rebuild_order_book: {e}")
+        db_transaction.on_commit(add)
+    return order
+
+
+def cancel_order(order):
+    """Cancel an open order and refund its reservation; anything else is left as it is."""
+    with db_transaction.atomic():
+        order = LimitOrder.objects.select_for_update().get(pk=order.pk)
+        if order.status != LimitOrder.Status.OPEN:
+            return order
+        order.status = LimitOrder.Status.CANCELLED
+        order.closed_at = timezone.now()
+        order.save(update_fields=['status', 'closed_at'])
+        if order.reserved_amount:
+            Wallet.objects.filter(user_id=order.user_id).update(
+                cash_balance=F('cash_balance') + order.reserved_amount, last_updated=order.closed_at
+            )
+            request_portfolio_push(order.user_id)
+
+        def remove():
+            # A leftover entry is harmless: fills only take orders still open
+            try:
+                client = get_redis_client()
+                if client is not None:
+                    client.zrem(book_key(order.metal_id, order.side), str(order.id))
+            except Exception as e:
+                logger.warning(f"Failed to remove limit order {order.id} from the book: {e}")
+        db_transaction.on_commit(remove)
+    return order
+
+
+def rebuild_book(chunk_size=10000):
+    """Reload every sorted set from the open orders; returns the number indexed."""
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    keys = [
+        book_key(metal_id, side)
+        for metal_id in Metal.objects.values_list('id', flat=True)
+        for side in LimitOrder.Side.values
+    ]
+    # Build beside the live sets and swap them in, so a tick never sees a half-built book
+    staging = {key: f'{key}:rebuild' for key in keys}
+    client.delete(*staging.values())
+    started = timezone.now()
+
+    indexed = 0
+    batch = []
+    open_orders = LimitOrder.objects.filter(status=LimitOrder.Status.OPEN)
+    rows = open_orders.values_list('id', 'metal_id', 'side', 'limit_price')
+    for order_id, metal_id, side, limit_price in rows.iterator(chunk_size=chunk_size):
+        batch.append((order_id, staging[book_key(metal_id, side)], limit_price))
+        if len(batch) >= chunk_size:
+            indexed += _load(client, batch)
+            batch = []
+    indexed += _load(client, batch)
+
+    pipe = client.pipeline()
+    for key, staged in staging.items():
+        pipe.delete(key)
+        if client.exists(staged):
+            pipe.rename(staged, key)
+    pipe.execute()
+
+    recent = open_orders.filter(created_at__gte=started - REBUILD_OVERLAP).values_list(
+        'id', 'metal_id', 'side', 'limit_price'
+    )
+    _add(client, list(recent))
+    return indexed
+
+
+def _load(client, batch):
+    pipe = client.pipeline(transaction=False)
+    for order_id, key, limit_price in batch:
+        pipe.zadd(key, {str(order_id): float(limit_price)})
+    pipe.execute()
+    return len(batch)
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+def marketable_range(side, price):
+    """(ORM lookups, Redis min, Redis max) for the orders on side that price makes marketable."""
+    if side == LimitOrder.Side.BUY:
+        return {'limit_price__gte': price}, f'{price}', '+inf'
+    return {'limit_price__lte': price}, '-inf', f'{price}'
+
+
+def _credit_wallets(credits, now):
+    """Add {user id: amount} to each wallet in one UPDATE."""
+    update_from_values(
+        Wallet, 'user',
+        [(user_id, amount) for user_id, amount in credits.items() if amount],
+        add=['cash_balance'],
+        constants={'last_updated': now},
+    )
+
+
+def _fill(orders, metal, price):
+    """Fill a batch of one metal's open orders at price; runs inside the batch's transaction."""
+    if not orders:
+        return 0
+    now = timezone.now()
+    holdings = PortfolioItem.objects.select_for_update().in_bulk([
+        order.portfolio_item_id for order in orders
+        if order.side == LimitOrder.Side.SELL and order.portfolio_item_id
+    ])
+
+    transactions = []
+    buys = []
+    sales = []
+    sold_items = {}
+    credits = defaultdict(Decimal)
+    for order in orders:
+        if order.side == LimitOrder.Side.BUY:
+            # The premium it reserved at, so the fill never costs more than the reservation
+            premium = order.amount_oz * order.premium_per_oz
+            transaction = Transaction(
+                user_id=order.user_id,
+                transaction_type=Transaction.TransactionType.BUY,
+                metal=metal,
+                amount_oz=order.amount_oz,
+                price_per_oz=price,
+                total_value=_cents(order.amount_oz * price + premium),
+                fees=_cents(premium),
+                status=Transaction.Status.COMPLETED,
+            )
+            buys.append((transaction, PortfolioItem(
+                user_id=order.user_id,
+                metal=metal,
+                product_id=order.product_id,
+                weight_oz=order.amount_oz,
+                quantity=order.quantity,
+                vault_location_id=order.vault_id,
+                purchase_price=price,
+                status=PortfolioItem.Status.VAULTED,
+            )))
+            credits[order.user_id] += order.reserved_amount - transaction.total_value
+        else:
+            item = holdings.get(order.portfolio_item_id)
+            if item is None or item.status != PortfolioItem.Status.VAULTED or item.weight_oz < order.amount_oz:
+                order.status = LimitOrder.Status.REJECTED
+                order.closed_at = now
+                continue
+            item.weight_oz -= order.amount_oz
+            sold_items[item.pk] = item
+            gross = _cents(order.amount_oz * price)
+            fee = _cents(gross * SELL_FEE_RATE)
+            transaction = Transaction(
+                user_id=order.user_id,
+                transaction_type=Transaction.TransactionType.SELL,
+                metal=metal,
+                amount_oz=order.amount_oz,
+                price_per_oz=price,
+                total_value=gross,
+                fees=fee,
+                status=Transaction.Status.COMPLETED,
+            )
+            sales.append((transaction, gross - fee))
+            credits[order.user_id] += gross - fee
+        transactions.append(transaction)
+        order.status = LimitOrder.Status.FILLED
+        order.filled_price = price
+        order.closed_at = now
+        order.transaction = transaction
+
+    Transaction.objects.bulk_create(transactions, batch_size=1000)
+    PortfolioItem.objects.bulk_create([item for _, item in buys], batch_size=1000)
+    lots.record_buys(buys)
+    lots.record_sales(sales)
+
+    sold_out = [pk for pk, item in sold_items.items() if item.weight_oz == 0]
+    update_from_values(
+        PortfolioItem, 'id',
+        [(pk, item.weight_oz) for pk, item in sold_items.items() if item.weight_oz != 0],
+        assign=['weight_oz'],
+    )
+    if sold_out:
+        PortfolioItem.objects.filter(pk__in=sold_out).delete()
+
+    _credit_wallets(credits, now)
+    update_from_values(
+        LimitOrder, 'id',
+        [(order.pk, order.status, order.filled_price, order.closed_at, order.transaction_id) for order in orders],
+        assign=['status', 'filled_price', 'closed_at', 'transaction'],
+    )
+
+    outbox.enqueue_many(OutboxMessage.Kind.CHANNEL, [
+        {
+            'group': notification_group_name(order.user_id),
+            'message': {
+                'type': 'notification',
+                'data': {
+                    'kind': 'limit_order',
+                    'order_id': str(order.id),
+                    'metal': metal.symbol,
+                    'side': order.side,
+                    'status': order.status,
+                    'limit_price': str(order.limit_price),
+                    'price': str(price),
+                    'amount_oz': str(order.amount_oz),
+                },
+            },
+        }
+        for order in orders
+    ])
+    for user_id in {order.user_id for order in orders}:
+        request_portfolio_push(user_id)
+    return len(transactions)
+
+
+def _open_orders():
+    return LimitOrder.objects.select_for_update().filter(status=LimitOrder.Status.OPEN).order_by()
+
+
+def _execute_from_redis(client, metal, price, side, score_min, score_max):
+    pop = client.register_script(POP_RANGE_SCRIPT)
+    key = book_key(metal.id, side)
+    batch_size = _batch_size()
+    filled = 0
+    while True:
+        ids = [value.decode() if isinstance(value, bytes) else value for value in pop(
+            keys=[key], args=[score_min, score_max, batch_size]
+        )]
+        if not ids:
+            return filled
+        try:
+            with db_transaction.atomic():
+                filled += _fill(list(_open_orders().filter(id__in=ids)), metal, price)
+        except Exception:
+            # Put the batch back so the next tick can retry it
+            orders = LimitOrder.objects.filter(id__in=ids, status=LimitOrder.Status.OPEN)
+            _add(client, orders.values_list('id', 'metal_id', 'side', 'limit_price'))
+            raise
+        if len(ids) < batch_size:
+            return filled
+
+
+def _execute_from_database(metal, price, side, lookups):
+    batch_size = _batch_size()
+    filled = 0
+    while True:
+        with db_transaction.atomic():
+            orders = list(
+                _open_orders().select_for_update(skip_locked=True, of=('self',))
+                .filter(metal=metal, side=side, **lookups)[:batch_size]
+            )
+            filled += _fill(orders, metal, price)
+        if len(orders) < batch_size:
+            return filled
+
+
+def execute_tick(metal, price):
+    """Fill every open order of the metal that price makes marketable; returns the number filled."""
+    price = Decimal(price)
+    platform = PlatformSettings.get_solo()
+    if platform.is_metal_halted(metal.symbol):
+        return 0
+    sides = []
+    if platform.metals_buying_enabled:
+        sides.append(LimitOrder.Side.BUY)
+    if platform.metals_selling_enabled:
+        sides.append(LimitOrder.Side.SELL)
+
+    client = get_redis_client()
+    filled = 0
+    for side in sides:
+        lookups, score_min, score_max = marketable_range(side, price)
+        if client is None:
+            filled += _execute_from_database(metal, price, side, lookups)
+        else:
+            filled += _execute_from_redis(client, metal, price, side, score_min, score_max)
+    return filled
+
+
+def execute_price_moves(moves):
+    """Execute against a tick's [(metal id, old price, new price)]; returns orders filled."""
+    metals = {str(metal.id): metal for metal in Metal.objects.filter(id__in=[metal_id for metal_id, _, _ in moves])}
+    filled = 0
+    for metal_id, _, new_price in moves:
+        metal = metals.get(str(metal_id))
+        if metal is not None:
+            filled += execute_tick(metal, new_price)
+    return filled
@@ -0,0 +1,279 @@
+"""
+Portfolio push engine - coalesced per-user portfolio updates for PortfolioConsumer
+
+Trade, deposit and delivery events call request_portfolio_push() for the
+affected user; price ticks call request_online_portfolio_push(), which only
+recomputes valuations for users that currently hold an open portfolio socket.
+Both paths are coalesced per user within PORTFOLIO_PUSH_COALESCE_SECONDS so a
+burst of events results in a single recomputation and a single message.
+"""
+
+import logging
+import time
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+from utils.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of open portfolio sockets, '<user id>|<channel name>' scored by last-seen time
+PRESENCE_KEY = 'portfolio:presence'
+PENDING_USER_KEY = 'portfolio:push:pending:{user_id}'
+PENDING_TICK_KEY = 'portfolio:push:pending:tick'
+
+# Used when the default cache is not Redis-backed (tests, local dev).
+_local_presence = {}
+
+
+def portfolio_group_name(user_id):
+    return f'portfolio_{user_id}'
+
+
+def _coalesce_window():
+    return float(getattr(settings, 'PORTFOLIO_PUSH_COALESCE_SECONDS', 1.0))
+
+
+# ---------------------------------------------------------------------------
+# Dashboard payloads
+# ---------------------------------------------------------------------------
+
+def portfolio_items_queryset():
+    from .models import PortfolioItem
+    return PortfolioItem.objects.select_related('metal', 'product__metal', 'vault_location')
+
+
+def build_dashboard_payload(user, portfolio_items=None, wallet_balance=None):
+    """Build the payload returned by PortfolioViewSet.dashboard for one user."""
+    from .serializers import MetalSerializer, PortfolioItemSerializer
+
+    if portfolio_items is None:
+        portfolio_items = list(portfolio_items_queryset().filter(user=user))
+
+    total_value = 0.0
+    holdings = {}
+    for item in portfolio_items:
+        item_value = float(item.weight_oz * item.metal.current_price)
+        total_value += item_value
+
+        metal_symbol = item.metal.symbol
+        if metal_symbol not in holdings:
+            holdings[metal_symbol] = {
+                'metal': MetalSerializer(item.metal).data,
+                'total_oz': 0,
+                'total_value': 0
+            }
+        holdings[metal_symbol]['total_oz'] += float(item.weight_oz)
+        holdings[metal_symbol]['total_value'] += item_value
+
+    if wallet_balance is None:
+        wallet = getattr(user, 'wallet', None)
+        wallet_balance = wallet.cash_balance if wallet else None
+
+    return {
+        'total_value': total_value,
+        'cash_balance': float(wallet_balance) if wallet_balance is not None else 0.0,
+        'holdings': list(holdings.values()),
+        'portfolio_items': PortfolioItemSerializer(portfolio_items, many=True).data
+    }
+
+
+def build_dashboard_payloads(user_ids):
+    """Build dashboard payloads for many users with a constant number of queries."""
+    from users.models import Wallet
+
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+
+    items_by_user = defaultdict(list)
+    for item in portfolio_items_queryset().filter(user_id__in=user_ids):
+        items_by_user[str(item.user_id)].append(item)
+
+    balances = {
+        str(user_id): balance
+        for user_id, balance in Wallet.objects.filter(user_id__in=user_ids).values_list('user_id', 'cash_balance')
+    }
+
+    return {
+        user_id: build_dashboard_payload(
+            None,
+            portfolio_items=items_by_user.get(user_id, []),
+            wallet_balance=balances.get(user_id),
+        )
+        for user_id in user_ids
+    }
+
+
+# ---------------------------------------------------------------------------
+# Presence tracking
+# ---------------------------------------------------------------------------
+
+# Each socket is its own member, refreshed by the consumer's heartbeat; a
+# member not seen for PORTFOLIO_PRESENCE_TTL_SECONDS (a worker that crashed,
+# a disconnect that never ran) is pruned when the online users are read, so
+# lost disconnects cannot keep a user revalued on every tick.
+
+def _presence_ttl():
+    return float(getattr(settings, 'PORTFOLIO_PRESENCE_TTL_SECONDS', 90))
+
+
+def _presence_member(user_id, connection_id):
+    return f'{user_id}|{connection_id}'
+
+
+def mark_portfolio_online(user_id, connection_id):
+    """Record or refresh an open portfolio socket; the consumer calls this on connect and every heartbeat."""
+    member = _presence_member(user_id, connection_id)
+    client = get_redis_client()
+    if client is None:
+        _local_presence[member] = time.time()
+        return
+    client.zadd(PRESENCE_KEY, {member: time.time()})
+
+
+def mark_portfolio_offline(user_id, connection_id):
+    """Release an open portfolio socket."""
+    member = _presence_member(user_id, connection_id)
+    client = get_redis_client()
+    if client is None:
+        _local_presence.pop(member, None)
+        return
+    client.zrem(PRESENCE_KEY, member)
+
+
+def online_portfolio_user_ids():
+    """Return ids of users that hold at least one portfolio socket seen within the presence TTL."""
+    cutoff = time.time() - _presence_ttl()
+    client = get_redis_client()
+    if client is None:
+        for member, seen in list(_local_presence.items()):
+            if seen < cutoff:
+                del _local_presence[member]
+        members = list(_local_presence)
+    else:
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(PRESENCE_KEY, '-inf', cutoff)
+        pipe.zrange(PRESENCE_KEY, 0, -1)
+        _, members = pipe.execute()
+    user_ids = (
+        (member.decode() if isinstance(member, bytes) else member).split('|', 1)[0]
+        for member in members
+    )
+    return list(dict.fromkeys(user_ids))
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+def request_portfolio_push(user_id):
+    """
+    Schedule a recomputed portfolio summary for the user once the current
+    transaction commits. Repeated requests inside the coalescing window
+    collapse into one push.
+    """
+    db_transaction.on_commit(lambda: _schedule_user_push(str(user_id)))
+
+
+def request_portfolio_pushes(user_ids):
+    """
+    request_portfolio_push for a batch job's users: once the current
+    transaction commits, one task recomputes the summaries of those with an
+    open portfolio socket (the others get fresh data when they connect).
+    """
+    user_ids = [str(user_id) for user_id in user_ids]
+    if user_ids:
+        db_transaction.on_commit(lambda: _schedule_batch_push(user_ids))
+
+
+def request_online_portfolio_push():
+    """Schedule a revaluation for every user with an open portfolio socket."""
+    window = _coalesce_window()
+    try:
+        if not cache.add(PENDING_TICK_KEY, 1, timeout=window * 5 + 1):
+            return
+        from .tasks import push_online_portfolios
+        push_online_portfolios.apply_async(countdown=window)
+    except Exception as e:
+        logger.warning(f"Failed to schedule online portfolio push: {e}")
+
+
+def _schedule_user_push(user_id):
+    window = _coalesce_window()
+    try:
+        if not cache.add(PENDING_USER_KEY.format(user_id=user_id), 1, timeout=window * 5 + 1):
+            return
+        from .tasks import push_portfolio_updates
+        push_portfolio_updates.apply_async(args=[[user_id]], countdown=window)
+    except Exception as e:
+        # Pushes are best-effort; clients still get fresh data on next load.
+        logger.warning(f"Failed to schedule portfolio push for {user_id}: {e}")
+
+
+def _schedule_batch_push(user_ids):
+    try:
+        online = set(online_portfolio_user_ids())
+        targets = [user_id for user_id in user_ids if user_id in online]
+        if not targets:
+            return
+        from .tasks import push_portfolio_updates
+        push_portfolio_updates.apply_async(args=[targets], countdown=_coalesce_window())
+    except Exception as e:
+        logger.warning(f"Failed to schedule portfolio pushes for {len(user_ids)} users: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Delivery
+# ---------------------------------------------------------------------------
+
+def push_portfolio_updates(user_ids):
+    """Recompute and send portfolio summaries for the given users."""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return 0
+
+    # Clear pending markers before computing so events that land while we
+    # compute schedule a fresh push instead of being swallowed.
+    cache.delete_many([PENDING_USER_KEY.format(user_id=user_id) for user_id in user_ids])
+
+    payloads = build_dashboard_payloads(user_ids)
+    _send_portfolio_updates(payloads)
+    return len(payloads)
+
+
+def push_online_portfolios(chunk_size=500):
+    """Revalue portfolios for users with an open socket, in chunks."""
+    cache.delete(PENDING_TICK_KEY)
+
+    user_ids = online_portfolio_user_ids()
+    sent = 0
+    for start in range(0, len(user_ids), chunk_size):
+        payloads = build_dashboard_payloads(user_ids[start:start + chunk_size])
+        _send_portfolio_updates(payloads)
+        sent += len(payloads)
+    return sent
+
+
+def _send_portfolio_updates(payloads):
+    if not payloads:
+        return
+
+    channel_layer = get_channel_layer()
+
+    async def send_all():
+        for user_id, payload in payloads.items():
+            await channel_layer.group_send(
+                portfolio_group_name(user_id),
+                {
+                    'type': 'portfolio_update',
+                    'data': payload
+                }
+            )
+
+    async_to_sync(send_all)()
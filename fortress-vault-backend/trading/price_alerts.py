@@ -0,0 +1,269 @@
+"""
+Price alerts matched on each price tick
+
+Active alerts are indexed per metal and direction in Redis sorted sets,
+scored by threshold:
+
+    price_alerts:<metal id>:above    alerts for the price rising to a threshold
+    price_alerts:<metal id>:below    alerts for the price falling to a threshold
+
+A tick that moves a metal from old to new can only cross the thresholds in
+between, so matching is a range read over that band, never a scan of all
+alerts:
+
+- price up:   'above' alerts with old < threshold <= new
+- price down: 'below' alerts with new <= threshold < old
+
+Matched ids are popped from the set by a Lua script, PRICE_ALERT_BATCH_SIZE
+at a time, so two workers never trigger the same alert. Each batch is marked
+triggered with one UPDATE and its notifications are bulk-inserted into the
+outbox: one NotificationConsumer group message and one email per alert,
+sent by the outbox relay after commit.
+
+The sets are kept in step with the table on commit when alerts are created
+or cancelled; a Redis error there is logged, not raised, since the alert
+row has already committed. rebuild_index() (the rebuild_price_alert_index
+command) restores the sets from the table after a Redis flush or outage. Without Redis the same
+range reads run against the partial (metal, direction, threshold) index on
+active alerts.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from admin_api import outbox
+from admin_api.models import OutboxMessage
+from users.consumers import notification_group_name
+from utils.redis import POP_RANGE_SCRIPT, get_redis_client
+from .models import Metal, PriceAlert
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'price_alerts:{metal_id}:{direction}'
+# Alerts created this long before a rebuild started are added again after its swap,
+# covering ones that committed while it ran (the swap replaces what they indexed)
+REBUILD_OVERLAP = timedelta(minutes=1)
+
+
+def index_key(metal_id, direction):
+    return INDEX_KEY.format(metal_id=metal_id, direction=direction)
+
+
+def _batch_size():
+    return getattr(settings, 'PRICE_ALERT_BATCH_SIZE', 1000)
+
+
+# ---------------------------------------------------------------------------
+# Index maintenance
+# ---------------------------------------------------------------------------
+
+def _add(client, alerts):
+    pipe = client.pipeline(transaction=False)
+    for alert_id, metal_id, direction, threshold in alerts:
+        pipe.zadd(index_key(metal_id, direction), {str(alert_id): float(threshold)})
+    pipe.execute()
+
+
+def index_alert(alert):
+    """Add an alert to its sorted set once the creating transaction commits."""
+    def add():
+        try:
+            client = get_redis_client()
+            if client is not None:
+                _add(client, [(alert.id, alert.metal_id, alert.direction, alert.threshold)])
+        except Exception as e:
+            logger.warning(f"Failed to index price alert {alert.id}; run rebuild_price_alert_index: {e}")
+    db_transaction.on_commit(add)
+
+
+def unindex_alert(alert):
+    """Remove an alert from its sorted set once the cancelling transaction commits."""
+    def remove():
+        # A leftover entry is harmless: matching only triggers alerts still active
+        try:
+            client = get_redis_client()
+            if client is not None:
+                client.zrem(index_key(alert.metal_id, alert.direction), str(alert.id))
+        except Exception as e:
+            logger.warning(f"Failed to unindex price alert {alert.id}: {e}")
+    db_transaction.on_commit(remove)
+
+
+def rebuild_index(chunk_size=10000):
+    """Reload every sorted set from the active alerts; returns the number indexed."""
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    keys = [
+        index_key(metal_id, direction)
+        for metal_id in Metal.objects.values_list('id', flat=True)
+        for direction in PriceAlert.Direction.values
+    ]
+    # Build beside the live sets and swap them in, so matching never sees a half-built index
+    staging = {key: f'{key}:rebuild' for key in keys}
+    client.delete(*staging.values())
+    started = timezone.now()
+
+    indexed = 0
+    batch = []
+    active = PriceAlert.objects.filter(status=PriceAlert.Status.ACTIVE)
+    rows = active.values_list('id', 'metal_id', 'direction', 'threshold')
+    for alert_id, metal_id, direction, threshold in rows.iterator(chunk_size=chunk_size):
+        batch.append((alert_id, staging[index_key(metal_id, direction)], threshold))
+        if len(batch) >= chunk_size:
+            indexed += _load(client, batch)
+            batch = []
+    indexed += _load(client, batch)
+
+    pipe = client.pipeline()
+    for key, staged in staging.items():
+        pipe.delete(key)
+        if client.exists(staged):
+            pipe.rename(staged, key)
+    pipe.execute()
+
+    recent = active.filter(created_at__gte=started - REBUILD_OVERLAP).values_list(
+        'id', 'metal_id', 'direction', 'threshold'
+    )
+    _add(client, list(recent))
+    return indexed
+
+
+def _load(client, batch):
+    pipe = client.pipeline(transaction=False)
+    for alert_id, key, threshold in batch:
+        pipe.zadd(key, {str(alert_id): float(threshold)})
+    pipe.execute()
+    return len(batch)
+
+
+# ---------------------------------------------------------------------------
+# Matching
+# ---------------------------------------------------------------------------
+
+def crossed_band(old_price, new_price):
+    """(direction, ORM lookups, Redis min, Redis max) for the thresholds a move crosses, or None."""
+    if new_price > old_price:
+        return (
+            PriceAlert.Direction.ABOVE,
+            {'threshold__gt': old_price, 'threshold__lte': new_price},
+            f'({old_price}',
+            f'{new_price}',
+        )
+    if new_price < old_price:
+        return (
+            PriceAlert.Direction.BELOW,
+            {'threshold__gte': new_price, 'threshold__lt': old_price},
+            f'{new_price}',
+            f'({old_price}',
+        )
+    return None
+
+
+def _trigger(alerts, metal, price):
+    """Mark a batch triggered and queue its notifications; runs inside the batch's transaction."""
+    if not alerts:
+        return 0
+    now = timezone.now()
+    PriceAlert.objects.filter(id__in=[alert_id for alert_id, _, _, _ in alerts]).update(
+        status=PriceAlert.Status.TRIGGERED, triggered_at=now, triggered_price=price
+    )
+    outbox.enqueue_many(OutboxMessage.Kind.CHANNEL, [
+        {
+            'group': notification_group_name(user_id),
+            'message': {
+                'type': 'notification',
+                'data': {
+                    'kind': 'price_alert',
+                    'alert_id': str(alert_id),
+                    'metal': metal.symbol,
+                    'direction': direction,
+                    'threshold': str(threshold),
+                    'price': str(price),
+                    'triggered_at': now.isoformat(),
+                },
+            },
+        }
+        for alert_id, user_id, direction, threshold in alerts
+    ])
+    outbox.enqueue_many(OutboxMessage.Kind.EMAIL, [
+        {'email': 'price_alert', 'alert_id': str(alert_id)} for alert_id, _, _, _ in alerts
+    ])
+    return len(alerts)
+
+
+_ALERT_FIELDS = ('id', 'user_id', 'direction', 'threshold')
+
+
+def _match_in_redis(client, metal, price, direction, score_min, score_max):
+    pop = client.register_script(POP_RANGE_SCRIPT)
+    key = index_key(metal.id, direction)
+    batch_size = _batch_size()
+    triggered = 0
+    while True:
+        ids = [value.decode() if isinstance(value, bytes) else value for value in pop(
+            keys=[key], args=[score_min, score_max, batch_size]
+        )]
+        if not ids:
+            return triggered
+        try:
+            with db_transaction.atomic():
+                alerts = list(PriceAlert.objects.filter(
+                    id__in=ids, status=PriceAlert.Status.ACTIVE
+                ).values_list(*_ALERT_FIELDS))
+                triggered += _trigger(alerts, metal, price)
+        except Exception:
+            # Put the batch back so the next tick can retry it
+            alerts = PriceAlert.objects.filter(id__in=ids, status=PriceAlert.Status.ACTIVE)
+            _add(client, alerts.values_list('id', 'metal_id', 'direction', 'threshold'))
+            raise
+        if len(ids) < batch_size:
+            return triggered
+
+
+def _match_in_database(metal, price, direction, lookups):
+    batch_size = _batch_size()
+    triggered = 0
+    while True:
+        with db_transaction.atomic():
+            alerts = list(
+                PriceAlert.objects.select_for_update(skip_locked=True)
+                .filter(metal=metal, direction=direction, status=PriceAlert.Status.ACTIVE, **lookups)
+                .order_by()
+                .values_list(*_ALERT_FIELDS)[:batch_size]
+            )
+            triggered += _trigger(alerts, metal, price)
+        if len(alerts) < batch_size:
+            return triggered
+
+
+def match_price_move(metal, old_price, new_price):
+    """Trigger every active alert the move from old_price to new_price crossed; returns the count."""
+    old_price = Decimal(old_price)
+    new_price = Decimal(new_price)
+    band = crossed_band(old_price, new_price)
+    if band is None:
+        return 0
+    direction, lookups, score_min, score_max = band
+
+    client = get_redis_client()
+    if client is None:
+        return _match_in_database(metal, new_price, direction, lookups)
+    return _match_in_redis(client, metal, new_price, direction, score_min, score_max)
+
+
+def match_price_moves(moves):
+    """Match a tick's [(metal id, old price, new price)]; returns alerts triggered."""
+    metals = {str(metal.id): metal for metal in Metal.objects.filter(id__in=[metal_id for metal_id, _, _ in moves])}
+    triggered = 0
+    for metal_id, old_price, new_price in moves:
+        metal = metals.get(str(metal_id))
+        if metal is not None:
+            triggered += match_price_move(metal, old_price, new_price)
+    return triggered
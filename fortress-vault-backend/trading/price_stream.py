@@ -0,0 +1,176 @@
+"""
+Server-Sent Events price stream - one shared upstream subscription per process
+
+Every SSE listener in a worker process attaches to a single PriceStreamHub.
+The hub holds one channel-layer subscription to the 'metal_prices' group
+(the same group PriceConsumer joins), encodes each price_update once and
+hands the resulting bytes to every listener. Listeners only ever hold the
+latest frame, so a slow client skips intermediate ticks instead of
+buffering them.
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from utils import fastjson
+
+logger = logging.getLogger(__name__)
+
+PRICE_GROUP = 'metal_prices'
+RETRY_FRAME = b'retry: 3000\n\n'
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+# channels_redis expires group membership (group_expiry, default 1 day);
+# re-join well before that so long-lived hubs keep receiving ticks.
+GROUP_REFRESH_SECONDS = 3600
+
+
+def encode_price_frame(prices):
+    """Encode a price snapshot as an SSE frame matching the ws/prices/ payload."""
+    data = fastjson.dumps({'type': 'price_update', 'prices': prices})
+    return b'event: price_update\ndata: ' + data + b'\n\n'
+
+
+@database_sync_to_async
+def _load_current_prices():
+    from .models import Metal
+    from .serializers import MetalSerializer
+    return MetalSerializer(Metal.objects.all(), many=True).data
+
+
+class PriceStreamListener:
+    """A single SSE client: a one-slot, last-value-wins frame buffer."""
+
+    __slots__ = ('frame', 'ready')
+
+    def __init__(self):
+        self.frame = None
+        self.ready = asyncio.Event()
+
+    def offer(self, frame):
+        self.frame = frame
+        self.ready.set()
+
+    async def next_frame(self, timeout):
+        """Wait for the next frame; returns None if nothing arrived within timeout."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        frame, self.frame = self.frame, None
+        return frame
+
+
+class PriceStreamHub:
+    """Per-process fan-out of price updates to SSE listeners."""
+
+    def __init__(self):
+        self.listeners = set()
+        self.latest_frame = None
+        self._upstream = None
+        self._snapshot_lock = asyncio.Lock()
+
+    async def subscribe(self):
+        listener = PriceStreamListener()
+        self.listeners.add(listener)
+        if self._upstream is None:
+            self._upstream = asyncio.ensure_future(self._consume_upstream())
+
+        try:
+            frame = await self._current_frame()
+        except BaseException:
+            self.unsubscribe(listener)
+            raise
+        if frame is not None and listener.frame is None:
+            listener.offer(frame)
+        return listener
+
+    def unsubscribe(self, listener):
+        self.listeners.discard(listener)
+        if not self.listeners and self._upstream is not None:
+            self._upstream.cancel()
+            self._upstream = None
+            # Without an upstream the cached snapshot goes stale
+            self.latest_frame = None
+
+    def publish(self, frame):
+        self.latest_frame = frame
+        for listener in self.listeners:
+            listener.offer(frame)
+
+    async def _current_frame(self):
+        # Only the first listener after startup reads the DB; everyone else
+        # (including concurrent first listeners) reuses that snapshot.
+        if self.latest_frame is not None:
+            return self.latest_frame
+        async with self._snapshot_lock:
+            if self.latest_frame is None:
+                self.latest_frame = encode_price_frame(await _load_current_prices())
+            return self.latest_frame
+
+    async def _consume_upstream(self):
+        # Runs until the last listener leaves; reconnects with backoff so a
+        # channel-layer outage doesn't turn every new listener into a retry.
+        channel_layer = get_channel_layer()
+        backoff = 1
+        while True:
+            channel_name = None
+            try:
+                channel_name = await channel_layer.new_channel('price_stream.')
+                while True:
+                    await channel_layer.group_add(PRICE_GROUP, channel_name)
+                    backoff = 1
+                    try:
+                        await asyncio.wait_for(
+                            self._receive_loop(channel_layer, channel_name), GROUP_REFRESH_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            except Exception as e:
+                logger.error(f"Price stream upstream failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if channel_name is not None:
+                    try:
+                        await channel_layer.group_discard(PRICE_GROUP, channel_name)
+                    except Exception:
+                        pass
+
+    async def _receive_loop(self, channel_layer, channel_name):
+        while True:
+            message = await channel_layer.receive(channel_name)
+            if message.get('type') == 'price_update':
+                self.publish(encode_price_frame(message['prices']))
+
+
+_hubs = {}
+
+
+def get_price_stream_hub():
+    """Return the hub bound to the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        _hubs.clear()
+        hub = _hubs[loop] = PriceStreamHub()
+    return hub
+
+
+async def stream_price_frames(hub=None):
+    """Async iterator of SSE bytes for one client, with keepalive comments."""
+    hub = hub or get_price_stream_hub()
+    keepalive = getattr(settings, 'PRICE_STREAM_KEEPALIVE_SECONDS', 15)
+    listener = await hub.subscribe()
+    try:
+        yield RETRY_FRAME
+        while True:
+            frame = await listener.next_frame(keepalive)
+            yield frame if frame is not None else KEEPALIVE_FRAME
+    finally:
+        hub.unsubscribe(listener)
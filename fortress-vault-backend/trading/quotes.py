@@ -0,0 +1,287 @@
+"""
+Time-limited price quotes, executed without re-reading prices
+
+A quote fixes the price of a buy or sell for QUOTE_TTL_SECONDS. It covers
+one or more lines, so a multi-product basket is priced together:
+
+    buy     [{product_id, quantity}, ...] into one vault (or for delivery)
+    sell    [{portfolio_item_id, amount_oz}, ...] of vaulted holdings
+
+Pricing reads every product (or holding) of the quote in one query with its
+metal, and works out spot, premium, fees and total per line the same way
+TradingViewSet.buy and sell do, rounded to cents. The quote is stored in the
+default cache (Redis in production) under quote:<id> for its lifetime and
+handed to the client with a token, the quote id and user id signed with
+django.core.signing, so a quote cannot be guessed, taken by another user or
+used after it expires.
+
+Executing a quote verifies the token, reads the quote back from the cache
+and applies it at the quoted prices: Metal and Product are not read again.
+It still locks what it moves: the wallet once, and for sells the holdings,
+which must still cover the quoted ounces. A quote is used at most once; it
+is claimed (deleted from the cache) only after the wallet lock is held and
+the checks pass, so a quote that fails for lack of funds can be retried
+until it expires, and two requests racing on the same quote serialize on
+the wallet lock, the second finding it gone.
+
+Each execution is one database transaction with a fixed number of
+statements whatever the number of lines: bulk_create of the transactions
+and portfolio items, the lot ledger's bulk record_buys() / record_sales(),
+one UPDATE of the sold holdings and one of the wallet.
+
+Basket checkout (TradingViewSet.basket) is the same buy without the wait:
+it prices the lines with price_buy_lines() and executes them at once with
+execute_buy(claim=False), so a checkout costs the same number of queries
+for 2 lines as for 20.
+
+Platform switches (buying/selling enabled, halted metals) and KYC are
+checked by the views both when quoting and when executing.
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from users.models import Wallet
+from utils.bulk_sql import update_from_values
+from . import lots
+from .models import PortfolioItem, Product, Transaction
+from .order_book import SELL_FEE_RATE
+from .portfolio_push import request_portfolio_push
+
+QUOTE_KEY = 'quote:{quote_id}'
+SIGNING_SALT = 'trading.quotes'
+CENT = Decimal('0.01')
+
+
+class QuoteError(ValueError):
+    """A quote that cannot be created or executed; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def ttl():
+    return getattr(settings, 'QUOTE_TTL_SECONDS', 30)
+
+
+def price_buy_lines(lines):
+    """Price [{product_id, quantity}] from one read of the products and their metals."""
+    products = Product.objects.select_related('metal').filter(is_active=True).in_bulk(
+        {line['product_id'] for line in lines}
+    )
+    priced = []
+    for line in lines:
+        product = products.get(line['product_id'])
+        if product is None:
+            raise QuoteError(f"Product {line['product_id']} is not available", status_code=404)
+        weight = product.weight_oz * line['quantity']
+        spot_cost = _cents(weight * product.metal.current_price)
+        premium_cost = _cents(weight * product.premium_per_oz)
+        priced.append({
+            'product_id': str(product.id),
+            'product_name': product.name,
+            'metal_id': str(product.metal_id),
+            'metal_symbol': product.metal.symbol,
+            'metal_name': product.metal.name,
+            'quantity': line['quantity'],
+            'weight_oz': weight,
+            'spot_price': product.metal.current_price,
+            'premium_per_oz': product.premium_per_oz,
+            'spot_cost': spot_cost,
+            'premium_cost': premium_cost,
+            'fees': premium_cost,
+            'total': spot_cost + premium_cost,
+        })
+    return priced
+
+
+def price_sell_lines(user, lines):
+    """Price [{portfolio_item_id, amount_oz}] of the user's vaulted holdings from one read."""
+    items = PortfolioItem.objects.select_related('metal').filter(
+        user=user, status=PortfolioItem.Status.VAULTED
+    ).in_bulk({line['portfolio_item_id'] for line in lines})
+    remaining = {pk: item.weight_oz for pk, item in items.items()}
+    priced = []
+    for line in lines:
+        item = items.get(line['portfolio_item_id'])
+        if item is None:
+            raise QuoteError(f"Portfolio item {line['portfolio_item_id']} not found", status_code=404)
+        if line['amount_oz'] > remaining[item.pk]:
+            raise QuoteError('Insufficient holdings')
+        remaining[item.pk] -= line['amount_oz']
+        gross = _cents(line['amount_oz'] * item.metal.current_price)
+        fee = _cents(gross * SELL_FEE_RATE)
+        priced.append({
+            'portfolio_item_id': str(item.id),
+            'metal_id': str(item.metal_id),
+            'metal_symbol': item.metal.symbol,
+            'metal_name': item.metal.name,
+            'amount_oz': line['amount_oz'],
+            'spot_price': item.metal.current_price,
+            'gross': gross,
+            'fees': fee,
+            'total': gross - fee,
+        })
+    return priced
+
+
+def build_quote(user, side, lines, delivery_method=None, vault_id=None):
+    """A quote for already priced lines, not yet stored."""
+    now = timezone.now()
+    return {
+        'quote_id': str(uuid.uuid4()),
+        'user_id': str(user.pk),
+        'side': side,
+        'delivery_method': delivery_method,
+        'vault_id': str(vault_id) if vault_id else None,
+        'lines': lines,
+        'fees': sum((line['fees'] for line in lines), Decimal('0.00')),
+        'total': sum((line['total'] for line in lines), Decimal('0.00')),
+        'created_at': now.isoformat(),
+        'expires_at': (now + timedelta(seconds=ttl())).isoformat(),
+    }
+
+
+def create_quote(user, side, lines, delivery_method=None, vault_id=None):
+    """Store a quote for already priced lines and return it with its signed token."""
+    quote = build_quote(user, side, lines, delivery_method=delivery_method, vault_id=vault_id)
+    cache.set(QUOTE_KEY.format(quote_id=quote['quote_id']), quote, timeout=ttl())
+    token = signing.dumps({'quote': quote['quote_id'], 'user': str(user.pk)}, salt=SIGNING_SALT)
+    return {**quote, 'token': token}
+
+
+def load_quote(user, token, side):
+    """The cached quote a token refers to, checked against the user and side."""
+    try:
+        signed = signing.loads(token, salt=SIGNING_SALT, max_age=ttl())
+    except signing.SignatureExpired:
+        raise QuoteError('Quote has expired. Please request a new quote.', status_code=410)
+    except signing.BadSignature:
+        raise QuoteError('Invalid quote')
+    if signed['user'] != str(user.pk):
+        raise QuoteError('Invalid quote')
+    quote = cache.get(QUOTE_KEY.format(quote_id=signed['quote']))
+    if quote is None:
+        raise QuoteError('Quote has expired or was already used. Please request a new quote.', status_code=410)
+    if quote['side'] != side:
+        raise QuoteError(f"This is a {quote['side']} quote")
+    return quote
+
+
+def _claim(quote):
+    # delete() reports whether the key existed, so only one request gets to use the quote
+    if not cache.delete(QUOTE_KEY.format(quote_id=quote['quote_id'])):
+        raise QuoteError('Quote has expired or was already used. Please request a new quote.', status_code=410)
+
+
+def _lock_wallet(user):
+    wallet = Wallet.objects.select_for_update().filter(user=user).first()
+    if wallet is None:
+        raise QuoteError('User wallet not found. Please contact support.')
+    return wallet
+
+
+def execute_buy(user, quote, claim=True):
+    """
+    Buy every line of a buy quote at its quoted prices; returns
+    (transactions, portfolio items). claim=False executes a quote from
+    build_quote() that was never stored, as basket checkout does.
+    """
+    with db_transaction.atomic():
+        wallet = _lock_wallet(user)
+        if wallet.cash_balance < quote['total']:
+            raise QuoteError('Insufficient funds in your cash balance. Please deposit funds before purchasing.')
+        if claim:
+            _claim(quote)
+
+        vaulted = quote['delivery_method'] == 'vault'
+        buys = []
+        for line in quote['lines']:
+            transaction = Transaction(
+                user=user,
+                transaction_type=Transaction.TransactionType.BUY,
+                metal_id=uuid.UUID(line['metal_id']),
+                amount_oz=line['weight_oz'],
+                price_per_oz=line['spot_price'],
+                total_value=line['total'],
+                fees=line['fees'],
+                status=Transaction.Status.COMPLETED,
+            )
+            buys.append((transaction, PortfolioItem(
+                user=user,
+                metal_id=uuid.UUID(line['metal_id']),
+                product_id=uuid.UUID(line['product_id']),
+                weight_oz=line['weight_oz'],
+                quantity=line['quantity'],
+                vault_location_id=uuid.UUID(quote['vault_id']) if vaulted else None,
+                purchase_price=line['spot_price'],
+                status=PortfolioItem.Status.VAULTED if vaulted else PortfolioItem.Status.DELIVERED,
+            )))
+
+        wallet.cash_balance -= quote['total']
+        wallet.save(update_fields=['cash_balance', 'last_updated'])
+        transactions = Transaction.objects.bulk_create([transaction for transaction, _ in buys])
+        items = PortfolioItem.objects.bulk_create([item for _, item in buys])
+        lots.record_buys(buys)
+        request_portfolio_push(user.id)
+    return transactions, items
+
+
+def execute_sell(user, quote):
+    """Sell every line of a sell quote at its quoted prices; returns (transactions, net proceeds)."""
+    with db_transaction.atomic():
+        wallet = _lock_wallet(user)
+        holdings = PortfolioItem.objects.select_for_update().filter(
+            user=user, status=PortfolioItem.Status.VAULTED
+        ).in_bulk({line['portfolio_item_id'] for line in quote['lines']})
+        remaining = {str(pk): item.weight_oz for pk, item in holdings.items()}
+        sold = defaultdict(Decimal)
+        for line in quote['lines']:
+            if remaining.get(line['portfolio_item_id'], Decimal('0')) < line['amount_oz']:
+                raise QuoteError('Insufficient holdings')
+            remaining[line['portfolio_item_id']] -= line['amount_oz']
+            sold[line['portfolio_item_id']] += line['amount_oz']
+        _claim(quote)
+
+        sales = [
+            (Transaction(
+                user=user,
+                transaction_type=Transaction.TransactionType.SELL,
+                metal_id=uuid.UUID(line['metal_id']),
+                amount_oz=line['amount_oz'],
+                price_per_oz=line['spot_price'],
+                total_value=line['gross'],
+                fees=line['fees'],
+                status=Transaction.Status.COMPLETED,
+            ), line['total'])
+            for line in quote['lines']
+        ]
+        transactions = Transaction.objects.bulk_create([transaction for transaction, _ in sales])
+        lots.record_sales(sales)
+
+        update_from_values(
+            PortfolioItem, 'id',
+            [(pk, remaining[pk]) for pk in sold if remaining[pk] != 0],
+            assign=['weight_oz'],
+        )
+        sold_out = [pk for pk in sold if remaining[pk] == 0]
+        if sold_out:
+            PortfolioItem.objects.filter(pk__in=sold_out).delete()
+
+        wallet.cash_balance += quote['total']
+        wallet.save(update_fields=['cash_balance', 'last_updated'])
+        request_portfolio_push(user.id)
+    return transactions, quote['total']
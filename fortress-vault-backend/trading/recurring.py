@@ -0,0 +1,262 @@
+"""
+Recurring purchases (dollar-cost averaging) executed in batch windows
+
+A RecurringPurchase spends a fixed cash amount on a product every week or
+month, anchored on its start date. Plans are not scheduled one Celery task
+each: a single job (the execute_recurring_purchases beat task, hourly)
+takes every active plan due on or before today and runs them in batches of
+RECURRING_PURCHASE_BATCH_SIZE, in plan-id order.
+
+Every metal is priced once per window, from one read of the metals table,
+so all plans in a window buy at the same snapshot. Each batch is one
+database transaction with a fixed number of statements:
+
+- one SELECT ... FOR UPDATE of the batch users' wallets; balances are then
+  checked in memory, plan by plan, so a user's second plan sees the first
+  one's debit
+- bulk_create of the transactions, portfolio items and execution records,
+  and the lot ledger's bulk record_buys()
+- one UPDATE wallets debiting each user's total, and one UPDATE moving
+  every plan to its next scheduled day (utils.bulk_sql)
+
+A plan that cannot be bought (no funds, KYC, inactive product, amount below
+one unit) gets a FAILED execution with the reason and moves on to its next
+day; the rest of the batch is unaffected. If the batch's transaction itself
+fails, it is rolled back and retried one plan per transaction, so only the
+plan that raised is left due, to be retried by the next window. Plans on a
+halted metal are also left due. RecurringPurchaseExecution is unique per
+(plan, scheduled day), so a window never buys twice for the same day.
+
+Bars and coins are bought in whole units, as many as the amount covers at
+spot plus premium; digital products in fractional ounces (to 0.0001oz)
+worth at most the amount. A run that missed days buys once and schedules
+the next day after today.
+"""
+
+import calendar
+import logging
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from admin_api import outbox
+from admin_api.models import OutboxMessage, PlatformSettings
+from users.consumers import notification_group_name
+from users.models import Wallet
+from utils.bulk_sql import update_from_values
+from . import lots
+from .models import Metal, PortfolioItem, Product, RecurringPurchase, RecurringPurchaseExecution, Transaction
+from .portfolio_push import request_portfolio_push
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+OUNCE_STEP = Decimal('0.0001')
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _add_months(day, months, anchor_day):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def next_run(plan, after):
+    """The plan's first scheduled day after `after`."""
+    start = plan.start_on
+    if after < start:
+        return start
+    if plan.frequency == RecurringPurchase.Frequency.WEEKLY:
+        return start + timedelta(weeks=(after - start).days // 7 + 1)
+    # Month ends clamp (the 31st runs on the 30th in April) without drifting the anchor
+    months = (after.year - start.year) * 12 + after.month - start.month
+    candidate = _add_months(start, months, start.day)
+    if candidate <= after:
+        candidate = _add_months(start, months + 1, start.day)
+    return candidate
+
+
+def units(amount, product, price):
+    """(quantity, ounces) of product that amount buys at price plus premium."""
+    per_oz = price + product.premium_per_oz
+    if product.product_type == Product.ProductType.DIGITAL:
+        weight = (amount / per_oz).quantize(OUNCE_STEP, rounding=ROUND_DOWN)
+        return (1, weight) if weight > 0 else (0, Decimal('0'))
+    quantity = int(amount // (product.weight_oz * per_oz))
+    return quantity, product.weight_oz * quantity
+
+
+def _failure(plan, price, error):
+    return RecurringPurchaseExecution(
+        plan=plan,
+        scheduled_on=plan.next_run_on,
+        status=RecurringPurchaseExecution.Status.FAILED,
+        price_per_oz=price,
+        error=error,
+    )
+
+
+def _execute_batch(plans, prices, halted, today):
+    """Run a batch of due plans at the window's prices; runs inside the batch's transaction."""
+    now = timezone.now()
+    balances = dict(
+        Wallet.objects.select_for_update()
+        .filter(user_id__in={plan.user_id for plan in plans})
+        .values_list('user_id', 'cash_balance')
+    )
+
+    transactions = []
+    buys = []
+    executions = []
+    debits = defaultdict(Decimal)
+    scheduled = []
+    results = Counter()
+    for plan in plans:
+        product = plan.product
+        if product.metal.symbol in halted:
+            results['skipped'] += 1
+            continue
+        price = prices[product.metal_id]
+        quantity, weight = units(plan.amount, product, price)
+        cost = _cents(weight * (price + product.premium_per_oz))
+
+        if plan.user.kyc_status != 'verified':
+            executions.append(_failure(plan, price, 'KYC verification required before purchasing'))
+        elif not product.is_active:
+            executions.append(_failure(plan, price, 'Product is no longer available'))
+        elif plan.vault_id is None:
+            executions.append(_failure(plan, price, 'Vault is no longer available'))
+        elif not quantity:
+            executions.append(_failure(plan, price, f'{plan.amount} does not cover one {product.name} at {price}'))
+        elif plan.user_id not in balances:
+            executions.append(_failure(plan, price, 'User wallet not found'))
+        elif balances[plan.user_id] < cost:
+            executions.append(_failure(plan, price, 'Insufficient funds in your cash balance'))
+        else:
+            balances[plan.user_id] -= cost
+            debits[plan.user_id] += cost
+            transaction = Transaction(
+                user_id=plan.user_id,
+                transaction_type=Transaction.TransactionType.BUY,
+                metal_id=product.metal_id,
+                amount_oz=weight,
+                price_per_oz=price,
+                total_value=cost,
+                fees=_cents(weight * product.premium_per_oz),
+                status=Transaction.Status.COMPLETED,
+            )
+            transactions.append(transaction)
+            buys.append((transaction, PortfolioItem(
+                user_id=plan.user_id,
+                metal_id=product.metal_id,
+                product=product,
+                weight_oz=weight,
+                quantity=quantity,
+                vault_location_id=plan.vault_id,
+                purchase_price=price,
+                status=PortfolioItem.Status.VAULTED,
+            )))
+            executions.append(RecurringPurchaseExecution(
+                plan=plan,
+                scheduled_on=plan.next_run_on,
+                status=RecurringPurchaseExecution.Status.COMPLETED,
+                price_per_oz=price,
+                quantity=quantity,
+                amount_oz=weight,
+                total_cost=cost,
+                transaction=transaction,
+            ))
+        results[executions[-1].status] += 1
+        scheduled.append((plan.pk, next_run(plan, today), now))
+
+    Transaction.objects.bulk_create(transactions, batch_size=1000)
+    PortfolioItem.objects.bulk_create([item for _, item in buys], batch_size=1000)
+    lots.record_buys(buys)
+    RecurringPurchaseExecution.objects.bulk_create(executions, batch_size=1000)
+    update_from_values(
+        Wallet, 'user',
+        [(user_id, -amount) for user_id, amount in debits.items()],
+        add=['cash_balance'],
+        constants={'last_updated': now},
+    )
+    update_from_values(RecurringPurchase, 'id', scheduled, assign=['next_run_on', 'last_run_at'])
+
+    outbox.enqueue_many(OutboxMessage.Kind.CHANNEL, [
+        {
+            'group': notification_group_name(execution.plan.user_id),
+            'message': {
+                'type': 'notification',
+                'data': {
+                    'kind': 'recurring_purchase',
+                    'plan_id': str(execution.plan_id),
+                    'status': execution.status,
+                    'scheduled_on': execution.scheduled_on.isoformat(),
+                    'amount_oz': str(execution.amount_oz) if execution.amount_oz is not None else None,
+                    'total_cost': str(execution.total_cost) if execution.total_cost is not None else None,
+                    'error': execution.error,
+                },
+            },
+        }
+        for execution in executions
+    ])
+    for user_id in debits:
+        request_portfolio_push(user_id)
+    return results
+
+
+def _run_batch(plans, prices, halted, today):
+    if len(plans) > 1:
+        try:
+            with db_transaction.atomic():
+                return _execute_batch(plans, prices, halted, today)
+        except Exception:
+            logger.exception(f"Recurring purchase batch of {len(plans)} failed; retrying plan by plan")
+
+    results = Counter()
+    for plan in plans:
+        try:
+            with db_transaction.atomic():
+                results += _execute_batch([plan], prices, halted, today)
+        except Exception:
+            # Left due: the next window retries it
+            logger.exception(f"Recurring purchase {plan.pk} failed")
+            results['errored'] += 1
+    return results
+
+
+def execute_due_plans(today=None, batch_size=None):
+    """Run every active plan due on or before today; returns counts by outcome."""
+    today = today or timezone.localdate()
+    batch_size = batch_size or getattr(settings, 'RECURRING_PURCHASE_BATCH_SIZE', 1000)
+    platform = PlatformSettings.get_solo()
+    if not platform.metals_buying_enabled:
+        logger.info("Recurring purchases: buying is disabled, plans stay due")
+        return {}
+
+    # One price per metal for the whole window
+    prices = dict(Metal.objects.values_list('id', 'current_price'))
+    halted = set(platform.halted_metals)
+
+    results = Counter()
+    cursor = None
+    while True:
+        plans = RecurringPurchase.objects.filter(status=RecurringPurchase.Status.ACTIVE, next_run_on__lte=today)
+        if cursor is not None:
+            plans = plans.filter(id__gt=cursor)
+        plans = list(plans.select_related('user', 'product__metal').order_by('id')[:batch_size])
+        if not plans:
+            break
+        results += _run_batch(plans, prices, halted, today)
+        cursor = plans[-1].id
+
+    results = {str(outcome): count for outcome, count in results.items()}
+    logger.info(f"Recurring purchases for {today}: {results}")
+    return results
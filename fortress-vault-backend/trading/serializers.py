@@ -5,8 +5,14 @@ Trading serializers
 from rest_framework import serializers
 from django.conf import settings
 from urllib.parse import urlparse
-from .models import Metal, Product, PortfolioItem, Transaction, Shipment, ShipmentEvent, ShipmentWorkflowStage
+from django.db.models import Count
+from django.utils import timezone
+from .models import (
+    LimitOrder, Metal, Product, PortfolioItem, PriceAlert, RecurringPurchase, RecurringPurchaseExecution,
+    Transaction, Shipment, ShipmentEvent, ShipmentWorkflowStage
+)
 from vaults.serializers import VaultSerializer
+from utils.compiled_serializers import CompiledReadSerializer, reads
 
 
 class MetalSerializer(serializers.ModelSerializer):
@@ -45,6 +51,7 @@ class MetalSerializer(serializers.ModelSerializer):
 
         return cls.METAL_IMAGE_MAP.get(normalized_symbol)
 
+    @reads('symbol')
     def get_image_url(self, obj):
         return self.get_image_url_for_symbol(obj.symbol)
     
@@ -87,6 +94,7 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'purchase_date', 'created_at']
     
+    @reads('weight_oz', 'metal__current_price')
     def get_current_value(self, obj):
         """Calculate current value based on current metal price"""
         return float(obj.weight_oz * obj.metal.current_price)
@@ -103,9 +111,142 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'user_email', 'transaction_type', 'metal',
             'amount_oz', 'price_per_oz', 'total_value', 'fees',
-            'status', 'created_at'
+            'cost_basis', 'realized_pnl', 'status', 'created_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at']
+        read_only_fields = ['id', 'user', 'cost_basis', 'realized_pnl', 'created_at']
+
+
+class PriceAlertSerializer(serializers.ModelSerializer):
+    """Price alert serializer"""
+    
+    metal_symbol = serializers.CharField(source='metal.symbol', read_only=True)
+    threshold = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)
+    
+    class Meta:
+        model = PriceAlert
+        fields = [
+            'id', 'metal', 'metal_symbol', 'direction', 'threshold', 'status',
+            'triggered_price', 'created_at', 'triggered_at'
+        ]
+        read_only_fields = ['id', 'status', 'triggered_price', 'created_at', 'triggered_at']
+    
+    def validate(self, attrs):
+        # An alert already on the far side of the price would only fire after a round trip
+        price = attrs['metal'].current_price
+        if attrs['direction'] == PriceAlert.Direction.ABOVE and attrs['threshold'] <= price:
+            raise serializers.ValidationError({'threshold': f'Must be above the current price ({price}).'})
+        if attrs['direction'] == PriceAlert.Direction.BELOW and attrs['threshold'] >= price:
+            raise serializers.ValidationError({'threshold': f'Must be below the current price ({price}).'})
+        return attrs
+
+
+class LimitOrderSerializer(serializers.ModelSerializer):
+    """Limit order serializer: buys name a product, quantity and vault; sells a holding and ounces"""
+    
+    metal_symbol = serializers.CharField(source='metal.symbol', read_only=True)
+    limit_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(is_active=True).select_related('metal'), required=False
+    )
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    portfolio_item = serializers.PrimaryKeyRelatedField(
+        queryset=PortfolioItem.objects.select_related('metal'), required=False
+    )
+    amount_oz = serializers.DecimalField(max_digits=10, decimal_places=4, min_value=0.0001, required=False)
+    
+    class Meta:
+        model = LimitOrder
+        fields = [
+            'id', 'side', 'metal', 'metal_symbol', 'limit_price', 'amount_oz', 'product', 'quantity', 'vault',
+            'reserved_amount', 'premium_per_oz', 'portfolio_item', 'status', 'filled_price', 'transaction',
+            'created_at', 'closed_at'
+        ]
+        read_only_fields = [
+            'id', 'metal', 'reserved_amount', 'premium_per_oz', 'status', 'filled_price', 'transaction', 'created_at', 'closed_at'
+        ]
+    
+    def validate(self, attrs):
+        from .order_book import buy_reservation
+
+        if attrs['side'] == LimitOrder.Side.BUY:
+            for field in ('product', 'quantity', 'vault'):
+                if not attrs.get(field):
+                    raise serializers.ValidationError({field: 'Required for a buy order.'})
+            product = attrs['product']
+            attrs['metal'] = product.metal
+            attrs['amount_oz'] = product.weight_oz * attrs['quantity']
+            attrs['premium_per_oz'] = product.premium_per_oz
+            attrs['reserved_amount'] = buy_reservation(attrs['amount_oz'], attrs['limit_price'], product)
+            attrs.pop('portfolio_item', None)
+        else:
+            item = attrs.get('portfolio_item')
+            if item is None or item.user_id != self.context['request'].user.id:
+                raise serializers.ValidationError({'portfolio_item': 'Required for a sell order.'})
+            if item.status != PortfolioItem.Status.VAULTED:
+                raise serializers.ValidationError({'portfolio_item': 'Only vaulted holdings can be sold.'})
+            if not attrs.get('amount_oz'):
+                raise serializers.ValidationError({'amount_oz': 'Required for a sell order.'})
+            if attrs['amount_oz'] > item.weight_oz:
+                raise serializers.ValidationError({'amount_oz': 'Insufficient holdings'})
+            attrs['metal'] = item.metal
+            for field in ('product', 'quantity', 'vault'):
+                attrs.pop(field, None)
+
+        # A limit the price has already reached is a market order: use trade/buy or trade/sell
+        price = attrs['metal'].current_price
+        if attrs['side'] == LimitOrder.Side.BUY and attrs['limit_price'] >= price:
+            raise serializers.ValidationError({'limit_price': f'Must be below the current price ({price}).'})
+        if attrs['side'] == LimitOrder.Side.SELL and attrs['limit_price'] <= price:
+            raise serializers.ValidationError({'limit_price': f'Must be above the current price ({price}).'})
+        return attrs
+
+
+class RecurringPurchaseSerializer(serializers.ModelSerializer):
+    """Recurring purchase plan serializer; the schedule is fixed once created"""
+    
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.filter(is_active=True))
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    metal_symbol = serializers.CharField(source='product.metal.symbol', read_only=True)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=1)
+    start_on = serializers.DateField(required=False)
+    status = serializers.ChoiceField(
+        choices=[RecurringPurchase.Status.ACTIVE, RecurringPurchase.Status.PAUSED], required=False
+    )
+    
+    class Meta:
+        model = RecurringPurchase
+        fields = [
+            'id', 'product', 'product_name', 'metal_symbol', 'vault', 'amount', 'frequency', 'start_on',
+            'next_run_on', 'status', 'last_run_at', 'created_at'
+        ]
+        read_only_fields = ['id', 'next_run_on', 'last_run_at', 'created_at']
+    
+    def validate(self, attrs):
+        if self.instance is None:
+            if not attrs.get('vault'):
+                raise serializers.ValidationError({'vault': 'This field is required.'})
+            attrs.setdefault('start_on', timezone.localdate())
+            if attrs['start_on'] < timezone.localdate():
+                raise serializers.ValidationError({'start_on': 'Cannot be in the past.'})
+        else:
+            for field in ('product', 'frequency', 'start_on'):
+                if field in attrs and attrs[field] != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: 'Cannot be changed; cancel the plan and create another.'})
+            if 'vault' in attrs and not attrs['vault']:
+                raise serializers.ValidationError({'vault': 'This field may not be null.'})
+        return attrs
+
+
+class RecurringPurchaseExecutionSerializer(serializers.ModelSerializer):
+    """One run of a recurring purchase"""
+    
+    class Meta:
+        model = RecurringPurchaseExecution
+        fields = [
+            'id', 'scheduled_on', 'status', 'price_per_oz', 'quantity', 'amount_oz', 'total_cost',
+            'transaction', 'error', 'created_at'
+        ]
+        read_only_fields = fields
 
 
 class BuyMetalSerializer(serializers.Serializer):
@@ -129,6 +270,27 @@ class SellMetalSerializer(serializers.Serializer):
     amount_oz = serializers.DecimalField(max_digits=10, decimal_places=4, min_value=0.0001)
 
 
+class BuyQuoteLineSerializer(serializers.Serializer):
+    """One product of a buy quote"""
+    
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BuyQuoteSerializer(BuyMetalSerializer):
+    """Basket buy request serializer, for a quote or a checkout: products bought into one vault"""
+    
+    product_id = None
+    quantity = None
+    lines = BuyQuoteLineSerializer(many=True, allow_empty=False, max_length=settings.QUOTE_MAX_LINES)
+
+
+class SellQuoteSerializer(serializers.Serializer):
+    """Sell quote request serializer: several holdings sold together"""
+    
+    lines = SellMetalSerializer(many=True, allow_empty=False, max_length=settings.QUOTE_MAX_LINES)
+
+
 class ConvertMetalSerializer(serializers.Serializer):
     """Convert metal to cash request serializer"""
     
@@ -187,3 +349,17 @@ class DeliveryRequestSerializer(serializers.Serializer):
     items = DeliveryRequestItemSerializer(many=True)
     carrier = serializers.ChoiceField(choices=['fedex', 'brinks'])
     destination = serializers.JSONField()  # street, city, zip_code, country
+
+
+# Compiled read serializers for the list endpoints (see utils.compiled_serializers)
+class PortfolioItemReadSerializer(CompiledReadSerializer):
+    serializer_class = PortfolioItemSerializer
+
+
+class TransactionReadSerializer(CompiledReadSerializer):
+    serializer_class = TransactionSerializer
+
+
+class ShipmentReadSerializer(CompiledReadSerializer):
+    serializer_class = ShipmentSerializer
+    annotations = {'items_count': Count('items')}
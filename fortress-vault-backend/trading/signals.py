@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from utils.response_cache import invalidate_cache_scopes
+from .models import Metal, MetalPrice, Product
+
+
+@receiver([post_save, post_delete], sender=Metal)
+def invalidate_metal_responses(sender, instance, **kwargs):
+    """Metal prices feed the metal, metal-price and product endpoints"""
+    invalidate_cache_scopes('metals')
+
+
+@receiver(post_save, sender=Metal)
+def record_metal_price(sender, instance, update_fields=None, **kwargs):
+    """Price history for risk reports (admin_api.risk); saves that skip the price are not recorded"""
+    if update_fields is None or 'current_price' in update_fields:
+        MetalPrice.objects.create(metal=instance, price=instance.current_price)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_responses(sender, instance, **kwargs):
+    invalidate_cache_scopes('products')
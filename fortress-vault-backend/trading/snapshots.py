@@ -0,0 +1,283 @@
+"""
+Daily portfolio snapshots and time-weighted return
+
+Each day gets one PortfolioSnapshot row per user: the value of every metal
+held at that day's closing price (the last MetalPrice recorded that day,
+carried over days without one), cash, and the day's net external flow
+(deposits less withdrawals). Holdings are valued like the dashboard values
+them, every portfolio item at its metal's price.
+
+Users are processed in user-id chunks of PORTFOLIO_SNAPSHOT_CHUNK_SIZE,
+each with a fixed number of queries:
+
+- current ounces per metal (one GROUP BY over portfolio_items) and cash:
+  the wallet plus what open limit buy orders have reserved from it
+- the chunk's completed transactions since the first day, summed per user,
+  metal, type and day (one GROUP BY over transactions)
+
+Walking back from today, each day's transactions are undone on (users x
+metals) arrays, which gives every user's holdings and cash at the close of
+each earlier day. Snapshots are written per day with one bulk upsert, so
+the nightly run (yesterday only) and a backfill over a date range are the
+same code, and a rerun overwrites rather than duplicates.
+
+Users with nothing held, no cash and no flow that day get no row.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from users.models import Wallet
+from .models import LimitOrder, Metal, MetalPrice, PortfolioItem, PortfolioSnapshot, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Cash a completed transaction moved into (+1) or out of (-1) the wallet.
+# Withdrawals with a metal are delivery requests and move only their fees.
+_CASH_SIGN = {
+    Transaction.TransactionType.BUY: -1,
+    Transaction.TransactionType.SELL: 1,
+    Transaction.TransactionType.CONVERT: 1,
+    Transaction.TransactionType.DEPOSIT: 1,
+    Transaction.TransactionType.WITHDRAWAL: -1,
+    Transaction.TransactionType.STORAGE_FEE: -1,
+}
+_OZ_SIGN = {
+    Transaction.TransactionType.BUY: 1,
+    Transaction.TransactionType.SELL: -1,
+    Transaction.TransactionType.CONVERT: -1,
+}
+# Sells and conversions pay out net of fees
+_NET_OF_FEES = {Transaction.TransactionType.SELL, Transaction.TransactionType.CONVERT}
+_FLOW_TYPES = {Transaction.TransactionType.DEPOSIT, Transaction.TransactionType.WITHDRAWAL}
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _cents(value):
+    return Decimal(f'{value:.2f}')
+
+
+def daily_closes(metals, first_day, last_day):
+    """{day: price array over metals [(id, symbol, current price)]} for every day in the range."""
+    codes = {metal_id: code for code, (metal_id, _, _) in enumerate(metals)}
+    prices = np.array([float(price) for _, _, price in metals])
+    known = np.zeros(len(metals), dtype=bool)
+
+    # The last price before the range opens it
+    start = _start_of(first_day)
+    for metal_id in codes:
+        opening = (
+            MetalPrice.objects.filter(metal_id=metal_id, recorded_at__lt=start)
+            .order_by('-recorded_at').values_list('price', flat=True).first()
+        )
+        if opening is not None:
+            prices[codes[metal_id]] = float(opening)
+            known[codes[metal_id]] = True
+
+    by_day = defaultdict(dict)
+    rows = MetalPrice.objects.filter(
+        metal_id__in=codes, recorded_at__gte=start, recorded_at__lt=_start_of(last_day + timedelta(days=1))
+    ).order_by('recorded_at').values_list('metal_id', 'recorded_at', 'price')
+    for metal_id, recorded_at, price in rows.iterator(chunk_size=5000):
+        by_day[timezone.localdate(recorded_at)][codes[metal_id]] = float(price)
+
+    closes = {}
+    day = first_day
+    while day <= last_day:
+        for code, price in by_day.get(day, {}).items():
+            if not known[code]:
+                # No history before this: value earlier days at the first recorded price
+                for earlier in closes.values():
+                    earlier[code] = price
+                known[code] = True
+            prices[code] = price
+        closes[day] = prices.copy()
+        day += timedelta(days=1)
+    return closes
+
+
+def _snapshot_chunk(user_ids, metals, closes, first_day, last_day):
+    users = {user_id: code for code, user_id in enumerate(user_ids)}
+    metal_codes = {metal_id: code for code, (metal_id, _, _) in enumerate(metals)}
+    symbols = [symbol for _, symbol, _ in metals]
+    first_user, last_user = user_ids[0], user_ids[-1]
+
+    oz = np.zeros((len(user_ids), len(metals)))
+    cash = np.zeros(len(user_ids))
+    holdings = (
+        PortfolioItem.objects.filter(user_id__gte=first_user, user_id__lte=last_user)
+        .values('user_id', 'metal_id').annotate(oz=Sum('weight_oz')).order_by()
+        .values_list('user_id', 'metal_id', 'oz')
+    )
+    for user_id, metal_id, weight in holdings:
+        if user_id in users:
+            oz[users[user_id], metal_codes[metal_id]] = float(weight)
+    balances = Wallet.objects.filter(user_id__gte=first_user, user_id__lte=last_user).values_list(
+        'user_id', 'cash_balance'
+    )
+    for user_id, balance in balances:
+        if user_id in users:
+            cash[users[user_id]] += float(balance)
+    # Open limit buys hold their reservation out of the wallet; it is still the
+    # user's cash. Counted here, placing or cancelling an order moves nothing
+    # and a fill moves exactly its BUY transaction, so no order events need undoing.
+    reserved = (
+        LimitOrder.objects.filter(
+            user_id__gte=first_user, user_id__lte=last_user,
+            status=LimitOrder.Status.OPEN, side=LimitOrder.Side.BUY
+        )
+        .values('user_id').annotate(amount=Sum('reserved_amount')).order_by()
+        .values_list('user_id', 'amount')
+    )
+    for user_id, amount in reserved:
+        if user_id in users:
+            cash[users[user_id]] += float(amount or 0)
+
+    # Per-day changes: ounces, cash and external flow
+    changes = {}
+    rows = (
+        Transaction.objects.filter(
+            user_id__gte=first_user, user_id__lte=last_user,
+            status=Transaction.Status.COMPLETED, created_at__gte=_start_of(first_day)
+        )
+        .annotate(day=TruncDate('created_at'))
+        .values('user_id', 'metal_id', 'transaction_type', 'day')
+        .annotate(amount_oz=Sum('amount_oz'), value=Sum('total_value'), fees=Sum('fees'))
+        .order_by()
+        .values_list('user_id', 'metal_id', 'transaction_type', 'day', 'amount_oz', 'value', 'fees')
+    )
+    for user_id, metal_id, kind, day, amount_oz, value, fees in rows:
+        if user_id not in users:
+            continue
+        if day not in changes:
+            changes[day] = (np.zeros_like(oz), np.zeros_like(cash), np.zeros_like(cash))
+        day_oz, day_cash, day_flow = changes[day]
+        user = users[user_id]
+        sign = _CASH_SIGN.get(kind, 0)
+        if kind == Transaction.TransactionType.WITHDRAWAL and metal_id is not None:
+            # A delivery request: its total_value includes the shipped metal,
+            # which stays in holdings (in transit); the wallet paid only the fees
+            day_cash[user] -= float(fees or 0)
+            continue
+        moved = float(value or 0) - (float(fees or 0) if kind in _NET_OF_FEES else 0)
+        day_cash[user] += sign * moved
+        if kind in _FLOW_TYPES:
+            day_flow[user] += sign * moved
+        if kind in _OZ_SIGN and metal_id in metal_codes and amount_oz is not None:
+            day_oz[user, metal_codes[metal_id]] += _OZ_SIGN[kind] * float(amount_oz)
+
+    written = 0
+    no_flow = np.zeros_like(cash)
+    day = timezone.localdate()
+    while day >= first_day:
+        if day <= last_day:
+            values = oz * closes[day]
+            totals = values.sum(axis=1) + cash
+            flow = changes[day][2] if day in changes else no_flow
+            active = np.flatnonzero(values.any(axis=1) | (cash != 0) | (flow != 0))
+            snapshots = [
+                PortfolioSnapshot(
+                    user_id=user_ids[user],
+                    date=day,
+                    metals={symbol: round(float(value), 2) for symbol, value in zip(symbols, values[user]) if value},
+                    cash=_cents(cash[user]),
+                    total_value=_cents(totals[user]),
+                    net_flow=_cents(flow[user]),
+                )
+                for user in active
+            ]
+            PortfolioSnapshot.objects.bulk_create(
+                snapshots,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=['metals', 'cash', 'total_value', 'net_flow'],
+            )
+            written += len(snapshots)
+        if day in changes:
+            # Undo the day to get the previous close
+            day_oz, day_cash, _ = changes[day]
+            oz -= day_oz
+            cash -= day_cash
+        day -= timedelta(days=1)
+    return written
+
+
+def snapshot_portfolios(first_day=None, last_day=None, chunk_size=None):
+    """Write (or rewrite) snapshots for every day in the range; defaults to yesterday. Returns rows written."""
+    yesterday = timezone.localdate() - timedelta(days=1)
+    first_day = first_day or yesterday
+    last_day = min(last_day or first_day, timezone.localdate())
+    chunk_size = chunk_size or getattr(settings, 'PORTFOLIO_SNAPSHOT_CHUNK_SIZE', 2000)
+    if first_day > last_day:
+        return 0
+
+    metals = list(Metal.objects.order_by('symbol').values_list('id', 'symbol', 'current_price'))
+    closes = daily_closes(metals, first_day, last_day)
+
+    written = 0
+    cursor = None
+    while True:
+        wallets = Wallet.objects.order_by('user_id')
+        if cursor is not None:
+            wallets = wallets.filter(user_id__gt=cursor)
+        user_ids = list(wallets.values_list('user_id', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        written += _snapshot_chunk(user_ids, metals, closes, first_day, last_day)
+        cursor = user_ids[-1]
+
+    logger.info(f"Portfolio snapshots {first_day} to {last_day}: {written} rows")
+    return written
+
+
+def time_weighted_return(totals, flows):
+    """
+    Daily and cumulative time-weighted returns for consecutive snapshot
+    values, net of each day's external flow. A day that opens from nothing
+    has no return.
+    """
+    totals = np.asarray(totals, dtype=np.float64)
+    flows = np.asarray(flows, dtype=np.float64)
+    if len(totals) < 2:
+        return np.zeros(len(totals)), np.zeros(len(totals))
+    opening = totals[:-1]
+    growth = np.divide(totals[1:] - flows[1:], opening, out=np.ones(len(opening)), where=opening > 0)
+    return np.concatenate([[0.0], growth - 1]), np.concatenate([[0.0], np.cumprod(growth) - 1])
+
+
+def portfolio_history(user, date_from, date_to):
+    """A user's snapshots in the range (one indexed range read) with cumulative time-weighted return."""
+    rows = list(
+        PortfolioSnapshot.objects.filter(user=user, date__gte=date_from, date__lte=date_to)
+        .order_by('date')
+        .values_list('date', 'total_value', 'cash', 'net_flow', 'metals')
+    )
+    _, cumulative = time_weighted_return([row[1] for row in rows], [row[3] for row in rows])
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'snapshots': [
+            {
+                'date': day,
+                'total_value': total_value,
+                'cash': cash,
+                'net_flow': net_flow,
+                'metals': metals,
+                'cumulative_return': round(float(growth), 6),
+            }
+            for (day, total_value, cash, net_flow, metals), growth in zip(rows, cumulative)
+        ],
+        'time_weighted_return': round(float(cumulative[-1]), 6) if rows else None,
+    }
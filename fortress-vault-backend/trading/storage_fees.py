@@ -0,0 +1,196 @@
+"""
+Monthly storage-fee accrual
+
+Vault.storage_fee_percent is an annual rate (0.0008 = 0.08% a year). Each
+billing period charges every user with vaulted holdings one twelfth of that
+rate on the holdings' value. Holdings are valued at the metal prices
+snapshotted when the period's run starts.
+
+A run processes users in user-id order, in chunks of STORAGE_FEE_CHUNK_SIZE.
+Each chunk is one database transaction with a fixed number of statements:
+
+- one GROUP BY query that values the chunk's vaulted holdings and sums
+  their fees
+- bulk_create of the STORAGE_FEE transactions and StorageFeeCharge rows
+- one UPDATE wallets ... FROM storage_fee_charges that debits every wallet
+  in the chunk, and one batched portfolio push of the charged users once
+  the chunk commits
+
+The same transaction advances the run's cursor. A crash leaves the period
+resumable from the last committed chunk: calling accrue_storage_fees() for
+it again carries on with the same price snapshot, and a completed period is
+never charged twice. StorageFeeCharge is unique per (run, user) as a
+backstop, and the run row is locked per chunk, so concurrent workers queue
+up rather than double-charge.
+
+Holdings without a vault are not charged; neither are users without a
+wallet. Balances may go negative: the fee is owed either way.
+"""
+
+import logging
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, Value, When
+from django.utils import timezone
+
+from users.models import Wallet
+from .models import Metal, PortfolioItem, StorageFeeCharge, StorageFeeRun, Transaction
+from .portfolio_push import request_portfolio_pushes
+
+logger = logging.getLogger(__name__)
+
+BILLING_PERIODS_PER_YEAR = 12
+CENT = Decimal('0.01')
+
+_VALUE_FIELD = DecimalField(max_digits=24, decimal_places=8)
+
+
+def billing_period(day):
+    """The period (first day of the month) that a date falls in."""
+    return date(day.year, day.month, 1)
+
+
+def previous_period(today=None):
+    """The last complete billing period before today."""
+    today = today or timezone.localdate()
+    first = billing_period(today)
+    return date(first.year - 1, 12, 1) if first.month == 1 else date(first.year, first.month - 1, 1)
+
+
+def snapshot_prices():
+    return {str(metal_id): str(price) for metal_id, price in Metal.objects.values_list('id', 'current_price')}
+
+
+def start_run(period):
+    """The run for a period, creating it with a fresh price snapshot if needed."""
+    run = StorageFeeRun.objects.filter(period=period).first()
+    if run is not None:
+        return run
+    try:
+        with db_transaction.atomic():
+            return StorageFeeRun.objects.create(period=period, prices=snapshot_prices())
+    except IntegrityError:
+        # Another worker started the same period first
+        return StorageFeeRun.objects.get(period=period)
+
+
+def _price_expression(prices):
+    whens = [When(metal_id=metal_id, then=Value(Decimal(price))) for metal_id, price in prices.items()]
+    if not whens:
+        return F('metal__current_price')
+    # Metals added after the snapshot are valued at their current price
+    return Case(*whens, default=F('metal__current_price'), output_field=_VALUE_FIELD)
+
+
+def chargeable_holdings():
+    return PortfolioItem.objects.filter(
+        status=PortfolioItem.Status.VAULTED,
+        vault_location__isnull=False,
+        user__wallet__isnull=False,
+    )
+
+
+def value_holdings(run, first_user_id, last_user_id):
+    """[(user_id, holdings value, annual fee)] for users in the id range, in one query."""
+    value = ExpressionWrapper(F('weight_oz') * _price_expression(run.prices), output_field=_VALUE_FIELD)
+    annual_fee = ExpressionWrapper(value * F('vault_location__storage_fee_percent'), output_field=_VALUE_FIELD)
+    return list(
+        chargeable_holdings()
+        .filter(user_id__gte=first_user_id, user_id__lte=last_user_id)
+        .order_by('user_id')
+        .values('user_id')
+        .annotate(value=Sum(value), annual_fee=Sum(annual_fee))
+        .values_list('user_id', 'value', 'annual_fee')
+    )
+
+
+def _debit_wallets(run, first_user_id, last_user_id):
+    """Debit the chunk's charges from their wallets in one statement."""
+    wallets = connection.ops.quote_name(Wallet._meta.db_table)
+    charges = connection.ops.quote_name(StorageFeeCharge._meta.db_table)
+    run_pk = StorageFeeCharge._meta.get_field('run').target_field
+    user_pk = StorageFeeCharge._meta.get_field('user').target_field
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {wallets} SET cash_balance = {wallets}.cash_balance - c.amount, last_updated = %s '
+            f'FROM {charges} c '
+            f'WHERE c.user_id = {wallets}.user_id AND c.run_id = %s AND c.user_id >= %s AND c.user_id <= %s',
+            [
+                timezone.now(),
+                run_pk.get_db_prep_value(run.pk, connection),
+                user_pk.get_db_prep_value(first_user_id, connection),
+                user_pk.get_db_prep_value(last_user_id, connection),
+            ]
+        )
+        return cursor.rowcount
+
+
+def accrue_chunk(run_id, chunk_size):
+    """Charge the next chunk of users; returns False once the run has completed."""
+    with db_transaction.atomic():
+        run = StorageFeeRun.objects.select_for_update().get(pk=run_id)
+        if run.status == StorageFeeRun.Status.COMPLETED:
+            return False
+
+        holdings = chargeable_holdings()
+        if run.cursor is not None:
+            holdings = holdings.filter(user_id__gt=run.cursor)
+        user_ids = list(holdings.order_by('user_id').values_list('user_id', flat=True).distinct()[:chunk_size])
+        if not user_ids:
+            run.status = StorageFeeRun.Status.COMPLETED
+            run.completed_at = timezone.now()
+            run.save(update_fields=['status', 'completed_at'])
+            return False
+
+        transactions = []
+        charges = []
+        for user_id, value, annual_fee in value_holdings(run, user_ids[0], user_ids[-1]):
+            amount = (annual_fee / BILLING_PERIODS_PER_YEAR).quantize(CENT, rounding=ROUND_HALF_UP)
+            if amount <= 0:
+                continue
+            fee_transaction = Transaction(
+                user_id=user_id,
+                transaction_type=Transaction.TransactionType.STORAGE_FEE,
+                total_value=amount,
+                fees=Decimal('0.00'),
+                status=Transaction.Status.COMPLETED,
+            )
+            transactions.append(fee_transaction)
+            charges.append(StorageFeeCharge(
+                run=run,
+                user_id=user_id,
+                transaction=fee_transaction,
+                holdings_value=value.quantize(CENT, rounding=ROUND_HALF_UP),
+                amount=amount,
+            ))
+
+        Transaction.objects.bulk_create(transactions, batch_size=1000)
+        StorageFeeCharge.objects.bulk_create(charges, batch_size=1000)
+        _debit_wallets(run, user_ids[0], user_ids[-1])
+        # The raw UPDATE bypasses the views that push dashboards; queue the chunk's users at once
+        request_portfolio_pushes(charge.user_id for charge in charges)
+
+        run.cursor = user_ids[-1]
+        run.users_charged += len(charges)
+        run.total_fees += sum((charge.amount for charge in charges), Decimal('0.00'))
+        run.save(update_fields=['cursor', 'users_charged', 'total_fees'])
+        return True
+
+
+def accrue_storage_fees(period=None, chunk_size=None):
+    """Accrue (or resume accruing) storage fees for a billing period; returns the run."""
+    period = billing_period(period) if period else previous_period()
+    chunk_size = chunk_size or getattr(settings, 'STORAGE_FEE_CHUNK_SIZE', 5000)
+    run = start_run(period)
+    chunks = 0
+    while accrue_chunk(run.pk, chunk_size):
+        chunks += 1
+    run.refresh_from_db()
+    logger.info(
+        f"Storage fees {period:%Y-%m}: {run.users_charged} users charged {run.total_fees} "
+        f"({chunks} chunks this call)"
+    )
+    return run
@@ -11,7 +11,10 @@ import requests
 
 from django.core.cache import cache
 
+from utils.response_cache import bump_cache_versions
 from .models import Metal, PortfolioItem
+from . import order_book, portfolio_push, price_alerts, recurring, snapshots, storage_fees
+from .portfolio_push import request_online_portfolio_push
 
 logger = logging.getLogger(__name__)
 
@@ -27,15 +30,21 @@ def update_metal_prices():
         fx_rate_usd_to_gbp = _fetch_usd_to_gbp_rate()
         if fx_rate_usd_to_gbp is not None:
             cache.set('fx:usd_to_gbp', str(fx_rate_usd_to_gbp), timeout=60 * 60 * 6)
+            # GBP prices on the public metal-prices endpoint depend on the rate
+            bump_cache_versions('metals')
 
         if getattr(settings, 'METAL_PRICE_API_KEY', '') or getattr(settings, 'FX_API_KEY', ''):
-            updated = _update_metal_prices_from_api()
-            if updated:
+            moves = _update_metal_prices_from_api()
+            if moves:
                 from .consumers import broadcast_price_update
                 broadcast_price_update()
-                return f"Updated {updated} metal prices"
+                request_online_portfolio_push()
+                request_price_alert_match(moves)
+                request_limit_order_execution(moves)
+                return f"Updated {len(moves)} metal prices"
 
         metals = Metal.objects.all()
+        moves = []
         
         for metal in metals:
             # Simulate price change (-2% to +2%)
@@ -45,6 +54,7 @@ def update_metal_prices():
             # Calculate 24h change
             price_change_24h = ((new_price - metal.current_price) / metal.current_price) * 100
             
+            moves.append((metal.id, metal.current_price, new_price.quantize(Decimal('0.01'))))
             metal.current_price = new_price
             metal.price_change_24h = price_change_24h
             metal.save()
@@ -54,6 +64,9 @@ def update_metal_prices():
         # Broadcast price updates via WebSocket
         from .consumers import broadcast_price_update
         broadcast_price_update()
+        request_online_portfolio_push()
+        request_price_alert_match(moves)
+        request_limit_order_execution(moves)
         
         return f"Updated {metals.count()} metal prices"
     except Exception as e:
@@ -112,7 +125,7 @@ def _update_metal_prices_from_api():
         'Pd': 'XPD',
     }
 
-    updated = 0
+    moves = []
     for metal in Metal.objects.all():
         api_symbol = trading_symbol_map.get(metal.symbol)
         if not api_symbol:
@@ -132,10 +145,10 @@ def _update_metal_prices_from_api():
         metal.current_price = new_price
         metal.price_change_24h = price_change_24h
         metal.save(update_fields=['current_price', 'price_change_24h', 'last_updated'])
-        updated += 1
+        moves.append((metal.id, old_price, new_price.quantize(Decimal('0.01'))))
         logger.info(f"Updated {metal.symbol} price to ${new_price}")
 
-    return updated
+    return moves
 
 
 def _fetch_metal_prices_from_metals_api():
@@ -227,6 +240,42 @@ def _fetch_metal_prices_from_exchangerate_host():
     return symbol_to_price_usd_per_oz
 
 
+def request_price_alert_match(moves):
+    """Queue alert matching for a tick's [(metal id, old price, new price)]"""
+    moves = [[str(metal_id), str(old_price), str(new_price)] for metal_id, old_price, new_price in moves]
+    if moves:
+        match_price_alerts.delay(moves)
+
+
+@shared_task
+def match_price_alerts(moves):
+    """Trigger the price alerts crossed by a price tick"""
+    try:
+        triggered = price_alerts.match_price_moves(moves)
+        return f"Triggered {triggered} price alerts"
+    except Exception as e:
+        logger.error(f"Error matching price alerts: {e}")
+        raise
+
+
+def request_limit_order_execution(moves):
+    """Queue limit order execution for a tick's [(metal id, old price, new price)]"""
+    moves = [[str(metal_id), str(old_price), str(new_price)] for metal_id, old_price, new_price in moves]
+    if moves:
+        execute_limit_orders.delay(moves)
+
+
+@shared_task
+def execute_limit_orders(moves):
+    """Fill the resting limit orders a price tick made marketable"""
+    try:
+        filled = order_book.execute_price_moves(moves)
+        return f"Filled {filled} limit orders"
+    except Exception as e:
+        logger.error(f"Error executing limit orders: {e}")
+        raise
+
+
 @shared_task
 def calculate_portfolio_values():
     """Recalculate portfolio values based on current prices"""
@@ -243,6 +292,61 @@ def calculate_portfolio_values():
         raise
 
 
+@shared_task
+def accrue_storage_fees():
+    """Charge last month's storage fees (resumes an interrupted run)"""
+    try:
+        run = storage_fees.accrue_storage_fees()
+        return f"Storage fees {run.period:%Y-%m}: {run.users_charged} users, {run.total_fees} total"
+    except Exception as e:
+        logger.error(f"Error accruing storage fees: {e}")
+        raise
+
+
+@shared_task
+def snapshot_portfolios():
+    """Record yesterday's closing portfolio value for every user"""
+    try:
+        written = snapshots.snapshot_portfolios()
+        return f"Wrote {written} portfolio snapshots"
+    except Exception as e:
+        logger.error(f"Error writing portfolio snapshots: {e}")
+        raise
+
+
+@shared_task
+def execute_recurring_purchases():
+    """Run every recurring purchase due today in batches"""
+    try:
+        results = recurring.execute_due_plans()
+        return f"Recurring purchases: {results}"
+    except Exception as e:
+        logger.error(f"Error executing recurring purchases: {e}")
+        raise
+
+
+@shared_task
+def push_portfolio_updates(user_ids):
+    """Send coalesced portfolio summaries to the users' PortfolioConsumer groups"""
+    try:
+        sent = portfolio_push.push_portfolio_updates(user_ids)
+        return f"Pushed portfolio updates to {sent} users"
+    except Exception as e:
+        logger.error(f"Error pushing portfolio updates: {e}")
+        raise
+
+
+@shared_task
+def push_online_portfolios():
+    """Revalue portfolios for users with an open portfolio socket after a price tick"""
+    try:
+        sent = portfolio_push.push_online_portfolios()
+        return f"Pushed portfolio revaluations to {sent} online users"
+    except Exception as e:
+        logger.error(f"Error pushing online portfolio revaluations: {e}")
+        raise
+
+
 @shared_task
 def send_transaction_notification(user_id, transaction_id):
     """Send transaction notification email"""
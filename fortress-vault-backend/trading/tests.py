@@ -1,11 +1,50 @@
+import asyncio
 from decimal import Decimal
+from unittest.mock import AsyncMock, Mock, patch
 
-from django.test import TestCase
-from rest_framework import status
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers, status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
 from users.models import User
-from .models import Metal, Shipment, Transaction
+from vaults.models import Vault
+from .models import (
+    LimitOrder, Lot, Metal, MetalPrice, Product, PortfolioItem, PortfolioSnapshot, Position, PriceAlert,
+    RecurringPurchase, RecurringPurchaseExecution, Shipment, StorageFeeRun, Transaction
+)
+from users.consumers import NotificationConsumer
+from users.models import Wallet
+from admin_api.models import PlatformSettings
+from admin_api.platform_settings import VERSION_KEY, clear_local_settings
+from rest_framework.renderers import JSONRenderer
+from utils import fastjson
+from utils import metrics
+from utils.compiled_serializers import CompiledReadSerializer, reads
+from utils.testing import QueryBudgetMixin
+from utils.websocket import PING_TIMEOUT_CLOSE_CODE, SEND_OVERFLOW_CLOSE_CODE, get_websocket_metrics
+from . import lots, order_book, portfolio_push, price_alerts, quotes, recurring, snapshots, storage_fees
+from .consumers import PriceConsumer, DeliveryConsumer, PortfolioConsumer
+from .serializers import (
+    PortfolioItemSerializer, TransactionSerializer, ShipmentSerializer,
+    PortfolioItemReadSerializer, TransactionReadSerializer, ShipmentReadSerializer
+)
+from .price_stream import RETRY_FRAME, PriceStreamHub, encode_price_frame
+
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
 
 
 class ShipmentWorkflowViewSetTests(TestCase):
@@ -109,3 +148,2057 @@ class TransactionActivityFeedTests(TestCase):
         self.assertIn(Transaction.TransactionType.WITHDRAWAL, txn_types)
         self.assertIn(Transaction.TransactionType.STORAGE_FEE, txn_types)
         self.assertNotIn(Transaction.TransactionType.DEPOSIT, txn_types)
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class PortfolioPushTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='push@test.com',
+            username='push_user',
+            password='testpass123'
+        )
+        self.offline_user = User.objects.create_user(
+            email='offline@test.com',
+            username='offline_user',
+            password='testpass123'
+        )
+        self.metal = Metal.objects.create(
+            name='Gold',
+            symbol='XAU',
+            current_price=Decimal('2000.00'),
+            price_change_24h=Decimal('0.00')
+        )
+        self.product = Product.objects.create(
+            metal=self.metal,
+            name='1oz Gold Bar',
+            manufacturer='PAMP',
+            purity='.9999',
+            weight_oz=Decimal('1.0000'),
+            premium_per_oz=Decimal('50.00'),
+            product_type=Product.ProductType.BAR
+        )
+        self.vault = Vault.objects.create(
+            name='Zurich Vault',
+            city='Zurich',
+            country='Switzerland',
+            storage_fee_percent=Decimal('0.0008')
+        )
+        for user in [self.user, self.offline_user]:
+            PortfolioItem.objects.create(
+                user=user,
+                metal=self.metal,
+                product=self.product,
+                weight_oz=Decimal('2.0000'),
+                vault_location=self.vault,
+                purchase_price=Decimal('1900.00')
+            )
+
+    def tearDown(self):
+        portfolio_push._local_presence.clear()
+
+    def test_deposits_within_window_schedule_a_single_push(self):
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+
+        with patch('trading.tasks.push_portfolio_updates.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/trading/trade/deposit/', {'amount': '100.00'})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/trading/trade/deposit/', {'amount': '50.00'})
+
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['args'], [[str(self.user.id)]])
+
+    def test_push_sends_dashboard_summary_to_user_group(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(portfolio_push.portfolio_group_name(self.user.id), channel_name)
+
+        portfolio_push.push_portfolio_updates([self.user.id])
+
+        message = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(message['type'], 'portfolio_update')
+        self.assertEqual(message['data']['total_value'], 4000.0)
+        self.assertEqual(len(message['data']['portfolio_items']), 1)
+        self.assertEqual(message['data']['holdings'][0]['total_oz'], 2.0)
+
+    def test_push_payload_matches_dashboard_endpoint(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/trading/portfolio/dashboard/')
+
+        payloads = portfolio_push.build_dashboard_payloads([self.user.id])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(payloads[str(self.user.id)], response.data)
+
+    def test_price_tick_only_revalues_users_with_open_socket(self):
+        portfolio_push.mark_portfolio_online(self.user.id, 'socket-1')
+        portfolio_push.mark_portfolio_online(self.user.id, 'socket-2')
+
+        with patch('trading.portfolio_push._send_portfolio_updates') as send:
+            sent = portfolio_push.push_online_portfolios()
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(set(send.call_args.args[0]), {str(self.user.id)})
+
+        portfolio_push.mark_portfolio_offline(self.user.id, 'socket-1')
+        self.assertEqual(portfolio_push.online_portfolio_user_ids(), [str(self.user.id)])
+        portfolio_push.mark_portfolio_offline(self.user.id, 'socket-2')
+        self.assertEqual(portfolio_push.online_portfolio_user_ids(), [])
+
+    @override_settings(PORTFOLIO_PRESENCE_TTL_SECONDS=90)
+    def test_presence_not_refreshed_by_heartbeat_expires(self):
+        # A socket whose disconnect never ran (worker crash) stops being revalued
+        with patch('trading.portfolio_push.time.time', return_value=1000.0):
+            portfolio_push.mark_portfolio_online(self.user.id, 'lost')
+        with patch('trading.portfolio_push.time.time', return_value=1060.0):
+            self.assertEqual(portfolio_push.online_portfolio_user_ids(), [str(self.user.id)])
+        with patch('trading.portfolio_push.time.time', return_value=1100.0):
+            self.assertEqual(portfolio_push.online_portfolio_user_ids(), [])
+        self.assertEqual(portfolio_push._local_presence, {})
+
+    def test_presence_uses_redis_sorted_set(self):
+        client = Mock()
+        client.pipeline.return_value.execute.return_value = [
+            1, [f'{self.user.id}|a'.encode(), f'{self.user.id}|b'.encode()]
+        ]
+        with patch('trading.portfolio_push.get_redis_client', return_value=client):
+            portfolio_push.mark_portfolio_online(self.user.id, 'a')
+            self.assertEqual(portfolio_push.online_portfolio_user_ids(), [str(self.user.id)])
+            portfolio_push.mark_portfolio_offline(self.user.id, 'a')
+
+        key, mapping = client.zadd.call_args.args
+        self.assertEqual((key, list(mapping)), (portfolio_push.PRESENCE_KEY, [f'{self.user.id}|a']))
+        client.pipeline.return_value.zremrangebyscore.assert_called_once()
+        client.zrem.assert_called_once_with(portfolio_push.PRESENCE_KEY, f'{self.user.id}|a')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ConsumerBackpressureTests(TestCase):
+    def test_price_updates_are_last_value_wins(self):
+        consumer = PriceConsumer()
+
+        consumer._enqueue('{"type": "price_update", "v": 1}', topic='price_update')
+        consumer._enqueue('{"type": "price_update", "v": 2}', topic='price_update')
+
+        self.assertEqual(len(consumer._send_queue), 1)
+        self.assertEqual(consumer._dequeue(), '{"type": "price_update", "v": 2}')
+
+    @override_settings(WEBSOCKET_SEND_QUEUE_SIZE=2)
+    def test_full_queue_drops_only_coalesced_messages(self):
+        consumer = PriceConsumer()
+        dropped_before = get_websocket_metrics().get('PriceConsumer', {}).get('dropped', 0)
+
+        consumer._enqueue('{"type": "price_update"}', topic='price_update')
+        consumer._enqueue('connection_established')
+        consumer._enqueue('error')
+        consumer._enqueue('{"type": "price_update", "v": 2}', topic='price_update')
+
+        self.assertFalse(consumer._overflowed)
+        self.assertEqual([consumer._dequeue() for _ in range(2)], ['connection_established', 'error'])
+        self.assertEqual(get_websocket_metrics()['PriceConsumer']['dropped'], dropped_before + 2)
+
+    @override_settings(WEBSOCKET_SEND_QUEUE_SIZE=2)
+    def test_full_queue_of_notifications_closes_for_reconnect(self):
+        consumer = NotificationConsumer()
+        consumer.close = AsyncMock()
+        overflows_before = get_websocket_metrics().get('NotificationConsumer', {}).get('overflow_closes', 0)
+
+        for i in range(3):
+            consumer._enqueue(f'notification-{i}', topic='notification')
+        consumer._enqueue('notification-3', topic='notification')
+        async_to_sync(consumer._writer)()
+
+        consumer.close.assert_awaited_once_with(code=SEND_OVERFLOW_CLOSE_CODE)
+        self.assertEqual(len(consumer._send_queue), 0)
+        self.assertEqual(get_websocket_metrics()['NotificationConsumer']['overflow_closes'], overflows_before + 1)
+        self.assertNotIn('dropped', get_websocket_metrics()['NotificationConsumer'])
+
+    def test_group_messages_are_delivered_through_queue(self):
+        user = SimpleNamespace(id='user-1', is_authenticated=True)
+
+        async def run():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await get_channel_layer().group_send('notifications_user-1', {
+                'type': 'notification',
+                'data': {'title': 'Shipment dispatched'}
+            })
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(run)()
+        self.assertEqual(message, {'type': 'notification', 'data': {'title': 'Shipment dispatched'}})
+
+    @override_settings(WEBSOCKET_HEARTBEAT_INTERVAL=0.05, WEBSOCKET_PING_TIMEOUT=0.12)
+    def test_silent_client_is_pinged_then_closed(self):
+        user = SimpleNamespace(id='user-2', is_authenticated=True)
+
+        async def run():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+
+            ping = await communicator.receive_json_from(timeout=1)
+            closed = await communicator.receive_output(timeout=1)
+            while closed['type'] != 'websocket.close':
+                closed = await communicator.receive_output(timeout=1)
+            return ping, closed
+
+        ping, closed = async_to_sync(run)()
+        self.assertEqual(ping, {'type': 'ping'})
+        self.assertEqual(closed['code'], PING_TIMEOUT_CLOSE_CODE)
+
+
+    @override_settings(WEBSOCKET_HEARTBEAT_INTERVAL=0.05, WEBSOCKET_PING_TIMEOUT=0)
+    def test_portfolio_presence_errors_do_not_break_the_socket(self):
+        user = SimpleNamespace(id='user-3', is_authenticated=True)
+        marks = []
+
+        def flaky_mark(user_id, connection_id):
+            marks.append(connection_id)
+            if len(marks) == 1:
+                raise ConnectionError('redis down')
+
+        async def run():
+            communicator = WebsocketCommunicator(PortfolioConsumer.as_asgi(), '/ws/portfolio/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            message = await communicator.receive_json_from(timeout=1)
+            while len(marks) < 2:
+                await asyncio.sleep(0.01)
+            await communicator.disconnect()
+            return connected, message
+
+        with patch('trading.consumers.mark_portfolio_online', side_effect=flaky_mark), \
+                patch('trading.consumers.mark_portfolio_offline', side_effect=ConnectionError('redis down')) as offline, \
+                patch.object(PortfolioConsumer, 'get_current_portfolio', AsyncMock(return_value={'total_value': 1.0})):
+            connected, message = async_to_sync(run)()
+
+        self.assertTrue(connected)
+        self.assertEqual(message, {'type': 'portfolio_update', 'data': {'total_value': 1.0}})
+        # The heartbeat re-registered the socket after the failed connect-time write
+        self.assertEqual(len(set(marks)), 1)
+        offline.assert_called_once_with('user-3', marks[0])
+
+
+SNAPSHOT_PRICES = [{'symbol': 'XAU', 'current_price': '2000.00'}]
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+@patch('trading.price_stream._load_current_prices', new_callable=AsyncMock, return_value=SNAPSHOT_PRICES)
+class PriceStreamTests(TestCase):
+    def test_listeners_share_one_subscription_and_encoded_frames(self, load_prices):
+        async def run():
+            hub = PriceStreamHub()
+            listeners = [await hub.subscribe() for _ in range(50)]
+            snapshots = [await listener.next_frame(1) for listener in listeners]
+
+            channel_layer = get_channel_layer()
+            while not channel_layer.groups.get('metal_prices'):
+                await asyncio.sleep(0.01)
+            subscriptions = len(channel_layer.groups['metal_prices'])
+
+            await channel_layer.group_send('metal_prices', {
+                'type': 'price_update',
+                'prices': [{'symbol': 'XAU', 'current_price': '2010.00'}]
+            })
+            updates = [await listener.next_frame(1) for listener in listeners]
+
+            for listener in listeners:
+                hub.unsubscribe(listener)
+            return hub, subscriptions, snapshots, updates
+
+        hub, subscriptions, snapshots, updates = async_to_sync(run)()
+
+        self.assertEqual(load_prices.await_count, 1)
+        self.assertEqual(subscriptions, 1)
+        self.assertEqual(set(snapshots), {encode_price_frame(SNAPSHOT_PRICES)})
+        self.assertIn(b'2010.00', updates[0])
+        self.assertTrue(all(frame is updates[0] for frame in updates))
+        self.assertIsNone(hub._upstream)
+
+    def test_slow_listener_only_gets_latest_frame(self, load_prices):
+        async def run():
+            hub = PriceStreamHub()
+            listener = await hub.subscribe()
+            hub.publish(b'first')
+            hub.publish(b'second')
+            frame = await listener.next_frame(1)
+            idle = await listener.next_frame(0.01)
+            hub.unsubscribe(listener)
+            return frame, idle
+
+        self.assertEqual(async_to_sync(run)(), (b'second', None))
+
+    def test_stream_endpoint_sends_snapshot(self, load_prices):
+        async def run():
+            response = await AsyncClient().get('/api/trading/metal-prices/stream/')
+            frames = response.streaming_content.__aiter__()
+            first = await frames.__anext__()
+            second = await frames.__anext__()
+            await frames.aclose()
+            return response, first, second
+
+        response, first, second = async_to_sync(run)()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(first, RETRY_FRAME)
+        self.assertEqual(second, encode_price_frame(SNAPSHOT_PRICES))
+
+    def test_stream_endpoint_refuses_wsgi(self, load_prices):
+        # gunicorn (config.wsgi) would buffer the endless stream and hold the worker
+        response = self.client.get('/api/trading/metal-prices/stream/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+        load_prices.assert_not_awaited()
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PlatformSettingsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_settings()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            email='trader@test.com',
+            username='trader',
+            password='testpass123',
+            kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('10000.00'))
+        self.metal = Metal.objects.create(
+            name='Gold',
+            symbol='XAU',
+            current_price=Decimal('2000.00'),
+            price_change_24h=Decimal('0.00')
+        )
+        self.product = Product.objects.create(
+            metal=self.metal,
+            name='1oz Gold Bar',
+            manufacturer='PAMP',
+            purity='.9999',
+            weight_oz=Decimal('1.0000'),
+            premium_per_oz=Decimal('50.00'),
+            product_type=Product.ProductType.BAR
+        )
+
+    def tearDown(self):
+        clear_local_settings()
+
+    def _buy(self):
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        return self.client.post('/api/trading/trade/buy/', {
+            'product_id': str(self.product.id),
+            'quantity': 1,
+            'delivery_method': 'delivery'
+        })
+
+    def test_cached_reads_skip_the_database(self):
+        PlatformSettings.get_solo()
+
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                PlatformSettings.get_solo()
+
+    @override_settings(PLATFORM_SETTINGS_CHECK_SECONDS=0)
+    def test_version_bump_from_another_process_is_picked_up(self):
+        self.assertTrue(PlatformSettings.get_solo().metals_buying_enabled)
+
+        # Simulate another worker saving the row and publishing a new version
+        PlatformSettings.objects.update(metals_buying_enabled=False)
+        self.assertTrue(PlatformSettings.get_solo().metals_buying_enabled)
+
+        cache.set(VERSION_KEY, 'published-by-other-worker')
+        self.assertFalse(PlatformSettings.get_solo().metals_buying_enabled)
+
+    def test_admin_update_halts_trading_in_metal(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            '/api/admin/platform/settings/', {'halted_metals': ['xau']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['halted_metals'], ['XAU'])
+
+        response = self._buy()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('halted', response.data['error'])
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.post('/api/admin/platform/settings/', {'halted_metals': []}, format='json')
+
+        self.assertEqual(self._buy().status_code, status.HTTP_201_CREATED)
+
+    def test_admin_update_rejects_unknown_metal_and_merges_flags(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.post(
+            '/api/admin/platform/settings/', {'halted_metals': ['XYZ']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.post('/api/admin/platform/settings/', {'flags': {'a': True, 'b': 1}}, format='json')
+        response = self.client.post('/api/admin/platform/settings/', {'flags': {'a': None}}, format='json')
+        self.assertEqual(response.data['flags'], {'b': 1})
+        self.assertEqual(PlatformSettings.get_solo().flag('b'), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.metal = Metal.objects.create(
+            name='Gold',
+            symbol='XAU',
+            current_price=Decimal('2000.00'),
+            price_change_24h=Decimal('0.00')
+        )
+        self.product = Product.objects.create(
+            metal=self.metal,
+            name='1oz Gold Bar',
+            manufacturer='PAMP',
+            purity='.9999',
+            weight_oz=Decimal('1.0000'),
+            premium_per_oz=Decimal('50.00'),
+            product_type=Product.ProductType.BAR
+        )
+        Vault.objects.create(
+            name='Zurich Vault',
+            city='Zurich',
+            country='Switzerland',
+            storage_fee_percent=Decimal('0.0008')
+        )
+
+    def test_repeat_request_is_served_without_queries(self):
+        first = self.client.get('/api/trading/products/')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/trading/products/')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get('/api/trading/metal-prices/')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/trading/metal-prices/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_price_change_invalidates_products_and_metals(self):
+        product_etag = self.client.get('/api/trading/products/')['ETag']
+        metal_etag = self.client.get('/api/trading/metals/')['ETag']
+
+        self.metal.current_price = Decimal('2100.00')
+        self.metal.save()
+
+        response = self.client.get('/api/trading/products/', HTTP_IF_NONE_MATCH=product_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], product_etag)
+        self.assertEqual(response.data['results'][0]['metal']['current_price'], '2100.00')
+        self.assertNotEqual(self.client.get('/api/trading/metals/')['ETag'], metal_etag)
+
+    def test_vault_change_only_invalidates_vaults(self):
+        vault_response = self.client.get('/api/vaults/')
+        metal_etag = self.client.get('/api/trading/metals/')['ETag']
+
+        response = self.client.get(
+            '/api/vaults/', HTTP_IF_MODIFIED_SINCE=vault_response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        vault = Vault.objects.get()
+        vault.name = 'Zurich Freeport'
+        vault.save()
+
+        self.assertNotEqual(self.client.get('/api/vaults/')['ETag'], vault_response['ETag'])
+        self.assertEqual(self.client.get('/api/trading/metals/')['ETag'], metal_etag)
+
+
+class FastJSONRendererTests(TestCase):
+    @override_settings(JSON_DECIMAL_MODE='number')
+    def test_number_mode_keeps_every_decimal_digit(self):
+        self.assertEqual(
+            fastjson.dumps({'value': Decimal('2345.678900000000000001')}),
+            b'{"value":2345.678900000000000001}'
+        )
+
+    @override_settings(JSON_DECIMAL_MODE='string')
+    def test_string_mode_writes_decimals_as_strings(self):
+        self.assertEqual(fastjson.dumps({'value': Decimal('29.810')}), b'{"value":"29.810"}')
+
+    def test_matches_stdlib_renderer_for_common_types(self):
+        data = {
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'at': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc),
+            'label': 'Zürich \u2028',
+            'items': [1, 2.5, None, True],
+        }
+
+        self.assertEqual(fastjson.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_dev_email_context_keeps_str_formatting(self):
+        from utils.emails import _json_safe
+
+        at = datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc)
+        context = {'at': at, 'on': at.date(), 'total': Decimal('12.50'), 3: ['x']}
+
+        self.assertEqual(
+            _json_safe(context), {'at': '2024-05-01 12:30:00+00:00', 'on': '2024-05-01', 'total': 12.5, '3': ['x']}
+        )
+
+    def test_api_responses_use_orjson_renderer(self):
+        metal = Metal.objects.create(
+            name='Gold', symbol='XAU', current_price=Decimal('2345.67'), price_change_24h=Decimal('0.00')
+        )
+
+        response = APIClient().get(f'/api/trading/metals/{metal.id}/')
+
+        self.assertIsInstance(response.accepted_renderer, fastjson.ORJSONRenderer)
+        self.assertEqual(fastjson.loads(response.content)['current_price'], '2345.67')
+
+
+class CompiledReadSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='compiled@test.com', username='compiled', password='testpass123')
+        self.gold = Metal.objects.create(
+            name='Gold', symbol='XAU', current_price=Decimal('2345.67'), price_change_24h=Decimal('-0.35')
+        )
+        self.silver = Metal.objects.create(
+            name='Silver', symbol='XAG', current_price=Decimal('29.81'), price_change_24h=Decimal('1.20')
+        )
+        self.product = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), product_type='bar'
+        )
+        self.vault = Vault.objects.create(
+            name='Zurich Vault', city='Zurich', country='Switzerland', flag_emoji='🇨🇭',
+            storage_fee_percent=Decimal('0.0008')
+        )
+        self.shipment = Shipment.objects.create(
+            user=self.user, carrier='fedex', destination_address={'street': '123 Main St', 'zip': None}
+        )
+        self.shipment.initialize_workflow()
+        self.shipment.events.create(status=Shipment.Status.REQUESTED, description='Requested', location=None)
+        Shipment.objects.create(user=self.user, carrier='brinks', tracking_number='TRK-1', destination_address={})
+
+        PortfolioItem.objects.create(
+            user=self.user, metal=self.gold, product=self.product, weight_oz=Decimal('2.5000'), quantity=2,
+            vault_location=self.vault, purchase_price=Decimal('5751.10'), serial_numbers=['A1', 'A2']
+        )
+        # No vault: vault_location is null and vault_location_name is omitted, as DRF does
+        PortfolioItem.objects.create(
+            user=self.user, metal=self.gold, product=self.product, weight_oz=Decimal('1.0000'),
+            vault_location=None, shipment=self.shipment, purchase_price=Decimal('2301.15'),
+            status=PortfolioItem.Status.IN_TRANSIT
+        )
+        Transaction.objects.create(
+            user=self.user, transaction_type=Transaction.TransactionType.BUY, metal=self.silver,
+            amount_oz=Decimal('10.0000'), price_per_oz=Decimal('29.81'), total_value=Decimal('298.10')
+        )
+        Transaction.objects.create(
+            user=self.user, transaction_type=Transaction.TransactionType.DEPOSIT, metal=None,
+            total_value=Decimal('1000.00'), status=Transaction.Status.COMPLETED
+        )
+
+    def assert_parity(self, serializer_class, read_serializer_class, queryset):
+        expected = serializer_class(queryset, many=True).data
+        actual = read_serializer_class(read_serializer_class.values(queryset)).data
+
+        self.assertEqual(len(actual), queryset.count())
+        # Byte-identical JSON also checks key order and value types
+        self.assertEqual(fastjson.dumps(actual), fastjson.dumps(expected))
+
+    def test_portfolio_items_match_drf_serializer(self):
+        self.assert_parity(
+            PortfolioItemSerializer, PortfolioItemReadSerializer,
+            PortfolioItem.objects.order_by('created_at')
+        )
+
+    def test_transactions_match_drf_serializer(self):
+        self.assert_parity(
+            TransactionSerializer, TransactionReadSerializer,
+            Transaction.objects.order_by('created_at')
+        )
+
+    def test_shipments_match_drf_serializer(self):
+        self.assert_parity(ShipmentSerializer, ShipmentReadSerializer, Shipment.objects.order_by('created_at'))
+
+    @override_settings(FX_METAL_IMAGE_BASE_URL='https://cdn.example.com/metals/')
+    def test_method_fields_call_the_serializer_method(self):
+        self.assert_parity(
+            TransactionSerializer, TransactionReadSerializer,
+            Transaction.objects.filter(metal__isnull=False)
+        )
+
+    @override_settings(REST_FRAMEWORK={'COERCE_DECIMAL_TO_STRING': False, 'DATETIME_FORMAT': 'iso-8601'})
+    def test_plans_follow_drf_settings(self):
+        self.assert_parity(
+            PortfolioItemSerializer, PortfolioItemReadSerializer,
+            PortfolioItem.objects.order_by('created_at')
+        )
+
+    def test_accepts_a_model_queryset(self):
+        queryset = Transaction.objects.order_by('created_at')
+
+        self.assertEqual(
+            fastjson.dumps(TransactionReadSerializer(queryset).data),
+            fastjson.dumps(TransactionSerializer(queryset, many=True).data)
+        )
+
+    def test_unsupported_method_field_fails_at_compile_time(self):
+        class UndeclaredSerializer(TransactionSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta(TransactionSerializer.Meta):
+                fields = TransactionSerializer.Meta.fields + ['label']
+
+            def get_label(self, obj):
+                return obj.status
+
+        class UndeclaredReadSerializer(CompiledReadSerializer):
+            serializer_class = UndeclaredSerializer
+
+        with self.assertRaises(ImproperlyConfigured):
+            UndeclaredReadSerializer.get_plan()
+
+        class DeclaredSerializer(UndeclaredSerializer):
+            @reads('status')
+            def get_label(self, obj):
+                return obj.status
+
+        class DeclaredReadSerializer(CompiledReadSerializer):
+            serializer_class = DeclaredSerializer
+
+        queryset = Transaction.objects.order_by('created_at')
+        self.assertEqual(
+            [row['label'] for row in DeclaredReadSerializer(queryset).data],
+            [Transaction.Status.PENDING, Transaction.Status.COMPLETED]
+        )
+
+    def test_list_endpoints_match_and_issue_fewer_queries(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        for url in ['/api/trading/portfolio/', '/api/trading/transactions/', '/api/trading/shipments/']:
+            with override_settings(COMPILED_READ_SERIALIZERS=False):
+                expected = client.get(url)
+            with self.assertNumQueries(4 if url.endswith('shipments/') else 2):
+                response = client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
+
+
+class FieldSelectionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='fields@test.com', username='fields', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(
+            name='Gold', symbol='XAU', current_price=Decimal('2345.67'), price_change_24h=Decimal('0.00')
+        )
+        self.product = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('45.50'), product_type='bar'
+        )
+        self.vault = Vault.objects.create(
+            name='Zurich Vault', city='Zurich', country='Switzerland', storage_fee_percent=Decimal('0.0008')
+        )
+        self.item = PortfolioItem.objects.create(
+            user=self.user, metal=self.gold, product=self.product, weight_oz=Decimal('2.5000'),
+            vault_location=self.vault, purchase_price=Decimal('5751.10')
+        )
+        self.shipment = Shipment.objects.create(user=self.user, carrier='fedex', destination_address={})
+        self.shipment.initialize_workflow()
+        self.event = self.shipment.events.create(status=Shipment.Status.REQUESTED, description='Requested')
+
+    def get_both(self, url):
+        with override_settings(COMPILED_READ_SERIALIZERS=False):
+            expected = self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected.content)
+        return fastjson.loads(response.content)
+
+    def test_fields_selects_top_level_and_nested_keys(self):
+        data = self.get_both('/api/trading/portfolio/?fields=id,weight_oz,metal.symbol')
+
+        self.assertEqual(data['results'], [{'id': str(self.item.id), 'metal': {'symbol': 'XAU'}, 'weight_oz': '2.5000'}])
+
+    def test_expand_collapses_unlisted_nested_objects_to_ids(self):
+        data = self.get_both('/api/trading/portfolio/?expand=product')
+
+        item = data['results'][0]
+        self.assertEqual(item['metal'], str(self.gold.id))
+        self.assertEqual(item['vault_location'], str(self.vault.id))
+        self.assertEqual(item['product']['name'], '1oz Gold Bar')
+        self.assertEqual(item['product']['metal'], str(self.gold.id))
+        self.assertEqual(item['vault_location_name'], 'Zurich Vault')
+
+    def test_empty_expand_collapses_many_relations_to_id_lists(self):
+        data = self.get_both('/api/trading/shipments/?expand=&fields=id,events,workflow_stages,items_count')
+
+        shipment = data['results'][0]
+        self.assertEqual(shipment['events'], [str(self.event.id)])
+        self.assertEqual(len(shipment['workflow_stages']), 8)
+        self.assertTrue(all(isinstance(stage, str) for stage in shipment['workflow_stages']))
+        self.assertEqual(shipment['items_count'], 0)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/trading/portfolio/?fields=id,metal.colour')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], ['Unknown field(s): metal.colour'])
+
+    def test_retrieve_loads_only_the_selected_relations(self):
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(f'/api/trading/portfolio/{self.item.id}/?fields=id,metal.name')
+
+        self.assertEqual(response.data, {'id': str(self.item.id), 'metal': {'name': 'Gold'}})
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('"metals"', sql)
+        self.assertNotIn('"products"', sql)
+        self.assertNotIn('"vaults"', sql)
+        self.assertNotIn('purchase_price', sql)
+
+    def test_empty_fields_parameter_returns_every_field(self):
+        response = self.client.get('/api/trading/portfolio/')
+
+        self.assertEqual(self.client.get('/api/trading/portfolio/?fields=').content, response.content)
+        self.assertEqual(
+            response.json()['results'][0],
+            fastjson.loads(fastjson.dumps(PortfolioItemSerializer(self.item).data))
+        )
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='budget@test.com', username='budget', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        metals = [
+            Metal.objects.create(name=name, symbol=symbol, current_price=Decimal('100.00'))
+            for name, symbol in [('Gold', 'XAU'), ('Silver', 'XAG'), ('Platinum', 'XPT')]
+        ]
+        for i, metal in enumerate(metals):
+            product = Product.objects.create(
+                metal=metal, name=f'{metal.name} Bar', manufacturer='PAMP', purity='.9999',
+                weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('5.00'), product_type='bar'
+            )
+            PortfolioItem.objects.create(
+                user=self.user, metal=metal, product=product, weight_oz=Decimal('1.0000'),
+                purchase_price=Decimal('105.00')
+            )
+            Transaction.objects.create(
+                user=self.user, transaction_type=Transaction.TransactionType.BUY, metal=metal,
+                amount_oz=Decimal('1.0000'), price_per_oz=Decimal('100.00'), total_value=Decimal('100.00')
+            )
+            shipment = Shipment.objects.create(user=self.user, carrier='fedex', destination_address={})
+            shipment.initialize_workflow()
+
+    def test_list_endpoint_budgets(self):
+        budgets = {
+            '/api/trading/portfolio/': 2,
+            '/api/trading/transactions/': 2,
+            # count, shipments, events, workflow stages
+            '/api/trading/shipments/': 4,
+            '/api/trading/products/': 2,
+        }
+        for url, max_queries in budgets.items():
+            with self.subTest(url=url):
+                self.assertEndpointBudget(self.client, 'get', url, max_queries=max_queries)
+
+    def test_drf_path_budgets(self):
+        item = PortfolioItem.objects.first()
+
+        with override_settings(COMPILED_READ_SERIALIZERS=False):
+            self.assertEndpointBudget(
+                self.client, 'get', '/api/trading/portfolio/?expand=product,product.metal', max_queries=2
+            )
+        self.assertEndpointBudget(self.client, 'get', f'/api/trading/portfolio/{item.id}/', max_queries=2)
+
+
+def metric_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, METRICS_ALLOWED_IPS=['127.0.0.1'])
+@patch('utils.metrics.get_redis_client', return_value=None)
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+
+    def scrape(self, **kwargs):
+        response = self.client.get('/metrics', **kwargs)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_latency_is_labelled_with_view_and_action(self, _):
+        sample = (
+            'http_request_duration_seconds_count'
+            '{view="metal-list",action="list",method="GET",status="200"}'
+        )
+        before = metric_value(self.scrape(), sample)
+
+        self.client.get('/api/trading/metals/')
+        text = self.scrape()
+
+        self.assertEqual(metric_value(text, sample), before + 1)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        bucket = sample.replace('_count', '_bucket').replace('"200"}', '"200",le="+Inf"}')
+        self.assertEqual(metric_value(text, bucket), before + 1)
+
+    @override_settings(METRICS_AUTH_TOKEN='scrape-secret', METRICS_ALLOWED_IPS=[])
+    def test_token_is_required_when_configured(self, _):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_allowlist_admits_scraper_network_only(self, _):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.client.get('/metrics', HTTP_X_FORWARDED_FOR='10.1.2.3').status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.scrape(REMOTE_ADDR='10.1.2.3')
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_unconfigured_endpoint_is_closed_unless_debug(self, _):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        with override_settings(DEBUG=True):
+            self.scrape()
+
+    def test_celery_runtime_and_queue_wait(self, _):
+        task = SimpleNamespace(name='trading.tasks.update_metal_prices', request=SimpleNamespace())
+        headers = {}
+        metrics._stamp_published_at(headers=headers)
+        task.request.published_at = headers['published_at'] - 2
+
+        metrics._task_prerun(task_id='t-1', task=task)
+        metrics._task_postrun(task_id='t-1', task=task, state='SUCCESS')
+        text = self.scrape()
+
+        wait = 'celery_task_queue_wait_seconds_sum{task="trading.tasks.update_metal_prices"}'
+        runtime = 'celery_task_runtime_seconds_count{task="trading.tasks.update_metal_prices",state="SUCCESS"}'
+        self.assertGreaterEqual(metric_value(text, wait), 2)
+        self.assertGreaterEqual(metric_value(text, runtime), 1)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'utils.cache.InstrumentedLocMemCache'}})
+    def test_cache_hit_ratio(self, _):
+        before = metrics.collect()[metrics.CACHE_GETS.name]
+        cache.set('metrics-test', 1)
+        cache.get('metrics-test')
+        cache.get('metrics-test-missing')
+        cache.get_many(['metrics-test', 'metrics-test-missing'])
+
+        after = metrics.collect()[metrics.CACHE_GETS.name]
+        self.assertEqual(after['{result="hit"}'] - before.get('{result="hit"}', 0), 2)
+        self.assertEqual(after['{result="miss"}'] - before.get('{result="miss"}', 0), 2)
+        self.assertIn('django_cache_hit_ratio ', self.scrape())
+
+    def test_open_websocket_connections_gauge(self, _):
+        user = SimpleNamespace(id='user-metrics', is_authenticated=True)
+        sample = 'websocket_open_connections{consumer="NotificationConsumer"}'
+        before = metric_value(metrics.render(), sample)
+
+        async def run():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            during = metric_value(metrics.render(), sample)
+            await communicator.disconnect()
+            return during
+
+        during = async_to_sync(run)()
+        self.assertEqual(during, before + 1)
+        self.assertEqual(metric_value(metrics.render(), sample), before)
+
+    def test_flush_sends_deltas_to_redis(self, get_redis_client):
+        pipe = SimpleNamespace(calls=[], execute=lambda: None)
+        pipe.hincrbyfloat = lambda key, field, amount: pipe.calls.append((key, field, amount))
+        get_redis_client.return_value = SimpleNamespace(pipeline=lambda transaction: pipe)
+        metrics.flush()
+
+        metrics.CHANNEL_LAYER_SEND_SECONDS.observe(0.02, operation='group_send')
+        metrics.CHANNEL_LAYER_SEND_SECONDS.observe(0.03, operation='group_send')
+        metrics.flush()
+
+        self.assertIn(
+            ('metrics:channel_layer_send_duration_seconds', '_count{operation="group_send"}', 2), pipe.calls
+        )
+        self.assertIn(
+            ('metrics:channel_layer_send_duration_seconds', '_bucket{operation="group_send",le="0.025"}', 1),
+            pipe.calls
+        )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='export@test.com', username='export', password='testpass123')
+        other = User.objects.create_user(email='other@test.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        product = Product.objects.create(
+            metal=self.gold, name='Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('5.00'), product_type='bar'
+        )
+        PortfolioItem.objects.create(
+            user=self.user, metal=self.gold, product=product, weight_oz=Decimal('1.5000'),
+            purchase_price=Decimal('3000.00'), serial_numbers=['A1', 'A2']
+        )
+        for owner, kind in [(self.user, 'buy'), (self.user, 'sell'), (self.user, 'buy'), (other, 'buy')]:
+            Transaction.objects.create(
+                user=owner, transaction_type=kind, metal=self.gold, amount_oz=Decimal('1.0000'),
+                price_per_oz=Decimal('2000.00'), total_value=Decimal('2000.00'), status='completed'
+            )
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_statement_csv_streams_own_filtered_transactions(self):
+        response = self.client.get('/api/trading/transactions/export/?type=buy')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="statement-', response['Content-Disposition'])
+        lines = self.read(response).splitlines()
+        self.assertEqual(
+            lines[0],
+            'id,created_at,transaction_type,metal_symbol,amount_oz,price_per_oz,total_value,fees,status'
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(',buy,XAU,1.0000,2000.00,2000.00,0.00,completed' in line for line in lines[1:]))
+
+    def test_statement_period_includes_the_whole_last_day_and_rejects_bad_filters(self):
+        today = timezone.localdate()
+        late = timezone.make_aware(datetime.combine(today, datetime.min.time())) + timedelta(hours=23)
+        Transaction.objects.filter(user=self.user, transaction_type='sell').update(created_at=late)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/trading/transactions/export/', {'date_from': today, 'date_to': today})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(self.read(response).splitlines()), 4)
+        # Bounds compare the bare column (index and partition pruning), not a date cast of it
+        self.assertFalse([query['sql'] for query in queries if 'cast_date' in query['sql']])
+        response = self.client.get(
+            '/api/trading/transactions/export/', {'date_to': (today - timedelta(days=1)).isoformat()}
+        )
+        self.assertEqual(len(self.read(response).splitlines()), 1)
+
+        for params in ({'date_from': 'yesterday'}, {'date_to': '2026-02-30'}, {'type': 'gift'}):
+            self.assertEqual(self.client.get('/api/trading/transactions/export/', params).status_code, 400)
+            self.assertEqual(self.client.get('/api/trading/transactions/', params).status_code, 400)
+
+    def test_holdings_ndjson(self):
+        response = self.client.get('/api/trading/portfolio/export/?output=ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [fastjson.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['product'], 'Gold Bar')
+        self.assertEqual(rows[0]['serial_numbers'], ['A1', 'A2'])
+        self.assertIsNone(rows[0]['vault_location_name'])
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/api/trading/transactions/export/?output=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    def test_statement_streams_under_asgi(self):
+        token = AccessToken.for_user(self.user)
+
+        async def run():
+            response = await AsyncClient().get('/api/trading/transactions/export/', authorization=f'Bearer {token}')
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, body = async_to_sync(run)()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(body.decode().splitlines()), 4)
+
+
+class StorageFeeAccrualTests(TestCase):
+    def setUp(self):
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        product = Product.objects.create(
+            metal=self.gold, name='Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('5.00'), product_type='bar'
+        )
+        london = Vault.objects.create(name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0012'))
+        zurich = Vault.objects.create(name='Zurich', city='Zurich', country='CH', storage_fee_percent=Decimal('0.0024'))
+        self.users = []
+        holdings = [
+            # 20000 * 0.0012 / 12 = 2.00
+            [(london, '10.0000', 'vaulted')],
+            # (10000 * 0.0012 + 2000 * 0.0024) / 12 = 1.40
+            [(london, '5.0000', 'vaulted'), (zurich, '1.0000', 'vaulted')],
+            # Not charged: shipped out, and not in a vault
+            [(london, '3.0000', 'in_transit'), (None, '2.0000', 'vaulted')],
+        ]
+        for i, items in enumerate(holdings):
+            user = User.objects.create_user(email=f'fees{i}@test.com', username=f'fees{i}', password='testpass123')
+            Wallet.objects.filter(user=user).update(cash_balance=Decimal('100.00'))
+            for vault, weight, item_status in items:
+                PortfolioItem.objects.create(
+                    user=user, metal=self.gold, product=product, weight_oz=Decimal(weight),
+                    vault_location=vault, status=item_status, purchase_price=Decimal('1.00')
+                )
+            self.users.append(user)
+        self.period = datetime(2026, 9, 1).date()
+
+    def balances(self):
+        return [Wallet.objects.get(user=user).cash_balance for user in self.users]
+
+    def test_charges_each_user_once_per_period(self):
+        online = [str(user.id) for user in self.users]
+        with patch('trading.portfolio_push.online_portfolio_user_ids', return_value=online), \
+                patch('trading.tasks.push_portfolio_updates.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            run = storage_fees.accrue_storage_fees(self.period, chunk_size=1)
+
+        # One push per committed chunk, for the users it charged
+        self.assertEqual(
+            sorted(call.kwargs['args'] for call in apply_async.call_args_list),
+            sorted([[[str(self.users[0].id)]], [[str(self.users[1].id)]]])
+        )
+
+        self.assertEqual(run.status, StorageFeeRun.Status.COMPLETED)
+        self.assertEqual(run.users_charged, 2)
+        self.assertEqual(run.total_fees, Decimal('3.40'))
+        self.assertEqual(self.balances(), [Decimal('98.00'), Decimal('98.60'), Decimal('100.00')])
+        fees = Transaction.objects.filter(transaction_type=Transaction.TransactionType.STORAGE_FEE)
+        self.assertEqual(
+            sorted(fees.values_list('total_value', flat=True)), [Decimal('1.40'), Decimal('2.00')]
+        )
+        self.assertEqual(run.charges.get(user=self.users[0]).holdings_value, Decimal('20000.00'))
+
+        storage_fees.accrue_storage_fees(self.period, chunk_size=1)
+        self.assertEqual(fees.count(), 2)
+        self.assertEqual(self.balances(), [Decimal('98.00'), Decimal('98.60'), Decimal('100.00')])
+
+    def test_fee_between_wallet_read_and_trade_is_kept(self):
+        user = User.objects.get(pk=self.users[0].pk)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        item = PortfolioItem.objects.get(user=user)
+        # The request's user already holds its wallet, read before the fee run
+        self.assertEqual(user.wallet.cash_balance, Decimal('100.00'))
+
+        storage_fees.accrue_storage_fees(self.period)
+        response = client.post('/api/trading/trade/deposit/', {'amount': '10.00'})
+        self.assertEqual(response.data['new_balance'], 108.0)
+        response = client.post('/api/trading/trade/sell/', {'portfolio_item_id': str(item.id), 'amount_oz': '1.0000'})
+        self.assertEqual(response.status_code, 200, response.data)
+
+        # 100 - 2.00 fee + 10 deposit + 1990 (2000 less the 0.5% sell fee)
+        self.assertEqual(self.balances()[0], Decimal('2098.00'))
+
+    def test_interrupted_run_resumes_with_its_price_snapshot(self):
+        debit = storage_fees._debit_wallets
+        calls = []
+
+        def fail_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('worker lost')
+            return debit(*args)
+
+        with patch.object(storage_fees, '_debit_wallets', side_effect=fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                storage_fees.accrue_storage_fees(self.period, chunk_size=1)
+
+        run = StorageFeeRun.objects.get(period=self.period)
+        self.assertEqual(run.status, StorageFeeRun.Status.RUNNING)
+        self.assertEqual(run.users_charged, 1)
+
+        Metal.objects.filter(pk=self.gold.pk).update(current_price=Decimal('4000.00'))
+        run = storage_fees.accrue_storage_fees(self.period, chunk_size=1)
+
+        self.assertEqual(run.status, StorageFeeRun.Status.COMPLETED)
+        self.assertEqual(run.total_fees, Decimal('3.40'))
+        self.assertEqual(
+            Transaction.objects.filter(transaction_type=Transaction.TransactionType.STORAGE_FEE).count(), 2
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LotLedgerTests(TestCase):
+    def setUp(self):
+        clear_local_settings()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='lots@test.com', username='lots', password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('10000.00'))
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        self.product = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type=Product.ProductType.BAR
+        )
+        self.vault = Vault.objects.create(
+            name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008')
+        )
+
+    def tearDown(self):
+        clear_local_settings()
+
+    def set_price(self, price):
+        Metal.objects.filter(pk=self.gold.pk).update(current_price=Decimal(price))
+
+    def buy(self):
+        # Fresh user so the wallet balance is re-read
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.client.post('/api/trading/trade/buy/', {
+            'product_id': str(self.product.id), 'quantity': 1, 'delivery_method': 'vault', 'vault_id': str(self.vault.id)
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['portfolio_item']['id']
+
+    def sell(self, item_id, amount):
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.client.post('/api/trading/trade/sell/', {'portfolio_item_id': item_id, 'amount_oz': amount})
+        self.assertEqual(response.status_code, 200)
+        return response.data['transaction']
+
+    def test_sells_consume_lots_first_in_first_out(self):
+        self.buy()
+        self.set_price('2100.00')
+        second = self.buy()
+        self.set_price('2200.00')
+
+        # Sold from the second bar, but costed against the first lot (2000 + 50 premium)
+        first_sale = self.sell(second, '1.0000')
+        self.assertEqual(first_sale['cost_basis'], '2050.00')
+        self.assertEqual(first_sale['realized_pnl'], '139.00')
+
+        # Half of the second lot (2100 + 50 premium)
+        remaining = PortfolioItem.objects.get(user=self.user).id
+        second_sale = self.sell(str(remaining), '0.5000')
+        self.assertEqual(second_sale['cost_basis'], '1075.00')
+        self.assertEqual(second_sale['realized_pnl'], '19.50')
+
+        open_lots = Lot.objects.filter(user=self.user, closed_at__isnull=True)
+        self.assertEqual([(lot.remaining_oz, lot.remaining_cost) for lot in open_lots], [
+            (Decimal('0.5000'), Decimal('1075.00'))
+        ])
+        position = Position.objects.get(user=self.user, metal=self.gold)
+        self.assertEqual((position.open_oz, position.open_cost), (Decimal('0.5000'), Decimal('1075.00')))
+
+        response = self.client.get('/api/trading/portfolio/pnl/')
+        self.assertEqual(response.status_code, 200)
+        gold = response.data['metals'][0]
+        self.assertEqual(gold['market_value'], Decimal('1100.00'))
+        self.assertEqual(gold['unrealized_pnl'], Decimal('25.00'))
+        self.assertEqual(gold['realized_pnl'], Decimal('158.50'))
+
+    def test_pnl_reads_positions_not_history(self):
+        item = self.buy()
+        for _ in range(5):
+            self.sell(item, '0.1000')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(lots.portfolio_pnl(self.user)['metals']), 1)
+
+
+class PortfolioSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='snap@test.com', username='snap', password='testpass123')
+        self.saver = User.objects.create_user(email='saver@test.com', username='saver', password='testpass123')
+        User.objects.create_user(email='idle@test.com', username='idle', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+        self.days = [self.today - timedelta(days=offset) for offset in (3, 2, 1)]
+
+        gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2300.00'))
+        for day, price in zip(self.days, ('2000.00', '2100.00', '2200.00')):
+            MetalPrice.objects.create(metal=gold, price=Decimal(price), recorded_at=self.at(day))
+        product = Product.objects.create(
+            metal=gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type=Product.ProductType.BAR
+        )
+
+        # Deposit 5000 and buy 1oz, deposit 1000, then sell half at 2200
+        history = [
+            (self.days[0], Transaction.TransactionType.DEPOSIT, None, None, '5000.00', '0.00'),
+            (self.days[0], Transaction.TransactionType.BUY, gold, '1.0000', '2050.00', '50.00'),
+            (self.days[1], Transaction.TransactionType.DEPOSIT, None, None, '1000.00', '0.00'),
+            (self.days[2], Transaction.TransactionType.SELL, gold, '0.5000', '1100.00', '5.50'),
+        ]
+        for day, kind, metal, amount_oz, total_value, fees in history:
+            transaction = Transaction.objects.create(
+                user=self.user, transaction_type=kind, metal=metal, amount_oz=amount_oz,
+                total_value=Decimal(total_value), fees=Decimal(fees), status=Transaction.Status.COMPLETED
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=self.at(day))
+        PortfolioItem.objects.create(
+            user=self.user, metal=gold, product=product, weight_oz=Decimal('0.5000'), purchase_price=Decimal('2000.00')
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('5044.50'))
+        Wallet.objects.filter(user=self.saver).update(cash_balance=Decimal('100.00'))
+
+    def at(self, day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+
+    def test_backfill_rolls_holdings_and_cash_back(self):
+        written = snapshots.snapshot_portfolios(self.days[0], self.days[-1], chunk_size=1)
+        self.assertEqual(written, 6)
+
+        rows = list(PortfolioSnapshot.objects.filter(user=self.user).order_by('date').values_list(
+            'date', 'metals', 'cash', 'total_value', 'net_flow'
+        ))
+        self.assertEqual(rows, [
+            (self.days[0], {'XAU': 2000.0}, Decimal('2950.00'), Decimal('4950.00'), Decimal('5000.00')),
+            (self.days[1], {'XAU': 2100.0}, Decimal('3950.00'), Decimal('6050.00'), Decimal('1000.00')),
+            (self.days[2], {'XAU': 1100.0}, Decimal('5044.50'), Decimal('6144.50'), Decimal('0.00')),
+        ])
+        self.assertEqual(PortfolioSnapshot.objects.filter(user=self.saver).count(), 3)
+
+        # Reruns overwrite
+        Wallet.objects.filter(user=self.saver).update(cash_balance=Decimal('150.00'))
+        snapshots.snapshot_portfolios(self.days[-1])
+        self.assertEqual(PortfolioSnapshot.objects.count(), 6)
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.saver, date=self.days[-1]).cash, Decimal('150.00'))
+
+    def test_backfill_across_delivery_request_undoes_only_its_fees(self):
+        # request_delivery records metal value plus fees but debits only the fees;
+        # the item stays held, in transit. An admin cash withdrawal is a real outflow.
+        gold = Metal.objects.get(symbol='XAU')
+        PortfolioItem.objects.filter(user=self.user).update(status=PortfolioItem.Status.IN_TRANSIT)
+        for kind, metal, amount_oz, total_value, fees in [
+            (Transaction.TransactionType.WITHDRAWAL, gold, '0.5000', '1261.00', '161.00'),
+            (Transaction.TransactionType.WITHDRAWAL, None, None, '500.00', '0.00'),
+        ]:
+            transaction = Transaction.objects.create(
+                user=self.user, transaction_type=kind, metal=metal, amount_oz=amount_oz,
+                total_value=Decimal(total_value), fees=Decimal(fees), status=Transaction.Status.COMPLETED
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=self.at(self.days[2]))
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('4383.50'))
+
+        snapshots.snapshot_portfolios(self.days[0], self.days[-1])
+
+        rows = list(PortfolioSnapshot.objects.filter(user=self.user).order_by('date').values_list(
+            'cash', 'total_value', 'net_flow'
+        ))
+        self.assertEqual(rows, [
+            (Decimal('2950.00'), Decimal('4950.00'), Decimal('5000.00')),
+            (Decimal('3950.00'), Decimal('6050.00'), Decimal('1000.00')),
+            (Decimal('4383.50'), Decimal('5483.50'), Decimal('-500.00')),
+        ])
+
+    @override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+    def test_backfill_across_placed_and_filled_limit_orders(self):
+        clear_local_settings()
+        gold = Metal.objects.get(symbol='XAU')
+        product = Product.objects.get(metal=gold)
+        vault = Vault.objects.create(name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008'))
+
+        def place(limit_price):
+            limit_price = Decimal(limit_price)
+            return order_book.place_order(LimitOrder(
+                user=self.user, metal=gold, side=LimitOrder.Side.BUY, limit_price=limit_price,
+                amount_oz=Decimal('1.0000'), product=product, quantity=1, vault=vault,
+                premium_per_oz=product.premium_per_oz,
+                reserved_amount=order_book.buy_reservation(Decimal('1.0000'), limit_price, product),
+            ))
+
+        # Reserves 2300 and fills at 2200 (2250 with premium); then 2050 stays reserved
+        place('2250.00')
+        self.assertEqual(order_book.execute_tick(gold, Decimal('2200.00')), 1)
+        place('2000.00')
+        self.assertEqual(Wallet.objects.get(user=self.user).cash_balance, Decimal('744.50'))
+
+        snapshots.snapshot_portfolios(self.days[0], self.today)
+
+        rows = list(PortfolioSnapshot.objects.filter(user=self.user).order_by('date').values_list(
+            'cash', 'net_flow'
+        ))
+        self.assertEqual(rows, [
+            (Decimal('2950.00'), Decimal('5000.00')),
+            (Decimal('3950.00'), Decimal('1000.00')),
+            (Decimal('5044.50'), Decimal('0.00')),
+            (Decimal('2794.50'), Decimal('0.00')),
+        ])
+        clear_local_settings()
+
+    def test_history_reads_one_range_with_time_weighted_return(self):
+        snapshots.snapshot_portfolios(self.days[0], self.days[-1])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/trading/portfolio/history/', {'date_from': self.days[0].isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['total_value'] for row in response.data['snapshots']], [
+            Decimal('4950.00'), Decimal('6050.00'), Decimal('6144.50')
+        ])
+        # The 1000 deposit is not a gain: (6050 - 1000) / 4950, then 6144.50 / 6050
+        expected = (5050 / 4950) * (6144.50 / 6050) - 1
+        self.assertAlmostEqual(response.data['time_weighted_return'], expected, places=6)
+        self.assertEqual(response.data['snapshots'][0]['cumulative_return'], 0.0)
+
+        for params in ({'date_to': 'yesterday'}, {'date_to': '2024-02-30'}, {
+            'date_from': self.days[-1].isoformat(), 'date_to': self.days[0].isoformat()
+        }):
+            response = self.client.get('/api/trading/portfolio/history/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, USE_SMTP_EMAIL=False)
+class PriceAlertTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='alerts@test.com', username='alerts', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+
+    def alert(self, direction, threshold):
+        return PriceAlert.objects.create(
+            user=self.user, metal=self.gold, direction=direction, threshold=Decimal(threshold)
+        )
+
+    def active_thresholds(self):
+        return sorted(
+            str(threshold) for threshold in
+            PriceAlert.objects.filter(status=PriceAlert.Status.ACTIVE).values_list('threshold', flat=True)
+        )
+
+    def test_create_and_cancel(self):
+        response = self.client.post('/api/trading/alerts/', {
+            'metal': str(self.gold.id), 'direction': 'above', 'threshold': '1990.00'
+        })
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/trading/alerts/', {
+            'metal': str(self.gold.id), 'direction': 'above', 'threshold': '2100.00'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['metal_symbol'], 'XAU')
+        self.assertEqual(response.data['status'], 'active')
+
+        response = self.client.delete(f"/api/trading/alerts/{response.data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(PriceAlert.objects.get().status, PriceAlert.Status.CANCELLED)
+
+    @override_settings(PRICE_ALERT_BATCH_SIZE=1)
+    def test_tick_triggers_only_the_crossed_band(self):
+        for threshold in ('2010.00', '2050.00', '2100.00'):
+            self.alert('above', threshold)
+        for threshold in ('1990.00', '1950.00'):
+            self.alert('below', threshold)
+
+        self.assertEqual(price_alerts.match_price_moves([(str(self.gold.id), '2000.00', '2050.00')]), 2)
+        self.assertEqual(self.active_thresholds(), ['1950.00', '1990.00', '2100.00'])
+        self.assertEqual(price_alerts.match_price_moves([(str(self.gold.id), '2050.00', '2040.00')]), 0)
+        self.assertEqual(price_alerts.match_price_moves([(str(self.gold.id), '2040.00', '1950.00')]), 2)
+        self.assertEqual(self.active_thresholds(), ['2100.00'])
+
+        triggered = PriceAlert.objects.get(threshold=Decimal('1950.00'))
+        self.assertEqual(triggered.triggered_price, Decimal('1950.00'))
+
+    def test_triggered_alerts_notify_through_the_outbox(self):
+        from admin_api import outbox
+        from admin_api.models import DevEmail, OutboxMessage
+
+        alert = self.alert('above', '2010.00')
+        price_alerts.match_price_moves([(str(self.gold.id), '2000.00', '2020.00')])
+
+        channel = OutboxMessage.objects.get(kind=OutboxMessage.Kind.CHANNEL)
+        self.assertEqual(channel.payload['group'], f'notifications_{self.user.id}')
+        self.assertEqual(channel.payload['message']['data']['alert_id'], str(alert.id))
+        self.assertEqual(channel.payload['message']['data']['price'], '2020.00')
+
+        self.assertEqual(outbox.relay_outbox(), 2)
+        self.assertEqual(DevEmail.objects.get().recipient_list, ['alerts@test.com'])
+
+    def test_redis_index_pops_matched_ids(self):
+        alert = self.alert('below', '1990.00')
+        self.alert('below', '1900.00')
+        pop = Mock(side_effect=[[str(alert.id).encode()], []])
+        client = Mock()
+        client.register_script.return_value = pop
+
+        with patch('trading.price_alerts.get_redis_client', return_value=client):
+            self.assertEqual(price_alerts.match_price_move(self.gold, '2000.00', '1980.00'), 1)
+
+        pop.assert_called_once_with(
+            keys=[f'price_alerts:{self.gold.id}:below'], args=['1980.00', '(2000.00', 1000]
+        )
+        self.assertEqual(self.active_thresholds(), ['1900.00'])
+
+    def test_redis_errors_after_commit_are_logged_not_raised(self):
+        client = Mock()
+        client.pipeline.return_value.execute.side_effect = ConnectionError('redis down')
+        client.zrem.side_effect = ConnectionError('redis down')
+
+        with patch('trading.price_alerts.get_redis_client', return_value=client), \
+                self.assertLogs('trading.price_alerts', level='WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/trading/alerts/', {
+                    'metal': str(self.gold.id), 'direction': 'above', 'threshold': '2100.00'
+                })
+            self.assertEqual(response.status_code, 201)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f"/api/trading/alerts/{response.data['id']}/")
+            self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('rebuild_price_alert_index', logs.output[0])
+
+    def test_rebuild_adds_back_alerts_created_while_it_ran(self):
+        alert = self.alert('above', '2100.00')
+        client = Mock()
+        client.exists.return_value = True
+
+        with patch('trading.price_alerts.get_redis_client', return_value=client):
+            self.assertEqual(price_alerts.rebuild_index(), 1)
+
+        live_key = f'price_alerts:{self.gold.id}:above'
+        calls = client.pipeline.return_value.mock_calls
+        swapped = max(i for i, call in enumerate(calls) if call[0] == 'rename')
+        readded = [call.args for call in calls[swapped:] if call[0] == 'zadd']
+        self.assertEqual(readded, [(live_key, {str(alert.id): 2100.0})])
+
+    def test_price_tick_queues_matching(self):
+        from .tasks import update_metal_prices
+
+        with patch('trading.tasks.match_price_alerts.delay') as delay, \
+                patch('trading.tasks.request_online_portfolio_push'):
+            update_metal_prices()
+
+        (moves,), _ = delay.call_args
+        self.assertEqual([metal_id for metal_id, _, _ in moves], [str(self.gold.id)])
+        self.assertEqual(moves[0][1], '2000.00')
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class LimitOrderTests(TestCase):
+    def setUp(self):
+        clear_local_settings()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='orders@test.com', username='orders', password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('10000.00'))
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        self.product = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type=Product.ProductType.BAR
+        )
+        self.vault = Vault.objects.create(
+            name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008')
+        )
+
+    def tearDown(self):
+        clear_local_settings()
+
+    def cash(self):
+        return Wallet.objects.get(user=self.user).cash_balance
+
+    def place_buy(self, limit_price, quantity=1):
+        return order_book.place_order(LimitOrder(
+            user=self.user, metal=self.gold, side=LimitOrder.Side.BUY, limit_price=Decimal(limit_price),
+            amount_oz=self.product.weight_oz * quantity, product=self.product, quantity=quantity, vault=self.vault,
+            premium_per_oz=self.product.premium_per_oz,
+            reserved_amount=order_book.buy_reservation(
+                self.product.weight_oz * quantity, Decimal(limit_price), self.product
+            ),
+        ))
+
+    def place_sell(self, item, limit_price, amount_oz):
+        return order_book.place_order(LimitOrder(
+            user=self.user, metal=self.gold, side=LimitOrder.Side.SELL, limit_price=Decimal(limit_price),
+            amount_oz=Decimal(amount_oz), portfolio_item=item,
+        ))
+
+    def holding(self):
+        # Fresh user so the wallet balance is re-read
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.client.post('/api/trading/trade/buy/', {
+            'product_id': str(self.product.id), 'quantity': 2, 'delivery_method': 'vault', 'vault_id': str(self.vault.id)
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return PortfolioItem.objects.get(pk=response.data['portfolio_item']['id'])
+
+    def tick(self, old_price, new_price):
+        return order_book.execute_price_moves([(str(self.gold.id), old_price, new_price)])
+
+    def test_buy_order_reserves_funds_and_cancel_refunds(self):
+        response = self.client.post('/api/trading/orders/', {
+            'side': 'buy', 'limit_price': '2000.00', 'product': str(self.product.id), 'quantity': 2,
+            'vault': str(self.vault.id)
+        })
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/trading/orders/', {
+            'side': 'buy', 'limit_price': '1900.00', 'product': str(self.product.id), 'quantity': 2,
+            'vault': str(self.vault.id)
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['metal_symbol'], 'XAU')
+        self.assertEqual(response.data['amount_oz'], '2.0000')
+        self.assertEqual(response.data['reserved_amount'], '3900.00')
+        self.assertEqual(self.cash(), Decimal('6100.00'))
+
+        response = self.client.delete(f"/api/trading/orders/{response.data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(LimitOrder.objects.get().status, LimitOrder.Status.CANCELLED)
+        self.assertEqual(self.cash(), Decimal('10000.00'))
+
+    def test_buy_order_needs_the_reservation_in_cash(self):
+        response = self.client.post('/api/trading/orders/', {
+            'side': 'buy', 'limit_price': '1900.00', 'product': str(self.product.id), 'quantity': 6,
+            'vault': str(self.vault.id)
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LimitOrder.objects.exists())
+        self.assertEqual(self.cash(), Decimal('10000.00'))
+
+    def test_sell_order_must_be_above_the_price_and_within_the_holding(self):
+        item = self.holding()
+        for limit_price, amount_oz in (('1990.00', '1.0000'), ('2100.00', '3.0000')):
+            response = self.client.post('/api/trading/orders/', {
+                'side': 'sell', 'limit_price': limit_price, 'portfolio_item': str(item.id), 'amount_oz': amount_oz
+            })
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/trading/orders/', {
+            'side': 'sell', 'limit_price': '2100.00', 'portfolio_item': str(item.id), 'amount_oz': '1.5000'
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['reserved_amount'], '0.00')
+
+    @override_settings(LIMIT_ORDER_BATCH_SIZE=1)
+    def test_tick_fills_only_marketable_orders(self):
+        first = self.place_buy('1950.00')
+        second = self.place_buy('1900.00')
+        self.assertEqual(self.cash(), Decimal('6050.00'))
+
+        self.assertEqual(self.tick('2000.00', '1960.00'), 0)
+        self.assertEqual(self.tick('1960.00', '1940.00'), 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, LimitOrder.Status.FILLED)
+        self.assertEqual(first.filled_price, Decimal('1940.00'))
+        self.assertEqual(second.status, LimitOrder.Status.OPEN)
+        # Filled at 1940 + 50 premium; the 10.00 left of the 2000.00 reservation comes back
+        self.assertEqual(first.transaction.total_value, Decimal('1990.00'))
+        self.assertEqual(self.cash(), Decimal('6060.00'))
+
+        item = PortfolioItem.objects.get()
+        self.assertEqual((item.vault_location, item.purchase_price), (self.vault, Decimal('1940.00')))
+        self.assertEqual(Lot.objects.get().transaction, first.transaction)
+        position = Position.objects.get(user=self.user)
+        self.assertEqual((position.open_oz, position.open_cost), (Decimal('1.0000'), Decimal('1990.00')))
+
+        self.assertEqual(self.tick('1940.00', '1850.00'), 1)
+        self.assertEqual(LimitOrder.objects.filter(status=LimitOrder.Status.OPEN).count(), 0)
+
+    def test_premium_raised_while_resting_does_not_exceed_the_reservation(self):
+        order = self.place_buy('1950.00')
+        self.assertEqual(order.reserved_amount, Decimal('2000.00'))
+        Product.objects.filter(pk=self.product.pk).update(premium_per_oz=Decimal('500.00'))
+
+        self.assertEqual(self.tick('1960.00', '1950.00'), 1)
+        order.refresh_from_db()
+        # Charged the 50.00 premium it reserved at, so the whole reservation is used and nothing more
+        self.assertEqual(order.transaction.total_value, Decimal('2000.00'))
+        self.assertEqual(self.cash(), Decimal('8000.00'))
+
+    def test_sell_fill_moves_holdings_cash_and_lots(self):
+        item = self.holding()
+        self.assertEqual(self.cash(), Decimal('5900.00'))
+        partial = self.place_sell(item, '2100.00', '0.5000')
+        rest = self.place_sell(item, '2200.00', '1.5000')
+
+        self.assertEqual(self.tick('2000.00', '2150.00'), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.weight_oz, Decimal('1.5000'))
+        # 1075.00 gross less the 0.5% fee
+        self.assertEqual(self.cash(), Decimal('5900.00') + Decimal('1069.62'))
+        sale = LimitOrder.objects.get(pk=partial.pk).transaction
+        self.assertEqual((sale.total_value, sale.fees), (Decimal('1075.00'), Decimal('5.38')))
+        self.assertEqual(sale.cost_basis, Decimal('1025.00'))
+        self.assertEqual(sale.realized_pnl, Decimal('44.62'))
+
+        self.assertEqual(self.tick('2150.00', '2200.00'), 1)
+        self.assertFalse(PortfolioItem.objects.filter(pk=item.pk).exists())
+        self.assertEqual(LimitOrder.objects.get(pk=rest.pk).status, LimitOrder.Status.FILLED)
+        position = Position.objects.get(user=self.user)
+        self.assertEqual((position.open_oz, position.open_cost), (Decimal('0'), Decimal('0.00')))
+
+    def test_sell_is_rejected_when_the_holding_is_gone(self):
+        item = self.holding()
+        order = self.place_sell(item, '2100.00', '2.0000')
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        response = self.client.post('/api/trading/trade/sell/', {'portfolio_item_id': str(item.id), 'amount_oz': '2'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.tick('2000.00', '2100.00'), 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, LimitOrder.Status.REJECTED)
+        self.assertIsNone(order.transaction_id)
+
+    def test_batch_fill_runs_a_fixed_number_of_queries(self):
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('100000.00'))
+
+        def fill(count, price):
+            for _ in range(count):
+                self.place_buy('1950.00')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.tick('2000.00', price), count)
+            return len(queries)
+
+        fill(1, '1940.00')
+        self.assertEqual(fill(2, '1930.00'), fill(20, '1920.00'))
+
+    def test_halted_metal_fills_nothing(self):
+        order = self.place_buy('1950.00')
+        platform = PlatformSettings.get_solo()
+        platform.halted_metals = ['XAU']
+        platform.save()
+        clear_local_settings()
+
+        self.assertEqual(self.tick('2000.00', '1900.00'), 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, LimitOrder.Status.OPEN)
+
+    def test_redis_book_pops_marketable_ids(self):
+        order = self.place_buy('1950.00')
+        self.place_buy('1900.00')
+        pop = Mock(side_effect=[[str(order.id).encode()], []])
+        client = Mock()
+        client.register_script.return_value = pop
+
+        with patch('trading.order_book.get_redis_client', return_value=client):
+            self.assertEqual(order_book.execute_tick(self.gold, '1940.00'), 1)
+
+        self.assertEqual(pop.call_args_list[0].kwargs, {
+            'keys': [f'order_book:{self.gold.id}:buy'], 'args': ['1940.00', '+inf', 1000]
+        })
+        self.assertEqual(pop.call_args_list[1].kwargs, {
+            'keys': [f'order_book:{self.gold.id}:sell'], 'args': ['-inf', '1940.00', 1000]
+        })
+        self.assertEqual(LimitOrder.objects.filter(status=LimitOrder.Status.OPEN).count(), 1)
+
+    def test_book_errors_after_commit_are_logged_and_rebuild_adds_back(self):
+        client = Mock()
+        client.pipeline.return_value.execute.side_effect = [ConnectionError('redis down'), None, None, None, None]
+        client.exists.return_value = True
+
+        with patch('trading.order_book.get_redis_client', return_value=client), \
+                self.assertLogs('trading.order_book', level='WARNING') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            order = self.place_buy('1950.00')
+        self.assertEqual(order.status, LimitOrder.Status.OPEN)
+        self.assertIn('rebuild_order_book', logs.output[0])
+
+        client.pipeline.reset_mock()
+        with patch('trading.order_book.get_redis_client', return_value=client):
+            self.assertEqual(order_book.rebuild_book(), 1)
+        calls = client.pipeline.return_value.mock_calls
+        swapped = max(i for i, call in enumerate(calls) if call[0] == 'rename')
+        readded = [call.args for call in calls[swapped:] if call[0] == 'zadd']
+        self.assertEqual(readded, [(f'order_book:{self.gold.id}:buy', {str(order.id): 1950.0})])
+
+    def test_price_tick_queues_execution(self):
+        from .tasks import update_metal_prices
+
+        with patch('trading.tasks.execute_limit_orders.delay') as delay, \
+                patch('trading.tasks.match_price_alerts.delay'), \
+                patch('trading.tasks.request_online_portfolio_push'):
+            update_metal_prices()
+
+        (moves,), _ = delay.call_args
+        self.assertEqual([metal_id for metal_id, _, _ in moves], [str(self.gold.id)])
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RecurringPurchaseTests(TestCase):
+    def setUp(self):
+        clear_local_settings()
+        self.client = APIClient()
+        self.user = self.customer('dca')
+        self.client.force_authenticate(user=self.user)
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        self.bar = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type=Product.ProductType.BAR
+        )
+        self.digital = Product.objects.create(
+            metal=self.gold, name='Digital Gold', manufacturer='Fortress', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('0.00'), product_type=Product.ProductType.DIGITAL
+        )
+        self.vault = Vault.objects.create(
+            name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008')
+        )
+        self.today = timezone.localdate()
+
+    def tearDown(self):
+        clear_local_settings()
+
+    def customer(self, name, cash='5000.00'):
+        user = User.objects.create_user(
+            email=f'{name}@test.com', username=name, password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=user).update(cash_balance=Decimal(cash))
+        return user
+
+    def plan(self, user, amount, product=None, frequency='monthly'):
+        return RecurringPurchase.objects.create(
+            user=user, product=product or self.bar, vault=self.vault, amount=Decimal(amount),
+            frequency=frequency, start_on=self.today, next_run_on=self.today
+        )
+
+    def cash(self, user):
+        return Wallet.objects.get(user=user).cash_balance
+
+    def test_create_pause_resume_and_cancel(self):
+        response = self.client.post('/api/trading/recurring-purchases/', {
+            'product': str(self.bar.id), 'vault': str(self.vault.id), 'amount': '200.00', 'frequency': 'monthly',
+            'start_on': (self.today - timedelta(days=1)).isoformat()
+        })
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/trading/recurring-purchases/', {
+            'product': str(self.bar.id), 'vault': str(self.vault.id), 'amount': '200.00', 'frequency': 'weekly'
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['next_run_on'], self.today.isoformat())
+        self.assertEqual(response.data['metal_symbol'], 'XAU')
+        url = f"/api/trading/recurring-purchases/{response.data['id']}/"
+
+        self.assertEqual(self.client.patch(url, {'frequency': 'monthly'}).status_code, 400)
+        self.assertEqual(self.client.patch(url, {'status': 'paused'}).status_code, 200)
+        RecurringPurchase.objects.update(next_run_on=self.today - timedelta(days=21))
+        response = self.client.patch(url, {'status': 'active'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['next_run_on'], self.today.isoformat())
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(RecurringPurchase.objects.get().status, RecurringPurchase.Status.CANCELLED)
+
+    def test_schedule_keeps_its_anchor_day(self):
+        plan = RecurringPurchase(frequency='monthly', start_on=date(2027, 1, 31))
+        self.assertEqual(recurring.next_run(plan, date(2027, 1, 31)), date(2027, 2, 28))
+        self.assertEqual(recurring.next_run(plan, date(2027, 2, 28)), date(2027, 3, 31))
+        self.assertEqual(recurring.next_run(plan, date(2027, 4, 10)), date(2027, 4, 30))
+        plan = RecurringPurchase(frequency='weekly', start_on=date(2027, 1, 4))
+        self.assertEqual(recurring.next_run(plan, date(2027, 1, 4)), date(2027, 1, 11))
+        self.assertEqual(recurring.next_run(plan, date(2027, 1, 20)), date(2027, 1, 25))
+
+    def test_due_plans_buy_at_one_snapshot_with_failures_isolated(self):
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('6000.00'))
+        other = self.customer('dca-other', cash='100.00')
+        bars = self.plan(self.user, '4500.00')
+        digital = self.plan(self.user, '1000.00', product=self.digital)
+        short = self.plan(other, '2000.00')
+        later = self.plan(self.user, '200.00')
+        RecurringPurchase.objects.filter(pk=later.pk).update(next_run_on=self.today + timedelta(days=1))
+
+        results = recurring.execute_due_plans(batch_size=10)
+        self.assertEqual(results, {'completed': 2, 'failed': 1})
+
+        # Two bars at 2050 each, then 0.5000oz of digital gold for 1000.00
+        bars_run = RecurringPurchaseExecution.objects.get(plan=bars)
+        self.assertEqual((bars_run.quantity, bars_run.total_cost), (2, Decimal('4100.00')))
+        digital_run = RecurringPurchaseExecution.objects.get(plan=digital)
+        self.assertEqual((digital_run.amount_oz, digital_run.total_cost), (Decimal('0.5000'), Decimal('1000.00')))
+        self.assertEqual(self.cash(self.user), Decimal('900.00'))
+
+        failed = RecurringPurchaseExecution.objects.get(plan=short)
+        self.assertEqual(failed.status, RecurringPurchaseExecution.Status.FAILED)
+        self.assertEqual(failed.error, '2000.00 does not cover one 1oz Gold Bar at 2000.00')
+        self.assertEqual(self.cash(other), Decimal('100.00'))
+
+        self.assertEqual(PortfolioItem.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Lot.objects.filter(user=self.user).count(), 2)
+        position = Position.objects.get(user=self.user)
+        self.assertEqual((position.open_oz, position.open_cost), (Decimal('2.5000'), Decimal('5100.00')))
+        for plan in (bars, digital, short):
+            plan.refresh_from_db()
+            self.assertGreater(plan.next_run_on, self.today)
+
+        # A second window the same day has nothing left to run
+        self.assertEqual(recurring.execute_due_plans(), {})
+        self.assertFalse(RecurringPurchaseExecution.objects.filter(plan=later).exists())
+
+    def test_balance_is_checked_across_a_users_plans(self):
+        for _ in range(3):
+            self.plan(self.user, '2100.00')
+        self.assertEqual(recurring.execute_due_plans(), {'completed': 2, 'failed': 1})
+        self.assertEqual(self.cash(self.user), Decimal('900.00'))
+        failed = RecurringPurchaseExecution.objects.get(status=RecurringPurchaseExecution.Status.FAILED)
+        self.assertEqual(failed.error, 'Insufficient funds in your cash balance')
+
+    def test_a_batch_error_only_leaves_the_failing_plan_due(self):
+        other = self.customer('dca-broken')
+        good = self.plan(self.user, '2100.00')
+        broken = self.plan(other, '2100.00')
+        record_buys = lots.record_buys
+
+        def fail_for_broken(buys):
+            if any(transaction.user_id == other.id for transaction, _ in buys):
+                raise RuntimeError('ledger unavailable')
+            return record_buys(buys)
+
+        with patch('trading.recurring.lots.record_buys', side_effect=fail_for_broken):
+            results = recurring.execute_due_plans()
+
+        self.assertEqual(results, {'completed': 1, 'errored': 1})
+        good.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertGreater(good.next_run_on, self.today)
+        self.assertEqual(broken.next_run_on, self.today)
+        self.assertEqual(self.cash(other), Decimal('5000.00'))
+        self.assertFalse(RecurringPurchaseExecution.objects.filter(plan=broken).exists())
+
+    def test_halted_metal_leaves_plans_due(self):
+        plan = self.plan(self.user, '2100.00')
+        platform = PlatformSettings.get_solo()
+        platform.halted_metals = ['XAU']
+        platform.save()
+        clear_local_settings()
+
+        self.assertEqual(recurring.execute_due_plans(), {'skipped': 1})
+        plan.refresh_from_db()
+        self.assertEqual(plan.next_run_on, self.today)
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class QuoteTests(TestCase):
+    def setUp(self):
+        clear_local_settings()
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='quote@test.com', username='quote', password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('10000.00'))
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        self.silver = Metal.objects.create(name='Silver', symbol='XAG', current_price=Decimal('25.00'))
+        self.bar = Product.objects.create(
+            metal=self.gold, name='1oz Gold Bar', manufacturer='PAMP', purity='.9999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('50.00'), product_type=Product.ProductType.BAR
+        )
+        self.coin = Product.objects.create(
+            metal=self.silver, name='Silver Eagle', manufacturer='US Mint', purity='.999',
+            weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('3.00'), product_type=Product.ProductType.COIN
+        )
+        self.vault = Vault.objects.create(
+            name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008')
+        )
+
+    def tearDown(self):
+        clear_local_settings()
+        cache.clear()
+
+    def cash(self):
+        return Wallet.objects.get(user=self.user).cash_balance
+
+    def quote_basket(self, client=None):
+        return (client or self.client).post('/api/trading/trade/quote/', {
+            'side': 'buy', 'delivery_method': 'vault', 'vault_id': str(self.vault.id),
+            'lines': [
+                {'product_id': str(self.bar.id), 'quantity': 2},
+                {'product_id': str(self.coin.id), 'quantity': 10},
+            ],
+        }, format='json')
+
+    def test_basket_quote_is_executed_at_quoted_prices_once(self):
+        response = self.quote_basket()
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], Decimal('4380.00'))
+        self.assertEqual(response.data['fees'], Decimal('130.00'))
+        self.assertEqual([line['total'] for line in response.data['lines']], [Decimal('4100.00'), Decimal('280.00')])
+        token = response.data['token']
+
+        Metal.objects.filter(pk=self.gold.pk).update(current_price=Decimal('2500.00'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse([q['sql'] for q in queries if '"metals"' in q['sql'] or '"products"' in q['sql']])
+
+        self.assertEqual(self.cash(), Decimal('5620.00'))
+        items = PortfolioItem.objects.filter(user=self.user).order_by('weight_oz')
+        self.assertEqual([(item.weight_oz, item.vault_location_id) for item in items], [
+            (Decimal('2.0000'), self.vault.id), (Decimal('10.0000'), self.vault.id)
+        ])
+        self.assertEqual(
+            Transaction.objects.get(user=self.user, metal=self.gold).price_per_oz, Decimal('2000.00')
+        )
+        self.assertEqual(Position.objects.get(user=self.user, metal=self.gold).open_cost, Decimal('4100.00'))
+
+        response = self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.cash(), Decimal('5620.00'))
+
+    def test_single_product_quote_and_sell_quote(self):
+        response = self.client.post('/api/trading/trade/quote/', {
+            'product_id': str(self.bar.id), 'quantity': 1, 'delivery_method': 'vault', 'vault_id': str(self.vault.id)
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], Decimal('2050.00'))
+        response = self.client.post('/api/trading/trade/buy/', {'quote': response.data['token']}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        item = PortfolioItem.objects.get(user=self.user)
+
+        response = self.client.post('/api/trading/trade/quote/', {
+            'side': 'sell', 'lines': [
+                {'portfolio_item_id': str(item.id), 'amount_oz': '0.5000'},
+                {'portfolio_item_id': str(item.id), 'amount_oz': '0.5000'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], Decimal('1990.00'))
+        token = response.data['token']
+
+        self.assertEqual(self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json').status_code, 400)
+        response = self.client.post('/api/trading/trade/sell/', {'quote': token}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['proceeds'], 1990.0)
+        self.assertFalse(PortfolioItem.objects.filter(pk=item.pk).exists())
+        self.assertEqual(self.cash(), Decimal('9940.00'))
+        self.assertEqual(Position.objects.get(user=self.user, metal=self.gold).open_oz, Decimal('0'))
+
+    def test_quote_cannot_be_used_by_another_user_or_after_expiry(self):
+        token = self.quote_basket().data['token']
+        other = User.objects.create_user(
+            email='other@test.com', username='other', password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        self.assertEqual(other_client.post('/api/trading/trade/buy/', {'quote': token}, format='json').status_code, 400)
+        self.assertEqual(
+            self.client.post('/api/trading/trade/buy/', {'quote': token + 'x'}, format='json').status_code, 400
+        )
+
+        with override_settings(QUOTE_TTL_SECONDS=-1):
+            response = self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.cash(), Decimal('10000.00'))
+
+    def test_failed_execution_keeps_quote_until_it_succeeds(self):
+        token = self.quote_basket().data['token']
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('100.00'))
+        self.assertEqual(self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json').status_code, 400)
+
+        platform = PlatformSettings.get_solo(use_cache=False)
+        platform.halted_metals = ['XAG']
+        platform.save()
+        clear_local_settings()
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('5000.00'))
+        self.assertEqual(self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json').status_code, 503)
+
+        platform.halted_metals = []
+        platform.save()
+        clear_local_settings()
+        self.assertEqual(self.client.post('/api/trading/trade/buy/', {'quote': token}, format='json').status_code, 201)
+        self.assertEqual(self.cash(), Decimal('620.00'))
+
+    def test_quote_validation(self):
+        response = self.client.post('/api/trading/trade/quote/', {
+            'side': 'buy', 'delivery_method': 'vault', 'vault_id': str(self.vault.id),
+            'lines': [{'product_id': str(uuid.uuid4()), 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/trading/trade/quote/', {'side': 'short', 'lines': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/trading/trade/quote/', {
+            'side': 'buy', 'delivery_method': 'vault', 'vault_id': str(self.vault.id), 'lines': []
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BasketCheckoutTests(TestCase):
+    def setUp(self):
+        clear_local_settings()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='basket@test.com', username='basket', password='testpass123', kyc_status=User.KYCStatus.VERIFIED
+        )
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('100000.00'))
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        self.gold = Metal.objects.create(name='Gold', symbol='XAU', current_price=Decimal('2000.00'))
+        self.silver = Metal.objects.create(name='Silver', symbol='XAG', current_price=Decimal('25.00'))
+        self.products = [
+            Product.objects.create(
+                metal=self.silver if n % 2 else self.gold, name=f'Product {n}', manufacturer='PAMP', purity='.999',
+                weight_oz=Decimal('1.0000'), premium_per_oz=Decimal('2.00'), product_type=Product.ProductType.COIN
+            )
+            for n in range(20)
+        ]
+        self.vault = Vault.objects.create(
+            name='London', city='London', country='UK', storage_fee_percent=Decimal('0.0008')
+        )
+
+    def tearDown(self):
+        clear_local_settings()
+
+    def checkout(self, products, quantity=1):
+        return self.client.post('/api/trading/trade/basket/', {
+            'delivery_method': 'vault', 'vault_id': str(self.vault.id),
+            'lines': [{'product_id': str(product.id), 'quantity': quantity} for product in products],
+        }, format='json')
+
+    def test_checkout_buys_every_line_in_one_transaction(self):
+        response = self.checkout(self.products[:2], quantity=3)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], Decimal('6087.00'))
+        self.assertEqual(response.data['fees'], Decimal('12.00'))
+        self.assertEqual(Wallet.objects.get(user=self.user).cash_balance, Decimal('93913.00'))
+        self.assertEqual(PortfolioItem.objects.filter(user=self.user, vault_location=self.vault).count(), 2)
+        self.assertEqual(Transaction.objects.filter(user=self.user, transaction_type='buy').count(), 2)
+        self.assertEqual(Lot.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Position.objects.get(user=self.user, metal=self.silver).open_oz, Decimal('3.0000'))
+
+    def test_checkout_query_count_does_not_grow_with_lines(self):
+        self.checkout(self.products[:1])
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.checkout(self.products[:2]).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.checkout(self.products).status_code, 201)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(PortfolioItem.objects.filter(user=self.user).count(), 23)
+
+    def test_failed_checkout_buys_nothing(self):
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        self.assertEqual(self.checkout(self.products[:3]).status_code, 404)
+
+        Wallet.objects.filter(user=self.user).update(cash_balance=Decimal('2000.00'))
+        response = self.checkout([self.products[0], self.products[2]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Wallet.objects.get(user=self.user).cash_balance, Decimal('2000.00'))
+        self.assertFalse(PortfolioItem.objects.filter(user=self.user).exists())
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
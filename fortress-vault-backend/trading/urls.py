@@ -4,7 +4,7 @@ Trading app URLs
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MetalViewSet, ProductViewSet, PortfolioViewSet, TransactionViewSet, TradingViewSet, ShipmentViewSet, PlatformSettingsPublicView, MetalPricesPublicView
+from .views import MetalViewSet, ProductViewSet, PortfolioViewSet, TransactionViewSet, TradingViewSet, ShipmentViewSet, PriceAlertViewSet, LimitOrderViewSet, RecurringPurchaseViewSet, PlatformSettingsPublicView, MetalPricesPublicView, metal_prices_stream
 
 router = DefaultRouter()
 router.register(r'metals', MetalViewSet, basename='metal')
@@ -13,9 +13,13 @@ router.register(r'portfolio', PortfolioViewSet, basename='portfolio')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'trade', TradingViewSet, basename='trade')
 router.register(r'shipments', ShipmentViewSet, basename='shipment')
+router.register(r'alerts', PriceAlertViewSet, basename='price-alert')
+router.register(r'orders', LimitOrderViewSet, basename='limit-order')
+router.register(r'recurring-purchases', RecurringPurchaseViewSet, basename='recurring-purchase')
 
 urlpatterns = [
     path('platform/settings/', PlatformSettingsPublicView.as_view({'get': 'retrieve'}), name='platform-settings-public'),
     path('metal-prices/', MetalPricesPublicView.as_view({'get': 'retrieve'}), name='metal-prices-public'),
+    path('metal-prices/stream/', metal_prices_stream, name='metal-prices-stream'),
     path('', include(router.urls)),
 ]
@@ -6,38 +6,58 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db import transaction as db_transaction
 from decimal import Decimal, InvalidOperation
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 import uuid
 
 from django.core.cache import cache
 
-from .models import Metal, Product, PortfolioItem, Transaction, Shipment, ShipmentEvent, ShipmentWorkflowStage
+from .models import (
+    LimitOrder, Metal, Product, PortfolioItem, PriceAlert, RecurringPurchase, Transaction, Shipment, ShipmentEvent,
+    ShipmentWorkflowStage
+)
 from vaults.models import Vault
 from users.models import Wallet
 from admin_api.models import PlatformSettings
+from utils.compiled_serializers import CompiledListMixin
+from utils.exports import ExportMixin
+from utils.field_selection import FieldSelectionMixin
+from utils.response_cache import CachedResponseMixin
+from . import lots, order_book, price_alerts, quotes, recurring, snapshots
+from .price_stream import stream_price_frames
+from .portfolio_push import build_dashboard_payload, portfolio_items_queryset, request_portfolio_push
 from .serializers import (
     MetalSerializer, ProductSerializer, PortfolioItemSerializer,
     TransactionSerializer, BuyMetalSerializer, SellMetalSerializer, ConvertMetalSerializer,
-    DeliveryRequestSerializer, ShipmentSerializer
+    BuyQuoteSerializer, SellQuoteSerializer,
+    DeliveryRequestSerializer, ShipmentSerializer, PriceAlertSerializer, LimitOrderSerializer,
+    RecurringPurchaseSerializer, RecurringPurchaseExecutionSerializer,
+    PortfolioItemReadSerializer, TransactionReadSerializer, ShipmentReadSerializer
 )
 
 
-class MetalViewSet(viewsets.ReadOnlyModelViewSet):
+class MetalViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Metal viewset - read only"""
     
+    cache_scopes = ('metals',)
     queryset = Metal.objects.all()
     serializer_class = MetalSerializer
     permission_classes = [AllowAny]
 
 
-class ShipmentViewSet(viewsets.ReadOnlyModelViewSet):
+class ShipmentViewSet(FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """Shipment viewset for users"""
 
     serializer_class = ShipmentSerializer
+    compiled_serializer_class = ShipmentReadSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -108,10 +128,12 @@ class ShipmentViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'message': 'Stage action submitted successfully', 'shipment': ShipmentSerializer(shipment).data})
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CachedResponseMixin, FieldSelectionMixin, viewsets.ReadOnlyModelViewSet):
     """Product viewset - read only"""
     
-    queryset = Product.objects.filter(is_active=True)
+    # Products embed their metal (including the current price)
+    cache_scopes = ('products', 'metals')
+    queryset = Product.objects.filter(is_active=True).select_related('metal')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
@@ -122,11 +144,16 @@ class PlatformSettingsPublicView(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def retrieve(self, request):
         obj = PlatformSettings.get_solo()
-        return Response({'metals_buying_enabled': obj.metals_buying_enabled, 'metals_selling_enabled': obj.metals_selling_enabled})
+        return Response({
+            'metals_buying_enabled': obj.metals_buying_enabled,
+            'metals_selling_enabled': obj.metals_selling_enabled,
+            'halted_metals': obj.halted_metals,
+        })
 
 
-class MetalPricesPublicView(viewsets.ViewSet):
+class MetalPricesPublicView(CachedResponseMixin, viewsets.ViewSet):
     permission_classes = [AllowAny]
+    cache_scopes = ('metals',)
 
     @action(detail=False, methods=['get'])
     def retrieve(self, request):
@@ -165,12 +192,37 @@ class MetalPricesPublicView(viewsets.ViewSet):
         })
 
 
-class PortfolioViewSet(viewsets.ReadOnlyModelViewSet):
+async def metal_prices_stream(request):
+    """Server-Sent Events feed of the ws/prices/ price updates, for clients that can't use WebSockets"""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI Django drains an async stream to a list before sending
+        # anything, so the client gets no bytes and the worker is held
+        # forever. nginx routes this path to the daphne service instead.
+        return JsonResponse(
+            {'error': 'The price stream is only served by the ASGI (daphne) service.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    response = StreamingHttpResponse(stream_price_frames(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class PortfolioViewSet(ExportMixin, FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """Portfolio viewset"""
     
     queryset = PortfolioItem.objects.all()
     serializer_class = PortfolioItemSerializer
+    compiled_serializer_class = PortfolioItemReadSerializer
     permission_classes = [IsAuthenticated]
+    export_filename = 'holdings'
+    export_columns = [
+        ('id', 'id'), ('metal_symbol', 'metal__symbol'), ('product', 'product__name'),
+        ('weight_oz', 'weight_oz'), ('quantity', 'quantity'), ('vault_location_name', 'vault_location__name'),
+        ('serial_numbers', 'serial_numbers'), ('purchase_date', 'purchase_date'),
+        ('purchase_price', 'purchase_price'), ('status', 'status'),
+    ]
     
     def get_queryset(self):
         """Users can only see their own portfolio"""
@@ -181,51 +233,208 @@ class PortfolioViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get dashboard data"""
-        user = request.user
-        portfolio_items = self.get_queryset()
-        
-        # Calculate total portfolio value
-        total_value = sum(
-            float(item.weight_oz * item.metal.current_price)
-            for item in portfolio_items
-        )
-        
-        # Get holdings by metal
-        holdings = {}
-        for item in portfolio_items:
-            metal_symbol = item.metal.symbol
-            if metal_symbol not in holdings:
-                holdings[metal_symbol] = {
-                    'metal': MetalSerializer(item.metal).data,
-                    'total_oz': 0,
-                    'total_value': 0
-                }
-            holdings[metal_symbol]['total_oz'] += float(item.weight_oz)
-            holdings[metal_symbol]['total_value'] += float(item.weight_oz * item.metal.current_price)
-        
-        # Safely get cash balance
-        wallet = getattr(user, 'wallet', None)
-        cash_balance = float(wallet.cash_balance) if wallet else 0.0
-        
-        return Response({
-            'total_value': total_value,
-            'cash_balance': cash_balance,
-            'holdings': list(holdings.values()),
-            'portfolio_items': PortfolioItemSerializer(portfolio_items, many=True).data
-        })
+        portfolio_items = portfolio_items_queryset().filter(user=request.user)
+        return Response(build_dashboard_payload(request.user, portfolio_items=list(portfolio_items)))
+    
+    @action(detail=False, methods=['get'])
+    def pnl(self, request):
+        """Realized and unrealized P&L per metal (FIFO lots, current prices)"""
+        return Response(lots.portfolio_pnl(request.user))
+    
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Daily portfolio values and time-weighted return; ?date_from=&date_to= (default: the last year)"""
+        date_to = timezone.localdate()
+        date_from = date_to - timedelta(days=365)
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                return Response({'error': f'{param} must be a valid date, YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+            if param == 'date_from':
+                date_from = parsed
+            else:
+                date_to = parsed
+        if date_from > date_to:
+            return Response({'error': 'date_from must not be after date_to'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(snapshots.portfolio_history(request.user, date_from, date_to))
 
 
 
-class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class TransactionViewSet(ExportMixin, FieldSelectionMixin, CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """Transaction viewset"""
     
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    compiled_serializer_class = TransactionReadSerializer
     permission_classes = [IsAuthenticated]
+    export_filename = 'statement'
+    export_columns = [
+        ('id', 'id'), ('created_at', 'created_at'), ('transaction_type', 'transaction_type'),
+        ('metal_symbol', 'metal__symbol'), ('amount_oz', 'amount_oz'), ('price_per_oz', 'price_per_oz'),
+        ('total_value', 'total_value'), ('fees', 'fees'), ('status', 'status'),
+    ]
     
     def get_queryset(self):
         """Users can only see their own transactions"""
-        return Transaction.objects.filter(user=self.request.user).select_related('metal')
+        queryset = Transaction.objects.filter(user=self.request.user).select_related('metal')
+        
+        # Statement period and type (list and export); both dates are inclusive days
+        type_filter = self.request.query_params.get('type')
+        if type_filter:
+            if type_filter not in Transaction.TransactionType.values:
+                raise ValidationError({'type': f'Must be one of {", ".join(Transaction.TransactionType.values)}.'})
+            queryset = queryset.filter(transaction_type=type_filter)
+        # Half-open datetime bounds on the bare column, so the created_at index and
+        # partition pruning still apply: [start of date_from, start of the day after date_to)
+        for param, lookup, offset in (('date_from', 'created_at__gte', 0), ('date_to', 'created_at__lt', 1)):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise ValidationError({param: 'Must be a valid date, YYYY-MM-DD.'})
+            bound = timezone.make_aware(datetime.combine(parsed + timedelta(days=offset), time.min))
+            queryset = queryset.filter(**{lookup: bound})
+        
+        return queryset
+
+
+class PriceAlertViewSet(viewsets.ModelViewSet):
+    """Price alert viewset; deleting an alert cancels it"""
+    
+    queryset = PriceAlert.objects.all()
+    serializer_class = PriceAlertSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+    
+    def get_queryset(self):
+        """Users can only see their own alerts"""
+        queryset = PriceAlert.objects.filter(user=self.request.user).select_related('metal')
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+    
+    def perform_create(self, serializer):
+        limit = getattr(settings, 'PRICE_ALERT_MAX_PER_USER', 50)
+        active = PriceAlert.objects.filter(user=self.request.user, status=PriceAlert.Status.ACTIVE).count()
+        if active >= limit:
+            raise ValidationError({'error': f'At most {limit} active price alerts per user'})
+        alert = serializer.save(user=self.request.user)
+        price_alerts.index_alert(alert)
+    
+    def perform_destroy(self, instance):
+        if instance.status != PriceAlert.Status.ACTIVE:
+            return
+        instance.status = PriceAlert.Status.CANCELLED
+        instance.save(update_fields=['status'])
+        price_alerts.unindex_alert(instance)
+
+
+class LimitOrderViewSet(viewsets.ModelViewSet):
+    """Limit order viewset; deleting an open order cancels it and refunds its reservation"""
+    
+    queryset = LimitOrder.objects.all()
+    serializer_class = LimitOrderSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+    
+    def get_queryset(self):
+        """Users can only see their own orders"""
+        queryset = LimitOrder.objects.filter(user=self.request.user).select_related('metal')
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+    
+    def perform_create(self, serializer):
+        user = self.request.user
+        data = serializer.validated_data
+        platform = PlatformSettings.get_solo()
+        if data['side'] == LimitOrder.Side.BUY:
+            if not platform.metals_buying_enabled:
+                raise ValidationError({
+                    'error': 'Purchasing is temporarily unavailable. Please contact an administrator.'
+                })
+            if user.kyc_status != 'verified':
+                raise ValidationError({'error': 'KYC verification required before purchasing'})
+        elif not platform.metals_selling_enabled:
+            raise ValidationError({
+                'error': 'Selling is temporarily unavailable. Please try again later or contact support.'
+            })
+        if platform.is_metal_halted(data['metal'].symbol):
+            raise ValidationError({'error': f"Trading in {data['metal'].name} is temporarily halted."})
+
+        limit = getattr(settings, 'LIMIT_ORDER_MAX_PER_USER', 100)
+        open_orders = LimitOrder.objects.filter(user=user, status=LimitOrder.Status.OPEN).count()
+        if open_orders >= limit:
+            raise ValidationError({'error': f'At most {limit} open limit orders per user'})
+        try:
+            serializer.instance = order_book.place_order(LimitOrder(user=user, **data))
+        except order_book.OrderError as e:
+            raise ValidationError({'error': str(e)})
+    
+    def perform_destroy(self, instance):
+        order_book.cancel_order(instance)
+
+
+class RecurringPurchaseViewSet(viewsets.ModelViewSet):
+    """Recurring purchase plans; deleting a plan cancels it"""
+    
+    queryset = RecurringPurchase.objects.all()
+    serializer_class = RecurringPurchaseSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    
+    def get_queryset(self):
+        """Users can only see their own plans"""
+        queryset = RecurringPurchase.objects.filter(user=self.request.user).select_related('product__metal')
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+    
+    def perform_create(self, serializer):
+        limit = getattr(settings, 'RECURRING_PURCHASE_MAX_PER_USER', 20)
+        active = RecurringPurchase.objects.filter(user=self.request.user).exclude(
+            status=RecurringPurchase.Status.CANCELLED
+        ).count()
+        if active >= limit:
+            raise ValidationError({'error': f'At most {limit} recurring purchases per user'})
+        serializer.save(user=self.request.user, next_run_on=serializer.validated_data['start_on'])
+    
+    def perform_update(self, serializer):
+        plan = serializer.instance
+        if plan.status == RecurringPurchase.Status.CANCELLED:
+            raise ValidationError({'error': 'Cancelled plans cannot be changed'})
+        extra = {}
+        if plan.status == RecurringPurchase.Status.PAUSED and \
+                serializer.validated_data.get('status') == RecurringPurchase.Status.ACTIVE:
+            # Resume on the next scheduled day, not with the days missed while paused
+            extra['next_run_on'] = recurring.next_run(plan, timezone.localdate() - timedelta(days=1))
+        serializer.save(**extra)
+    
+    def perform_destroy(self, instance):
+        instance.status = RecurringPurchase.Status.CANCELLED
+        instance.save(update_fields=['status'])
+    
+    @action(detail=True, methods=['get'])
+    def executions(self, request, pk=None):
+        """The plan's runs, most recent first"""
+        plan = self.get_object()
+        page = self.paginate_queryset(plan.executions.all())
+        if page is not None:
+            return self.get_paginated_response(RecurringPurchaseExecutionSerializer(page, many=True).data)
+        return Response(RecurringPurchaseExecutionSerializer(plan.executions.all(), many=True).data)
 
 
 class TradingViewSet(viewsets.ViewSet):
@@ -243,6 +452,9 @@ class TradingViewSet(viewsets.ViewSet):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
+        if 'quote' in request.data:
+            return self._execute_quote(request, 'buy', settings_obj)
+
         serializer = BuyMetalSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -260,6 +472,12 @@ class TradingViewSet(viewsets.ViewSet):
         product = get_object_or_404(Product, id=data['product_id'], is_active=True)
         quantity = data['quantity']
         
+        if settings_obj.is_metal_halted(product.metal.symbol):
+            return Response(
+                {'error': f'Trading in {product.metal.name} is temporarily halted.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
         # Calculate costs
         spot_price = product.metal.current_price
         total_weight = product.weight_oz * quantity
@@ -274,18 +492,19 @@ class TradingViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check wallet balance
-        if user.wallet.cash_balance < total_cost:
-            return Response(
-                {'error': 'Insufficient funds in your cash balance. Please deposit funds before purchasing.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Process purchase
         with db_transaction.atomic():
+            # Lock the wallet so a concurrent fee or fill can't be overwritten by a stale balance
+            wallet = Wallet.objects.select_for_update().get(user=user)
+            if wallet.cash_balance < total_cost:
+                return Response(
+                    {'error': 'Insufficient funds in your cash balance. Please deposit funds before purchasing.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
             # Deduct from wallet
-            user.wallet.cash_balance -= Decimal(str(total_cost))
-            user.wallet.save()
+            wallet.cash_balance -= Decimal(str(total_cost))
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
             
             # Create portfolio item
             vault_location = None
@@ -317,6 +536,9 @@ class TradingViewSet(viewsets.ViewSet):
                 fees=premium_cost,
                 status=Transaction.Status.COMPLETED
             )
+            lots.record_buy(transaction, portfolio_item)
+            
+            request_portfolio_push(user.id)
         
         return Response({
             'message': 'Purchase successful',
@@ -334,6 +556,9 @@ class TradingViewSet(viewsets.ViewSet):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
+        if 'quote' in request.data:
+            return self._execute_quote(request, 'sell', settings_obj)
+
         serializer = SellMetalSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -350,6 +575,12 @@ class TradingViewSet(viewsets.ViewSet):
         
         amount_oz = data['amount_oz']
         
+        if settings_obj.is_metal_halted(portfolio_item.metal.symbol):
+            return Response(
+                {'error': f'Trading in {portfolio_item.metal.name} is temporarily halted.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
         # Validate amount
         if amount_oz > portfolio_item.weight_oz:
             return Response(
@@ -366,8 +597,9 @@ class TradingViewSet(viewsets.ViewSet):
         # Process sale
         with db_transaction.atomic():
             # Add to wallet
-            user.wallet.cash_balance += net_proceeds
-            user.wallet.save()
+            wallet = Wallet.objects.select_for_update().get(user=user)
+            wallet.cash_balance += net_proceeds
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
             
             # Update portfolio item
             portfolio_item.weight_oz -= amount_oz
@@ -387,6 +619,9 @@ class TradingViewSet(viewsets.ViewSet):
                 fees=fee,
                 status=Transaction.Status.COMPLETED
             )
+            lots.record_sale(transaction, net_proceeds)
+            
+            request_portfolio_push(user.id)
         
         return Response({
             'message': 'Sale successful',
@@ -394,6 +629,152 @@ class TradingViewSet(viewsets.ViewSet):
             'proceeds': float(net_proceeds)
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """Price a buy or sell of one product or holding, or of a basket of lines, and hold it briefly"""
+        side = request.data.get('side', 'buy')
+        if side not in ('buy', 'sell'):
+            raise ValidationError({'side': 'Must be "buy" or "sell".'})
+
+        settings_obj = PlatformSettings.get_solo()
+        if side == 'buy' and not settings_obj.metals_buying_enabled:
+            return Response(
+                {'error': 'Purchasing is temporarily unavailable. Please contact an administrator.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        if side == 'sell' and not settings_obj.metals_selling_enabled:
+            return Response(
+                {'error': 'Selling is temporarily unavailable. Please try again later or contact support.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        user = request.user
+        basket = 'lines' in request.data
+        if side == 'buy':
+            serializer = (BuyQuoteSerializer if basket else BuyMetalSerializer)(data=request.data)
+        else:
+            serializer = (SellQuoteSerializer if basket else SellMetalSerializer)(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        lines = data['lines'] if basket else [data]
+
+        try:
+            if side == 'buy':
+                if user.kyc_status != 'verified':
+                    return Response(
+                        {'error': 'KYC verification required before purchasing'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                if data['delivery_method'] == 'vault':
+                    get_object_or_404(Vault, id=data['vault_id'])
+                lines = quotes.price_buy_lines(lines)
+            else:
+                lines = quotes.price_sell_lines(user, lines)
+        except quotes.QuoteError as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+
+        halted = self._halted_response(settings_obj, lines)
+        if halted:
+            return halted
+
+        quote = quotes.create_quote(
+            user, side, lines, delivery_method=data.get('delivery_method'), vault_id=data.get('vault_id')
+        )
+        return Response(quote, status=status.HTTP_201_CREATED)
+
+    def _halted_response(self, settings_obj, lines):
+        for line in lines:
+            if settings_obj.is_metal_halted(line['metal_symbol']):
+                return Response(
+                    {'error': f"Trading in {line['metal_name']} is temporarily halted."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+        return None
+
+    def _execute_quote(self, request, side, settings_obj):
+        """Buy or sell at the prices of a quote from the quote action"""
+        user = request.user
+        if side == 'buy' and user.kyc_status != 'verified':
+            return Response(
+                {'error': 'KYC verification required before purchasing'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            quote = quotes.load_quote(user, str(request.data['quote']), side)
+            halted = self._halted_response(settings_obj, quote['lines'])
+            if halted:
+                return halted
+            if side == 'buy':
+                transactions, items = quotes.execute_buy(user, quote)
+            else:
+                transactions, proceeds = quotes.execute_sell(user, quote)
+        except quotes.QuoteError as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+
+        if side == 'buy':
+            return self._purchase_response(quote, transactions, items)
+        # Built from the quote: serializing the new rows would read their metals and products again
+        return Response({
+            'message': 'Sale successful',
+            'quote_id': quote['quote_id'],
+            'proceeds': float(proceeds),
+            'fees': quote['fees'],
+            'lines': [
+                {**line, 'transaction_id': str(transaction.id)}
+                for line, transaction in zip(quote['lines'], transactions)
+            ],
+        }, status=status.HTTP_200_OK)
+
+    def _purchase_response(self, quote, transactions, items):
+        # Built from the quote: serializing the new rows would read their metals and products again
+        return Response({
+            'message': 'Purchase successful',
+            'quote_id': quote['quote_id'],
+            'total': quote['total'],
+            'fees': quote['fees'],
+            'lines': [
+                {**line, 'transaction_id': str(transaction.id), 'portfolio_item_id': str(item.id)}
+                for line, transaction, item in zip(quote['lines'], transactions, items)
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def basket(self, request):
+        """Buy several products at current prices in one transaction"""
+        settings_obj = PlatformSettings.get_solo()
+        if not settings_obj.metals_buying_enabled:
+            return Response(
+                {'error': 'Purchasing is temporarily unavailable. Please contact an administrator.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        serializer = BuyQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        data = serializer.validated_data
+
+        if user.kyc_status != 'verified':
+            return Response(
+                {'error': 'KYC verification required before purchasing'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if data['delivery_method'] == 'vault':
+            get_object_or_404(Vault, id=data['vault_id'])
+
+        try:
+            lines = quotes.price_buy_lines(data['lines'])
+            halted = self._halted_response(settings_obj, lines)
+            if halted:
+                return halted
+            quote = quotes.build_quote(
+                user, 'buy', lines, delivery_method=data['delivery_method'], vault_id=data.get('vault_id')
+            )
+            transactions, items = quotes.execute_buy(user, quote, claim=False)
+        except quotes.QuoteError as exc:
+            return Response({'error': str(exc)}, status=exc.status_code)
+        return self._purchase_response(quote, transactions, items)
+
     @action(detail=False, methods=['post'])
     def convert(self, request):
         """Convert metals to cash"""
@@ -413,6 +794,12 @@ class TradingViewSet(viewsets.ViewSet):
         
         amount_oz = data['amount_oz']
         
+        if PlatformSettings.get_solo().is_metal_halted(portfolio_item.metal.symbol):
+            return Response(
+                {'error': f'Trading in {portfolio_item.metal.name} is temporarily halted.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
         # Validate amount
         if amount_oz > portfolio_item.weight_oz:
             return Response(
@@ -429,8 +816,9 @@ class TradingViewSet(viewsets.ViewSet):
         # Process conversion
         with db_transaction.atomic():
             # Add to wallet
-            user.wallet.cash_balance += net_proceeds
-            user.wallet.save()
+            wallet = Wallet.objects.select_for_update().get(user=user)
+            wallet.cash_balance += net_proceeds
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
             
             # Update portfolio item
             portfolio_item.weight_oz -= amount_oz
@@ -450,6 +838,9 @@ class TradingViewSet(viewsets.ViewSet):
                 fees=fee,
                 status=Transaction.Status.COMPLETED
             )
+            lots.record_sale(transaction, net_proceeds)
+            
+            request_portfolio_push(user.id)
         
         return Response({
             'message': 'Conversion successful',
@@ -475,11 +866,9 @@ class TradingViewSet(viewsets.ViewSet):
         
         with db_transaction.atomic():
             # Add to wallet
-            if not hasattr(user, 'wallet'):
-                Wallet.objects.create(user=user)
-            
-            user.wallet.cash_balance += amount_decimal
-            user.wallet.save()
+            wallet, _ = Wallet.objects.select_for_update().get_or_create(user=user)
+            wallet.cash_balance += amount_decimal
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
             
             # Create transaction
             transaction = Transaction.objects.create(
@@ -489,10 +878,12 @@ class TradingViewSet(viewsets.ViewSet):
                 status=Transaction.Status.COMPLETED
             )
             
+            request_portfolio_push(user.id)
+            
         return Response({
             'message': 'Deposit successful',
             'transaction': TransactionSerializer(transaction).data,
-            'new_balance': float(user.wallet.cash_balance)
+            'new_balance': float(wallet.cash_balance)
         }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
@@ -543,14 +934,15 @@ class TradingViewSet(viewsets.ViewSet):
             
             # Note: In a real system we would deduct these fees from the wallet, 
             # but for now we'll just record them in the transaction.
-            if user.wallet.cash_balance < total_fees:
+            wallet = Wallet.objects.select_for_update().get(user=user)
+            if wallet.cash_balance < total_fees:
                  return Response(
                     {'error': f'Insufficient funds to cover delivery fees (${total_fees:,.2f})'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            user.wallet.cash_balance -= total_fees
-            user.wallet.save()
+            wallet.cash_balance -= total_fees
+            wallet.save(update_fields=['cash_balance', 'last_updated'])
 
             # Create transaction
             transaction = Transaction.objects.create(
@@ -584,6 +976,8 @@ class TradingViewSet(viewsets.ViewSet):
                 location="Main Vault"
             )
             
+            request_portfolio_push(user.id)
+            
         return Response({
             'message': 'Delivery request submitted successfully',
             'transaction': TransactionSerializer(transaction).data,
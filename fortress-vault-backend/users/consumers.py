@@ -2,14 +2,17 @@
 WebSocket consumers for notifications and support
 """
 
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 
+from utils.websocket import BackpressureMixin
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+
+def notification_group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+class NotificationConsumer(BackpressureMixin, AsyncWebsocketConsumer):
     """Real-time notifications consumer"""
     
     async def connect(self):
@@ -20,7 +23,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        self.room_group_name = f'notifications_{self.user.id}'
+        self.room_group_name = notification_group_name(self.user.id)
         
         # Join room group
         await self.channel_layer.group_add(
@@ -40,13 +43,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     
     async def notification(self, event):
         """Receive notification from room group"""
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'notification',
             'data': event['data']
-        }))
+        })
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(BackpressureMixin, AsyncWebsocketConsumer):
     """Realtime support chat consumer."""
 
     async def connect(self):
@@ -71,10 +74,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.queue_send({
             'type': 'chat_message',
             'message': event['message']
-        }))
+        })
 
     @database_sync_to_async
     def verify_thread_access(self):
@@ -87,15 +90,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
 
 def broadcast_chat_message(thread_id, payload):
-    channel_layer = get_channel_layer()
-    try:
-        async_to_sync(channel_layer.group_send)(
-            f'chat_{thread_id}',
-            {
-                'type': 'chat_message',
-                'message': payload,
-            }
-        )
-    except Exception:
-        # Non-fatal in environments where Redis/Channels are unavailable.
-        return
+    """Queue a chat message for the thread's sockets; sent by the outbox relay after commit"""
+    from admin_api.outbox import enqueue_group_send
+
+    enqueue_group_send(
+        f'chat_{thread_id}',
+        {
+            'type': 'chat_message',
+            'message': payload,
+        }
+    )
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
+from django.db import transaction as db_transaction
 from .models import User, Address, ChatThread, ChatMessage
 from .consumers import broadcast_chat_message
 from .serializers import (
@@ -226,14 +227,15 @@ class ChatViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
 
         thread = self._get_or_create_thread(request.user)
-        message = ChatMessage.objects.create(
-            thread=thread,
-            sender=request.user,
-            body=serializer.validated_data['body'].strip()
-        )
-        thread.save(update_fields=['updated_at'])
+        with db_transaction.atomic():
+            message = ChatMessage.objects.create(
+                thread=thread,
+                sender=request.user,
+                body=serializer.validated_data['body'].strip()
+            )
+            thread.save(update_fields=['updated_at'])
 
-        message_payload = ChatMessageSerializer(message).data
-        broadcast_chat_message(thread.id, message_payload)
+            message_payload = ChatMessageSerializer(message).data
+            broadcast_chat_message(thread.id, message_payload)
 
         return Response({'message': 'Message sent', 'data': message_payload}, status=status.HTTP_201_CREATED)
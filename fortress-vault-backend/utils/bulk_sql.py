@@ -0,0 +1,70 @@
+"""
+Row-by-row updates in one statement
+
+QuerySet.bulk_update() writes one CASE WHEN per field with a branch per
+row, which Django takes longer to compile than the database takes to run
+once a batch reaches the thousands. update_from_values() sends the rows as
+a VALUES list instead and joins it to the table:
+
+    UPDATE wallets SET cash_balance = wallets.cash_balance + v.column2, last_updated = %s
+    FROM (VALUES (%s, %s), (%s, %s), ...) AS v
+    WHERE wallets.user_id = v.column1
+
+Fields can be assigned from the row or added to the current value, so
+concurrent increments (wallet credits, position totals) need no read and
+no row locks beyond the UPDATE's own. Values go through each field's
+get_db_prep_save(); on PostgreSQL they are also cast to the column type,
+since VALUES columns are otherwise typed as text. UPDATE ... FROM needs
+PostgreSQL or SQLite 3.33+.
+"""
+
+from django.db import connection
+
+
+def _placeholder(field):
+    if connection.vendor == 'postgresql':
+        return f'CAST(%s AS {field.db_type(connection)})'
+    return '%s'
+
+
+def update_from_values(model, keys, rows, assign=(), add=(), constants=None, batch_size=1000):
+    """
+    Update model rows from [(key values..., assigned values..., added
+    values...)], matched on the key fields. constants are set on every
+    matched row. Returns the number of rows updated.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    opts = model._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    keys = [opts.get_field(name) for name in ([keys] if isinstance(keys, str) else keys)]
+    assign = [opts.get_field(name) for name in assign]
+    add = [opts.get_field(name) for name in add]
+    fields = keys + assign + add
+    constants = {opts.get_field(name): value for name, value in (constants or {}).items()}
+
+    columns = {field: f'v.column{position}' for position, field in enumerate(fields, start=1)}
+    sets = [f'{quote(field.column)} = {columns[field]}' for field in assign]
+    sets += [f'{quote(field.column)} = {table}.{quote(field.column)} + {columns[field]}' for field in add]
+    sets += [f'{quote(field.column)} = %s' for field in constants]
+    where = ' AND '.join(f'{table}.{quote(field.column)} = {columns[field]}' for field in keys)
+    row_sql = '(' + ', '.join(_placeholder(field) for field in fields) + ')'
+    constant_params = [field.get_db_prep_save(value, connection) for field, value in constants.items()]
+
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = list(constant_params)
+            for row in batch:
+                params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, row))
+            cursor.execute(
+                f'UPDATE {table} SET {", ".join(sets)} '
+                f'FROM (VALUES {", ".join([row_sql] * len(batch))}) AS v '
+                f'WHERE {where}',
+                params,
+            )
+            updated += cursor.rowcount
+    return updated
@@ -0,0 +1,36 @@
+"""
+Cache backends that count hits and misses for utils.metrics
+"""
+
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+
+from .metrics import CACHE_GETS
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            CACHE_GETS.inc(result='miss')
+            return default
+        CACHE_GETS.inc(result='hit')
+        return value
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+    # django-redis fetches get_many() in one MGET; the base class loops over get()
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        found = super().get_many(keys, *args, **kwargs)
+        if found:
+            CACHE_GETS.inc(len(found), result='hit')
+        if len(keys) > len(found):
+            CACHE_GETS.inc(len(keys) - len(found), result='miss')
+        return found
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
@@ -0,0 +1,438 @@
+"""
+values()-driven read serializers for hot list endpoints
+
+A CompiledReadSerializer wraps an existing ModelSerializer and produces the
+same output from values_list() tuples instead of model instances. The DRF
+serializer's fields are inspected once per class and compiled into a plan:
+the ORM lookups to select and, for every output key, a small accessor that
+reads its column and formats it the way the DRF field would (falling back to
+the field's own to_representation for types without a fast path).
+
+- Nested serializers read from the same row through joins.
+- many=True nested serializers cost one extra values_list() query per
+  relation, like prefetch_related.
+- Plans can be compiled for a utils.field_selection.FieldSelection
+  (?fields= / ?expand=); collapsed many=True relations select related pks.
+- SerializerMethodField methods are called with a lightweight object that
+  carries only the lookups declared on the method with @reads(...).
+- Fields with a callable source (e.g. 'items.count') are supplied by an
+  annotation of the same name on the compiled class.
+
+Anything else (properties, reverse one-to-one, many-to-many) raises
+ImproperlyConfigured when the plan is compiled, so unsupported serializers
+fail loudly instead of drifting from the DRF output.
+"""
+
+import decimal
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db.models import QuerySet
+from django.db.models.query import ModelIterable
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+# Returned by an accessor when DRF would leave the key out (SkipField)
+SKIP = object()
+
+
+def reads(*lookups):
+    """
+    Declare the ORM lookups a get_<field> method reads from obj, e.g.
+    @reads('weight_oz', 'metal__current_price'), so compiled serializers can
+    call it. The method must not depend on anything else on obj.
+    """
+    def decorator(method):
+        method.compiled_lookups = lookups
+        return method
+    return decorator
+
+
+class _Columns:
+    """Ordered, de-duplicated lookups selected by one values_list() query"""
+
+    def __init__(self):
+        self.lookups = []
+        self._index = {}
+
+    def add(self, lookup):
+        if lookup not in self._index:
+            self._index[lookup] = len(self.lookups)
+            self.lookups.append(lookup)
+        return self._index[lookup]
+
+
+def _resolve(model, parts, context):
+    """Walk a lookup path; return (final model field, whether a relation on the way is nullable)."""
+    nullable = False
+    field = None
+    for position, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f"{context}: '{part}' is not a field of {model.__name__}")
+        if position < len(parts) - 1:
+            if not (field.many_to_one or field.one_to_one) or field.auto_created:
+                raise ImproperlyConfigured(f"{context}: '{part}' is not a forward relation")
+            nullable = nullable or field.null
+            model = field.related_model
+    return field, nullable
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _decimal_formatter(field):
+    if field.decimal_places is None or field.localize:
+        return field.to_representation
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def format_decimal(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        quantized = value.quantize(exponent, rounding=rounding, context=context)
+        return '{:f}'.format(quantized) if coerce_to_string else quantized
+
+    return format_decimal
+
+
+def _datetime_formatter(field, tz):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or hasattr(field, 'timezone') or tz is None:
+        return field.to_representation
+    iso = output_format.lower() == ISO_8601
+
+    def format_datetime(value):
+        if isinstance(value, str) or not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(tz)
+        if iso:
+            value = value.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return value.strftime(output_format)
+
+    return format_datetime
+
+
+def _formatter(field, tz):
+    """Return a callable mirroring field.to_representation, or None for identity."""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # DRF returns the raw pk; values_list() already selects it
+        return None if field.pk_field is None else field.pk_field.to_representation
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_formatter(field, tz)
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return _isoformat
+        return field.to_representation
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return None
+    if type(field) is serializers.ReadOnlyField:
+        return None
+    return field.to_representation
+
+
+def _value_accessor(index, format_value):
+    if format_value is None:
+        return lambda row: row[index]
+
+    def accessor(row):
+        value = row[index]
+        return None if value is None else format_value(value)
+
+    return accessor
+
+
+def _guarded(accessor, guard, field):
+    """Mirror Field.get_attribute when a nullable relation on the source path is NULL."""
+    def on_missing():
+        if field.default is not empty:
+            try:
+                return field.get_default()
+            except SkipField:
+                return SKIP
+        if field.allow_null:
+            return None
+        return SKIP
+
+    def guarded_accessor(row):
+        if row[guard] is None:
+            return on_missing()
+        return accessor(row)
+
+    return guarded_accessor
+
+
+def _object_builder(lookups, columns, prefix):
+    """Build row -> object exposing the given lookups as nested attributes."""
+    tree = {}
+    for lookup in lookups:
+        parts = lookup.split('__')
+        node = tree
+        for depth, part in enumerate(parts[:-1]):
+            # A NULL relation becomes None on the object, as on a model instance
+            sentinel = columns.add(prefix + '__'.join(parts[:depth + 1]))
+            node = node.setdefault(part, {None: sentinel})
+        node[parts[-1]] = columns.add(prefix + lookup)
+
+    def compile_node(node):
+        sentinel = node.get(None)
+        values = [(name, index) for name, index in node.items() if name is not None and isinstance(index, int)]
+        children = [(name, compile_node(child)) for name, child in node.items() if isinstance(child, dict)]
+
+        def build(row):
+            if sentinel is not None and row[sentinel] is None:
+                return None
+            obj = SimpleNamespace()
+            for name, index in values:
+                setattr(obj, name, row[index])
+            for name, build_child in children:
+                setattr(obj, name, build_child(row))
+            return obj
+
+        return build
+
+    return compile_node(tree)
+
+
+class _Plan:
+    """Compiled form of one serializer over one values_list() query"""
+
+    def __init__(self, serializer, tz, annotations=None):
+        self.model = serializer.Meta.model
+        self.tz = tz
+        self.columns = _Columns()
+        self.many = []
+        self.annotations = {}
+        self.entries = self._compile(serializer, self.model, '', annotations or {}, top_level=True)
+
+    @property
+    def lookups(self):
+        return self.columns.lookups
+
+    def _compile(self, serializer, model, prefix, annotations, top_level):
+        context = type(serializer).__name__
+        columns = self.columns
+        entries = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            label = f'{context}.{name}'
+
+            if name in annotations and top_level:
+                self.annotations[name] = annotations[name]
+                entries.append((name, _value_accessor(columns.add(name), _formatter(field, self.tz))))
+                continue
+
+            if isinstance(field, serializers.SerializerMethodField):
+                method = getattr(serializer, field.method_name)
+                lookups = getattr(method, 'compiled_lookups', None)
+                if lookups is None:
+                    raise ImproperlyConfigured(f"{label}: decorate {field.method_name}() with @reads(...)")
+                for lookup in lookups:
+                    _resolve(model, lookup.split('__'), label)
+                build_obj = _object_builder(lookups, columns, prefix)
+                entries.append((name, lambda row, method=method, build_obj=build_obj: method(build_obj(row))))
+                continue
+
+            parts = field.source_attrs
+            if not parts:
+                raise ImproperlyConfigured(f"{label}: source='*' is only supported for SerializerMethodField")
+            model_field, nullable = _resolve(model, parts, label)
+            lookup = prefix + '__'.join(parts)
+
+            if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+                if not top_level or len(parts) != 1 or not model_field.one_to_many:
+                    raise ImproperlyConfigured(f"{label}: many=True is only supported for reverse foreign keys")
+                if isinstance(field, serializers.ListSerializer):
+                    child_plan = _Plan(field.child, self.tz)
+                elif isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+                    child_plan = _PrimaryKeyListPlan(model_field.related_model)
+                else:
+                    raise ImproperlyConfigured(f"{label}: only primary key many=True relations are supported")
+                fk_index = child_plan.columns.add(model_field.field.name)
+                pk_index = columns.add(model._meta.pk.name)
+                self.many.append((name, child_plan, model_field.field.name, fk_index, pk_index))
+                # Placeholder keeps the key order; filled in by _Plan.serialize()
+                entries.append((name, lambda row: None))
+                continue
+
+            if model_field.many_to_many or model_field.one_to_many or (model_field.one_to_one and model_field.auto_created):
+                raise ImproperlyConfigured(f"{label}: only forward relations and concrete fields are supported")
+
+            if isinstance(field, serializers.BaseSerializer):
+                if not model_field.is_relation:
+                    raise ImproperlyConfigured(f"{label}: nested serializer over a non-relation")
+                sentinel = columns.add(lookup)
+                nested = self._compile(field, model_field.related_model, lookup + '__', annotations, top_level=False)
+                accessor = self._row_builder(nested, sentinel)
+            else:
+                accessor = _value_accessor(columns.add(lookup), _formatter(field, self.tz))
+
+            if nullable:
+                guard = columns.add(prefix + '__'.join(parts[:-1]))
+                accessor = _guarded(accessor, guard, field)
+            entries.append((name, accessor))
+        return entries
+
+    @staticmethod
+    def _row_builder(entries, sentinel=None):
+        def build(row):
+            if sentinel is not None and row[sentinel] is None:
+                return None
+            data = {}
+            for name, accessor in entries:
+                value = accessor(row)
+                if value is not SKIP:
+                    data[name] = value
+            return data
+        return build
+
+    def queryset(self, queryset):
+        return queryset.prefetch_related(None).values_list(*self.lookups)
+
+    def serialize(self, rows):
+        build = self._row_builder(self.entries)
+        data = [build(row) for row in rows]
+        for name, child_plan, fk_name, fk_index, pk_index in self.many:
+            pks = {row[pk_index] for row in rows}
+            groups = defaultdict(list)
+            if pks:
+                child_queryset = child_plan.model._default_manager.filter(**{f'{fk_name}__in': pks})
+                child_rows = list(child_plan.queryset(child_queryset))
+                for child_row, item in zip(child_rows, child_plan.serialize(child_rows)):
+                    groups[child_row[fk_index]].append(item)
+            for row, item in zip(rows, data):
+                item[name] = groups.get(row[pk_index], [])
+        return data
+
+
+class _PrimaryKeyListPlan:
+    """many=True PrimaryKeyRelatedField (a collapsed ?expand= relation): related pks only"""
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = _Columns()
+        self.columns.add(model._meta.pk.name)
+
+    def queryset(self, queryset):
+        return queryset.values_list(*self.columns.lookups)
+
+    def serialize(self, rows):
+        return [row[0] for row in rows]
+
+
+class CompiledReadSerializer:
+    """
+    Read-only, list-only counterpart of serializer_class.
+
+        rows = TransactionReadSerializer.values(queryset)
+        TransactionReadSerializer(rows).data == TransactionSerializer(queryset, many=True).data
+    """
+
+    serializer_class = None
+    # {field_name: expression} for fields with a callable source
+    annotations = {}
+
+    _plans = {}
+    # Bound on cached plans, which ?fields= / ?expand= combinations multiply
+    MAX_PLANS = 256
+
+    def __init__(self, rows, selection=None):
+        self.selection = selection
+        if isinstance(rows, QuerySet) and rows._iterable_class is ModelIterable:
+            rows = self.values(rows, selection)
+        self.rows = rows
+
+    @classmethod
+    def get_plan(cls, selection=None):
+        """Compiled plan for the active timezone and an optional utils.field_selection.FieldSelection."""
+        # DRF renders datetimes in the active timezone, so plans are compiled per timezone
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        key = (cls, tz, selection.key if selection is not None else None)
+        plan = cls._plans.get(key)
+        if plan is None:
+            serializer = cls.serializer_class()
+            if selection is not None:
+                selection.apply(serializer)
+            plan = _Plan(serializer, tz, cls.annotations)
+            if len(cls._plans) >= cls.MAX_PLANS:
+                cls._plans.clear()
+            cls._plans[key] = plan
+        return plan
+
+    @classmethod
+    def values(cls, queryset, selection=None):
+        """Turn a model queryset into the values_list() queryset the plan reads."""
+        plan = cls.get_plan(selection)
+        if plan.annotations:
+            query = queryset.query
+            if not query.order_by and query.default_ordering and queryset.model._meta.ordering:
+                # Aggregate annotations add a GROUP BY, which drops Meta.ordering
+                queryset = queryset.order_by(*queryset.model._meta.ordering)
+            queryset = queryset.annotate(**plan.annotations)
+        return plan.queryset(queryset)
+
+    @property
+    def data(self):
+        return self.get_plan(self.selection).serialize(list(self.rows))
+
+
+@receiver(setting_changed)
+def _reset_plans(*, setting, **kwargs):
+    # DRF field defaults (decimal coercion, formats) are read when fields are built
+    if setting == 'REST_FRAMEWORK':
+        CompiledReadSerializer._plans.clear()
+
+
+class CompiledListMixin:
+    """
+    Serve list() from compiled_serializer_class when COMPILED_READ_SERIALIZERS
+    is on; the regular serializer is used otherwise.
+    """
+
+    compiled_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        return self.compiled_list_response(self.filter_queryset(self.get_queryset()))
+
+    def compiled_list_response(self, queryset):
+        compiled = getattr(settings, 'COMPILED_READ_SERIALIZERS', True)
+        # ?fields= / ?expand= when the view also uses utils.field_selection.FieldSelectionMixin
+        selection = self.get_field_selection() if hasattr(self, 'get_field_selection') else None
+        if compiled:
+            queryset = self.compiled_serializer_class.values(queryset, selection)
+
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        if compiled:
+            data = self.compiled_serializer_class(rows, selection).data
+        else:
+            data = self.get_serializer(rows, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
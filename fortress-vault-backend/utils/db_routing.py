@@ -0,0 +1,194 @@
+"""
+Read-replica routing
+
+Reads go to a replica only for GET/HEAD requests to views marked
+replica-safe, and only once the view has authenticated the user:
+
+    @replica_safe
+    class TransactionVolumeView(ReplicaReadMixin, viewsets.ViewSet): ...
+
+    class SomeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+        @replica_safe
+        @action(detail=False, methods=['get'])
+        def report(self, request): ...
+
+Everything else, including authentication and Celery tasks, reads from the
+primary. ReplicaRoutingMiddleware keeps per-request routing state:
+
+- the first write in a request switches its remaining reads to the primary
+- a user who wrote is pinned to the primary for REPLICA_STICKY_SECONDS
+  afterwards (read-your-writes across requests)
+- replicas lagging more than REPLICA_MAX_LAG_SECONDS, or failing the lag
+  check, are skipped. Lag is measured at most once per
+  REPLICA_LAG_CHECK_SECONDS per process.
+
+Replica aliases are listed in settings.DATABASE_REPLICAS; with none
+configured the router is a no-op.
+"""
+
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_KEY = 'db:sticky:{user_id}'
+
+# 0 on a primary or a replica that has replayed everything it received;
+# otherwise seconds since the last replayed transaction
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+# alias -> (checked at, lag in seconds or None when the replica is unusable)
+_lag_checks = {}
+
+
+class _RoutingState:
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+@contextmanager
+def request_routing():
+    """Routing state for one request (or any unit of work that wants replica reads)."""
+    state = _RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def replica_safe(view):
+    """Mark a ReplicaReadMixin view class or one of its actions as safe to read from a replica."""
+    view.replica_safe = True
+    return view
+
+
+def measure_replica_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # No replication to measure (e.g. a second SQLite alias for local testing)
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def replica_lag(alias):
+    """Cached lag of a replica in seconds, or None if it could not be checked."""
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5):
+        return checked[1]
+    try:
+        lag = measure_replica_lag(alias)
+    except Exception as e:
+        logger.warning(f"Replica {alias} unavailable, reading from primary: {e}")
+        lag = None
+    _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def is_sticky(user):
+    return bool(user is not None and user.is_authenticated and cache.get(STICKY_KEY.format(user_id=user.pk)))
+
+
+def choose_replica(user=None):
+    """A healthy replica alias for this user's reads, or None for the primary."""
+    replicas = get_replicas()
+    if not replicas or is_sticky(user):
+        return None
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2)
+    healthy = [alias for alias in replicas if (lag := replica_lag(alias)) is not None and lag <= max_lag]
+    return random.choice(healthy) if healthy else None
+
+
+def use_replica(user=None):
+    """Route the rest of the current request's reads to a replica when one is usable."""
+    state = _state.get()
+    if state is None or state.wrote:
+        return None
+    state.replica = choose_replica(user)
+    return state.replica
+
+
+class ReplicaRouter:
+    """Send reads to the replica chosen for the current request; writes always to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.replica and not state.wrote:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Per-request routing state and read-your-writes stickiness"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_routing() as state:
+            response = self.get_response(request)
+
+        if state.wrote and get_replicas():
+            # DRF copies the authenticated user back onto the Django request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                cache.set(
+                    STICKY_KEY.format(user_id=user.pk), 1,
+                    timeout=getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+                )
+        return response
+
+
+class ReplicaReadMixin:
+    """Read from a replica in @replica_safe views and actions (GET/HEAD only)"""
+
+    def is_replica_safe(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if getattr(self, 'replica_safe', False):
+            return True
+        handler = getattr(self, getattr(self, 'action', None) or request.method.lower(), None)
+        return getattr(handler, 'replica_safe', False)
+
+    def initial(self, request, *args, **kwargs):
+        # After authentication, so the user lookup itself always hits the primary
+        super().initial(request, *args, **kwargs)
+        if self.is_replica_safe(request):
+            use_replica(request.user)
@@ -1,7 +1,7 @@
 import logging
-import uuid
 from decimal import Decimal
-from datetime import date, datetime
+
+import orjson
 
 from django.db.models import Model
 from django.template.loader import render_to_string
@@ -11,21 +11,22 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 
-def _json_safe(value):
-    if value is None or isinstance(value, (str, int, float, bool)):
-        return value
-    if isinstance(value, (uuid.UUID, date, datetime)):
-        return str(value)
+def _json_safe_default(value):
     if isinstance(value, Decimal):
         return float(value)
     if isinstance(value, Model):
         return str(value.pk)
-    if isinstance(value, dict):
-        return {str(k): _json_safe(v) for k, v in value.items()}
-    if isinstance(value, (list, tuple)):
-        return [_json_safe(v) for v in value]
     return str(value)
 
+
+def _json_safe(value):
+    # One orjson round trip instead of walking the context in Python. Dates, times
+    # and dataclasses pass through to str() so logged contexts read as they always have.
+    return orjson.loads(orjson.dumps(value, default=_json_safe_default, option=(
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )))
+
+
 def send_html_email(subject, template_name, context, recipient_list, from_email=None):
     """
     Send an HTML email using a template.
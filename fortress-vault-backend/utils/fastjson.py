@@ -0,0 +1,128 @@
+"""
+orjson-backed JSON encoding for DRF responses, request parsing and WebSocket frames
+
+JSON_DECIMAL_MODE controls how Decimal values are written everywhere this
+module is used:
+
+    'number'  exact JSON number with the Decimal's own digits (default)
+    'string'  JSON string, e.g. "2345.67"
+
+Serializer DecimalFields still follow DRF's COERCE_DECIMAL_TO_STRING
+(strings by default); the mode applies to every Decimal that reaches the
+encoder, i.e. Decimals in hand-built response dicts, consumer payloads, and
+serializer output when coercion is turned off. Other types follow DRF's
+JSONEncoder conventions (UTC datetimes end in 'Z', UUIDs are strings, lazy
+translations are forced, querysets become lists).
+"""
+
+import datetime
+import decimal
+
+import orjson
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+DECIMAL_MODES = ('number', 'string')
+
+BASE_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def get_decimal_mode():
+    mode = getattr(settings, 'JSON_DECIMAL_MODE', 'number')
+    if mode not in DECIMAL_MODES:
+        raise ImproperlyConfigured(f"JSON_DECIMAL_MODE must be one of {DECIMAL_MODES}, not {mode!r}")
+    return mode
+
+
+def _decimal_as_number(value):
+    if not value.is_finite():
+        # NaN/Infinity have no JSON number form
+        return str(value)
+    return orjson.Fragment(format(value, 'f'))
+
+
+def _default_factory(decimal_mode):
+    encode_decimal = _decimal_as_number if decimal_mode == 'number' else str
+
+    def default(obj):
+        if isinstance(obj, decimal.Decimal):
+            return encode_decimal(obj)
+        if isinstance(obj, Promise):
+            return force_str(obj)
+        if isinstance(obj, datetime.timedelta):
+            return str(obj.total_seconds())
+        if isinstance(obj, QuerySet):
+            return list(obj)
+        if isinstance(obj, bytes):
+            return obj.decode()
+        if hasattr(obj, 'tolist'):
+            # Numpy arrays and array scalars
+            return obj.tolist()
+        if hasattr(obj, '__getitem__'):
+            try:
+                return list(obj) if isinstance(obj, (list, tuple)) else dict(obj)
+            except Exception:
+                pass
+        elif hasattr(obj, '__iter__'):
+            return list(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    return default
+
+
+_defaults = {mode: _default_factory(mode) for mode in DECIMAL_MODES}
+
+
+def dumps(obj, indent=False, decimal_mode=None):
+    """Serialize obj to JSON bytes."""
+    option = BASE_OPTIONS | orjson.OPT_INDENT_2 if indent else BASE_OPTIONS
+    return orjson.dumps(obj, default=_defaults[decimal_mode or get_decimal_mode()], option=option)
+
+
+def dumps_str(obj, **kwargs):
+    """Serialize obj to a JSON str (for text WebSocket frames)."""
+    return dumps(obj, **kwargs).decode()
+
+
+loads = orjson.loads
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Drop-in replacement for rest_framework.renderers.JSONRenderer"""
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = False
+        if accepted_media_type:
+            _, _, params = accepted_media_type.partition(';')
+            indent = 'indent=' in params.replace(' ', '')
+        ret = dumps(data, indent=indent)
+        # Like DRF, escape U+2028/U+2029 so the output is also valid JavaScript
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(BaseParser):
+    """Drop-in replacement for rest_framework.parsers.JSONParser"""
+
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
@@ -0,0 +1,229 @@
+"""
+Sparse fieldsets and nested expansion for read endpoints
+
+    ?fields=id,weight_oz,metal.symbol    only these keys (dotted paths reach into nested objects)
+    ?expand=product,product.metal        expand only these nested objects; others become ids
+
+Without ?expand= every nested object is expanded, as before; once it is
+present, nested serializers that are not listed (and not reached by a
+dotted ?fields= path) collapse to their primary key, or a list of primary
+keys for many=True. Unknown names in ?fields= are a 400.
+
+FieldSelectionMixin applies the selection to the view's serializer and
+rewrites the queryset's select_related / prefetch_related / only() to load
+just what the pruned serializer reads. CompiledListMixin passes the same
+selection to its compiled read serializer, whose values_list() columns
+follow the pruned fields directly.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _parse_paths(value):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _freeze(tree):
+    if tree is None:
+        return None
+    return tuple(sorted((name, _freeze(child)) for name, child in tree.items()))
+
+
+class FieldSelection:
+    """Parsed ?fields= / ?expand= trees; None means 'no restriction'"""
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+        fields = _parse_paths(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+        expand = _parse_paths(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None
+        return cls(fields or None, expand)
+
+    @property
+    def key(self):
+        return (_freeze(self.fields), _freeze(self.expand))
+
+    def apply(self, serializer):
+        """Prune a serializer instance's fields in place (use the child of a ListSerializer)."""
+        _apply(serializer, self.fields, self.expand, path='')
+        return serializer
+
+
+def _collapsed(field, name):
+    source = field.source if field.source != name else None
+    kwargs = {'read_only': True}
+    if source:
+        kwargs['source'] = source
+    if isinstance(field, serializers.ListSerializer):
+        return serializers.PrimaryKeyRelatedField(many=True, **kwargs)
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def _apply(serializer, fields, expand, path):
+    if fields is not None:
+        unknown = sorted(f'{path}{name}' for name in fields if name not in serializer.fields)
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [f"Unknown field(s): {', '.join(unknown)}"]})
+        for name in list(serializer.fields):
+            if name not in fields:
+                serializer.fields.pop(name)
+
+    for name, field in list(serializer.fields.items()):
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if not isinstance(nested, serializers.BaseSerializer):
+            continue
+        sub_fields = (fields or {}).get(name) or None
+        if expand is not None and name not in expand and not sub_fields:
+            serializer.fields[name] = _collapsed(field, name)
+            continue
+        sub_expand = expand.get(name, {}) if expand is not None else None
+        _apply(nested, sub_fields, sub_expand, path=f'{path}{name}.')
+
+
+class _LoadPlan:
+    """Columns and relations one queryset needs for a pruned serializer"""
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = set()
+        self.select = set()
+        self.prefetch = {}
+        # Set when a field reads attributes we cannot name: keep every column
+        # and the view's own select_related / prefetch_related
+        self.opaque = False
+
+    def add_path(self, model, parts, prefix=''):
+        """Record what reading obj.<parts> touches; stops at the first non-field part."""
+        for position, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                # A property or method: it may read any column of this object
+                self.opaque = True
+                return
+            lookup = prefix + '__'.join(parts[:position + 1])
+            if field.many_to_many or field.one_to_many:
+                self.prefetch.setdefault(lookup, None)
+                return
+            self.columns.add(lookup)
+            if not field.is_relation or position == len(parts) - 1:
+                return
+            self.select.add(lookup)
+            model = field.related_model
+
+    def apply(self, queryset):
+        if not self.opaque:
+            queryset = queryset.select_related(None).prefetch_related(None)
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        for lookup, child in sorted(self.prefetch.items()):
+            if child is None:
+                queryset = queryset.prefetch_related(lookup)
+            else:
+                queryset = queryset.prefetch_related(
+                    Prefetch(lookup, queryset=child.apply(child.model._default_manager.all()))
+                )
+        if not self.opaque:
+            queryset = queryset.only(*sorted(self.columns | {queryset.model._meta.pk.name}))
+        return queryset
+
+
+def _collect(serializer, plan, model, prefix=''):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            # @reads(...) from utils.compiled_serializers names what the method touches
+            lookups = getattr(getattr(serializer, field.method_name), 'compiled_lookups', None)
+            if lookups is None:
+                plan.opaque = True
+                continue
+            for lookup in lookups:
+                plan.add_path(model, lookup.split('__'), prefix)
+            continue
+
+        parts = field.source_attrs
+        if not parts:
+            plan.opaque = True
+            continue
+
+        is_many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+        if is_many and not prefix and len(parts) == 1:
+            try:
+                relation = model._meta.get_field(parts[0])
+            except FieldDoesNotExist:
+                relation = None
+            if relation is not None and relation.one_to_many:
+                child = _LoadPlan(relation.related_model)
+                # The prefetch matches children to parents through this foreign key
+                child.columns.add(relation.field.name)
+                if isinstance(field, serializers.ListSerializer):
+                    _collect(field.child, child, relation.related_model)
+                plan.prefetch[parts[0]] = child
+                continue
+
+        plan.add_path(model, parts, prefix)
+        if isinstance(field, serializers.BaseSerializer) and not is_many:
+            lookup = prefix + '__'.join(parts)
+            try:
+                related_model = model._meta.get_field(parts[0]).related_model if len(parts) == 1 else None
+            except FieldDoesNotExist:
+                related_model = None
+            if related_model is None:
+                plan.opaque = True
+                continue
+            plan.select.add(lookup)
+            _collect(field, plan, related_model, lookup + '__')
+
+
+def optimize_queryset(queryset, serializer):
+    """Restrict select_related / prefetch_related / only() to what serializer reads."""
+    plan = _LoadPlan(queryset.model)
+    _collect(serializer, plan, queryset.model)
+    return plan.apply(queryset)
+
+
+class FieldSelectionMixin:
+    """Apply ?fields= / ?expand= to a viewset's serializer and queryset (GET only)"""
+
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            request = self.request
+            self._field_selection = (
+                FieldSelection.from_request(request) if request.method in ('GET', 'HEAD') else None
+            )
+        return self._field_selection
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selection = self.get_field_selection()
+        if selection is not None:
+            selection.apply(getattr(serializer, 'child', serializer))
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_field_selection() is not None:
+            queryset = optimize_queryset(queryset, self.get_serializer())
+        return queryset
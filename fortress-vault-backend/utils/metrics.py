@@ -0,0 +1,332 @@
+"""
+In-process metrics with a Prometheus text exposition endpoint
+
+Counters, gauges and histograms record into a process-local buffer. A
+daemon thread flushes the buffered deltas to Redis every
+METRICS_FLUSH_INTERVAL seconds (one HINCRBYFLOAT per changed sample, one
+pipeline per flush), and Celery workers also flush after every task. Every
+gunicorn/daphne/Celery process adds into the same hashes, so /metrics on any
+worker reports cluster-wide totals. Without Redis (tests, local dev) the
+endpoint reports this process's own values.
+
+Gauges only move by inc()/dec() so that they add up across processes; a
+process killed with WebSocket connections open leaves its share behind
+until its metric hash is deleted.
+"""
+
+import atexit
+import hmac
+import ipaddress
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+METRIC_KEY = 'metrics:{name}'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_lock = threading.Lock()
+# (metric name, sample field) -> value, everything this process recorded
+_local = defaultdict(float)
+# Same keys, deltas not yet flushed to Redis
+_pending = defaultdict(float)
+_flusher_pid = None
+
+_LE = re.compile(r'le="([^"]+)"')
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return ','.join(f'{name}="{_escape(labels[name])}"' for name in self.labelnames)
+
+    def _record(self, suffix, labels, amount):
+        field = f'{suffix}{{{labels}}}' if labels else suffix
+        _ensure_flusher()
+        with _lock:
+            _local[(self.name, field)] += amount
+            _pending[(self.name, field)] += amount
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._record('', self._labels(labels), amount)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        self._record('', self._labels(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        self._record('', self._labels(labels), -amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        prefix = f'{labels},' if labels else ''
+        for bound in self.buckets:
+            if value <= bound:
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                self._record('_bucket', f'{prefix}le="{le}"', 1)
+        self._record('_sum', labels, value)
+        self._record('_count', labels, 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+REGISTRY = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request latency by view and DRF action',
+    ['view', 'action', 'method', 'status']
+)
+CELERY_TASK_SECONDS = Histogram(
+    'celery_task_runtime_seconds', 'Celery task runtime', ['task', 'state'], buckets=TASK_BUCKETS
+)
+CELERY_QUEUE_WAIT_SECONDS = Histogram(
+    'celery_task_queue_wait_seconds', 'Time from publish (or ETA) to task start', ['task'], buckets=TASK_BUCKETS
+)
+WEBSOCKET_CONNECTIONS = Gauge('websocket_open_connections', 'Open WebSocket connections', ['consumer'])
+WEBSOCKET_MESSAGES = Counter(
+    'websocket_messages_total', 'Outbound WebSocket queue events (see utils.websocket)', ['consumer', 'event']
+)
+CHANNEL_LAYER_SEND_SECONDS = Histogram(
+    'channel_layer_send_duration_seconds', 'Channel layer send latency', ['operation']
+)
+CACHE_GETS = Counter('django_cache_gets_total', 'Django cache lookups by result', ['result'])
+
+
+def flush():
+    """Push buffered deltas to Redis; without Redis they are only kept locally."""
+    with _lock:
+        if not _pending:
+            return
+        pending = dict(_pending)
+        _pending.clear()
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for (name, field), amount in pending.items():
+            pipe.hincrbyfloat(METRIC_KEY.format(name=name), field, amount)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to flush metrics: {e}")
+
+
+def _flush_loop():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+        flush()
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        if _flusher_pid is not None:
+            # Forked worker: the parent's samples are the parent's to flush
+            _local.clear()
+            _pending.clear()
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """{metric name: {sample field: value}}, cluster-wide when Redis is available."""
+    flush()
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for metric in REGISTRY:
+                pipe.hgetall(METRIC_KEY.format(name=metric.name))
+            return {
+                metric.name: {field.decode(): float(value) for field, value in raw.items()}
+                for metric, raw in zip(REGISTRY, pipe.execute())
+            }
+        except Exception as e:
+            logger.warning(f"Reading metrics from Redis failed, reporting this process only: {e}")
+    samples = {metric.name: {} for metric in REGISTRY}
+    with _lock:
+        for (name, field), value in _local.items():
+            samples[name][field] = value
+    return samples
+
+
+def _sample_key(field):
+    # Buckets in numeric le order, after the other labels
+    match = _LE.search(field)
+    le = float(match.group(1)) if match else 0.0
+    return (_LE.sub('', field), le)
+
+
+def render():
+    samples = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for field in sorted(samples[metric.name], key=_sample_key):
+            lines.append(f'{metric.name}{field} {_format_value(samples[metric.name][field])}')
+
+    gets = samples[CACHE_GETS.name]
+    hits = gets.get('{result="hit"}', 0)
+    total = hits + gets.get('{result="miss"}', 0)
+    lines.append('# HELP django_cache_hit_ratio Share of cache lookups that were hits')
+    lines.append('# TYPE django_cache_hit_ratio gauge')
+    lines.append(f'django_cache_hit_ratio {_format_value(hits / total if total else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _scrape_allowed(request):
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if not token and not allowed_ips:
+        # Nothing configured: only a development server is open
+        return settings.DEBUG
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if hmac.compare_digest(supplied.encode(), token.encode()):
+            return True
+    try:
+        # REMOTE_ADDR rather than X-Forwarded-For, which the client controls
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in allowed_ips)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape target. Requires the METRICS_AUTH_TOKEN bearer token or a
+    client address in METRICS_ALLOWED_IPS; with neither set it is only served
+    when DEBUG is on.
+    """
+    if not _scrape_allowed(request):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Observe request latency per resolved view and DRF action"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            view, action = '<unresolved>', ''
+        else:
+            view = match.view_name or match.route
+            # ViewSet.as_view({...}) keeps its method -> action map on the view function
+            action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower(), '')
+        HTTP_REQUEST_SECONDS.observe(
+            duration, view=view, action=action, method=request.method, status=response.status_code
+        )
+        return response
+
+
+_task_started = {}
+
+
+def _stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers['published_at'] = time.time()
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at is None:
+        return
+    ready_at = published_at
+    eta = getattr(task.request, 'eta', None)
+    if eta:
+        try:
+            ready_at = max(ready_at, datetime.fromisoformat(eta).timestamp())
+        except (TypeError, ValueError):
+            pass
+    CELERY_QUEUE_WAIT_SECONDS.observe(max(0.0, time.time() - ready_at), task=task.name)
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_SECONDS.observe(time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN')
+    flush()
+
+
+def install_celery_metrics():
+    """Connect the Celery signal handlers for task runtime and queue wait."""
+    from celery.signals import before_task_publish, task_postrun, task_prerun
+
+    before_task_publish.connect(_stamp_published_at, weak=False)
+    task_prerun.connect(_task_prerun, weak=False)
+    task_postrun.connect(_task_postrun, weak=False)
@@ -0,0 +1,257 @@
+"""
+Monthly range partitioning for append-mostly tables (PostgreSQL only)
+
+transactions, shipment_events, admin_actions and dev_emails are partitioned
+by month on their creation timestamp. Range filters on that column prune to
+the matching partitions, and the month being written stays small.
+
+- convert_to_partitioned() / convert_to_plain() are used by the migrations
+  to rebuild a table in place (data, indexes and foreign keys included)
+- ensure_partitions() creates partitions ahead of time; rows that landed in
+  the DEFAULT partition meanwhile are moved into the new month
+- archive_partitions() exports whole months past the retention window to
+  gzipped CSV files, then detaches and drops them
+
+The primary key becomes (id, <timestamp>), since Postgres requires the
+partition key in every unique constraint. Django still treats id as the
+primary key. Nothing may hold a database-level foreign key to these
+tables: TransactionNote.transaction uses db_constraint=False and the ORM
+still cascades deletes. On other databases everything here is a no-op.
+"""
+
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction as db_transaction
+
+logger = logging.getLogger(__name__)
+
+# table -> partition key column
+PARTITIONED_TABLES = {
+    'transactions': 'created_at',
+    'shipment_events': 'timestamp',
+    'admin_actions': 'timestamp',
+    'dev_emails': 'created_at',
+}
+
+_PARTITION_NAME = re.compile(r'^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def is_supported(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month.year:04d}_{month.month:02d}'
+
+
+def parse_partition_name(name):
+    """'transactions_p2026_01' -> ('transactions', date(2026, 1, 1)), or None."""
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return match.group('table'), date(int(match.group('year')), int(match.group('month')), 1)
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _quote(conn, name):
+    return conn.ops.quote_name(name)
+
+
+def partitions_to_archive(partition_names, today, retention_months):
+    """Names of monthly partitions that ended before the retention window starting retention_months ago."""
+    cutoff = add_months(month_start(today), -retention_months)
+    expired = []
+    for name in partition_names:
+        parsed = parse_partition_name(name)
+        if parsed is not None and add_months(parsed[1], 1) <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+def list_partitions(table, conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [table]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partition(cursor, conn, table, column, month):
+    """Create (or fill from DEFAULT) the partition for one month."""
+    name = partition_name(table, month)
+    start, end = _bound(month), _bound(add_months(month, 1))
+    qtable, qname = _quote(conn, table), _quote(conn, name)
+    with db_transaction.atomic(using=conn.alias):
+        # Built detached and attached afterwards so rows already sitting in the
+        # DEFAULT partition for this month can be moved in first
+        cursor.execute(f'CREATE TABLE {qname} (LIKE {qtable} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {_quote(conn, table + "_default")} '
+            f'WHERE {_quote(conn, column)} >= %s AND {_quote(conn, column)} < %s RETURNING *) '
+            f'INSERT INTO {qname} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE {qtable} ATTACH PARTITION {qname} FOR VALUES FROM (%s) TO (%s)', [start, end])
+    return name
+
+
+def ensure_partitions(months_ahead=3, today=None, tables=None, conn=None):
+    """Create missing monthly partitions up to months_ahead after the current month; returns the names created."""
+    conn = conn or connection
+    if not is_supported(conn):
+        return []
+    current = month_start(today or datetime.now(dt_timezone.utc))
+    created = []
+    with conn.cursor() as cursor:
+        for table in tables or PARTITIONED_TABLES:
+            existing = set(list_partitions(table, conn))
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if partition_name(table, month) not in existing:
+                    created.append(_create_partition(cursor, conn, table, PARTITIONED_TABLES[table], month))
+    return created
+
+
+def export_partition(name, directory, conn=None):
+    """Write a partition to <directory>/<name>.csv.gz; returns (path, rows)."""
+    conn = conn or connection
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial = f'{path}.partial'
+    with conn.cursor() as cursor:
+        with gzip.open(partial, 'wb') as f:
+            cursor.copy_expert(f'COPY {_quote(conn, name)} TO STDOUT WITH (FORMAT csv, HEADER)', f)
+        cursor.execute(f'SELECT count(*) FROM {_quote(conn, name)}')
+        rows = cursor.fetchone()[0]
+    os.replace(partial, path)
+    return path, rows
+
+
+def archive_partitions(directory, retention_months=12, today=None, tables=None, dry_run=False, conn=None):
+    """Export, detach and drop monthly partitions older than the retention window.
+
+    Returns [(partition, path, rows)]. A partition is only dropped after its
+    export has been written completely.
+    """
+    conn = conn or connection
+    if not is_supported(conn):
+        return []
+    today = today or datetime.now(dt_timezone.utc)
+    archived = []
+    for table in tables or PARTITIONED_TABLES:
+        for name in partitions_to_archive(list_partitions(table, conn), today, retention_months):
+            if dry_run:
+                archived.append((name, None, None))
+                continue
+            path, rows = export_partition(name, directory, conn)
+            with db_transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {_quote(conn, table)} DETACH PARTITION {_quote(conn, name)}')
+                cursor.execute(f'DROP TABLE {_quote(conn, name)}')
+            logger.info(f"Archived {rows} rows from {name} to {path}")
+            archived.append((name, path, rows))
+    return archived
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+def _table_definition(cursor, table):
+    """Index definitions and foreign keys to recreate after rebuilding a table."""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+        [table, table]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+    primary_key = cursor.fetchone()[0]
+    return indexes, foreign_keys, primary_key
+
+
+def _rebuild(schema_editor, table, create_sql, after_create=None):
+    conn = schema_editor.connection
+    old = f'{table}_old'
+    qtable, qold = _quote(conn, table), _quote(conn, old)
+    with conn.cursor() as cursor:
+        indexes, foreign_keys, primary_key = _table_definition(cursor, table)
+        cursor.execute(f'ALTER TABLE {qtable} RENAME TO {qold}')
+        cursor.execute(f'ALTER TABLE {qold} RENAME CONSTRAINT {_quote(conn, primary_key)} TO {_quote(conn, old + "_pkey")}')
+        cursor.execute(create_sql.format(table=qtable, old=qold))
+        if after_create:
+            after_create(cursor)
+        cursor.execute(f'INSERT INTO {qtable} SELECT * FROM {qold}')
+        cursor.execute(f'DROP TABLE {qold}')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qtable} ADD CONSTRAINT {_quote(conn, name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def convert_to_partitioned(schema_editor, table, months_ahead=3):
+    """Rebuild a plain table as a monthly-partitioned one with a DEFAULT partition."""
+    conn = schema_editor.connection
+    if not is_supported(conn):
+        return
+    column = PARTITIONED_TABLES[table]
+    qcolumn = _quote(conn, column)
+
+    def create_partitions(cursor):
+        cursor.execute(f'SELECT min({qcolumn}) FROM {_quote(conn, table + "_old")}')
+        oldest = cursor.fetchone()[0]
+        current = month_start(datetime.now(dt_timezone.utc))
+        month = month_start(oldest) if oldest else current
+        cursor.execute(
+            f'CREATE TABLE {_quote(conn, table + "_default")} PARTITION OF {_quote(conn, table)} DEFAULT'
+        )
+        while month <= add_months(current, months_ahead):
+            name = partition_name(table, month)
+            cursor.execute(
+                f'CREATE TABLE {_quote(conn, name)} PARTITION OF {_quote(conn, table)} FOR VALUES FROM (%s) TO (%s)',
+                [_bound(month), _bound(add_months(month, 1))]
+            )
+            month = add_months(month, 1)
+
+    _rebuild(
+        schema_editor, table,
+        'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ({qcolumn}); '
+        f'ALTER TABLE {{table}} ADD CONSTRAINT {_quote(conn, table + "_pkey")} PRIMARY KEY (id, {qcolumn})',
+        after_create=create_partitions
+    )
+
+
+def convert_to_plain(schema_editor, table):
+    """Reverse of convert_to_partitioned(): one ordinary table keyed on id."""
+    conn = schema_editor.connection
+    if not is_supported(conn):
+        return
+    _rebuild(
+        schema_editor, table,
+        'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS); '
+        f'ALTER TABLE {{table}} ADD CONSTRAINT {_quote(conn, table + "_pkey")} PRIMARY KEY (id)'
+    )
@@ -0,0 +1,36 @@
+"""
+Shared access to the Redis client behind the default cache
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sorted-set pop by score range: removes and returns up to ARGV[3] members
+# scored in [ARGV[1], ARGV[2]] in one atomic step, so two workers never
+# take the same member. Register with client.register_script().
+POP_RANGE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[2], 'LIMIT', 0, ARGV[3])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
+
+def get_redis_client():
+    """
+    Return the raw Redis client used by the default django-redis cache.
+
+    Returns None when the default cache is not Redis-backed (e.g. locmem in
+    tests) or Redis is unreachable, so callers can fall back to
+    process-local state.
+    """
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+    except Exception as e:
+        logger.warning(f"Redis connection unavailable: {e}")
+        return None
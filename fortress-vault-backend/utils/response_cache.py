@@ -0,0 +1,160 @@
+"""
+Conditional GET and shared rendered-response cache for public catalog endpoints
+
+Cached views declare which catalog scopes ('metals', 'products', 'vaults')
+their output depends on. Each scope has a version stored in the default
+cache; saving a Metal, Product or Vault bumps its scope (see the signals in
+trading and vaults). The ETag is derived from the view, the request path and
+query string and the current scope versions, so it changes exactly when the
+underlying data does, and the rendered bytes are stored under that ETag.
+
+A request whose If-None-Match matches gets a 304 without touching the ORM.
+Any other request with a cached body is answered straight from the stored
+bytes; only a miss runs the view, its queries and its serializers.
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version:{scope}'
+RESPONSE_KEY = 'catalog:response:{etag}'
+
+
+def bump_cache_versions(*scopes):
+    """Invalidate cached responses that depend on any of the given scopes."""
+    version = f'{time.time():.6f}'
+    try:
+        cache.set_many({VERSION_KEY.format(scope=scope): version for scope in scopes}, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to bump catalog cache versions {scopes}: {e}")
+
+
+def invalidate_cache_scopes(*scopes):
+    """
+    Bump scope versions now and again after the current transaction commits,
+    so a response cached from pre-commit data mid-transaction is dropped too.
+    """
+    bump_cache_versions(*scopes)
+    db_transaction.on_commit(lambda: bump_cache_versions(*scopes))
+
+
+def get_cache_versions(scopes):
+    """Return {scope: version}, seeding versions that are missing (e.g. after eviction)."""
+    keys = {VERSION_KEY.format(scope=scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        version = f'{time.time():.6f}'
+        for key in missing:
+            cache.add(key, version, timeout=None)
+        found.update(cache.get_many(missing))
+    return {scope: found.get(key) for key, scope in keys.items()}
+
+
+def _accepts_json(request):
+    # The browsable API (text/html) is rendered per request and never cached
+    if request.GET.get('format') not in (None, 'json'):
+        return False
+    accept = request.META.get('HTTP_ACCEPT', '')
+    return 'text/html' not in accept
+
+
+class CachedResponseMixin:
+    """
+    Response cache for read-only, non-personalised DRF views.
+
+    cache_scopes lists the catalog scopes the view's output depends on;
+    cached_actions limits caching to the public read actions of a viewset.
+    """
+
+    cache_scopes = ()
+    cached_actions = ('list', 'retrieve')
+
+    def _response_cache_state(self, request):
+        method = request.method.lower()
+        if method not in ('get', 'head') or not _accepts_json(request):
+            return None
+        action = getattr(self, 'action_map', {}).get('get')
+        if action not in self.cached_actions:
+            return None
+
+        try:
+            versions = get_cache_versions(self.cache_scopes)
+        except Exception as e:
+            logger.warning(f"Catalog cache unavailable, serving uncached: {e}")
+            return None
+        if None in versions.values():
+            return None
+
+        fingerprint = '|'.join([
+            type(self).__name__,
+            action,
+            request.get_host(),
+            request.path,
+            '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&'))),
+            *(f'{scope}={versions[scope]}' for scope in sorted(versions)),
+        ])
+        etag = '"' + hashlib.sha1(fingerprint.encode()).hexdigest() + '"'
+        last_modified = int(max(float(version) for version in versions.values()))
+        return etag, last_modified
+
+    def _not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            candidates = [tag.strip() for tag in if_none_match.split(',')]
+            return etag in candidates or f'W/{etag}' in candidates or '*' in candidates
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def _set_cache_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = f"public, max-age={getattr(settings, 'CATALOG_CACHE_MAX_AGE', 0)}"
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        state = self._response_cache_state(request)
+        if state is None:
+            return super().dispatch(request, *args, **kwargs)
+        etag, last_modified = state
+
+        if self._not_modified(request, etag, last_modified):
+            return self._set_cache_headers(HttpResponseNotModified(), etag, last_modified)
+
+        response_key = RESPONSE_KEY.format(etag=etag.strip('"'))
+        try:
+            cached = cache.get(response_key)
+        except Exception:
+            cached = None
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            return self._set_cache_headers(response, etag, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        if hasattr(response, 'render'):
+            response.render()
+        try:
+            cache.set(
+                response_key,
+                (response.content, response['Content-Type']),
+                timeout=getattr(settings, 'CATALOG_RESPONSE_CACHE_SECONDS', 3600)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store catalog response: {e}")
+        return self._set_cache_headers(response, etag, last_modified)
@@ -0,0 +1,299 @@
+"""
+Per-request SQL instrumentation and N+1 detection
+
+SQLInstrumentationMiddleware wraps every database connection with an
+execute_wrapper for the duration of a request and records each statement's
+duration and fingerprint (the parametrised SQL with IN (...) lists
+collapsed). From that it derives:
+
+- query count and total SQL time
+- duplicate queries: executions of a fingerprint beyond its first, which is
+  what an N+1 looks like from the database's side
+- the slowest single statement
+
+The numbers go out in a Server-Timing header (no SQL text) and into a
+per-endpoint aggregate in Redis, which the admin SQL stats endpoint ranks.
+Requests are summed per endpoint in process memory and written every
+SQL_STATS_FLUSH_EVERY requests or SQL_STATS_FLUSH_INTERVAL seconds,
+whichever comes first: one pipeline with one Lua call per endpoint seen, so
+most requests do no Redis I/O at all. Queries made from async views' worker threads
+outside the request thread are not seen.
+"""
+
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from redis.commands.core import Script
+
+from .redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_KEY = 'sqlstats:endpoint:{endpoint}'
+INDEX_KEY = 'sqlstats:endpoints'
+# Stored SQL text is cut to keep the hashes small
+MAX_SQL_LENGTH = 2000
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+# KEYS: endpoint hash, endpoint index
+# ARGV: endpoint, requests, queries, sql_ms, duplicates, requests_with_duplicates,
+#       max_queries, worst_ms, worst_sql, duplicate_count, duplicate_sql, ttl, now
+_RECORD_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'requests', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'queries', ARGV[3])
+redis.call('HINCRBYFLOAT', KEYS[1], 'sql_ms', ARGV[4])
+redis.call('HINCRBY', KEYS[1], 'duplicate_queries', ARGV[5])
+redis.call('HINCRBY', KEYS[1], 'requests_with_duplicates', ARGV[6])
+if tonumber(ARGV[7]) > tonumber(redis.call('HGET', KEYS[1], 'max_queries') or '0') then
+    redis.call('HSET', KEYS[1], 'max_queries', ARGV[7])
+end
+if tonumber(ARGV[8]) > tonumber(redis.call('HGET', KEYS[1], 'worst_ms') or '-1') then
+    redis.call('HSET', KEYS[1], 'worst_ms', ARGV[8])
+    redis.call('HSET', KEYS[1], 'worst_sql', ARGV[9])
+end
+if tonumber(ARGV[10]) > tonumber(redis.call('HGET', KEYS[1], 'top_duplicate_count') or '0') then
+    redis.call('HSET', KEYS[1], 'top_duplicate_count', ARGV[10])
+    redis.call('HSET', KEYS[1], 'top_duplicate_sql', ARGV[11])
+end
+redis.call('HSET', KEYS[1], 'last_seen', ARGV[13])
+redis.call('EXPIRE', KEYS[1], ARGV[12])
+redis.call('ZADD', KEYS[2], ARGV[13], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[12])
+"""
+# Hashed once here; the pipeline that runs it uploads it only if Redis lacks it
+_record_script = Script(None, _RECORD_SCRIPT.encode())
+
+_lock = threading.Lock()
+# endpoint -> stats summed since the last flush
+_buffer = {}
+_buffered_requests = 0
+_last_flush = time.monotonic()
+
+
+def fingerprint(sql):
+    """Normalise parametrised SQL so executions with different parameters compare equal."""
+    return _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', sql.strip()))
+
+
+class QueryRecorder:
+    """execute_wrapper that records every statement run while it is installed"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+
+    def record(self):
+        """Install on every configured connection; use as a context manager."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """[(fingerprint, executions)] for statements run more than once, most repeated first."""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for _, count in self.duplicates())
+
+    def worst(self):
+        """(sql, ms) of the slowest statement, or None."""
+        if not self.queries:
+            return None
+        return max(self.queries, key=lambda query: query[1])
+
+
+def endpoint_name(request):
+    """Stable per-endpoint label: method plus URL pattern name (never the raw path)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} <unresolved>'
+    return f'{request.method} {match.view_name or match.route}'
+
+
+def _endpoint_key(endpoint):
+    return ENDPOINT_KEY.format(endpoint=hashlib.sha1(endpoint.encode()).hexdigest()[:16])
+
+
+def record_endpoint_stats(endpoint, recorder):
+    """Add one request's statements to the buffered aggregate for its endpoint."""
+    global _buffered_requests
+    worst_sql, worst_ms = recorder.worst() or ('', 0.0)
+    duplicates = recorder.duplicates()
+    duplicate_sql, duplicate_count = duplicates[0] if duplicates else ('', 0)
+    with _lock:
+        stats = _buffer.setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'sql_ms': 0.0, 'duplicate_queries': 0,
+            'requests_with_duplicates': 0, 'max_queries': 0, 'worst_ms': -1.0, 'worst_sql': '',
+            'top_duplicate_count': 0, 'top_duplicate_sql': '',
+        })
+        stats['requests'] += 1
+        stats['queries'] += recorder.count
+        stats['sql_ms'] += recorder.total_ms
+        stats['duplicate_queries'] += recorder.duplicate_count
+        stats['requests_with_duplicates'] += 1 if recorder.duplicate_count else 0
+        stats['max_queries'] = max(stats['max_queries'], recorder.count)
+        if worst_ms > stats['worst_ms']:
+            stats['worst_ms'], stats['worst_sql'] = worst_ms, worst_sql[:MAX_SQL_LENGTH]
+        if duplicate_count > stats['top_duplicate_count']:
+            stats['top_duplicate_count'], stats['top_duplicate_sql'] = duplicate_count, duplicate_sql[:MAX_SQL_LENGTH]
+        _buffered_requests += 1
+        due = (
+            _buffered_requests >= getattr(settings, 'SQL_STATS_FLUSH_EVERY', 100)
+            or time.monotonic() - _last_flush >= getattr(settings, 'SQL_STATS_FLUSH_INTERVAL', 10)
+        )
+    if due:
+        flush_endpoint_stats()
+
+
+def flush_endpoint_stats():
+    """Write the buffered per-endpoint aggregates to Redis in one pipeline."""
+    global _buffered_requests, _last_flush
+    with _lock:
+        pending = dict(_buffer)
+        _buffer.clear()
+        _buffered_requests = 0
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    client = get_redis_client()
+    if client is None:
+        return
+    ttl = getattr(settings, 'SQL_STATS_TTL_SECONDS', 7 * 24 * 3600)
+    now = int(time.time())
+    try:
+        pipe = client.pipeline(transaction=False)
+        for endpoint, stats in pending.items():
+            _record_script(keys=[_endpoint_key(endpoint), INDEX_KEY], args=[
+                endpoint, stats['requests'], stats['queries'], f"{stats['sql_ms']:.3f}",
+                stats['duplicate_queries'], stats['requests_with_duplicates'], stats['max_queries'],
+                f"{stats['worst_ms']:.3f}", stats['worst_sql'],
+                stats['top_duplicate_count'], stats['top_duplicate_sql'], ttl, now
+            ], client=pipe)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record SQL stats for {len(pending)} endpoints: {e}")
+
+
+atexit.register(flush_endpoint_stats)
+
+
+SORT_FIELDS = ('queries', 'avg_queries', 'max_queries', 'sql_ms', 'avg_sql_ms', 'duplicate_queries', 'worst_ms')
+
+
+def get_endpoint_stats(order_by='duplicate_queries', limit=20):
+    """Aggregated per-endpoint stats from Redis, worst first."""
+    flush_endpoint_stats()
+    client = get_redis_client()
+    if client is None:
+        return []
+    endpoints = client.zrange(INDEX_KEY, 0, -1)
+    pipe = client.pipeline()
+    for endpoint in endpoints:
+        pipe.hgetall(ENDPOINT_KEY.format(endpoint=hashlib.sha1(endpoint).hexdigest()[:16]))
+    rows = []
+    for endpoint, raw in zip(endpoints, pipe.execute()):
+        if not raw:
+            continue
+        stats = {key.decode(): value.decode() for key, value in raw.items()}
+        requests = int(stats.get('requests', 0)) or 1
+        queries = int(stats.get('queries', 0))
+        sql_ms = float(stats.get('sql_ms', 0))
+        rows.append({
+            'endpoint': endpoint.decode(),
+            'requests': int(stats.get('requests', 0)),
+            'queries': queries,
+            'avg_queries': round(queries / requests, 2),
+            'max_queries': int(stats.get('max_queries', 0)),
+            'sql_ms': round(sql_ms, 2),
+            'avg_sql_ms': round(sql_ms / requests, 2),
+            'duplicate_queries': int(stats.get('duplicate_queries', 0)),
+            'requests_with_duplicates': int(stats.get('requests_with_duplicates', 0)),
+            'top_duplicate_sql': stats.get('top_duplicate_sql') or None,
+            'top_duplicate_count': int(stats.get('top_duplicate_count', 0)),
+            'worst_ms': round(float(stats.get('worst_ms', 0)), 2),
+            'worst_sql': stats.get('worst_sql') or None,
+            'last_seen': int(stats.get('last_seen', 0)),
+        })
+    rows.sort(key=lambda row: row[order_by], reverse=True)
+    return rows[:limit]
+
+
+def reset_endpoint_stats():
+    with _lock:
+        _buffer.clear()
+    client = get_redis_client()
+    if client is None:
+        return 0
+    endpoints = client.zrange(INDEX_KEY, 0, -1)
+    keys = [ENDPOINT_KEY.format(endpoint=hashlib.sha1(endpoint).hexdigest()[:16]) for endpoint in endpoints]
+    client.delete(INDEX_KEY, *keys)
+    return len(endpoints)
+
+
+def server_timing(recorder, request_ms):
+    metrics = [
+        f'app;dur={request_ms:.1f}',
+        f'db;dur={recorder.total_ms:.1f};desc="{recorder.count} queries, {recorder.duplicate_count} duplicate"',
+    ]
+    worst = recorder.worst()
+    if worst is not None:
+        metrics.append(f'db-worst;dur={worst[1]:.1f}')
+    return ', '.join(metrics)
+
+
+class SQLInstrumentationMiddleware:
+    """Record SQL per request; see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        request_ms = (time.perf_counter() - started) * 1000
+
+        if getattr(settings, 'SQL_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(recorder, request_ms)
+
+        endpoint = endpoint_name(request)
+        duplicates = recorder.duplicates()
+        threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 5)
+        if duplicates and duplicates[0][1] >= threshold:
+            sql, count = duplicates[0]
+            logger.warning(f"Possible N+1 on {endpoint}: {count} executions of {sql[:300]}")
+
+        if recorder.queries:
+            record_endpoint_stats(endpoint, recorder)
+        return response
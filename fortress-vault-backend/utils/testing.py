@@ -0,0 +1,45 @@
+"""
+Test helpers
+
+QueryBudgetMixin asserts SQL budgets with the same recorder the
+instrumentation middleware uses, and reports the offending statements
+(duplicate fingerprints first) when a budget is exceeded:
+
+    class PortfolioTests(QueryBudgetMixin, TestCase):
+        def test_list_budget(self):
+            self.assertEndpointBudget(self.client, 'get', '/api/trading/portfolio/', max_queries=2)
+"""
+
+from contextlib import contextmanager
+
+from .sql_instrumentation import QueryRecorder
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for per-endpoint query budgets"""
+
+    def _budget_report(self, recorder):
+        lines = [f"{recorder.count} queries, {recorder.duplicate_count} duplicate, {recorder.total_ms:.1f} ms"]
+        for sql, count in recorder.duplicates():
+            lines.append(f"  {count}x {sql}")
+        for position, (sql, duration) in enumerate(recorder.queries, start=1):
+            lines.append(f"  {position}. ({duration:.1f} ms) {sql}")
+        return '\n'.join(lines)
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_duplicates=0):
+        """Fail if the block runs more than max_queries statements or repeats one too often."""
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        if recorder.count > max_queries:
+            self.fail(f"Query budget of {max_queries} exceeded\n{self._budget_report(recorder)}")
+        if recorder.duplicate_count > max_duplicates:
+            self.fail(f"Duplicate query budget of {max_duplicates} exceeded\n{self._budget_report(recorder)}")
+
+    def assertEndpointBudget(self, client, method, url, max_queries, max_duplicates=0, status_code=200, **kwargs):
+        """Request url with client and check both the status code and the query budget."""
+        with self.assertQueryBudget(max_queries, max_duplicates):
+            response = getattr(client, method)(url, **kwargs)
+        self.assertEqual(response.status_code, status_code, getattr(response, 'data', response.content))
+        return response
@@ -0,0 +1,215 @@
+"""
+WebSocket consumer helpers - bounded outbound queues with backpressure
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+from utils import fastjson
+from utils.metrics import WEBSOCKET_CONNECTIONS, WEBSOCKET_MESSAGES
+
+# Close code sent when a client stops answering heartbeats
+PING_TIMEOUT_CLOSE_CODE = 4008
+# Close code sent when a client falls so far behind that messages which must
+# not be lost no longer fit in its queue; the client should reconnect and
+# reload state rather than carry on with a gap
+SEND_OVERFLOW_CLOSE_CODE = 4009
+
+# Process-wide counters keyed by (consumer class name, metric name)
+_metrics = Counter()
+
+
+def get_websocket_metrics():
+    """
+    Snapshot of outbound queue metrics for this process.
+
+    Returns a dict of {consumer_name: {metric: value}} where metric is one of
+    queued, sent, dropped, coalesced, overflow_closes and ping_timeouts.
+    """
+    snapshot = {}
+    for (consumer_name, metric), value in _metrics.items():
+        snapshot.setdefault(consumer_name, {})[metric] = value
+    return snapshot
+
+
+class BackpressureMixin:
+    """
+    Outbound flow control for AsyncWebsocketConsumer subclasses.
+
+    Messages go through queue_send() into a bounded per-connection queue that a
+    single writer task drains. Message types listed in coalesce_topics are
+    last-value-wins: a newer message replaces the pending one in place
+    instead of queueing behind it. Only those are ever discarded: when the
+    queue is full the oldest coalesced message is dropped, since a newer one
+    supersedes it anyway. Anything else (chat messages, notifications) is
+    never silently lost; if the queue is full of them the connection is
+    closed with SEND_OVERFLOW_CLOSE_CODE so the client reconnects and
+    reloads. Idle connections get a heartbeat ping and are closed when the
+    client stops sending anything (any frame, typically a pong) for
+    ping_timeout seconds.
+    """
+
+    # Message types where only the latest value matters (e.g. price snapshots)
+    coalesce_topics = ()
+    # Minimum seconds between flushes; lets bursts coalesce even when the
+    # server accepts writes without blocking
+    send_flush_interval = 0
+
+    async def on_heartbeat(self):
+        """Called every heartbeat_interval while the connection is open."""
+
+    @property
+    def send_queue_size(self):
+        return getattr(settings, 'WEBSOCKET_SEND_QUEUE_SIZE', 64)
+
+    @property
+    def heartbeat_interval(self):
+        return getattr(settings, 'WEBSOCKET_HEARTBEAT_INTERVAL', 25)
+
+    @property
+    def ping_timeout(self):
+        return getattr(settings, 'WEBSOCKET_PING_TIMEOUT', 75)
+
+    @property
+    def metrics_name(self):
+        return type(self).__name__
+
+    def _init_send_queue(self):
+        if hasattr(self, '_send_queue'):
+            return
+        self._send_queue = deque()
+        self._pending_topics = {}
+        self._send_ready = asyncio.Event()
+        self._background_tasks = []
+        self._last_received = time.monotonic()
+        self._last_sent = time.monotonic()
+        self._overflowed = False
+
+    def _count(self, metric, amount=1):
+        _metrics[(self.metrics_name, metric)] += amount
+        WEBSOCKET_MESSAGES.inc(amount, consumer=self.metrics_name, event=metric)
+
+    def _enqueue(self, text, topic=None):
+        """Add an encoded frame to the outbound queue, applying coalescing and the size bound."""
+        self._init_send_queue()
+        if self._overflowed:
+            return
+
+        coalesced = topic is not None and topic in self.coalesce_topics
+        if coalesced and topic in self._pending_topics:
+            self._pending_topics[topic] = text
+            self._count('coalesced')
+            return
+
+        if len(self._send_queue) >= self.send_queue_size and not self._drop_oldest_coalesced():
+            if coalesced:
+                # The queue is all must-deliver messages; a newer value will follow
+                self._count('dropped')
+                return
+            self._overflow()
+            return
+
+        if coalesced:
+            self._pending_topics[topic] = text
+            entry = (topic, None)
+        else:
+            entry = (None, text)
+        self._send_queue.append(entry)
+        self._count('queued')
+        self._send_ready.set()
+
+    def _drop_oldest_coalesced(self):
+        for index, (topic, _) in enumerate(self._send_queue):
+            if topic is not None:
+                del self._send_queue[index]
+                self._pending_topics.pop(topic, None)
+                self._count('dropped')
+                return True
+        return False
+
+    def _overflow(self):
+        # Closing is async; the writer does it once it wakes up
+        self._overflowed = True
+        self._send_queue.clear()
+        self._pending_topics.clear()
+        self._count('overflow_closes')
+        self._send_ready.set()
+
+    def _dequeue(self):
+        topic, text = self._send_queue.popleft()
+        if topic is not None:
+            text = self._pending_topics.pop(topic)
+        return text
+
+    async def queue_send(self, payload, topic=None):
+        """Encode payload as JSON (see utils.fastjson) and queue it for delivery to the client."""
+        self._enqueue(fastjson.dumps_str(payload), topic=topic if topic is not None else payload.get('type'))
+
+    async def accept(self, subprotocol=None):
+        await super().accept(subprotocol)
+        self._init_send_queue()
+        if not getattr(self, '_connection_counted', False):
+            WEBSOCKET_CONNECTIONS.inc(consumer=self.metrics_name)
+            self._connection_counted = True
+        self._background_tasks = [asyncio.ensure_future(self._writer())]
+        if self.heartbeat_interval:
+            self._background_tasks.append(asyncio.ensure_future(self._heartbeat()))
+
+    async def _writer(self):
+        try:
+            while True:
+                await self._send_ready.wait()
+                self._send_ready.clear()
+                if self._overflowed:
+                    await self.close(code=SEND_OVERFLOW_CLOSE_CODE)
+                    return
+                while self._send_queue:
+                    await self.send(text_data=self._dequeue())
+                    self._last_sent = time.monotonic()
+                    self._count('sent')
+                if self.send_flush_interval:
+                    await asyncio.sleep(self.send_flush_interval)
+        except asyncio.CancelledError:
+            pass
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                await asyncio.sleep(self.heartbeat_interval)
+                now = time.monotonic()
+                if self.ping_timeout and now - self._last_received > self.ping_timeout:
+                    self._count('ping_timeouts')
+                    await self.close(code=PING_TIMEOUT_CLOSE_CODE)
+                    return
+                await self.on_heartbeat()
+                idle_in = now - self._last_received >= self.heartbeat_interval
+                idle_out = now - self._last_sent >= self.heartbeat_interval
+                # A full queue already has traffic waiting; a ping would only displace it
+                if (idle_in or idle_out) and len(self._send_queue) < self.send_queue_size:
+                    self._enqueue(fastjson.dumps_str({'type': 'ping'}))
+        except asyncio.CancelledError:
+            pass
+
+    async def websocket_receive(self, message):
+        self._init_send_queue()
+        self._last_received = time.monotonic()
+
+        text_data = message.get('text')
+        if text_data and '"pong"' in text_data:
+            try:
+                if fastjson.loads(text_data).get('type') == 'pong':
+                    return
+            except (ValueError, AttributeError):
+                pass
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        for task in getattr(self, '_background_tasks', []):
+            task.cancel()
+        if getattr(self, '_connection_counted', False):
+            WEBSOCKET_CONNECTIONS.dec(consumer=self.metrics_name)
+            self._connection_counted = False
+        await super().websocket_disconnect(message)
@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from utils.response_cache import invalidate_cache_scopes
+from .models import Vault
+
+
+@receiver([post_save, post_delete], sender=Vault)
+def invalidate_vault_responses(sender, instance, **kwargs):
+    invalidate_cache_scopes('vaults')
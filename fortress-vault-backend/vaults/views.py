@@ -6,15 +6,17 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from utils.response_cache import CachedResponseMixin
 from .models import Vault
 from .serializers import VaultSerializer
 from trading.models import PortfolioItem
 from trading.serializers import PortfolioItemSerializer
 
 
-class VaultViewSet(viewsets.ReadOnlyModelViewSet):
+class VaultViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Vault viewset"""
     
+    cache_scopes = ('vaults',)
     queryset = Vault.objects.filter(status=Vault.Status.ACTIVE)
     serializer_class = VaultSerializer
     permission_classes = [AllowAny]
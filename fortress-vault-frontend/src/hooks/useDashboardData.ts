@@ -68,7 +68,7 @@ export const useDashboardData = () => {
             const response = await api.get<DashboardData>('/trading/portfolio/dashboard/');
             return response.data;
         },
-        refetchInterval: 60000, // Refresh every minute
+        // No polling: kept fresh by portfolio_update pushes (see useRealTimeData)
     });
 };
 
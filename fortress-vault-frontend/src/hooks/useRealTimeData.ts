@@ -33,6 +33,10 @@ export const useRealTimeData = () => {
             ws.onmessage = (event) => {
                 try {
                     const data = JSON.parse(event.data);
+                    if (data.type === 'ping') {
+                        ws.send(JSON.stringify({ type: 'pong' }));
+                        return;
+                    }
                     if (data.type === 'price_update') {
                         queryClient.setQueryData(['metals'], data.prices);
                         if (data.metal_prices) {
@@ -67,26 +71,45 @@ export const useRealTimeData = () => {
     useEffect(() => {
         if (!isAuthenticated) return;
 
-        const token = localStorage.getItem('access_token');
-        if (!token) return;
+        if (!localStorage.getItem('access_token')) return;
 
         const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const wsBaseUrl = `${wsProtocol}//${window.location.hostname}:9000/ws`;
 
+        // The dashboard has no polling fallback: this socket is its only source of
+        // updates, so reconnect after network drops, deploys and server-side idle
+        // closes (4008), backing off exponentially up to 30s.
+        let attempt = 0;
+        let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+        let stopped = false;
+
         const connectPortfolio = () => {
             if (portfolioWsRef.current?.readyState === WebSocket.OPEN) return;
 
+            // Read the token on every attempt: it may have been refreshed since
+            const token = localStorage.getItem('access_token');
+            if (!token) return;
+
             // Pass token in query string for our custom middleware
             const url = `${wsBaseUrl}/portfolio/?token=${token}`;
             const ws = new WebSocket(url);
 
             ws.onopen = () => {
                 console.log('Connected to Portfolio WebSocket');
+                if (attempt > 0) {
+                    // Pushes sent while disconnected were missed
+                    queryClient.invalidateQueries({ queryKey: ['dashboard'] });
+                }
+                attempt = 0;
             };
 
             ws.onmessage = (event) => {
                 try {
                     const data = JSON.parse(event.data);
+                    if (data.type === 'ping') {
+                        ws.send(JSON.stringify({ type: 'pong' }));
+                        return;
+                    }
                     if (data.type === 'portfolio_update') {
                         // Invalidate dashboard queries to refetch or update directly
                         // If backend sends full portfolio object:
@@ -108,6 +131,10 @@ export const useRealTimeData = () => {
 
             ws.onclose = (e) => {
                 console.log('Portfolio WebSocket closed', e.code, e.reason);
+                if (stopped) return;
+                const delay = Math.min(30000, 1000 * 2 ** attempt) * (0.5 + Math.random() / 2);
+                attempt += 1;
+                reconnectTimer = setTimeout(connectPortfolio, delay);
             };
 
             portfolioWsRef.current = ws;
@@ -116,6 +143,8 @@ export const useRealTimeData = () => {
         connectPortfolio();
 
         return () => {
+            stopped = true;
+            if (reconnectTimer) clearTimeout(reconnectTimer);
             portfolioWsRef.current?.close();
         };
 
@@ -39,7 +39,11 @@ export default function SupportChatPage() {
     const wsUrl = `${getWsBaseUrl()}/chat/${data.thread_id}/?token=${token}`;
     const ws = new WebSocket(wsUrl);
 
-    ws.onmessage = () => {
+    ws.onmessage = (event) => {
+      if (JSON.parse(event.data).type === 'ping') {
+        ws.send(JSON.stringify({ type: 'pong' }));
+        return;
+      }
       refetch();
     };
 